@@ -1,13 +1,26 @@
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
-from src.data.loader import load_data
-from src.data.profiler import generate_profile, format_profile_for_prompt
-from src.ai.agent import process_query
+from src.data.registry import open_upload, open_stored, get_dataset_registry, enable_copy_on_write
+from src.data.profiler import profile_dataset, get_full_profile, format_profile_for_prompt
+from src.data.rollups import get_rollup_store
+from src.ai.agent import speed_up_query
+from src.ai.code_cache import get_code_cache
+from src.ai.jobs import get_job_manager, JobRejected
+from src.ai.llm_client import get_llm_client
+from src.ai.prompt_budget import describe_prompt_sizes
+from src.execution.executor import warm_sandbox
+from src.execution.result_cache import get_result_cache
+from src.execution.speculative import get_strategy_stats
+from src.utils.helpers import hash_dataframe, format_dataframe_for_display
+from src.utils.history import new_chat_history
+from src.utils.tracing import describe_trace, get_tracer, start_metrics_server
 from src.visualization.chart_generator import should_visualize, create_chart
-import tempfile
-import os
+from src.visualization.rendering import render_figure, describe_render, page_count
 import json
+import uuid
+
+# Sessions share uploaded frames and hand generated code shallow views of them
+enable_copy_on_write()
 
 # Page configuration
 st.set_page_config(
@@ -22,13 +35,191 @@ if 'df' not in st.session_state:
 if 'profile' not in st.session_state:
     st.session_state.profile = None
 if 'chat_history' not in st.session_state:
-    st.session_state.chat_history = []
+    st.session_state.chat_history = new_chat_history()
 if 'data_profile_str' not in st.session_state:
     st.session_state.data_profile_str = ""
 if 'voice_enabled' not in st.session_state:
     st.session_state.voice_enabled = False
 if 'last_narrated' not in st.session_state:
     st.session_state.last_narrated = None
+if 'upload_id' not in st.session_state:
+    st.session_state.upload_id = None
+if 'profile_code' not in st.session_state:
+    from config.settings import PROFILE_EXECUTION
+    st.session_state.profile_code = PROFILE_EXECUTION
+if 'pending_speedup' not in st.session_state:
+    st.session_state.pending_speedup = None
+if 'dataset_key' not in st.session_state:
+    st.session_state.dataset_key = None
+if 'load_stats' not in st.session_state:
+    st.session_state.load_stats = None
+if 'dataset_lease' not in st.session_state:
+    st.session_state.dataset_lease = None
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if 'job_ids' not in st.session_state:
+    # Background questions whose answers are not in the chat history yet
+    st.session_state.job_ids = []
+
+def show_table(df: pd.DataFrame, key: str):
+    """Show a result one page at a time; only the current page is sent to the browser."""
+    from config.settings import RESULT_PAGE_ROWS
+    pages = page_count(len(df), RESULT_PAGE_ROWS)
+    page = 1
+    if pages > 1:
+        page = st.number_input(f"Page (of {pages:,})", min_value=1, max_value=pages, value=1, key=f"page_{key}")
+    st.dataframe(format_dataframe_for_display(df, RESULT_PAGE_ROWS, page - 1), use_container_width=True)
+    if pages > 1:
+        first = (page - 1) * RESULT_PAGE_ROWS + 1
+        st.caption(f"Rows {first:,}–{min(page * RESULT_PAGE_ROWS, len(df)):,} of {len(df):,}")
+
+def show_figure(fig, render_note: str = None):
+    st.plotly_chart(fig, use_container_width=True)
+    if render_note:
+        st.caption(f"📉 {render_note}")
+
+JOB_STAGES = {
+    'queued': "⏳ Waiting for a free slot",
+    'codegen': "🤔 Analyzing your data",
+    'validating': "🧪 Checking the code on a sample",
+    'running': "⚙️ Running the analysis",
+    'correcting': "🔄 Fixing an error",
+    'summarizing': "💡 Writing insight",
+}
+
+def build_assistant_message(job) -> dict:
+    """Turn a finished background job into a chat history message."""
+    response = job.response or {}
+    assistant_message = {"role": "assistant", "content": "", "question": job.question}
+    if job.error:
+        assistant_message["content"] = f"❌ Error processing query: {job.error}"
+        return assistant_message
+    if not response:
+        assistant_message["content"] = "✖️ Cancelled."
+        return assistant_message
+
+    if response.get('error'):
+        assistant_message["content"] = f"❌ Error: {response['error']}"
+        if response.get('was_retried'):
+            assistant_message["content"] += "\n\n🔄 Attempted automatic correction."
+    else:
+        if response.get('result') is not None:
+            if isinstance(response['result'], pd.DataFrame):
+                assistant_message["content"] = "📊 **Result:**"
+                assistant_message["result"] = response['result']
+            else:
+                assistant_message["content"] = f"📊 **Result:** {response['result']}"
+
+        # Show visualization if available
+        if response.get('fig') is not None:
+            assistant_message["fig"] = response['fig']
+        elif should_visualize(response.get('result')):
+            # Auto-generate chart
+            chart = create_chart(response.get('result'))
+            if chart:
+                assistant_message["fig"] = chart
+        if assistant_message.get("fig") is not None:
+            # Downsample once; history reruns reuse the bounded figure
+            assistant_message["fig"], render_report = render_figure(assistant_message["fig"])
+            assistant_message["render_note"] = describe_render(render_report)
+
+        if response.get('summary'):
+            assistant_message["content"] += f"\n\n💡 **Insight:** {response['summary']}"
+            # Store voice narrative for narration (prefer voice-optimized, fallback to summary)
+            assistant_message["summary_text"] = response.get('voice_narrative', response.get('summary', ''))
+        elif job.state == 'cancelled':
+            assistant_message["content"] += "\n\n✖️ Cancelled before the insight was written."
+
+    # Add code and stage timings to message
+    assistant_message["code"] = response.get('code', '')
+    assistant_message["language"] = response.get('language', 'python')
+    assistant_message["timings"] = response.get('timings', {})
+    assistant_message["warnings"] = response.get('warnings', [])
+    assistant_message["optimizations"] = response.get('optimizations', [])
+    assistant_message["sampling"] = response.get('sampling')
+    assistant_message["prompt_sizes"] = response.get('prompt_sizes', [])
+    assistant_message["speculation"] = response.get('speculation')
+    assistant_message["trace"] = response.get('trace', [])
+    assistant_message["line_profile"] = response.get('line_profile')
+    return assistant_message
+
+def collect_finished_jobs():
+    """Move the answers of this session's finished jobs into the chat history."""
+    manager = get_job_manager()
+    for job_id in list(st.session_state.job_ids):
+        job = manager.get(job_id)
+        if job is not None and not job.done:
+            continue
+        st.session_state.job_ids.remove(job_id)
+        if job is None:
+            # Pruned after JOB_RETENTION_SECONDS without being collected
+            continue
+        st.session_state.chat_history.append(build_assistant_message(job))
+        manager.forget(job_id)
+
+        # Trigger voice narration if enabled
+        if st.session_state.voice_enabled and job.response and job.response.get('summary'):
+            st.session_state.last_narrated = job.response['summary']
+
+from config.settings import JOB_POLL_SECONDS
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def show_active_jobs():
+    """Progress of this session's unfinished jobs; only this fragment reruns while polling."""
+    from config.settings import QUERY_ENGINE
+    manager = get_job_manager()
+    finished = False
+    for job_id in st.session_state.job_ids:
+        job = manager.get(job_id)
+        if job is None or job.done:
+            finished = True
+            continue
+        with st.chat_message("assistant"):
+            status = JOB_STAGES.get(job.stage, job.stage)
+            position = manager.position(job)
+            if position is not None:
+                status += f" (#{position} in line)"
+            st.markdown(f"{status}... · {job.elapsed():.0f}s")
+            st.caption(job.question)
+            if job.code:
+                st.code(job.code, language="sql" if QUERY_ENGINE == "duckdb" else "python")
+            if job.summary:
+                st.markdown(f"💡 **Insight:** {job.summary}")
+            if job.cancel_requested:
+                st.caption("✖️ Cancelling...")
+            elif st.button("✖️ Cancel", key=f"cancel_{job.id}"):
+                manager.cancel(job.id)
+    if finished:
+        # A full rerun moves the answer into the chat history
+        st.rerun()
+
+def show_history_result(history, index: int):
+    """Show a past message's result table; compacted ones are only rebuilt when toggled on."""
+    result_state = history.state(index, "result")
+    if result_state == "live":
+        show_table(history.load(index, "result"), str(index))
+    elif result_state in ("compact", "disk"):
+        if st.toggle("Show result table", key=f"show_result_{index}"):
+            result = history.load(index, "result")
+            if result is not None:
+                show_table(result, str(index))
+    elif result_state == "evicted":
+        st.caption("🗑️ Result table dropped to keep the session within its memory budget")
+
+def show_history_figure(history, index: int, message: dict):
+    """Show a past message's chart; compacted ones are only rebuilt when toggled on."""
+    fig_state = history.state(index, "fig")
+    if fig_state == "live":
+        show_figure(history.load(index, "fig"), message.get("render_note"))
+    elif fig_state in ("compact", "disk"):
+        if st.toggle("Show chart", key=f"show_fig_{index}"):
+            fig = history.load(index, "fig")
+            if history.format(index, "fig") == "png":
+                st.image(fig)
+            elif fig is not None:
+                show_figure(fig, message.get("render_note"))
+    elif fig_state == "evicted":
+        st.caption("🗑️ Chart dropped to keep the session within its memory budget")
 
 # Header
 st.title("✨ DataSpark - Autonomous Insight Agent")
@@ -38,10 +229,10 @@ st.markdown("**Your AI-powered data analyst. Upload data, ask questions, get ins
 with st.sidebar:
     st.header("📊 Data Upload")
     
-    from config.settings import MAX_FILE_SIZE_MB
+    from config.settings import MAX_FILE_SIZE_MB, QUERY_ENGINE
     uploaded_file = st.file_uploader(
-        "Upload CSV or JSON file",
-        type=['csv', 'json'],
+        "Upload CSV, JSON or JSON Lines file",
+        type=['csv', 'json', 'jsonl', 'ndjson'],
         help=f"Maximum file size: {MAX_FILE_SIZE_MB}MB"
     )
     
@@ -58,53 +249,182 @@ with st.sidebar:
         st.caption("💡 Insights will be narrated with Gemini-optimized voice narratives")
         st.caption("🎙️ Powered by Gemini AI + Browser TTS")
     
+    st.session_state.profile_code = st.toggle(
+        "🔥 Profile generated code",
+        value=st.session_state.profile_code,
+        help="Measure time and memory per line of the generated code (slower runs)"
+    )
+    
+    code_cache = get_code_cache()
+    if code_cache is not None:
+        cache_stats = code_cache.stats()
+        st.caption(
+            f"⚡ Code cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+            f"({cache_stats['evictions']} evicted)"
+        )
+    
+    llm_stats = get_llm_client().stats() if hasattr(get_llm_client(), 'stats') else None
+    if llm_stats and llm_stats['calls']:
+        st.caption(
+            f"🤖 LLM: {llm_stats['calls']} calls, {llm_stats['coalesced']} shared, {llm_stats['retries']} retries, "
+            f"p50 {llm_stats['latency_p50'] or 0:.1f}s / p95 {llm_stats['latency_p95'] or 0:.1f}s, "
+            f"{llm_stats['queue_depth']} queued, ~{llm_stats['prompt_tokens'] + llm_stats['response_tokens']:,} tokens"
+        )
+    for strategy, row in get_strategy_stats().summary().items():
+        st.caption(
+            f"🏁 {strategy}: {row['queries']} queries, {row['win_rate']:.0%} answered "
+            f"({row['first_try_rate']:.0%} without correction), p50 {row['p50_s']:.1f}s / p95 {row['p95_s']:.1f}s"
+        )
+    stage_stats = get_tracer().metrics.summary()
+    if stage_stats:
+        slowest = sorted(stage_stats.items(), key=lambda item: -item[1]['mean_s'])[:4]
+        st.caption("🔬 Stages: " + " · ".join(
+            f"{stage} {row['mean_s']:.2f}s avg" + (f" ({row['errors']} failed)" if row['errors'] else "")
+            for stage, row in slowest
+        ))
+    job_stats = get_job_manager().stats()
+    if job_stats['running'] or job_stats['queued']:
+        st.caption(f"🧵 Jobs: {job_stats['running']} running, {job_stats['queued']} queued "
+                   f"(up to {job_stats['max_concurrent']} at once)")
+    
+    result_cache = get_result_cache()
+    if result_cache is not None:
+        result_stats = result_cache.stats()
+        st.caption(
+            f"🗄️ Result cache: {result_stats['hits'] + result_stats['disk_hits']} hits / "
+            f"{result_stats['misses']} misses, {result_stats['bytes'] / 1024**2:.1f}MB in memory"
+            + (f", {result_stats['disk_bytes'] / 1024**2:.1f}MB on disk" if result_stats['disk_entries'] else "")
+        )
+    
+    registry_stats = get_dataset_registry().stats()
+    if registry_stats['datasets']:
+        st.caption(
+            f"🤝 Shared datasets: {registry_stats['datasets']} in memory "
+            f"({registry_stats['bytes'] / 1024**2:.0f}MB) for {registry_stats['sessions']} session(s)"
+        )
+    
+    history_stats = st.session_state.chat_history.stats()
+    if history_stats['messages']:
+        st.progress(
+            min(1.0, history_stats['memory_bytes'] / history_stats['max_bytes']),
+            text=(
+                f"🧠 Chat memory: {history_stats['memory_bytes'] / 1024**2:.1f} / "
+                f"{history_stats['max_bytes'] / 1024**2:.0f}MB"
+            )
+        )
+        st.caption(
+            f"{history_stats['live']} live, {history_stats['compact']} compressed, "
+            f"{history_stats['spilled']} on disk ({history_stats['disk_bytes'] / 1024**2:.1f}MB), "
+            f"{history_stats['evicted']} dropped"
+        )
+    
+    dataset = None  # (df, dataset_key, load_stats) to activate on this run
     if uploaded_file is not None:
         # Check file size
         file_size_mb = uploaded_file.size / (1024 * 1024)
         if file_size_mb > MAX_FILE_SIZE_MB:
             st.error(f"File size ({file_size_mb:.2f}MB) exceeds maximum ({MAX_FILE_SIZE_MB}MB)")
         else:
-            # Save uploaded file temporarily
-            file_ext = uploaded_file.name.split('.')[-1].lower()
-            with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{file_ext}') as tmp_file:
-                tmp_file.write(uploaded_file.getvalue())
-                tmp_path = tmp_file.name
-            
-            try:
-                # Load data
-                df = load_data(tmp_path, file_ext)
-                st.session_state.df = df
-                
-                # Generate profile
-                profile = generate_profile(df)
-                st.session_state.profile = profile
-                st.session_state.data_profile_str = format_profile_for_prompt(profile)
-                
-                st.success(f"✅ Data loaded successfully! ({len(df)} rows, {len(df.columns)} columns)")
-                
-                # Display profile
-                st.subheader("📋 Data Profile")
-                st.write(f"**Rows:** {profile['row_count']}")
-                st.write(f"**Columns:** {profile['column_count']}")
-                
-                st.write("**Column Types:**")
-                for col, dtype in profile['dtypes'].items():
-                    st.write(f"- {col}: `{dtype}`")
-                
-                st.write("**First 5 Rows:**")
-                st.dataframe(df.head(5), use_container_width=True)
-                
-            except Exception as e:
-                st.error(f"Error loading file: {str(e)}")
-            finally:
-                # Clean up temp file
-                if os.path.exists(tmp_path):
-                    os.unlink(tmp_path)
+            # Streamlit reruns the script on every interaction; only load a file once
+            upload_id = getattr(uploaded_file, 'file_id', None) or f"{uploaded_file.name}:{uploaded_file.size}"
+            if st.session_state.upload_id != upload_id:
+                file_ext = uploaded_file.name.split('.')[-1].lower()
+                try:
+                    # Sessions opening the same content share one frame; the store skips
+                    # parsing for content it has already converted
+                    dataset = open_upload(uploaded_file.getvalue(), file_ext)
+                    st.session_state.upload_id = upload_id
+                except Exception as e:
+                    st.error(f"Error loading file: {str(e)}")
+    elif st.session_state.df is None and st.query_params.get('dataset'):
+        # Restore the dataset after a browser refresh without re-parsing
+        restored_lease = open_stored(st.query_params['dataset'])
+        if restored_lease is not None:
+            dataset = (restored_lease, None)
+    
+    if dataset is not None:
+        lease, load_stats = dataset
+        df, dataset_key = lease.df, lease.key
+        try:
+            # Generate profile (cached per dataset; large frames get the fast tier first)
+            profile = profile_dataset(df, dataset_key)
+            rollup_store = get_rollup_store()
+            if rollup_store is not None:
+                # Pre-aggregate common query shapes in the background
+                rollup_store.schedule(df, profile)
+            previous_lease = st.session_state.dataset_lease
+            if previous_lease is not None and previous_lease is not lease:
+                previous_df = previous_lease.df
+                previous_lease.release()
+                result_cache = get_result_cache()
+                if previous_df is not df and get_dataset_registry().refs(previous_lease.key) == 0:
+                    # No session uses the previous upload any more; its results and rollups can't be used again
+                    if result_cache is not None:
+                        result_cache.invalidate_dataset(hash_dataframe(previous_df))
+                    if rollup_store is not None:
+                        rollup_store.invalidate(hash_dataframe(previous_df))
+            st.session_state.dataset_lease = lease
+            st.session_state.df = df
+            st.session_state.dataset_key = dataset_key
+            st.session_state.load_stats = load_stats
+            st.session_state.profile = profile
+            st.session_state.data_profile_str = format_profile_for_prompt(profile)
+            st.query_params['dataset'] = dataset_key
+        except Exception as e:
+            st.error(f"Error loading file: {str(e)}")
+    
+    if st.session_state.profile is not None and st.session_state.profile.get('tier') == 'fast':
+        # Swap in the exact profile once the background pass has finished
+        full_profile = get_full_profile(st.session_state.dataset_key)
+        if full_profile is not None:
+            st.session_state.profile = full_profile
+    
+    if st.session_state.df is not None and st.session_state.profile is not None:
+        df = st.session_state.df
+        profile = st.session_state.profile
+        load_stats = st.session_state.load_stats
+        
+        st.success(f"✅ Data loaded successfully! ({len(df)} rows, {len(df.columns)} columns)")
+        if load_stats and load_stats['source'] == 'shared':
+            st.caption("⏱️ Already open in another session; sharing its copy (no parsing, no extra memory)")
+        elif load_stats and load_stats['source'] == 'store':
+            st.caption(f"⏱️ Reloaded from dataset store in {load_stats['seconds']:.2f}s (no parsing)")
+        elif load_stats:
+            st.caption(
+                f"⏱️ Parsed in {load_stats['seconds']:.2f}s ({load_stats['rows_per_sec']:,.0f} rows/s, "
+                f"{load_stats['mode']} mode, peak memory +{load_stats['peak_rss_delta_mb'] or 0:.0f}MB)"
+            )
+        
+        # Display profile
+        st.subheader("📋 Data Profile")
+        st.write(f"**Rows:** {profile['row_count']}")
+        st.write(f"**Columns:** {profile['column_count']}")
+        if profile.get('tier') == 'fast':
+            st.caption(f"Statistics approximated from a {profile['sample_size']:,}-row sample; exact profile computing in the background")
+        rollup_store = get_rollup_store()
+        if rollup_store is not None and len(df) >= rollup_store.min_rows:
+            rollups = rollup_store.get(hash_dataframe(df))
+            if rollups is None:
+                st.caption("Pre-aggregating common group-by and trend queries in the background")
+            else:
+                info = rollups.describe()
+                st.caption(
+                    f"⚡ {info['cubes']} rollups over {', '.join(info['categories'] + info['dates']) or 'no'} "
+                    f"columns ready ({info['bytes'] / 1024**2:.1f}MB, built in {info['build_seconds']:.1f}s)"
+                )
+        
+        st.write("**Column Types:**")
+        for col, dtype in profile['dtypes'].items():
+            st.write(f"- {col}: `{dtype}`")
+        
+        st.write("**First 5 Rows:**")
+        st.dataframe(df.head(5), use_container_width=True)
 
 # Main chat interface
 if st.session_state.df is not None:
     st.header("💬 Ask Questions About Your Data")
-    
+    collect_finished_jobs()
+
     # Voice narration component (JavaScript)
     if st.session_state.voice_enabled and st.session_state.last_narrated:
         narration_text = st.session_state.last_narrated
@@ -153,78 +473,113 @@ if st.session_state.df is not None:
         """, height=0)
     
     # Display chat history
-    for message in st.session_state.chat_history:
+    for index, message in enumerate(st.session_state.chat_history):
         with st.chat_message(message["role"]):
             st.write(message["content"])
             
+            show_history_result(st.session_state.chat_history, index)
+            
             if "code" in message:
                 with st.expander("🔍 View Generated Code"):
-                    st.code(message["code"], language="python")
+                    st.code(message["code"], language=message.get("language", "python"))
+                    if message.get("timings"):
+                        st.caption(" · ".join(f"{stage} {seconds:.2f}s" for stage, seconds in message["timings"].items()))
+                    prompt_note = describe_prompt_sizes(message.get("prompt_sizes", []))
+                    if prompt_note:
+                        st.caption(f"📝 {prompt_note}")
+                    for rewrite in message.get("optimizations", []):
+                        if rewrite.get("applied"):
+                            speedup = f" ({rewrite['speedup']:.1f}x faster on a {rewrite['sample_rows']:,}-row sample)" if rewrite.get("speedup") else ""
+                            st.caption(f"⚡ Line {rewrite['line']}: vectorized {rewrite['pattern'].replace('_', ' ')}{speedup}")
+                    sampling = message.get("sampling")
+                    if sampling:
+                        caught = f", caught {sampling['errors_caught']} error(s)" if sampling['errors_caught'] else ""
+                        st.caption(
+                            f"🧪 Validated on a {sampling['sample_rows']:,}-row sample before the full "
+                            f"{sampling['full_rows']:,} rows{caught} · time saved {sampling['time_saved_s']:+.2f}s"
+                        )
+                    trace_note = describe_trace(message.get("trace", []))
+                    if trace_note:
+                        st.caption(f"🔬 {trace_note}")
+                    speculation = message.get("speculation")
+                    if speculation:
+                        outcome = (f"candidate {speculation['winner'] + 1} won" if speculation['winner'] is not None
+                                   else "none worked; corrected candidate 1")
+                        st.caption(
+                            f"🏁 {speculation['candidates']} candidates raced on the {speculation['phase']} data: "
+                            f"{outcome} after {speculation['race_s']:.2f}s, {speculation['cancelled']} cancelled"
+                        )
+                    for warning in message.get("warnings", []):
+                        st.caption(f"🐢 Line {warning['line']}: {warning['message']}")
+                    line_profile = message.get("line_profile")
+                    if line_profile:
+                        peak = f", peak {line_profile['peak_mb']:.1f}MB" if line_profile.get('peak_mb') is not None else ""
+                        st.caption(f"🔥 Line profile: {line_profile['seconds']:.2f}s{peak}")
+                        st.dataframe(
+                            pd.DataFrame([
+                                {"line": line['line'], "time s": round(line['seconds'], 4), "share": f"{line['share']:.0%}",
+                                 "hits": line['hits'], "net MB": line['net_mb'], "peak MB": line['peak_mb'],
+                                 "code": line['source']}
+                                for line in line_profile['lines']
+                            ]),
+                            hide_index=True, use_container_width=True
+                        )
+                        if message.get("question") and st.button("⚡ Make this faster", key=f"speedup_{index}"):
+                            st.session_state.pending_speedup = index
             
-            if "fig" in message and message["fig"] is not None:
-                st.plotly_chart(message["fig"], use_container_width=True)
+            show_history_figure(st.session_state.chat_history, index, message)
+    
+    if st.session_state.pending_speedup is not None:
+        slow_message = st.session_state.chat_history[st.session_state.pending_speedup]
+        st.session_state.pending_speedup = None
+        with st.chat_message("assistant"):
+            with st.spinner("⚡ Rewriting the hottest lines..."):
+                try:
+                    outcome = speed_up_query(slow_message["question"], st.session_state.df,
+                                             st.session_state.data_profile_str, slow_message["code"],
+                                             slow_message["line_profile"], slow_message.get("result"))
+                except Exception as e:
+                    outcome = {'accepted': False, 'reason': f"{type(e).__name__}: {e}", 'code': slow_message["code"]}
+        speedup_message = {"role": "assistant", "code": outcome['code'], "language": "python",
+                           "question": slow_message["question"], "prompt_sizes": outcome.get('prompt_sizes', [])}
+        if outcome['accepted']:
+            speedup_message["content"] = (
+                f"⚡ **Faster version:** {outcome['speedup']:.1f}x faster "
+                f"({outcome['original_seconds']:.2f}s → {outcome['seconds']:.2f}s, profiled)"
+            )
+            speedup_message["line_profile"] = outcome['line_profile']
+            if outcome.get('result') is not None:
+                speedup_message["result"] = outcome['result']
+            if outcome.get('fig') is not None:
+                speedup_message["fig"], render_report = render_figure(outcome['fig'])
+                speedup_message["render_note"] = describe_render(render_report)
+        else:
+            speedup_message["content"] = f"⚡ Kept the original code: {outcome['reason']}."
+        st.session_state.chat_history.append(speedup_message)
+        st.rerun()
     
-    # Query input
+    # Questions still being answered, refreshed in place until they finish
+    if st.session_state.job_ids:
+        show_active_jobs()
+    
+    # Query input; the question runs in the background so more can be asked meanwhile
     user_query = st.chat_input("Ask a question about your data...")
     
     if user_query:
-        # Add user message to history
-        st.session_state.chat_history.append({"role": "user", "content": user_query})
-        
-        # Process query
-        with st.spinner("🤔 Analyzing your data..."):
-            try:
-                response = process_query(
-                    user_query,
-                    st.session_state.df,
-                    st.session_state.data_profile_str
-                )
-                
-                # Display assistant response
-                assistant_message = {"role": "assistant", "content": ""}
-                
-                if response.get('error'):
-                    assistant_message["content"] = f"❌ Error: {response['error']}"
-                    if response.get('was_retried'):
-                        assistant_message["content"] += "\n\n🔄 Attempted automatic correction."
-                else:
-                    # Show result
-                    if response.get('result') is not None:
-                        if isinstance(response['result'], pd.DataFrame):
-                            assistant_message["content"] = "📊 **Result:**"
-                            st.dataframe(response['result'], use_container_width=True)
-                        else:
-                            assistant_message["content"] = f"📊 **Result:** {response['result']}"
-                    
-                    # Show visualization if available
-                    if response.get('fig') is not None:
-                        assistant_message["fig"] = response['fig']
-                    elif should_visualize(response.get('result')):
-                        # Auto-generate chart
-                        chart = create_chart(response.get('result'))
-                        if chart:
-                            assistant_message["fig"] = chart
-                    
-                    # Show summary
-                    if response.get('summary'):
-                        assistant_message["content"] += f"\n\n💡 **Insight:** {response['summary']}"
-                        # Store voice narrative for narration (prefer voice-optimized, fallback to summary)
-                        assistant_message["summary_text"] = response.get('voice_narrative', response.get('summary', ''))
-                
-                # Add code to message
-                assistant_message["code"] = response.get('code', '')
-                
-                st.session_state.chat_history.append(assistant_message)
-                
-                # Trigger voice narration if enabled
-                if st.session_state.voice_enabled and response.get('summary'):
-                    st.session_state.last_narrated = response['summary']
-                
-                # Rerun to show new message
-                st.rerun()
-                
-            except Exception as e:
-                st.error(f"Error processing query: {str(e)}")
+        try:
+            job = get_job_manager().submit(
+                st.session_state.session_id,
+                user_query,
+                st.session_state.df,
+                st.session_state.data_profile_str,
+                profile=st.session_state.profile_code
+            )
+        except JobRejected as e:
+            st.warning(f"⏳ {e}")
+        else:
+            st.session_state.chat_history.append({"role": "user", "content": user_query})
+            st.session_state.job_ids.append(job.id)
+            st.rerun()
 else:
     st.info("👆 Please upload a CSV or JSON file to get started!")
 
@@ -232,3 +587,11 @@ else:
 st.markdown("---")
 st.markdown("**DataSpark MVP** - Built with Streamlit & Google Gemini API")
 
+# The first page is already rendered; load the plotting libraries before the first query needs them
+from config.settings import SANDBOX_WARMUP, METRICS_PORT
+if SANDBOX_WARMUP:
+    warm_sandbox()
+if METRICS_PORT:
+    # Once per process; later reruns get the running server
+    start_metrics_server(METRICS_PORT)
+
@@ -0,0 +1,99 @@
+"""
+pandas vs DuckDB on the benchmark corpus.
+
+Runs each corpus query as generated pandas code (execute_code) and as
+generated SQL (execute_sql) over the same synthetic frame, checks that both
+engines return the same answer and prints the median times side by side:
+
+    python -m benchmarks.compare_engines --sizes 100000 1000000 10000000 --output engines.json
+"""
+import os
+
+# Measure execution, not the result cache
+os.environ.setdefault('RESULT_CACHE_ENABLED', 'false')
+
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.corpus import QUERIES, make_dataset
+from benchmarks.run_benchmarks import time_call, environment
+from src.execution.executor import execute_code
+from src.execution.sql_engine import execute_sql
+
+DEFAULT_SIZES = [100_000, 1_000_000]
+
+def _as_frame(value: Any) -> pd.DataFrame:
+    """Result as a frame with positional columns, rows in a canonical order."""
+    if isinstance(value, pd.Series):
+        value = value.reset_index()
+    if not isinstance(value, pd.DataFrame):
+        value = pd.DataFrame({'value': [value]})
+    frame = value.reset_index(drop=True)
+    frame.columns = range(frame.shape[1])
+    return frame.sort_values(list(frame.columns), ignore_index=True)
+
+def results_match(left: Any, right: Any) -> bool:
+    """Same answer from both engines, ignoring column names, row order and dtype width."""
+    left, right = _as_frame(left), _as_frame(right)
+    if left.shape != right.shape:
+        return False
+    for col in left.columns:
+        a, b = left[col], right[col]
+        if pd.api.types.is_numeric_dtype(a) and pd.api.types.is_numeric_dtype(b):
+            if not np.allclose(a.to_numpy(dtype=float), b.to_numpy(dtype=float), equal_nan=True):
+                return False
+        elif not (a.astype(str).to_numpy() == b.astype(str).to_numpy()).all():
+            return False
+    return True
+
+def compare_size(rows: int, repeat: int) -> List[Dict[str, Any]]:
+    df = make_dataset(rows)
+    records = []
+    for entry in QUERIES:
+        pandas_timing = time_call(lambda: execute_code(entry['code'], df.copy(), use_cache=False), repeat)
+        sql_timing = time_call(lambda: execute_sql(entry['sql'], df, use_cache=False), repeat)
+        (pandas_result, pandas_error), (sql_result, sql_error) = pandas_timing['value'], sql_timing['value']
+        match = (not pandas_error and not sql_error
+                 and results_match(pandas_result.get('result'), sql_result.get('result')))
+        records.append({
+            'rows': rows,
+            'query': entry['query'],
+            'pandas_seconds': pandas_timing['seconds'],
+            'duckdb_seconds': sql_timing['seconds'],
+            'match': match,
+            'error': pandas_error or sql_error,
+        })
+    return records
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare the pandas and DuckDB query engines")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="Dataset row counts")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed repetitions per measurement")
+    parser.add_argument('--output', help="Write results JSON here")
+    args = parser.parse_args(argv)
+
+    records = []
+    print(f"{'rows':>10} {'pandas':>10} {'duckdb':>10} {'speedup':>8}  match  query")
+    for rows in args.sizes:
+        for record in compare_size(rows, args.repeat):
+            records.append(record)
+            pandas_s, duckdb_s = record['pandas_seconds']['median'], record['duckdb_seconds']['median']
+            speedup = pandas_s / duckdb_s if duckdb_s else float('inf')
+            print(f"{rows:>10} {pandas_s:>10.4f} {duckdb_s:>10.4f} {speedup:>7.1f}x  "
+                  f"{'yes' if record['match'] else 'NO':<5}  {record['query']}")
+            if record['error']:
+                print(f"{'':>10} error: {record['error']}")
+
+    if args.output:
+        report = {'environment': environment(), 'config': {'repeat': args.repeat}, 'results': records}
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+    return 0 if all(record['match'] for record in records) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import re
+import numpy as np
+import pandas as pd
+from typing import List, Tuple
+from src.ai.llm_client import FakeLLMClient
+
+# Canned answers for the offline LLM. 'code' is what the model "generates" and
+# 'sql' the DuckDB answer (QUERY_ENGINE=duckdb), ordered so results line up with
+# the pandas ones; entries with 'broken_code'/'broken_sql' return that first so
+# the correction path runs.
+QUERIES = [
+    {
+        'query': "What is the total revenue by category?",
+        'code': "result = df.groupby('category')['revenue'].sum().reset_index()",
+        'sql': "SELECT category, SUM(revenue) AS revenue FROM df GROUP BY category ORDER BY category",
+    },
+    {
+        'query': "Show the monthly revenue trend",
+        'code': (
+            "monthly = df.groupby(pd.to_datetime(df['date']).dt.to_period('M').astype(str))['revenue'].sum()\n"
+            "result = monthly.reset_index()\n"
+            "fig = px.line(result, x='date', y='revenue', title='Monthly revenue')"
+        ),
+        'sql': (
+            "SELECT strftime(CAST(date AS DATE), '%Y-%m') AS date, SUM(revenue) AS revenue\n"
+            "FROM df GROUP BY 1 ORDER BY 1"
+        ),
+    },
+    {
+        'query': "Which product has the highest sales?",
+        'code': "result = df.groupby('product')['revenue'].sum().idxmax()",
+        'sql': "SELECT product FROM df GROUP BY product ORDER BY SUM(revenue) DESC LIMIT 1",
+    },
+    {
+        'query': "What is the average quantity per region?",
+        'code': "result = df.groupby('region')['quantity'].mean().reset_index()",
+        'sql': "SELECT region, AVG(quantity) AS quantity FROM df GROUP BY region ORDER BY region",
+    },
+    {
+        'query': "Who are the top 10 customers by revenue?",
+        'code': "result = df.groupby('customer_id')['revenue'].sum().nlargest(10).reset_index()",
+        'sql': (
+            "SELECT customer_id, SUM(revenue) AS revenue FROM df\n"
+            "GROUP BY customer_id ORDER BY revenue DESC LIMIT 10"
+        ),
+    },
+    {
+        'query': "How many orders are there per category and region?",
+        'code': "result = pd.crosstab(df['category'], df['region']).reset_index()",
+        'sql': (
+            "SELECT category,\n"
+            "    COUNT(*) FILTER (WHERE region = 'East') AS East,\n"
+            "    COUNT(*) FILTER (WHERE region = 'North') AS North,\n"
+            "    COUNT(*) FILTER (WHERE region = 'South') AS South,\n"
+            "    COUNT(*) FILTER (WHERE region = 'West') AS West\n"
+            "FROM df GROUP BY category ORDER BY category"
+        ),
+    },
+    {
+        'query': "How many orders fall into each size band?",
+        # Row-wise on purpose: exercises the vectorizing optimizer
+        'code': (
+            "bands = []\n"
+            "for _, row in df.iterrows():\n"
+            "    if row['quantity'] > 40:\n"
+            "        bands.append('bulk')\n"
+            "    else:\n"
+            "        bands.append('standard')\n"
+            "df['band'] = bands\n"
+            "result = df['band'].value_counts().reset_index()"
+        ),
+        'sql': (
+            "SELECT CASE WHEN quantity > 40 THEN 'bulk' ELSE 'standard' END AS band, COUNT(*) AS count\n"
+            "FROM df GROUP BY band ORDER BY count DESC"
+        ),
+    },
+    {
+        'query': "What is the revenue share by region?",
+        'broken_code': "result = df.groupby('Region')['revenue'].sum() / df['revenue'].sum()",
+        'code': "result = (df.groupby('region')['revenue'].sum() / df['revenue'].sum()).reset_index()",
+        'broken_sql': "SELECT region, SUM(revenues) / (SELECT SUM(revenues) FROM df) AS revenue FROM df GROUP BY region",
+        'sql': (
+            "SELECT region, SUM(revenue) / (SELECT SUM(revenue) FROM df) AS revenue\n"
+            "FROM df GROUP BY region ORDER BY region"
+        ),
+    },
+]
+
+SUMMARY_TEXT = "Revenue is concentrated in a few categories, with the top one contributing the largest share."
+NARRATIVE_TEXT = "Here's what stands out: most of the revenue comes from just a couple of categories."
+
+def make_dataset(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Synthetic sales data with the shape of tests/test_sample.csv plus region and customer."""
+    rng = np.random.default_rng(seed)
+    categories = np.array(['Electronics', 'Clothing', 'Food', 'Home', 'Sports', 'Toys'])
+    regions = np.array(['North', 'South', 'East', 'West'])
+    products = np.array([f"Product {i}" for i in range(200)])
+    dates = pd.Timestamp('2022-01-01') + pd.to_timedelta(rng.integers(0, 3 * 365, rows), unit='D')
+    return pd.DataFrame({
+        'date': dates.strftime('%Y-%m-%d'),
+        'product': products[rng.integers(0, len(products), rows)],
+        'category': categories[rng.integers(0, len(categories), rows)],
+        'region': regions[rng.integers(0, len(regions), rows)],
+        'customer_id': rng.integers(1, max(2, rows // 20), rows),
+        'revenue': np.round(rng.gamma(2.0, 250.0, rows), 2),
+        'quantity': rng.integers(1, 50, rows),
+    })
+
+def make_fake_llm(latency: float = 0.0) -> FakeLLMClient:
+    """Offline LLM that answers the corpus deterministically."""
+    rules: List[Tuple[str, str]] = [
+        (r'voice narration', NARRATIVE_TEXT),
+        (r'executive summary', SUMMARY_TEXT),
+    ]
+    for entry in QUERIES:
+        question = re.escape(f'User Question: "{entry["query"]}"')
+        # SQL prompts first: they also match the bare question
+        fixed_sql = f"```sql\n{entry['sql']}\n```"
+        rules.append((question + r'.*Previous DuckDB SQL query that failed', fixed_sql))
+        rules.append((question + r'.*DuckDB SQL', f"```sql\n{entry.get('broken_sql', entry['sql'])}\n```"))
+        fixed = f"```python\n{entry['code']}\n```"
+        rules.append((question + r'.*Previous code that failed', fixed))
+        rules.append((question, f"```python\n{entry.get('broken_code', entry['code'])}\n```"))
+    return FakeLLMClient(rules, latency=latency)
@@ -0,0 +1,115 @@
+"""
+Local HTTP stand-in for the LLM, serving the benchmark corpus.
+
+Speaks the protocol of HTTPLLMClient and can inject latency, a server-side
+rate limit and random 429/503 errors, so the shared client's throttling,
+retries and coalescing can be exercised without Gemini:
+
+    python -m benchmarks.fake_llm_server --port 8765 --latency 0.3 --rpm 60 --error-rate 0.1
+    LLM_BACKEND=http LLM_HTTP_URL=http://127.0.0.1:8765/generate streamlit run app.py
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+from benchmarks.corpus import make_fake_llm
+
+class FakeLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency: float = 0.0, rpm: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        super().__init__(address, _Handler)
+        self.llm = make_fake_llm()
+        self.latency = latency
+        self.rpm = rpm
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.rejected = 0
+        self.prompts = []
+        self._window = []
+        self._lock = threading.Lock()
+
+    def admit(self) -> Optional[float]:
+        """None if the request may proceed, else seconds the client should wait (429)."""
+        with self._lock:
+            self.requests += 1
+            now = time.monotonic()
+            self._window = [t for t in self._window if now - t < 60]
+            if self.rpm and len(self._window) >= self.rpm:
+                self.rejected += 1
+                return 60 - (now - self._window[0])
+            self._window.append(now)
+            return None
+
+class _Handler(BaseHTTPRequestHandler):
+    server: FakeLLMServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def _error(self, status: int, message: str, retry_after: Optional[float] = None) -> None:
+        self.send_response(status)
+        if retry_after is not None:
+            self.send_header('Retry-After', f"{retry_after:.2f}")
+        self.send_header('Content-Type', 'text/plain')
+        self.end_headers()
+        self.wfile.write(message.encode('utf-8'))
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        server = self.server
+        wait = server.admit()
+        if wait is not None:
+            return self._error(429, "Quota exceeded", retry_after=wait)
+        with server._lock:
+            failure = server.random.random() < server.error_rate
+            server.prompts.append(body['prompt'])
+        if failure:
+            with server._lock:
+                server.rejected += 1
+            status = server.random.choice([429, 503])
+            return self._error(status, "Injected failure", retry_after=0.05 if status == 429 else None)
+
+        if server.latency:
+            time.sleep(server.latency)
+        text = server.llm.respond(body['prompt'])
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        if not body.get('stream'):
+            self.wfile.write(json.dumps({'text': text}).encode('utf-8'))
+            return
+        for i in range(0, len(text), server.llm.chunk_size):
+            self.wfile.write((json.dumps({'text': text[i:i + server.llm.chunk_size]}) + '\n').encode('utf-8'))
+            self.wfile.flush()
+
+def start_server(port: int = 0, **options) -> FakeLLMServer:
+    """Serve in a background thread; port 0 picks a free port (see server.server_address)."""
+    server = FakeLLMServer(('127.0.0.1', port), **options)
+    threading.Thread(target=server.serve_forever, name='fake-llm-server', daemon=True).start()
+    return server
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Local fake LLM server for offline runs")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds per response")
+    parser.add_argument('--rpm', type=float, default=0.0, help="Requests per minute before answering 429")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests failing with 429/503")
+    args = parser.parse_args(argv)
+
+    server = FakeLLMServer(('127.0.0.1', args.port), latency=args.latency, rpm=args.rpm, error_rate=args.error_rate)
+    print(f"Fake LLM listening on http://127.0.0.1:{args.port}/generate", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
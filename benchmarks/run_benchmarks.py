@@ -0,0 +1,170 @@
+"""
+Offline benchmark of the query pipeline.
+
+Times load_data, generate_profile, execute_code, execute_with_retry,
+create_chart and the end-to-end process_query over synthetic datasets, with a
+deterministic local LLM in place of Gemini. Results are written as JSON so runs
+can be compared:
+
+    python -m benchmarks.run_benchmarks --sizes 10000 100000 1000000 --output before.json
+    python -m benchmarks.run_benchmarks --sizes 10000 100000 1000000 --compare before.json
+"""
+import os
+
+# Offline and uncached before any project module reads settings
+os.environ.setdefault('LLM_BACKEND', 'fake')
+os.environ.setdefault('CODE_CACHE_BACKEND', 'none')
+os.environ.setdefault('RESULT_CACHE_ENABLED', 'false')
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from benchmarks.corpus import QUERIES, make_dataset, make_fake_llm
+from src.ai.llm_client import set_llm_client
+from src.ai.agent import process_query
+from src.data.loader import load_data
+from src.data.profiler import generate_profile, format_profile_for_prompt
+from src.execution.executor import execute_code
+from src.execution.error_handler import execute_with_retry
+from src.visualization.chart_generator import should_visualize, create_chart
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+def time_call(fn: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    """Run fn repeat times; return min/median/max seconds and the last return value."""
+    samples = []
+    value = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = fn()
+        samples.append(time.perf_counter() - start)
+    return {
+        'seconds': {'min': min(samples), 'median': statistics.median(samples), 'max': max(samples)},
+        'value': value,
+    }
+
+def benchmark_size(rows: int, repeat: int, backend: str, workdir: str) -> List[Dict[str, Any]]:
+    """Benchmark every stage on one synthetic dataset."""
+    records = []
+
+    def record(stage: str, timing: Dict[str, Any], query: Optional[str] = None, **extra) -> None:
+        records.append({'rows': rows, 'stage': stage, 'query': query, 'seconds': timing['seconds'], **extra})
+
+    csv_path = os.path.join(workdir, f"sales_{rows}.csv")
+    if not os.path.exists(csv_path):
+        make_dataset(rows).to_csv(csv_path, index=False)
+
+    timing = time_call(lambda: load_data(csv_path, 'csv'), repeat)
+    df = timing['value']
+    record('load_data', timing, file_mb=os.path.getsize(csv_path) / 1024**2)
+
+    for tier in ('fast', 'full'):
+        timing = time_call(lambda: generate_profile(df, tier=tier), repeat)
+        record('generate_profile', timing, tier=tier)
+    data_profile = format_profile_for_prompt(timing['value'])
+
+    for entry in QUERIES:
+        query = entry['query']
+        timing = time_call(lambda: execute_code(entry['code'], df, backend=backend), repeat)
+        result_dict, error_message = timing['value']
+        record('execute_code', timing, query, error=error_message)
+
+        if 'broken_code' in entry:
+            timing = time_call(
+                lambda: execute_with_retry(entry['broken_code'], df, query, data_profile), repeat
+            )
+            record('execute_with_retry', timing, query, was_retried=timing['value'][2], error=timing['value'][1])
+
+        result = result_dict.get('result')
+        if not error_message and should_visualize(result) and isinstance(result, pd.DataFrame):
+            timing = time_call(lambda: create_chart(result), repeat)
+            record('create_chart', timing, query)
+
+        timing = time_call(lambda: process_query(query, df, data_profile), repeat)
+        record('process_query', timing, query, error=timing['value'].get('error'))
+
+    return records
+
+def environment() -> Dict[str, Any]:
+    """Describe the machine and code version a run was made on."""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+def compare(current: List[Dict[str, Any]], baseline: List[Dict[str, Any]]) -> None:
+    """Print median time ratios (current / baseline) for matching measurements."""
+    def key(record):
+        return (record['rows'], record['stage'], record.get('query'), record.get('tier'))
+
+    previous = {key(record): record for record in baseline}
+    print(f"{'rows':>10}  {'stage':<20} {'baseline':>10} {'current':>10} {'ratio':>7}  query")
+    for record in current:
+        old = previous.get(key(record))
+        if old is None:
+            continue
+        before, after = old['seconds']['median'], record['seconds']['median']
+        ratio = after / before if before else float('inf')
+        label = record.get('query') or record.get('tier') or ''
+        print(f"{record['rows']:>10}  {record['stage']:<20} {before:>10.4f} {after:>10.4f} {ratio:>6.2f}x  {label}")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline DataSpark pipeline benchmark")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="Dataset row counts (e.g. 10000 100000 1000000 10000000)")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed repetitions per measurement")
+    parser.add_argument('--backend', default='inline', choices=['inline', 'pool'], help="Execution backend")
+    parser.add_argument('--llm-latency', type=float, default=0.0,
+                        help="Seconds of simulated latency per fake LLM call")
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'dataspark-bench'),
+                        help="Where generated CSV files are cached between runs")
+    parser.add_argument('--output', help="Write results JSON here (default: stdout)")
+    parser.add_argument('--compare', help="Baseline results JSON to compare against")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.workdir, exist_ok=True)
+    set_llm_client(make_fake_llm(latency=args.llm_latency))
+
+    records = []
+    for rows in args.sizes:
+        print(f"Benchmarking {rows:,} rows...", file=sys.stderr)
+        records.extend(benchmark_size(rows, args.repeat, args.backend, args.workdir))
+
+    report = {
+        'environment': environment(),
+        'config': {'repeat': args.repeat, 'backend': args.backend, 'llm_latency': args.llm_latency},
+        'results': records,
+    }
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(records, json.load(f)['results'])
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+Cold-start import time report.
+
+Imports the modules app.py loads at startup in a fresh interpreter with
+`python -X importtime`, prints the slowest imports and fails when the total
+exceeds the budget, so startup regressions show up before deploy:
+
+    python -m benchmarks.startup --budget-ms 1500
+    python -m benchmarks.startup --output startup.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional
+
+# What app.py imports before the first page renders (streamlit itself excluded)
+STARTUP_MODULES = [
+    'config.settings',
+    'src.data.store',
+    'src.data.profiler',
+    'src.ai.agent',
+    'src.ai.code_cache',
+    'src.execution.executor',
+    'src.visualization.chart_generator',
+]
+
+# Must stay lazy: generated code or a background thread loads them on demand
+LAZY_MODULES = ['matplotlib.pyplot', 'seaborn', 'plotly.express', 'google.generativeai', 'langchain']
+
+DEFAULT_BUDGET_MS = 1500
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """Parse `-X importtime` output into {module, self_us, cumulative_us, depth} records."""
+    records = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+            records.append({
+                'module': name.strip(),
+                'self_us': int(self_us),
+                'cumulative_us': int(cumulative_us),
+                # importtime indents nested imports by two spaces per level
+                'depth': (len(name) - len(name.lstrip()) - 1) // 2,
+            })
+        except ValueError:
+            continue
+    return records
+
+def measure(modules: List[str], python: str = sys.executable) -> Dict[str, Any]:
+    """Import modules in a fresh interpreter and report where the time went."""
+    script = '; '.join(f'import {module}' for module in modules)
+    script += '; import sys; print(",".join(m for m in %r if m in sys.modules))' % (LAZY_MODULES,)
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    proc = subprocess.run(
+        [python, '-X', 'importtime', '-c', script],
+        cwd=repo_root, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Import failed:\n{proc.stderr[-2000:]}")
+
+    records = parse_importtime(proc.stderr)
+    top_level = [record for record in records if record['depth'] == 0]
+    loaded_lazy = [name for name in proc.stdout.strip().split(',') if name]
+    return {
+        'total_ms': sum(record['cumulative_us'] for record in top_level) / 1000,
+        'modules_imported': len(records),
+        'slowest': sorted(top_level, key=lambda record: record['cumulative_us'], reverse=True),
+        'eagerly_loaded_lazy_modules': loaded_lazy,
+    }
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="DataSpark cold-start import time report")
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS,
+                        help="Fail when total import time exceeds this many milliseconds")
+    parser.add_argument('--top', type=int, default=15, help="Number of slowest top-level imports to show")
+    parser.add_argument('--output', help="Also write the report as JSON here")
+    args = parser.parse_args(argv)
+
+    report = measure(STARTUP_MODULES)
+    report['budget_ms'] = args.budget_ms
+
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for record in report['slowest'][:args.top]:
+        print(f"{record['cumulative_us'] / 1000:>14.1f} {record['self_us'] / 1000:>9.1f}  {record['module']}")
+    print(f"\nTotal: {report['total_ms']:.0f} ms over {report['modules_imported']} modules "
+          f"(budget {args.budget_ms:.0f} ms)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    failed = False
+    if report['eagerly_loaded_lazy_modules']:
+        print(f"FAIL: imported at startup: {', '.join(report['eagerly_loaded_lazy_modules'])}")
+        failed = True
+    if report['total_ms'] > args.budget_ms:
+        print("FAIL: import time budget exceeded")
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
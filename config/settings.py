@@ -1,15 +1,15 @@
 import os
+import sys
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Try to import streamlit for secrets (Streamlit Cloud)
-try:
+# Use streamlit for secrets (Streamlit Cloud) only when running inside the app;
+# batch jobs, benchmarks and pool workers shouldn't pay for importing it
+_streamlit_available = 'streamlit' in sys.modules
+if _streamlit_available:
     import streamlit as st
-    # Streamlit Cloud uses st.secrets
-    _streamlit_available = True
-except ImportError:
-    _streamlit_available = False
 
 # API Configuration
 # Priority: Streamlit secrets > Environment variable > .env file
@@ -35,13 +35,200 @@ elif len(GEMINI_API_KEY) < 20:  # Basic validation - API keys are typically long
     import warnings
     warnings.warn("GEMINI_API_KEY appears to be invalid. Please check your configuration.")
 
+# LLM backend: 'gemini', 'http' or 'fake' (deterministic offline stand-in for benchmarks)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+# Use gemini-2.5-flash for fast responses, or gemini-2.5-pro for better quality
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+# 'http' backend: JSON endpoint such as benchmarks/fake_llm_server.py
+LLM_HTTP_URL = os.getenv("LLM_HTTP_URL", "http://127.0.0.1:8765/generate")
+# Shared client limits: requests/tokens per minute (0 = unlimited), per-call
+# timeout, retries with jittered exponential backoff, and coalescing of
+# identical prompts already in flight
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "30"))
+LLM_COALESCE = os.getenv("LLM_COALESCE", "true").lower() == "true"
+# Threads making LLM calls; a timed-out call keeps its thread until the backend's own
+# timeout ends it, so this also caps the threads such calls can hold
+LLM_MAX_WORKERS = int(os.getenv("LLM_MAX_WORKERS", "32"))
+# Codegen/correction prompts: schemas of wide datasets are cut down to the
+# columns a question mentions so the whole prompt stays near this many tokens
+# (0 disables), and tracebacks keep only the generated code's frames
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "2000"))
+PROMPT_MAX_DETAIL_COLUMNS = int(os.getenv("PROMPT_MAX_DETAIL_COLUMNS", "40"))
+PROMPT_TRACEBACK_MAX_CHARS = int(os.getenv("PROMPT_TRACEBACK_MAX_CHARS", "2000"))
+
 # File Upload Configuration
-MAX_FILE_SIZE_MB = 20
-ALLOWED_EXTENSIONS = ['.csv', '.json']
+MAX_FILE_SIZE_MB = int(os.getenv("MAX_FILE_SIZE_MB", "500"))
+ALLOWED_EXTENSIONS = ['.csv', '.json', '.jsonl', '.ndjson']
+
+# Loader Configuration
+# Files above this size are read in chunks and downcast while streaming
+LOADER_CHUNKED_THRESHOLD_MB = int(os.getenv("LOADER_CHUNKED_THRESHOLD_MB", "20"))
+LOADER_CHUNK_ROWS = int(os.getenv("LOADER_CHUNK_ROWS", "200000"))
+LOADER_CSV_ENGINE = os.getenv("LOADER_CSV_ENGINE", "c")  # 'c' or 'pyarrow'
+LOADER_DOWNCAST = os.getenv("LOADER_DOWNCAST", "true").lower() == "true"
+# Also narrow int64 columns to int32 when their range fits; off by default because sums
+# and products of such columns in generated code can overflow silently
+LOADER_DOWNCAST_INTEGERS = os.getenv("LOADER_DOWNCAST_INTEGERS", "false").lower() == "true"
+# Convert text columns holding dates (e.g. "2024-01-31" in a CSV) to datetimes; this changes
+# their dtype from object to datetime64, so it is off by default
+LOADER_PARSE_DATES = os.getenv("LOADER_PARSE_DATES", "false").lower() == "true"
+
+# Dataset Store Configuration
+# Parsed uploads are kept as memory-mappable Feather files keyed by content hash
+DATASET_STORE_DIR = os.getenv("DATASET_STORE_DIR", os.path.join(tempfile.gettempdir(), "dataspark", "datasets"))
+DATASET_STORE_MAX_DATASETS = int(os.getenv("DATASET_STORE_MAX_DATASETS", "32"))
+# Loaded frames are shared by all sessions of a process and dropped once no
+# session has held them for this long
+DATASET_REGISTRY_IDLE_SECONDS = float(os.getenv("DATASET_REGISTRY_IDLE_SECONDS", "600"))
+
+# Profiler Configuration
+# Frames with more cells than this get the fast (sampled/sketched) tier first
+PROFILER_FAST_THRESHOLD_CELLS = int(os.getenv("PROFILER_FAST_THRESHOLD_CELLS", "5000000"))
+# Fast tier: rows kept for quartiles, HyperLogLog precision for distinct counts
+# (2^p registers, ~1.04/sqrt(2^p) relative error) and datasets whose profiles are cached
+PROFILER_SAMPLE_SIZE = int(os.getenv("PROFILER_SAMPLE_SIZE", "10000"))
+PROFILER_HLL_PRECISION = int(os.getenv("PROFILER_HLL_PRECISION", "12"))
+PROFILER_CACHE_SIZE = int(os.getenv("PROFILER_CACHE_SIZE", "16"))
+
+# Rollups: after upload, frames with at least ROLLUP_MIN_ROWS rows get cubes of
+# sums/counts/min/max by low-cardinality columns and day/week/month buckets
+# (pairs up to ROLLUP_MAX_CELLS groups) plus sorted indexes, built in the
+# background and served to generated code through rollup()/lookup_rows()
+ROLLUPS_ENABLED = os.getenv("ROLLUPS_ENABLED", "true").lower() == "true"
+ROLLUP_MIN_ROWS = int(os.getenv("ROLLUP_MIN_ROWS", "50000"))
+ROLLUP_MAX_CARDINALITY = int(os.getenv("ROLLUP_MAX_CARDINALITY", "100"))
+ROLLUP_MAX_CELLS = int(os.getenv("ROLLUP_MAX_CELLS", "100000"))
+ROLLUP_INDEX_COLUMNS = int(os.getenv("ROLLUP_INDEX_COLUMNS", "4"))
+# Datasets whose rollups are kept in memory
+ROLLUP_MAX_DATASETS = int(os.getenv("ROLLUP_MAX_DATASETS", "8"))
 
 # Execution Configuration
 ALLOWED_LIBRARIES = ['pandas', 'numpy', 'matplotlib', 'seaborn', 'plotly']
-MAX_RETRY_ATTEMPTS = 1
+# Correction round-trips after generated code fails, and the time after the first
+# run within which a new correction may still start (0 = no time limit)
+MAX_RETRY_ATTEMPTS = int(os.getenv("MAX_RETRY_ATTEMPTS", "1"))
+RETRY_TIME_BUDGET_SECONDS = float(os.getenv("RETRY_TIME_BUDGET_SECONDS", "60"))
+# Code generation strategy: 'serial' (one program, corrected on failure) or
+# 'speculative' (SPECULATIVE_CANDIDATES diverse programs generated and run in
+# parallel; the first to produce a result wins and the rest are cancelled)
+CODEGEN_STRATEGY = os.getenv("CODEGEN_STRATEGY", "serial")
+SPECULATIVE_CANDIDATES = int(os.getenv("SPECULATIVE_CANDIDATES", "3"))
+# Strategy statistics (sidebar, batch report) cover the most recent queries per strategy
+STRATEGY_STATS_WINDOW = int(os.getenv("STRATEGY_STATS_WINDOW", "1000"))
+# Query engine: 'pandas' (generated Python code) or 'duckdb' (generated SQL run by
+# DuckDB over the loaded frame, multithreaded)
+QUERY_ENGINE = os.getenv("QUERY_ENGINE", "pandas")
+DUCKDB_THREADS = int(os.getenv("DUCKDB_THREADS", "0"))  # 0 = DuckDB default (all cores)
+# Arrow copies of this many recently queried datasets are kept for DuckDB to scan
+DUCKDB_ARROW_CACHE_DATASETS = int(os.getenv("DUCKDB_ARROW_CACHE_DATASETS", "4"))
+# Backend: 'inline' (Streamlit thread) or 'pool' (pre-warmed worker processes)
+EXECUTION_BACKEND = os.getenv("EXECUTION_BACKEND", "inline")
+EXECUTION_POOL_WORKERS = int(os.getenv("EXECUTION_POOL_WORKERS", str(os.cpu_count() or 2)))
+EXECUTION_TIMEOUT_SECONDS = float(os.getenv("EXECUTION_TIMEOUT_SECONDS", "60"))  # 0 disables the limit
+EXECUTION_MEMORY_LIMIT_MB = int(os.getenv("EXECUTION_MEMORY_LIMIT_MB", "2048"))  # 0 disables the cap
+# Datasets are shared with workers through this directory; /dev/shm keeps them in shared memory
+EXECUTION_SHARED_DIR = os.getenv(
+    "EXECUTION_SHARED_DIR",
+    "/dev/shm/dataspark" if os.path.isdir("/dev/shm") else os.path.join(tempfile.gettempdir(), "dataspark", "shm")
+)
+
+# Parsed and compiled generated code kept per process, keyed by source hash
+COMPILED_CODE_CACHE_SIZE = int(os.getenv("COMPILED_CODE_CACHE_SIZE", "256"))
+
+# Frames with at least this many rows run generated code on a stratified sample
+# first, so failing code and its correction never touch the full data (0 disables)
+SAMPLE_FIRST_MIN_ROWS = int(os.getenv("SAMPLE_FIRST_MIN_ROWS", "200000"))
+SAMPLE_FIRST_ROWS = int(os.getenv("SAMPLE_FIRST_ROWS", "5000"))
+
+# Rewrite row-wise generated code (iterrows, apply(axis=1), append loops) into
+# vectorized pandas, verified against the original on a sample of this many rows
+OPTIMIZER_ENABLED = os.getenv("OPTIMIZER_ENABLED", "true").lower() == "true"
+OPTIMIZER_SAMPLE_ROWS = int(os.getenv("OPTIMIZER_SAMPLE_ROWS", "2000"))
+# A verified rewrite is only kept if it is at least this much faster on the
+# sample (fastest of OPTIMIZER_TIMING_RUNS runs each), so timing noise can't
+# swap in a slower program
+OPTIMIZER_MIN_SPEEDUP = float(os.getenv("OPTIMIZER_MIN_SPEEDUP", "1.2"))
+OPTIMIZER_TIMING_RUNS = int(os.getenv("OPTIMIZER_TIMING_RUNS", "3"))
+
+# Import the sandbox plotting libraries in the background right after startup
+SANDBOX_WARMUP = os.getenv("SANDBOX_WARMUP", "true").lower() == "true"
+
+# Execution results cached by (dataset hash, code hash); evicted entries spill to
+# RESULT_CACHE_SPILL_DIR when set (empty keeps the cache memory-only)
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_MAX_MB = float(os.getenv("RESULT_CACHE_MAX_MB", "256"))
+RESULT_CACHE_MAX_ENTRY_MB = float(os.getenv("RESULT_CACHE_MAX_ENTRY_MB", "32"))
+RESULT_CACHE_SPILL_DIR = os.getenv("RESULT_CACHE_SPILL_DIR", "")
+RESULT_CACHE_DISK_MB = float(os.getenv("RESULT_CACHE_DISK_MB", "1024"))
+
+# Background query jobs: questions run on a shared pool while the UI polls
+# every JOB_POLL_SECONDS. At most JOB_MAX_CONCURRENT run at once per process and
+# JOB_MAX_PER_SESSION per session; a session can queue JOB_MAX_QUEUED_PER_SESSION
+# more. Finished jobs nobody collected are dropped after JOB_RETENTION_SECONDS
+JOB_MAX_CONCURRENT = int(os.getenv("JOB_MAX_CONCURRENT", "8"))
+JOB_MAX_PER_SESSION = int(os.getenv("JOB_MAX_PER_SESSION", "1"))
+JOB_MAX_QUEUED_PER_SESSION = int(os.getenv("JOB_MAX_QUEUED_PER_SESSION", "3"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "0.5"))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "600"))
+# Threads generating and running speculative candidates, shared by all queries; by
+# default every running job can race its SPECULATIVE_CANDIDATES at once
+SPECULATIVE_WORKERS = int(os.getenv("SPECULATIVE_WORKERS", str(SPECULATIVE_CANDIDATES * JOB_MAX_CONCURRENT)))
+
+# Stream generated code and summaries to the chat as tokens arrive
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "true").lower() == "true"
+# Parallel LLM calls for the summary and voice narrative
+INSIGHT_WORKERS = int(os.getenv("INSIGHT_WORKERS", "8"))
+
+# Chat History Configuration
+# Per session: the newest HISTORY_LIVE_MESSAGES keep live figures and results;
+# older ones are compressed, and beyond HISTORY_MAX_MB or HISTORY_MAX_MESSAGES
+# spilled to disk (empty HISTORY_SPILL_DIR drops them instead)
+HISTORY_MAX_MB = float(os.getenv("HISTORY_MAX_MB", "64"))
+HISTORY_LIVE_MESSAGES = int(os.getenv("HISTORY_LIVE_MESSAGES", "4"))
+HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", "50"))
+HISTORY_SPILL_DIR = os.getenv("HISTORY_SPILL_DIR", os.path.join(tempfile.gettempdir(), "dataspark", "history"))
+HISTORY_DISK_MB = float(os.getenv("HISTORY_DISK_MB", "512"))
+
+# Code Cache Configuration
+# Backend: 'memory' (per process LRU), 'sqlite' (shared on-disk file) or 'none'
+CODE_CACHE_BACKEND = os.getenv("CODE_CACHE_BACKEND", "memory")
+CODE_CACHE_PATH = os.getenv("CODE_CACHE_PATH", os.path.join(tempfile.gettempdir(), "dataspark", "code_cache.sqlite3"))
+CODE_CACHE_MAX_ENTRIES = int(os.getenv("CODE_CACHE_MAX_ENTRIES", "512"))
+CODE_CACHE_TTL_SECONDS = int(os.getenv("CODE_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
 
 # UI Configuration
 CHART_TYPES = ['bar', 'line', 'pie']
+# Results are sent to the browser one page at a time
+RESULT_PAGE_ROWS = int(os.getenv("RESULT_PAGE_ROWS", "100"))
+# Line/scatter traces are downsampled to this many points ('lttb' or 'minmax' bucketing)
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "2000"))
+CHART_DOWNSAMPLE_METHOD = os.getenv("CHART_DOWNSAMPLE_METHOD", "lttb")
+# Bars and pie slices beyond the top N are merged into an "Other" bucket
+CHART_MAX_CATEGORIES = int(os.getenv("CHART_MAX_CATEGORIES", "30"))
+# Traces with more points than this are drawn with WebGL (Scattergl) instead of SVG
+CHART_WEBGL_MIN_POINTS = int(os.getenv("CHART_WEBGL_MIN_POINTS", "1000"))
+
+# Tracing Configuration
+# Every query stage (upload, parse, profile, codegen, exec, retry, chart,
+# summary, narrative) is timed as a span. TRACE_LOG writes finished spans as
+# JSON lines to 'stdout', 'stderr' or a file path (empty disables); per-stage
+# metrics are served in Prometheus format on METRICS_PORT (0 disables) and by
+# the batch runner written to METRICS_FILE
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+TRACE_LOG = os.getenv("TRACE_LOG", "")
+TRACE_BUFFER_SPANS = int(os.getenv("TRACE_BUFFER_SPANS", "2000"))
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_FILE = os.getenv("METRICS_FILE", "")
+
+# Line profiling of generated code: per-line time (and, with PROFILE_MEMORY,
+# allocations still held at the end via tracemalloc) of the full-data run.
+# Off by default (tracing slows Python-heavy code); the app has a toggle.
+# The PROFILE_HOTSPOTS hottest lines are sent back for "make this faster"
+PROFILE_EXECUTION = os.getenv("PROFILE_EXECUTION", "false").lower() == "true"
+PROFILE_MEMORY = os.getenv("PROFILE_MEMORY", "true").lower() == "true"
+PROFILE_HOTSPOTS = int(os.getenv("PROFILE_HOTSPOTS", "3"))
@@ -54,6 +54,16 @@ docker build -t gcr.io/${PROJECT_ID}/dataspark .
 echo -e "${YELLOW}Pushing image to Container Registry...${NC}"
 docker push gcr.io/${PROJECT_ID}/dataspark
 
+# Size the service for the largest upload plus every execution pool worker at its memory cap:
+# a parsed upload takes about 3x its file size in the app process (plus ~512MB for the app itself)
+CPU=${CPU:-2}
+MAX_FILE_SIZE_MB=${MAX_FILE_SIZE_MB:-500}
+EXECUTION_POOL_WORKERS=${EXECUTION_POOL_WORKERS:-$CPU}
+EXECUTION_MEMORY_LIMIT_MB=${EXECUTION_MEMORY_LIMIT_MB:-2048}
+MEMORY_MB=$(( MAX_FILE_SIZE_MB * 3 + 512 + EXECUTION_POOL_WORKERS * EXECUTION_MEMORY_LIMIT_MB ))
+MEMORY=${MEMORY:-$(( (MEMORY_MB + 1023) / 1024 ))Gi}
+echo -e "${GREEN}✓ Using ${CPU} CPU and ${MEMORY} memory (${EXECUTION_POOL_WORKERS} workers x ${EXECUTION_MEMORY_LIMIT_MB}MB)${NC}"
+
 # Deploy to Cloud Run
 echo -e "${YELLOW}Deploying to Cloud Run...${NC}"
 gcloud run deploy dataspark \
@@ -61,11 +71,12 @@ gcloud run deploy dataspark \
   --platform managed \
   --region ${REGION} \
   --allow-unauthenticated \
-  --memory 1Gi \
-  --cpu 1 \
+  --memory ${MEMORY} \
+  --cpu ${CPU} \
+  --cpu-boost \
   --timeout 300 \
   --max-instances 10 \
-  --set-env-vars PORT=8080 \
+  --set-env-vars PORT=8080,MAX_FILE_SIZE_MB=${MAX_FILE_SIZE_MB},EXECUTION_POOL_WORKERS=${EXECUTION_POOL_WORKERS},EXECUTION_MEMORY_LIMIT_MB=${EXECUTION_MEMORY_LIMIT_MB} \
   --quiet
 
 # Get the service URL
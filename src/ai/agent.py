@@ -1,71 +1,410 @@
-from src.ai.code_generator import generate_code
-from src.execution.error_handler import execute_with_retry
-from src.ai.prompts import get_summary_prompt, get_followup_prompt
-import google.generativeai as genai
-from config.settings import GEMINI_API_KEY
+from src.ai.code_generator import (
+    generate_code, generate_code_stream, generate_sql, generate_sql_stream, stream_text, speed_up_code
+)
+from src.execution.error_handler import iter_execute_with_retry, get_engine_executor
+from src.ai.code_cache import get_code_cache, make_cache_key
+from src.ai.prompts import get_summary_prompt, get_voice_narrative_prompt, get_followup_prompt
+from src.ai.llm_client import get_llm_client, estimate_tokens
+from src.ai.prompt_budget import start_prompt_log
+from src.data.rollups import rollups_ready
+from src.execution.optimizer import optimize_code
+from src.execution.speculative import iter_speculative, get_strategy_stats
+from src.utils.tracing import span, bind, classify_query, trace_spans, add_to_current
+from config.settings import (
+    INSIGHT_WORKERS, OPTIMIZER_ENABLED, QUERY_ENGINE, CODEGEN_STRATEGY, SPECULATIVE_CANDIDATES,
+    PROFILE_EXECUTION, PROFILE_HOTSPOTS
+)
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Tuple, Iterator, Generator, Any, Optional
+import threading
+import time
 
-try:
-    genai.configure(api_key=GEMINI_API_KEY)
-    # Use gemini-2.5-flash for fast responses, or gemini-2.5-pro for better quality
-    model = genai.GenerativeModel('gemini-2.5-flash')
-except Exception as e:
-    raise ValueError(f"Failed to configure Gemini API: {str(e)}. Please check your GEMINI_API_KEY in .env file.")
+# Summary and narrative calls run here so they overlap each other and the UI render
+_insight_executor = ThreadPoolExecutor(max_workers=INSIGHT_WORKERS, thread_name_prefix='dataspark-insight')
 
-def process_query(user_query: str, df, data_profile: str) -> dict:
+def process_query(user_query: str, df, data_profile: str, wait_for_insights: bool = True,
+                  engine: str = None, narrative: bool = True, strategy: str = None,
+                  profile: bool = None) -> dict:
     """
     Main agent function to process user query.
     
+    Args:
+        wait_for_insights: If False, return as soon as code, result and fig exist;
+            summary and narrative keep running and are collected with resolve_insights().
+        engine: 'pandas' (generated Python) or 'duckdb' (generated SQL); defaults to QUERY_ENGINE.
+        narrative: Also generate the voice narrative (headless runs skip it).
+        strategy: 'serial' or 'speculative' code generation; defaults to CODEGEN_STRATEGY.
+        profile: Line-profile the full-data run of generated Python; defaults to PROFILE_EXECUTION.
+    
     Returns:
-        Dictionary with: code, result, fig, summary, error, was_retried
+        Dictionary with: code, result, fig, summary, error, was_retried, cache_hit,
+        timings (seconds per stage: codegen, optimize, exec, retry, summary, narrative),
+        warnings (slow row-wise patterns left in the executed code),
+        optimizations (vectorizing rewrites tried, with applied flag and measured speedup),
+        sampling (sample_rows, errors_caught, time_saved_s when code was validated on a sample first),
+        result_cache_hit (result served from the result cache without executing),
+        language ('python' or 'sql', the language of code),
+        prompt_sizes (estimated tokens of each codegen/correction prompt sent, with
+            how many columns the schema showed in detail),
+        strategy (code generation strategy used, None for code cache hits),
+        speculation (candidate race report for the speculative strategy),
+        attempts (corrections made),
+        trace_id and trace (finished stage spans of this query: codegen, exec,
+            retry, summary, ... with wall/CPU time, memory, rows and tokens),
+        line_profile (per-line time and memory of the executed code when profiled;
+            see speed_up_query())
+    """
+    events = process_query_stream(user_query, df, data_profile, stream=False, engine=engine,
+                                  narrative=narrative, strategy=strategy, profile=profile)
+    try:
+        for event, payload in events:
+            if event == 'result' and not wait_for_insights:
+                return payload
+            if event == 'done':
+                return payload
+    finally:
+        # Returning at 'result' leaves the generator suspended; closing it ends the
+        # query span now (the insight calls keep running for resolve_insights())
+        events.close()
+
+def process_query_stream(user_query: str, df, data_profile: str, stream: bool = True,
+                         engine: str = None, narrative: bool = True,
+                         strategy: str = None, profile: bool = None,
+                         cancel: Optional[threading.Event] = None) -> Iterator[Tuple[str, Any]]:
+    """
+    Process a query, yielding progress events for incremental rendering.
+    
+    Events:
+        ('stage', name): progress, one of 'codegen', 'validating' (sample run),
+            'running', 'correcting' and 'summarizing'
+        ('code', partial_code): generated or corrected code so far
+        ('result', response): execution finished; summary still pending
+        ('summary', partial_summary): summary text so far (stream=True only)
+        ('done', response): final response, as returned by process_query()
+    
+    With stream=False the LLM calls are not streamed and the summary and
+    narrative run concurrently; with stream=True the summary streams while the
+    narrative is generated alongside it.
+    
+    With engine='duckdb' the model writes a SQL query that DuckDB runs over the
+    frame instead of pandas code; the vectorizing optimizer is skipped.
+    
+    With strategy='speculative' SPECULATIVE_CANDIDATES programs are generated
+    and raced (see iter_speculative()); the optimizer is skipped for them too.
+    
+    The query runs under a 'query' span labelled with its question class;
+    each stage opens a child span.
+    
+    Setting cancel interrupts code or SQL that is executing (see
+    execute_code()) and skips further corrections; the caller stops
+    consuming events.
     """
-    # Generate code
-    code = generate_code(user_query, data_profile)
+    engine = engine or QUERY_ENGINE
+    strategy = strategy or CODEGEN_STRATEGY
+    profile = PROFILE_EXECUTION if profile is None else profile
+    with span('query', query_class=classify_query(user_query), engine=engine, strategy=strategy,
+              rows=len(df)) as root:
+        for event, payload in _query_events(user_query, df, data_profile, stream, engine, narrative, strategy,
+                                            profile, cancel):
+            if event == 'result':
+                payload['trace_id'] = root.trace_id
+            elif event == 'done':
+                root.set(error=payload['error'], cache_hit=payload['cache_hit'], attempts=payload['attempts'])
+                payload['trace_id'] = root.trace_id
+                payload['trace'] = [record for record in trace_spans(root.trace_id)
+                                    if record['span_id'] != root.span_id]
+            yield event, payload
+
+def _query_events(user_query: str, df, data_profile: str, stream: bool, engine: str, narrative: bool,
+                  strategy: str, profile: bool, cancel: Optional[threading.Event] = None) -> Iterator[Tuple[str, Any]]:
+    """Body of process_query_stream(), run under its 'query' span."""
+    if strategy not in ('serial', 'speculative'):
+        raise ValueError(f"Unsupported code generation strategy: {strategy}")
+    execute = get_engine_executor(engine)
+    use_sql = engine == 'duckdb'
+    # Line profiling applies to generated Python only
+    profile = profile and not use_sql
+    timings = {'codegen': 0.0, 'exec': 0.0, 'retry': 0.0}
+    optimizations = []
+    # Code generation and corrections run on this thread and log their prompt sizes here
+    prompt_sizes = start_prompt_log()
+    cache = get_code_cache()
+    cache_key = make_cache_key(user_query, data_profile, engine) if cache is not None else None
+    code = cache.get(cache_key) if cache is not None else None
+    cache_hit = False
+    speculation = None
+    attempts = 0
+    
+    if code is not None:
+        # Reuse code that already succeeded for this question and schema
+        yield 'code', code
+        yield 'stage', 'running'
+        start = time.perf_counter()
+        if profile:
+            result_dict, error_message = execute(code, df, profile=True, cancel=cancel)
+        else:
+            result_dict, error_message = execute(code, df, cancel=cancel)
+        timings['exec'] = time.perf_counter() - start
+        result_dict['code'] = code
+        was_retried = False
+        cache_hit = not error_message
+        if error_message:
+            # Stale entry (e.g. values changed under the same schema); regenerate
+            cache.delete(cache_key)
     
-    # Execute with retry
-    result_dict, error_message, was_retried = execute_with_retry(
-        code, df, user_query, data_profile
-    )
+    if not cache_hit and strategy == 'speculative':
+        # Race diverse candidates; corrections only if all of them fail
+        yield 'stage', 'codegen'
+        start = time.perf_counter()
+        with span('race', candidates=SPECULATIVE_CANDIDATES) as race:
+            for event, payload in iter_speculative(user_query, df, data_profile, SPECULATIVE_CANDIDATES,
+                                                   stream=stream, engine=engine, profile=profile,
+                                                   cancel=cancel):
+                if event == 'done':
+                    result_dict, error_message, was_retried, speculation = payload
+                else:
+                    yield event, payload
+            race.set(winner=speculation['winner'], failed=speculation['failed'])
+        timings['codegen'] = speculation['first_code_s'] or 0.0
+        timings['race'] = speculation['race_s']
+        timings.update(result_dict.pop('timings', {}))
+        attempts = result_dict.get('attempts', 0)
+        get_strategy_stats().record(strategy, time.perf_counter() - start, not error_message, was_retried,
+                                    speculation['winner'])
+        
+        if cache is not None and not error_message:
+            cache.set(cache_key, result_dict['code'])
+    elif not cache_hit:
+        # Generate code
+        yield 'stage', 'codegen'
+        query_start = start = time.perf_counter()
+        with span('codegen', engine=engine, streamed=stream):
+            if use_sql:
+                generator_args = (user_query, data_profile)
+            else:
+                # Only mention the rollup helpers when there are cubes behind them
+                generator_args = (user_query, data_profile, rollups_ready(df))
+            if stream:
+                code = ''
+                generator_stream = generate_sql_stream if use_sql else generate_code_stream
+                for code in generator_stream(*generator_args):
+                    yield 'code', code
+            else:
+                code = (generate_sql if use_sql else generate_code)(*generator_args)
+                yield 'code', code
+        timings['codegen'] = time.perf_counter() - start
+        
+        # Replace row-wise loops/applies with verified vectorized equivalents
+        if OPTIMIZER_ENABLED and not use_sql:
+            start = time.perf_counter()
+            with span('optimize', rows=len(df)):
+                optimized_code, optimizations = optimize_code(code, df)
+            timings['optimize'] = time.perf_counter() - start
+            if optimized_code != code:
+                code = optimized_code
+                yield 'code', code
+        
+        # Execute with retry
+        for event, payload in iter_execute_with_retry(code, df, user_query, data_profile, stream=stream, engine=engine,
+                                                      profile=profile, cancel=cancel):
+            if event == 'done':
+                result_dict, error_message, was_retried = payload
+            else:
+                yield event, payload
+        timings.update(result_dict.pop('timings', {}))
+        attempts = result_dict.get('attempts', 0)
+        get_strategy_stats().record(strategy, time.perf_counter() - query_start, not error_message, was_retried)
+        
+        if cache is not None and not error_message:
+            cache.set(cache_key, result_dict['code'])
     
     response = {
-        'code': code,
+        'code': result_dict.get('code', code),
         'result': result_dict.get('result'),
         'fig': result_dict.get('fig'),
         'output': result_dict.get('output'),
         'error': error_message,
-        'was_retried': was_retried
+        'was_retried': was_retried,
+        'cache_hit': cache_hit,
+        'timings': timings,
+        'warnings': (result_dict.get('analysis') or {}).get('warnings', []),
+        'optimizations': optimizations,
+        'sampling': result_dict.get('sampling'),
+        'result_cache_hit': bool(result_dict.get('result_cache_hit')),
+        'language': 'sql' if use_sql else 'python',
+        'prompt_sizes': list(prompt_sizes),
+        'strategy': None if cache_hit else strategy,
+        'speculation': speculation,
+        'attempts': attempts,
+        'line_profile': result_dict.get('line_profile')
     }
     
-    # Generate summary if successful
+    # Generate summary and voice narrative concurrently if successful
     if not error_message and result_dict.get('result') is not None:
         result_description = str(result_dict['result'])
         if hasattr(result_dict['result'], '__len__') and len(result_dict['result']) > 0:
             result_description = f"DataFrame with {len(result_dict['result'])} rows"
+        yield 'stage', 'summarizing'
         
+        if stream:
+            narrative_future = None
+            if narrative:
+                voice_prompt = get_voice_narrative_prompt(user_query, result_description)
+                narrative_future = _insight_executor.submit(bind(_timed_generate), voice_prompt, 'narrative')
+            try:
+                yield 'result', response
+                summary = yield from _stream_summary(timings, get_summary_prompt(user_query, result_description))
+            except GeneratorExit:
+                # The consumer stopped before the insight; nobody will collect the narrative
+                if narrative_future is not None:
+                    narrative_future.cancel()
+                raise
+            response['insights'] = {'summary': summary}
+            if narrative_future is not None:
+                response['insights']['narrative'] = narrative_future
+        else:
+            response['insights'] = start_insights(user_query, result_description, narrative=narrative)
+            yield 'result', response
+        resolve_insights(response)
+    else:
+        yield 'result', response
+    
+    yield 'done', response
+
+def _stream_summary(timings: dict, summary_prompt: str) -> Generator[Tuple[str, Any], None, Future]:
+    """Yield ('summary', text_so_far) events; return a resolved Future of (text, seconds)."""
+    outcome = Future()
+    start = time.perf_counter()
+    text = ''
+    with span('summary', streamed=True) as summary_span:
         try:
-            # Generate regular summary for display
-            summary_prompt = get_summary_prompt(user_query, result_description)
-            summary_response = model.generate_content(summary_prompt)
-            if summary_response and summary_response.text:
-                response['summary'] = summary_response.text
-                
-                # Generate voice-optimized narrative using Gemini
-                try:
-                    from src.ai.prompts import get_voice_narrative_prompt
-                    voice_prompt = get_voice_narrative_prompt(user_query, result_description, response['summary'])
-                    voice_response = model.generate_content(voice_prompt)
-                    if voice_response and voice_response.text:
-                        response['voice_narrative'] = voice_response.text.strip()
-                except Exception as voice_error:
-                    # If voice narrative generation fails, use summary as fallback
-                    response['voice_narrative'] = response['summary']
-                    
+            for text in stream_text(summary_prompt):
+                timings.setdefault('summary_first_token', time.perf_counter() - start)
+                yield 'summary', text
         except Exception as e:
-            # If summary generation fails, continue without it
-            error_msg = str(e)
-            if "API key" in error_msg or "API_KEY" in error_msg:
-                response['summary'] = "Summary generation failed: Invalid API key. Please check your .env file."
-            else:
-                response['summary'] = f"Summary generation failed: {error_msg}"
+            summary_span.set(error=f"{type(e).__name__}: {e}")
+            outcome.set_exception(e)
+        else:
+            outcome.set_result((text or None, time.perf_counter() - start))
+    return outcome
+
+def _timed_generate(prompt: str, stage: str = 'summary') -> Tuple[str, float]:
+    """Call the model under a span named stage and return (text, seconds)."""
+    start = time.perf_counter()
+    with span(stage):
+        add_to_current(prompt_tokens=estimate_tokens(prompt))
+        llm_response = get_llm_client().generate_content(prompt)
+        text = llm_response.text if llm_response else None
+        add_to_current(response_tokens=estimate_tokens(text or ''))
+    return text, time.perf_counter() - start
+
+def start_insights(user_query: str, result_description: str, narrative: bool = True) -> Dict[str, Future]:
+    """Start the summary and (unless narrative=False) voice narrative LLM calls in parallel."""
+    summary_prompt = get_summary_prompt(user_query, result_description)
+    insights = {'summary': _insight_executor.submit(bind(_timed_generate), summary_prompt, 'summary')}
+    if narrative:
+        voice_prompt = get_voice_narrative_prompt(user_query, result_description)
+        insights['narrative'] = _insight_executor.submit(bind(_timed_generate), voice_prompt, 'narrative')
+    return insights
+
+def resolve_insights(response: dict) -> dict:
+    """Wait for pending insight calls and fill in summary, voice_narrative and their timings."""
+    insights = response.pop('insights', None)
+    if not insights:
+        return response
+    
+    try:
+        # Generate regular summary for display
+        summary_text, response['timings']['summary'] = insights['summary'].result()
+        if summary_text:
+            response['summary'] = summary_text
+            
+            # Voice-optimized narrative, generated alongside the summary
+            if 'narrative' not in insights:
+                return response
+            try:
+                voice_text, response['timings']['narrative'] = insights['narrative'].result()
+                if voice_text:
+                    response['voice_narrative'] = voice_text.strip()
+            except Exception as voice_error:
+                # If voice narrative generation fails, use summary as fallback
+                response['voice_narrative'] = response['summary']
+                
+    except Exception as e:
+        # If summary generation fails, continue without it
+        if 'narrative' in insights:
+            insights['narrative'].cancel()
+        error_msg = str(e)
+        if "API key" in error_msg or "API_KEY" in error_msg:
+            response['summary'] = "Summary generation failed: Invalid API key. Please check your .env file."
+        else:
+            response['summary'] = f"Summary generation failed: {error_msg}"
     
     return response
 
+def speed_up_query(user_query: str, df, data_profile: str, code: str, line_profile: dict,
+                   original_result=None) -> dict:
+    """
+    Rewrite working but slow code around its hottest profiled lines.
+    
+    The PROFILE_HOTSPOTS most expensive lines of line_profile go to the model
+    with the code. The rewrite is kept only if it produces the same result,
+    figure and df changes as the original on the validation sample (the
+    whole frame when small), its full-run result equals original_result
+    (the original's full-run result, when the caller still has it) and its
+    line-profiled full run is faster; the code cache then serves it for this
+    question.
+    
+    Returns:
+        Dictionary with: code (rewritten if accepted, else the original),
+        accepted, reason (why a rewrite was rejected), speedup, original_seconds,
+        seconds, and for accepted rewrites result, fig, output and line_profile;
+        prompt_sizes as in process_query()
+    """
+    from config.settings import EXECUTION_BACKEND
+    from src.data.sampling import get_validation_sample
+    from src.execution.executor import execute_code
+    from src.execution.line_profiler import format_hotspots
+    from src.execution.optimizer import observe, outputs_match, values_match
+    
+    outcome = {'code': code, 'accepted': False, 'reason': None, 'speedup': None,
+               'original_seconds': line_profile['seconds'], 'seconds': None}
+    with span('speedup', query_class=classify_query(user_query), rows=len(df)) as speedup_span:
+        outcome['prompt_sizes'] = start_prompt_log()
+        rewritten = speed_up_code(user_query, data_profile, format_hotspots(line_profile, PROFILE_HOTSPOTS), code)
+        if rewritten.strip() == code.strip():
+            outcome['reason'] = "the model returned the same code"
+            return outcome
+        
+        # Cheap equivalence check before touching the full frame
+        sample = get_validation_sample(df)
+        check_frame = sample if sample is not None else df
+        before = observe(code, check_frame, EXECUTION_BACKEND)
+        after = observe(rewritten, check_frame, EXECUTION_BACKEND)
+        if after['error']:
+            outcome['reason'] = f"the rewrite failed: {after['error'].splitlines()[0]}"
+        elif before['error'] or not outputs_match(before, after):
+            outcome['reason'] = "the rewrite changed the result"
+        else:
+            result_dict, error_message = execute_code(rewritten, df, profile=True)
+            seconds = (result_dict.get('line_profile') or {}).get('seconds')
+            if error_message:
+                outcome['reason'] = f"the rewrite failed on the full data: {error_message.splitlines()[0]}"
+            elif original_result is not None and not values_match(original_result, result_dict.get('result')):
+                # Rows outside the sample can still tell the two programs apart
+                outcome['reason'] = "the rewrite changed the result on the full data"
+            elif seconds is not None:
+                outcome['seconds'] = seconds
+                outcome['speedup'] = line_profile['seconds'] / seconds if seconds else None
+                if seconds < line_profile['seconds']:
+                    outcome.update(code=rewritten, accepted=True, result=result_dict.get('result'),
+                                   fig=result_dict.get('fig'), output=result_dict.get('output'),
+                                   line_profile=result_dict['line_profile'])
+                else:
+                    outcome['reason'] = "the rewrite was not faster"
+        speedup_span.set(accepted=outcome['accepted'], speedup=outcome['speedup'])
+    
+    cache = get_code_cache()
+    if outcome['accepted'] and cache is not None:
+        cache.set(make_cache_key(user_query, data_profile, 'pandas'), outcome['code'])
+    return outcome
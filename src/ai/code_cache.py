@@ -0,0 +1,202 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import closing, contextmanager
+from typing import Optional, Dict, Any, Iterator
+
+def normalize_query(user_query: str) -> str:
+    """Normalize a user question so trivially different phrasings share a cache entry."""
+    normalized = re.sub(r'\s+', ' ', user_query.strip().lower())
+    return normalized.rstrip('?.! ')
+
+# Sample values listed after a column's dtype in the prompt profile (" | e.g. Paris, Rome")
+_EXAMPLES = re.compile(r' \| e\.g\. .*$')
+
+def schema_fingerprint(data_profile: str) -> str:
+    """
+    Fingerprint the schema in a prompt profile: column names and dtypes.
+
+    The row count and sample values are left out, so appended data and other
+    uploads with the same columns share entries.
+    """
+    lines = [_EXAMPLES.sub('', line) for line in data_profile.strip().splitlines()
+             if not line.strip().startswith('- Rows:')]
+    return hashlib.sha256('\n'.join(lines).encode('utf-8')).hexdigest()
+
+def make_cache_key(user_query: str, data_profile: str, engine: str = 'pandas') -> str:
+    """Build the cache key from the normalized query, the schema fingerprint and the query engine."""
+    raw = f"{normalize_query(user_query)}\0{schema_fingerprint(data_profile)}"
+    if engine != 'pandas':
+        # SQL and pandas code for the same question must not be mixed up;
+        # pandas keys stay as they were so existing caches remain valid
+        raw += f"\0{engine}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+class CodeCache(ABC):
+    """Base class for caches of generated code that executed successfully."""
+
+    def __init__(self, max_entries: int, ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def _is_expired(self, created_at: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached code for key, or None on a miss or expired entry."""
+
+    @abstractmethod
+    def set(self, key: str, code: str) -> None:
+        """Store code under key, evicting the least recently used entries beyond max_entries."""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Drop key if present."""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of entries currently stored."""
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss/eviction counters."""
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self).__name__,
+            'entries': len(self),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+class MemoryCodeCache(CodeCache):
+    """In-process LRU cache."""
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: Optional[float] = None):
+        super().__init__(max_entries, ttl_seconds)
+        self._entries = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._is_expired(entry[1]):
+                del self._entries[key]
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: str, code: str) -> None:
+        with self._lock:
+            self._entries[key] = (code, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class SqliteCodeCache(CodeCache):
+    """On-disk cache shared by every process pointing at the same SQLite file."""
+
+    def __init__(self, path: str, max_entries: int = 512, ttl_seconds: Optional[float] = None):
+        super().__init__(max_entries, ttl_seconds)
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS code_cache ("
+                "key TEXT PRIMARY KEY, code TEXT NOT NULL, "
+                "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Connection for one transaction; committed (or rolled back) and closed on exit."""
+        with closing(sqlite3.connect(self.path, timeout=5)) as conn, conn:
+            yield conn
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT code, created_at FROM code_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and self._is_expired(row[1]):
+                conn.execute("DELETE FROM code_cache WHERE key = ?", (key,))
+                self.evictions += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE code_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, code: str) -> None:
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO code_cache (key, code, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, code, now, now),
+            )
+            if self.ttl_seconds is not None:
+                expired = conn.execute(
+                    "DELETE FROM code_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+                ).rowcount
+                self.evictions += expired
+            overflow = conn.execute("SELECT COUNT(*) FROM code_cache").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                conn.execute(
+                    "DELETE FROM code_cache WHERE key IN "
+                    "(SELECT key FROM code_cache ORDER BY last_access ASC LIMIT ?)",
+                    (overflow,),
+                )
+                self.evictions += overflow
+
+    def delete(self, key: str) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM code_cache WHERE key = ?", (key,))
+
+    def __len__(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM code_cache").fetchone()[0]
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_code_cache() -> Optional[CodeCache]:
+    """Return the process-wide code cache configured in settings, or None if disabled."""
+    global _cache
+    from config.settings import (
+        CODE_CACHE_BACKEND, CODE_CACHE_PATH, CODE_CACHE_MAX_ENTRIES, CODE_CACHE_TTL_SECONDS
+    )
+    if CODE_CACHE_BACKEND == 'none':
+        return None
+    with _cache_lock:
+        if _cache is None:
+            if CODE_CACHE_BACKEND == 'sqlite':
+                _cache = SqliteCodeCache(CODE_CACHE_PATH, CODE_CACHE_MAX_ENTRIES, CODE_CACHE_TTL_SECONDS)
+            elif CODE_CACHE_BACKEND == 'memory':
+                _cache = MemoryCodeCache(CODE_CACHE_MAX_ENTRIES, CODE_CACHE_TTL_SECONDS)
+            else:
+                raise ValueError(f"Unsupported code cache backend: {CODE_CACHE_BACKEND}")
+        return _cache
@@ -1,32 +1,48 @@
-import google.generativeai as genai
-from config.settings import GEMINI_API_KEY
-from src.ai.prompts import get_code_generation_prompt, get_error_correction_prompt
-
-try:
-    genai.configure(api_key=GEMINI_API_KEY)
-    # Use gemini-2.5-flash for fast responses, or gemini-2.5-pro for better quality
-    model = genai.GenerativeModel('gemini-2.5-flash')
-except Exception as e:
-    raise ValueError(f"Failed to configure Gemini API: {str(e)}. Please check your GEMINI_API_KEY in .env file.")
-
-def extract_code_from_response(response: str) -> str:
-    """Extract Python code from markdown code blocks."""
-    if '```python' in response:
-        code = response.split('```python')[1].split('```')[0].strip()
+from src.ai.llm_client import get_llm_client, estimate_tokens
+from src.ai.prompt_budget import build_prompt
+from src.ai.prompts import (
+    get_code_generation_prompt, get_error_correction_prompt,
+    get_sql_generation_prompt, get_sql_error_correction_prompt,
+    get_candidate_prompt, get_speedup_prompt, CANDIDATE_HINTS, CANDIDATE_SQL_HINTS
+)
+from src.utils.tracing import add_to_current, bind
+from config.settings import SPECULATIVE_WORKERS
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Iterator, List
+
+# Speculative candidates are generated concurrently here
+_candidate_executor = ThreadPoolExecutor(max_workers=SPECULATIVE_WORKERS, thread_name_prefix='dataspark-candidate')
+
+def extract_code_from_response(response: str, partial: bool = False, language: str = 'python') -> str:
+    """
+    Extract code (Python by default, or e.g. language='sql') from markdown code blocks.
+    
+    With partial=True the response may be an incomplete streaming buffer: an
+    unterminated block yields the code so far and a half-written fence is hidden.
+    """
+    if partial:
+        fence = response.rfind('```')
+        if fence != -1 and response.count('```') % 2 == 1 and '\n' not in response[fence:]:
+            # Opening fence line (e.g. "```pyt") not finished yet
+            response = response[:fence]
+        response = response.rstrip('`')
+    if f'```{language}' in response:
+        code = response.split(f'```{language}')[1].split('```')[0].strip()
     elif '```' in response:
         code = response.split('```')[1].split('```')[0].strip()
     else:
         code = response.strip()
     return code
 
-def generate_code(user_query: str, data_profile: str) -> str:
-    """Generate Python code to answer user query."""
+def _generate(prompt: str, language: str = 'python') -> str:
+    """Call the model and extract the code block from its answer."""
     try:
-        prompt = get_code_generation_prompt(user_query, data_profile)
-        response = model.generate_content(prompt)
+        add_to_current(prompt_tokens=estimate_tokens(prompt))
+        response = get_llm_client().generate_content(prompt)
         if not response or not response.text:
             raise ValueError("Empty response from Gemini API")
-        code = extract_code_from_response(response.text)
+        add_to_current(response_tokens=estimate_tokens(response.text))
+        code = extract_code_from_response(response.text, language=language)
         return code
     except Exception as e:
         error_msg = str(e)
@@ -34,18 +50,96 @@ def generate_code(user_query: str, data_profile: str) -> str:
             raise ValueError(f"Invalid Gemini API key. Please check your GEMINI_API_KEY in .env file. Error: {error_msg}")
         raise
 
+def generate_code(user_query: str, data_profile: str, rollups: bool = False) -> str:
+    """Generate Python code to answer user query; rollups=True offers the rollup helpers."""
+    return _generate(build_prompt('codegen', get_code_generation_prompt, user_query, data_profile, rollups))
+
 def correct_code(user_query: str, data_profile: str, error_message: str, failed_code: str) -> str:
     """Generate corrected code after error."""
+    return _generate(build_prompt('retry', get_error_correction_prompt, user_query, data_profile, failed_code,
+                                  error_message=error_message))
+
+def speed_up_code(user_query: str, data_profile: str, hotspots: str, slow_code: str) -> str:
+    """Generate a faster version of working code, given its hottest profiled lines."""
+    return _generate(build_prompt('speedup', get_speedup_prompt, user_query, data_profile, hotspots, slow_code))
+
+def generate_sql(user_query: str, data_profile: str) -> str:
+    """Generate a DuckDB SQL query to answer user query."""
+    return _generate(build_prompt('codegen', get_sql_generation_prompt, user_query, data_profile), language='sql')
+
+def correct_sql(user_query: str, data_profile: str, error_message: str, failed_sql: str) -> str:
+    """Generate a corrected SQL query after error."""
+    return _generate(build_prompt('retry', get_sql_error_correction_prompt, user_query, data_profile, failed_sql,
+                                  error_message=error_message), language='sql')
+
+def generate_candidates(user_query: str, data_profile: str, k: int, engine: str = 'pandas',
+                        rollups: bool = False) -> List[Future]:
+    """
+    Start generating k diverse programs (SQL for engine='duckdb') at once.
+
+    Each candidate is steered towards a different approach; k is capped at
+    the number of approaches. Prompts are built on the calling thread, so
+    their sizes land in its prompt log. Returns one Future of code per candidate.
+    """
+    sql = engine == 'duckdb'
+    hints = CANDIDATE_SQL_HINTS if sql else CANDIDATE_HINTS
+    futures = []
+    for i, hint in enumerate(hints[:max(1, k)]):
+        prompt = build_prompt(f'candidate {i + 1}', get_candidate_prompt, user_query, data_profile, hint, sql,
+                              rollups)
+        # Token counts go to the caller's span
+        futures.append(_candidate_executor.submit(bind(_generate), prompt, 'sql' if sql else 'python'))
+    return futures
+
+def stream_text(prompt: str) -> Iterator[str]:
+    """Stream a generation, yielding the accumulated response text after each chunk."""
+    buffer = ''
+    add_to_current(prompt_tokens=estimate_tokens(prompt))
     try:
-        prompt = get_error_correction_prompt(user_query, data_profile, error_message, failed_code)
-        response = model.generate_content(prompt)
-        if not response or not response.text:
+        for chunk in get_llm_client().generate_content(prompt, stream=True):
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. the final finish-reason chunk)
+                continue
+            if text:
+                buffer += text
+                yield buffer
+    finally:
+        add_to_current(response_tokens=estimate_tokens(buffer))
+
+def _stream_code(prompt: str, language: str = 'python') -> Iterator[str]:
+    """Yield partial code while streaming; the last value is the final extracted code."""
+    try:
+        buffer = ''
+        for buffer in stream_text(prompt):
+            yield extract_code_from_response(buffer, partial=True, language=language)
+        if not buffer:
             raise ValueError("Empty response from Gemini API")
-        code = extract_code_from_response(response.text)
-        return code
+        yield extract_code_from_response(buffer, language=language)
     except Exception as e:
         error_msg = str(e)
         if "API key" in error_msg or "API_KEY" in error_msg:
             raise ValueError(f"Invalid Gemini API key. Please check your GEMINI_API_KEY in .env file. Error: {error_msg}")
         raise
 
+def generate_code_stream(user_query: str, data_profile: str, rollups: bool = False) -> Iterator[str]:
+    """Streaming generate_code(): yields partial code, ending with the final code."""
+    yield from _stream_code(build_prompt('codegen', get_code_generation_prompt, user_query, data_profile, rollups))
+
+def correct_code_stream(user_query: str, data_profile: str, error_message: str, failed_code: str) -> Iterator[str]:
+    """Streaming correct_code(): yields partial code, ending with the final code."""
+    yield from _stream_code(build_prompt('retry', get_error_correction_prompt, user_query, data_profile, failed_code,
+                                         error_message=error_message))
+
+def generate_sql_stream(user_query: str, data_profile: str) -> Iterator[str]:
+    """Streaming generate_sql(): yields partial SQL, ending with the final query."""
+    yield from _stream_code(build_prompt('codegen', get_sql_generation_prompt, user_query, data_profile), language='sql')
+
+def correct_sql_stream(user_query: str, data_profile: str, error_message: str, failed_sql: str) -> Iterator[str]:
+    """Streaming correct_sql(): yields partial SQL, ending with the final query."""
+    yield from _stream_code(
+        build_prompt('retry', get_sql_error_correction_prompt, user_query, data_profile, failed_sql,
+                     error_message=error_message),
+        language='sql'
+    )
@@ -0,0 +1,214 @@
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+class JobRejected(RuntimeError):
+    """Raised when a session (or the server) already has as many queued queries as allowed."""
+
+class QueryJob:
+    """
+    One question answered in the background.
+
+    state moves from 'queued' to 'running' and ends as 'done', 'failed' or
+    'cancelled'; stage follows the agent's progress ('codegen', 'validating',
+    'running', 'correcting', 'summarizing'). code and summary hold the
+    streamed text so far, response the process_query() response once the
+    result exists.
+    """
+
+    def __init__(self, session_id: str, user_query: str, df, data_profile: str, options: Dict[str, Any]):
+        self.id = uuid.uuid4().hex[:12]
+        self.session_id = session_id
+        self.question = user_query
+        self.state = 'queued'
+        self.stage = 'queued'
+        self.code = ''
+        self.summary = ''
+        self.response: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._df = df
+        self._data_profile = data_profile
+        self._options = options
+        self._cancel = threading.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.state in ('done', 'failed', 'cancelled')
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def elapsed(self) -> float:
+        """Seconds since submission (until finished)."""
+        return (self.finished or time.time()) - self.created
+
+class JobManager:
+    """
+    Runs queries on a thread pool so the UI thread only submits and polls.
+
+    At most max_concurrent jobs run at once overall and max_per_session per
+    session; the rest wait in FIFO order, up to max_queued_per_session per
+    session (submit() raises JobRejected beyond that). Cancelling a queued job
+    drops it at once; a running job's code execution is interrupted (its pool
+    worker is killed or its DuckDB query interrupted; inline execution only
+    stops before it starts) and the job ends at its next progress event.
+    Finished jobs are kept until
+    forget() or retention_seconds after they end.
+    """
+
+    def __init__(self, max_concurrent: int = 8, max_per_session: int = 1, max_queued_per_session: int = 3,
+                 retention_seconds: float = 600, stream: bool = True):
+        self.max_concurrent = max_concurrent
+        self.max_per_session = max_per_session
+        self.max_queued_per_session = max_queued_per_session
+        self.retention_seconds = retention_seconds
+        self.stream = stream
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix='dataspark-job')
+        self._jobs: Dict[str, QueryJob] = {}
+        self._pending = deque()
+        self._running: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # Finished jobs by final state
+        self._finished = {'done': 0, 'failed': 0, 'cancelled': 0}
+
+    def submit(self, session_id: str, user_query: str, df, data_profile: str, **options) -> QueryJob:
+        """Queue a question; options are passed to process_query_stream() (engine, strategy, profile)."""
+        job = QueryJob(session_id, user_query, df, data_profile, options)
+        with self._lock:
+            self._prune()
+            queued = sum(1 for pending in self._pending if pending.session_id == session_id)
+            if queued >= self.max_queued_per_session:
+                raise JobRejected(f"{queued} questions are already waiting; try again when one has finished")
+            self._jobs[job.id] = job
+            self._pending.append(job)
+            self._dispatch()
+        return job
+
+    def get(self, job_id: str) -> Optional[QueryJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self, session_id: str) -> List[QueryJob]:
+        """The session's jobs, oldest first."""
+        with self._lock:
+            return [job for job in self._jobs.values() if job.session_id == session_id]
+
+    def position(self, job: QueryJob) -> Optional[int]:
+        """1-based place of a queued job in the global queue, None once it started."""
+        with self._lock:
+            for i, pending in enumerate(self._pending):
+                if pending is job:
+                    return i + 1
+        return None
+
+    def cancel(self, job_id: str) -> bool:
+        """Request cancellation; returns False if the job is unknown or already finished."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.done:
+                return False
+            job._cancel.set()
+            if job in self._pending:
+                self._pending.remove(job)
+                self._finish(job, 'cancelled')
+        return True
+
+    def forget(self, job_id: str) -> None:
+        """Drop a finished job once its result has been collected."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.done:
+                del self._jobs[job_id]
+
+    def stats(self) -> Dict[str, Any]:
+        """Running and queued jobs now; completed (ran to a result or error) and cancelled since start."""
+        with self._lock:
+            return {
+                'running': sum(self._running.values()),
+                'queued': len(self._pending),
+                'sessions': len({job.session_id for job in self._jobs.values() if not job.done}),
+                'completed': self._finished['done'] + self._finished['failed'],
+                'cancelled': self._finished['cancelled'],
+                'max_concurrent': self.max_concurrent,
+            }
+
+    def _dispatch(self) -> None:
+        """Start queued jobs while global and per-session slots are free (lock held)."""
+        for job in list(self._pending):
+            if sum(self._running.values()) >= self.max_concurrent:
+                break
+            if self._running.get(job.session_id, 0) >= self.max_per_session:
+                # Later jobs of other sessions may still start
+                continue
+            self._pending.remove(job)
+            self._running[job.session_id] = self._running.get(job.session_id, 0) + 1
+            job.state = 'running'
+            job.started = time.time()
+            self._executor.submit(self._run, job)
+
+    def _finish(self, job: QueryJob, state: str) -> None:
+        job.state = state
+        job.finished = time.time()
+        # The frame may be a large upload; don't keep it alive through finished jobs
+        job._df = None
+        self._finished[state] += 1
+
+    def _prune(self) -> None:
+        """Forget finished jobs nobody collected (lock held)."""
+        cutoff = time.time() - self.retention_seconds
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done and job.finished < cutoff]:
+            del self._jobs[job_id]
+
+    def _run(self, job: QueryJob) -> None:
+        from src.ai.agent import process_query_stream
+        state = 'done'
+        events = process_query_stream(job.question, job._df, job._data_profile, stream=self.stream,
+                                      cancel=job._cancel, **job._options)
+        try:
+            job.stage = 'codegen'
+            for event, payload in events:
+                if job.cancel_requested:
+                    state = 'cancelled'
+                    break
+                if event == 'stage':
+                    job.stage = payload
+                elif event == 'code':
+                    job.code = payload
+                elif event == 'summary':
+                    job.summary = payload
+                elif event in ('result', 'done'):
+                    job.response = payload
+        except Exception as e:
+            state = 'failed'
+            job.error = f"{type(e).__name__}: {e}"
+        finally:
+            events.close()
+            with self._lock:
+                self._running[job.session_id] -= 1
+                if not self._running[job.session_id]:
+                    del self._running[job.session_id]
+                self._finish(job, state)
+                self._dispatch()
+
+_manager = None
+_manager_lock = threading.Lock()
+
+def get_job_manager() -> JobManager:
+    """Return the process-wide job manager shared by all sessions."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            from config.settings import (
+                JOB_MAX_CONCURRENT, JOB_MAX_PER_SESSION, JOB_MAX_QUEUED_PER_SESSION,
+                JOB_RETENTION_SECONDS, STREAM_RESPONSES
+            )
+            _manager = JobManager(JOB_MAX_CONCURRENT, JOB_MAX_PER_SESSION, JOB_MAX_QUEUED_PER_SESSION,
+                                  JOB_RETENTION_SECONDS, STREAM_RESPONSES)
+        return _manager
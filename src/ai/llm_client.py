@@ -0,0 +1,438 @@
+import hashlib
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+class LLMResponse:
+    """Minimal response object exposing .text like the Gemini SDK's responses."""
+
+    def __init__(self, text: str):
+        self.text = text
+
+class LLMClient(ABC):
+    """
+    Interface for text generation backends.
+
+    generate_content() mirrors GenerativeModel.generate_content(): it returns an
+    object with .text, or with stream=True an iterator of such chunks.
+    """
+
+    @abstractmethod
+    def generate_content(self, prompt: str, stream: bool = False) -> Union[LLMResponse, Iterator[LLMResponse]]:
+        """Generate text for prompt; with stream=True, yield it in chunks."""
+
+class GeminiClient(LLMClient):
+    """Google Gemini backend; the SDK model is created on first use."""
+
+    def __init__(self, api_key: Optional[str], model_name: str = 'gemini-2.5-flash',
+                 timeout: Optional[float] = None):
+        self.api_key = api_key
+        self.model_name = model_name
+        self.timeout = timeout
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        with self._lock:
+            if self._model is None:
+                try:
+                    import google.generativeai as genai
+                    genai.configure(api_key=self.api_key)
+                    self._model = genai.GenerativeModel(self.model_name)
+                except Exception as e:
+                    raise ValueError(f"Failed to configure Gemini API: {str(e)}. Please check your GEMINI_API_KEY in .env file.")
+            return self._model
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        request_options = {'timeout': self.timeout} if self.timeout else None
+        return self._get_model().generate_content(prompt, stream=stream, request_options=request_options)
+
+class LLMHTTPError(Exception):
+    """Non-200 answer from an HTTP LLM backend; retry_after is the server's hint in seconds."""
+
+    def __init__(self, status: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+        self.retry_after = retry_after
+
+class HTTPLLMClient(LLMClient):
+    """
+    JSON-over-HTTP backend (e.g. benchmarks/fake_llm_server.py or a gateway).
+
+    POST {url} with {"prompt": ..., "stream": bool}; the answer is
+    {"text": ...}, or for streams one {"text": chunk} JSON object per line.
+    """
+
+    def __init__(self, url: str, timeout: Optional[float] = None):
+        self.url = url
+        self.timeout = timeout
+
+    def _post(self, prompt: str, stream: bool):
+        import urllib.error
+        import urllib.request
+        body = json.dumps({'prompt': prompt, 'stream': stream}).encode('utf-8')
+        request = urllib.request.Request(self.url, data=body, headers={'Content-Type': 'application/json'})
+        try:
+            return urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            retry_after = e.headers.get('Retry-After')
+            raise LLMHTTPError(e.code, e.read().decode('utf-8', 'replace')[:200],
+                               float(retry_after) if retry_after else None) from None
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        response = self._post(prompt, stream)
+        if not stream:
+            with response:
+                return LLMResponse(json.loads(response.read())['text'])
+        return self._iter_lines(response)
+
+    def _iter_lines(self, response) -> Iterator[LLMResponse]:
+        with response:
+            for line in response:
+                if line.strip():
+                    yield LLMResponse(json.loads(line)['text'])
+
+class FakeLLMClient(LLMClient):
+    """
+    Deterministic offline stand-in for benchmarks and local runs.
+
+    rules is a list of (regex, response) pairs; the first pattern found in the
+    prompt wins, otherwise default is returned. latency adds a fixed delay per
+    call to approximate network time.
+    """
+
+    def __init__(self, rules: List[Tuple[str, str]], default: str = "The analysis completed successfully.",
+                 latency: float = 0.0, chunk_size: int = 16):
+        self.rules = [(re.compile(pattern, re.DOTALL), response) for pattern, response in rules]
+        self.default = default
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.calls = 0
+
+    def respond(self, prompt: str) -> str:
+        for pattern, response in self.rules:
+            if pattern.search(prompt):
+                return response
+        return self.default
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        text = self.respond(prompt)
+        if not stream:
+            return LLMResponse(text)
+        return iter([LLMResponse(text[i:i + self.chunk_size]) for i in range(0, len(text), self.chunk_size)])
+
+class ConcurrencyLimitedClient(LLMClient):
+    """Wraps a client so at most max_concurrent calls (including open streams) are in flight."""
+
+    def __init__(self, client: LLMClient, max_concurrent: int):
+        self.client = client
+        self.max_concurrent = max_concurrent
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        if not stream:
+            with self._slots:
+                return self.client.generate_content(prompt)
+        return self._stream(prompt)
+
+    def _stream(self, prompt: str) -> Iterator[LLMResponse]:
+        with self._slots:
+            yield from self.client.generate_content(prompt, stream=True)
+
+class TokenBucket:
+    """Refills rate units per second up to capacity; acquire() blocks until enough are available."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._available = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1.0) -> float:
+        """Take amount (capped at capacity) and return the seconds spent waiting."""
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._available = min(self.capacity, self._available + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._available >= amount:
+                    self._available -= amount
+                    return waited
+                delay = (amount - self._available) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token) for rate limits and metrics."""
+    return max(1, len(text) // 4)
+
+def is_retryable(error: Exception) -> bool:
+    """Quota, overload, timeout and connection errors are worth retrying; bad requests aren't."""
+    if isinstance(error, LLMHTTPError):
+        return error.status == 429 or error.status >= 500
+    if isinstance(error, (TimeoutError, FutureTimeoutError, ConnectionError)):
+        return True
+    # google.api_core exceptions, matched by name so the SDK stays an optional import
+    if type(error).__name__ in ('ResourceExhausted', 'TooManyRequests', 'ServiceUnavailable',
+                                'DeadlineExceeded', 'InternalServerError', 'Aborted'):
+        return True
+    message = str(error).lower()
+    return '429' in message or 'quota' in message or 'rate limit' in message
+
+class _SharedStream:
+    """One upstream stream fanned out to every caller that asked for the same prompt."""
+
+    def __init__(self):
+        self.chunks: List[LLMResponse] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._changed = threading.Condition()
+
+    def pump(self, source: Iterator[LLMResponse]) -> None:
+        try:
+            for chunk in source:
+                with self._changed:
+                    self.chunks.append(chunk)
+                    self._changed.notify_all()
+        except BaseException as e:
+            self.error = e
+        finally:
+            with self._changed:
+                self.done = True
+                self._changed.notify_all()
+
+    def reader(self) -> Iterator[LLMResponse]:
+        position = 0
+        while True:
+            with self._changed:
+                while position >= len(self.chunks) and not self.done:
+                    self._changed.wait()
+                pending = self.chunks[position:]
+                finished = self.done
+            for chunk in pending:
+                yield chunk
+            position += len(pending)
+            if finished and position >= len(self.chunks):
+                if self.error is not None:
+                    raise self.error
+                return
+
+class RateLimitedClient(LLMClient):
+    """
+    Shared front for an LLM backend under provider quotas.
+
+    - Requests and (estimated) prompt tokens pass through token buckets
+      sized from requests_per_minute / tokens_per_minute (0 = unlimited).
+    - Each call is bounded by timeout; quota, overload and timeout errors are
+      retried up to max_retries times with jittered exponential backoff,
+      honoring a server's Retry-After.
+    - Identical prompts already in flight are coalesced: later callers share
+      the first call's answer (or stream) instead of spending quota again.
+    - Calls run on at most max_workers threads. A call that times out can't
+      be interrupted, so its thread stays busy until the backend gives up
+      (backends have their own timeout); abandoned calls never add threads
+      beyond max_workers but take slots from new calls meanwhile.
+    - stats() reports queue depth, in-flight and abandoned calls, tokens and latency.
+    """
+
+    def __init__(self, client: LLMClient, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 timeout: Optional[float] = None, max_retries: int = 3, backoff_base: float = 1.0,
+                 backoff_max: float = 30.0, coalesce: bool = True, max_workers: int = 32):
+        self.client = client
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.coalesce = coalesce
+        self._requests = TokenBucket(requests_per_minute / 60, max(1.0, requests_per_minute / 60)) if requests_per_minute else None
+        self._tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute / 6) if tokens_per_minute else None
+        # Calls run here so a hung request can be abandoned after timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='dataspark-llm')
+        self._inflight: Dict[Tuple[str, bool], Any] = {}
+        self._latencies = deque(maxlen=512)
+        self._lock = threading.Lock()
+        self._metrics = {
+            'calls': 0, 'coalesced': 0, 'retries': 0, 'timeouts': 0, 'failures': 0,
+            'queue_depth': 0, 'in_flight': 0, 'abandoned': 0, 'prompt_tokens': 0, 'response_tokens': 0,
+            'rate_limited_seconds': 0.0,
+        }
+
+    def _count(self, name: str, amount: float = 1) -> None:
+        with self._lock:
+            self._metrics[name] += amount
+
+    def _throttle(self, prompt: str) -> None:
+        """Wait for a request slot and prompt-token budget."""
+        self._count('queue_depth')
+        try:
+            waited = self._requests.acquire() if self._requests else 0.0
+            if self._tokens:
+                waited += self._tokens.acquire(estimate_tokens(prompt))
+        finally:
+            self._count('queue_depth', -1)
+        if waited:
+            self._count('rate_limited_seconds', waited)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after:
+            return min(self.backoff_max, retry_after)
+        # Full jitter: concurrent callers hitting the same quota don't retry in lockstep
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _call(self, prompt: str, stream: bool):
+        """Throttled call with timeout and retries; streams are retried until their first chunk."""
+        attempt = 0
+        while True:
+            self._throttle(prompt)
+            self._count('calls')
+            self._count('prompt_tokens', estimate_tokens(prompt))
+            self._count('in_flight')
+            start = time.perf_counter()
+            try:
+                future = self._executor.submit(self._invoke, prompt, stream)
+                try:
+                    outcome = future.result(timeout=self.timeout)
+                except FutureTimeoutError:
+                    if not future.cancel():
+                        # Already running: its thread is held until the backend returns
+                        self._count('abandoned')
+                        future.add_done_callback(lambda _: self._count('abandoned', -1))
+                    self._count('timeouts')
+                    raise TimeoutError(f"LLM call exceeded {self.timeout:g}s") from None
+                with self._lock:
+                    self._latencies.append(time.perf_counter() - start)
+                return outcome
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    self._count('failures')
+                    raise
+                self._count('retries')
+                time.sleep(self._backoff(attempt, e))
+                attempt += 1
+            finally:
+                self._count('in_flight', -1)
+
+    def _invoke(self, prompt: str, stream: bool):
+        if not stream:
+            response = self.client.generate_content(prompt)
+            self._count('response_tokens', estimate_tokens(getattr(response, 'text', None) or ''))
+            return response
+        # Open the stream and read the first chunk here, so connection and quota
+        # errors surface (and are retried) before any text reaches the caller
+        iterator = iter(self.client.generate_content(prompt, stream=True))
+        first = next(iterator, None)
+        return first, iterator
+
+    def _counted(self, first: Optional[LLMResponse], iterator: Iterator[LLMResponse]) -> Iterator[LLMResponse]:
+        if first is None:
+            return
+        for chunk in itertools.chain([first], iterator):
+            try:
+                self._count('response_tokens', estimate_tokens(chunk.text or ''))
+            except ValueError:
+                pass
+            yield chunk
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        if not self.coalesce:
+            if not stream:
+                return self._call(prompt, False)
+            return self._counted(*self._call(prompt, True))
+
+        key = (hashlib.sha256(prompt.encode('utf-8')).hexdigest(), stream)
+        with self._lock:
+            shared = self._inflight.get(key)
+            leader = shared is None
+            if leader:
+                shared = Future() if not stream else _SharedStream()
+                self._inflight[key] = shared
+            else:
+                self._metrics['coalesced'] += 1
+
+        if not stream:
+            if not leader:
+                return shared.result()
+            try:
+                shared.set_result(self._call(prompt, False))
+            except BaseException as e:
+                shared.set_exception(e)
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+            return shared.result()
+
+        if leader:
+            def pump():
+                try:
+                    first, iterator = self._call(prompt, True)
+                    shared.pump(self._counted(first, iterator))
+                except BaseException as e:
+                    shared.error = e
+                    shared.pump(iter(()))
+                finally:
+                    with self._lock:
+                        self._inflight.pop(key, None)
+            threading.Thread(target=pump, name='dataspark-llm-stream', daemon=True).start()
+        return shared.reader()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = dict(self._metrics)
+        stats['latency_p50'] = latencies[len(latencies) // 2] if latencies else None
+        stats['latency_p95'] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None
+        return stats
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_llm_client() -> LLMClient:
+    """Return the shared LLM client, creating the configured backend on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            from config.settings import (
+                GEMINI_API_KEY, GEMINI_MODEL, LLM_BACKEND, LLM_HTTP_URL, LLM_REQUESTS_PER_MINUTE,
+                LLM_TOKENS_PER_MINUTE, LLM_TIMEOUT_SECONDS, LLM_MAX_RETRIES, LLM_BACKOFF_BASE_SECONDS,
+                LLM_BACKOFF_MAX_SECONDS, LLM_COALESCE, LLM_MAX_WORKERS
+            )
+            if LLM_BACKEND == 'gemini':
+                backend = GeminiClient(GEMINI_API_KEY, GEMINI_MODEL, timeout=LLM_TIMEOUT_SECONDS)
+            elif LLM_BACKEND == 'http':
+                backend = HTTPLLMClient(LLM_HTTP_URL, timeout=LLM_TIMEOUT_SECONDS)
+            elif LLM_BACKEND == 'fake':
+                backend = FakeLLMClient([])
+            else:
+                raise ValueError(f"Unsupported LLM backend: {LLM_BACKEND}")
+            _client = RateLimitedClient(
+                backend,
+                requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+                tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+                timeout=LLM_TIMEOUT_SECONDS,
+                max_retries=LLM_MAX_RETRIES,
+                backoff_base=LLM_BACKOFF_BASE_SECONDS,
+                backoff_max=LLM_BACKOFF_MAX_SECONDS,
+                coalesce=LLM_COALESCE,
+                max_workers=LLM_MAX_WORKERS,
+            )
+        return _client
+
+def set_llm_client(client: Optional[LLMClient]) -> None:
+    """Replace the shared client (None resets to the configured backend)."""
+    global _client
+    with _client_lock:
+        _client = client
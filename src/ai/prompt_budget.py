@@ -0,0 +1,224 @@
+import difflib
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.ai.llm_client import estimate_tokens
+
+# Words that say nothing about which columns a question needs
+_STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'each', 'for', 'from', 'how', 'in', 'is', 'it',
+    'many', 'me', 'much', 'of', 'on', 'or', 'per', 'show', 'the', 'to', 'top', 'what', 'which',
+    'who', 'with', 'give', 'list', 'find', 'all', 'does', 'do', 'there', 'between', 'over',
+}
+_COLUMN_LINE = re.compile(r'^- (.+?): (.+?)(?: \| e\.g\. (.*))?$')
+_FRAME_LINE = re.compile(r'^\s+File "(.+?)", line \d+')
+
+_log = threading.local()
+
+def _words(text: str) -> List[str]:
+    """Lowercase word stems of text; camelCase and snake_case names are split."""
+    text = re.sub(r'([a-z0-9])([A-Z])', r'\1 \2', text)
+    words = []
+    for word in re.findall(r'[a-z0-9]+', text.lower()):
+        if word in _STOPWORDS:
+            continue
+        # Crude plural stemming so "regions" matches "region"
+        if len(word) > 4 and word.endswith('ies'):
+            word = word[:-3] + 'y'
+        elif len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+def parse_profile(data_profile: str) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """
+    Split a format_profile_for_prompt() block into header lines and columns.
+
+    Each column is {'name', 'dtype', 'examples', 'line'}; examples are the
+    sample values listed for text columns.
+    """
+    header, columns = [], []
+    in_columns = False
+    for line in data_profile.strip().splitlines():
+        if in_columns:
+            match = _COLUMN_LINE.match(line)
+            if match:
+                name, dtype, examples = match.groups()
+                columns.append({
+                    'name': name, 'dtype': dtype, 'line': line,
+                    'examples': [value.strip() for value in examples.split(', ')] if examples else [],
+                })
+                continue
+        header.append(line)
+        if line.strip() == '- Column Details:':
+            in_columns = True
+    return header, columns
+
+def score_columns(user_query: str, columns: List[Dict[str, Any]]) -> List[float]:
+    """
+    Lexical relevance of each column to the question.
+
+    Exact mentions of the column name score highest, then shared words, then
+    near-misses (typos, abbreviations) and finally sample values quoted in the
+    question (e.g. "sales in North" points at the column holding "North").
+    """
+    query_lower = ' '.join(re.findall(r'[a-z0-9]+', user_query.lower()))
+    query_words = set(_words(user_query))
+    scores = []
+    for column in columns:
+        score = 0.0
+        name = ' '.join(re.findall(r'[a-z0-9]+', re.sub(r'([a-z0-9])([A-Z])', r'\1 \2', column['name']).lower()))
+        if name and f" {name} " in f" {query_lower} ":
+            score += 5
+        for word in set(_words(column['name'])):
+            if word in query_words:
+                score += 3
+            elif len(word) > 2 and difflib.get_close_matches(word, query_words, n=1, cutoff=0.8):
+                score += 2
+            elif len(word) > 2 and any(q.startswith(word) or word.startswith(q) for q in query_words if len(q) > 2):
+                score += 1
+        for value in column['examples']:
+            value_lower = ' '.join(re.findall(r'[a-z0-9]+', value.lower()))
+            if len(value_lower) >= 3 and f" {value_lower} " in f" {query_lower} ":
+                score += 2
+        scores.append(score)
+    return scores
+
+def _render_groups(columns: List[Dict[str, Any]], max_chars: int) -> List[str]:
+    """Names of columns grouped by dtype, shortened to about max_chars with '+N more'."""
+    groups: Dict[str, List[str]] = {}
+    for column in columns:
+        groups.setdefault(column['dtype'], []).append(column['name'])
+    total = sum(len(names) for names in groups.values())
+    lines = []
+    for dtype, names in groups.items():
+        # Every dtype keeps a share of the space proportional to its column count
+        share = max(40, max_chars * len(names) // max(total, 1))
+        shown, used = [], 0
+        for name in names:
+            if used + len(name) + 2 > share and shown:
+                break
+            shown.append(name)
+            used += len(name) + 2
+        more = f" (+{len(names) - len(shown)} more)" if len(shown) < len(names) else ""
+        lines.append(f"- {dtype} ({len(names)}): {', '.join(shown)}{more}")
+    return lines
+
+def fit_profile(user_query: str, data_profile: str, budget_tokens: int,
+                max_detail_columns: int = 40) -> Tuple[str, Dict[str, Any]]:
+    """
+    Shrink a prompt profile to about budget_tokens, keeping the columns the question needs.
+
+    Profiles within the budget are returned unchanged. Otherwise the most
+    relevant columns (at most max_detail_columns) keep their full line and
+    the rest are listed by name, grouped by dtype; if that is still too
+    long the name lists are cut. Returns (profile, info) where info has
+    'columns_total' and 'columns_detailed'.
+    """
+    header, columns = parse_profile(data_profile)
+    info = {'columns_total': len(columns), 'columns_detailed': len(columns)}
+    if budget_tokens <= 0 or estimate_tokens(data_profile) <= budget_tokens or not columns:
+        return data_profile, info
+
+    scores = score_columns(user_query, columns)
+    ranked = sorted((i for i, score in enumerate(scores) if score > 0), key=lambda i: -scores[i])
+    detailed = ranked[:max_detail_columns]
+    budget_chars = budget_tokens * 4
+    header_chars = sum(len(line) + 1 for line in header) + 80
+    # Least relevant detailed columns fall back to name-only until the details fit in half the budget
+    while detailed and header_chars + sum(len(columns[i]['line']) + 1 for i in detailed) > budget_chars // 2:
+        detailed.pop()
+    kept = set(detailed)
+    detail_lines = [columns[i]['line'] for i in sorted(kept)]
+    rest = [column for i, column in enumerate(columns) if i not in kept]
+    remaining = budget_chars - header_chars - sum(len(line) + 1 for line in detail_lines)
+
+    lines = list(header) + detail_lines
+    if rest:
+        lines.append(f"- Other columns by type ({len(rest)}; names only):")
+        lines.extend(_render_groups(rest, remaining))
+    info['columns_detailed'] = len(detail_lines)
+    return '\n' + '\n'.join(lines) + '\n', info
+
+def trim_traceback(error_message: str, max_chars: int = 2000) -> str:
+    """
+    Keep the parts of an execution error the model can act on.
+
+    Frames of the generated code ('<generated>') and the exception lines are
+    kept; frames inside pandas, numpy or the executor are replaced by a
+    count. The result is cut to max_chars, keeping its start and end.
+    """
+    if not error_message:
+        return error_message
+    lines = error_message.splitlines()
+    kept, omitted, skipping = [], 0, False
+    for line in lines:
+        frame = _FRAME_LINE.match(line)
+        if frame:
+            skipping = frame.group(1) != '<generated>'
+            if skipping:
+                omitted += 1
+                continue
+        elif skipping and line.startswith(' '):
+            # Source line and ^^^ markers of a skipped frame
+            continue
+        else:
+            skipping = False
+        if omitted and (frame or not line.startswith(' ')):
+            kept.append(f"  [{omitted} library frame{'s' if omitted > 1 else ''} omitted]")
+            omitted = 0
+        kept.append(line)
+    if omitted:
+        kept.append(f"  [{omitted} library frame{'s' if omitted > 1 else ''} omitted]")
+    trimmed = '\n'.join(kept)
+    if len(trimmed) > max_chars:
+        half = max_chars // 2
+        trimmed = f"{trimmed[:half]}\n  [...]\n{trimmed[-half:]}"
+    return trimmed
+
+def start_prompt_log() -> List[Dict[str, Any]]:
+    """Collect the size of every prompt built on this thread from now on; returns the list."""
+    _log.entries = []
+    return _log.entries
+
+def build_prompt(stage: str, template: Callable[..., str], user_query: str, data_profile: str,
+                 *args, error_message: Optional[str] = None) -> str:
+    """
+    Build a codegen or correction prompt within PROMPT_TOKEN_BUDGET.
+
+    template is one of the get_*_prompt() functions, called as
+    template(user_query, data_profile[, error_message], *args). The
+    profile gets whatever the rest of the prompt leaves of the budget (but
+    at least a quarter of it); error messages are trimmed to the generated
+    code's frames. The prompt's size is added to the thread's prompt log.
+    """
+    from config.settings import PROMPT_TOKEN_BUDGET, PROMPT_MAX_DETAIL_COLUMNS, PROMPT_TRACEBACK_MAX_CHARS
+    extra = args
+    if error_message is not None:
+        error_message = trim_traceback(error_message, PROMPT_TRACEBACK_MAX_CHARS)
+        extra = (error_message,) + args
+    profile, info = data_profile, None
+    if PROMPT_TOKEN_BUDGET > 0:
+        overhead = estimate_tokens(template(user_query, '', *extra))
+        profile_budget = max(PROMPT_TOKEN_BUDGET - overhead, PROMPT_TOKEN_BUDGET // 4)
+        profile, info = fit_profile(user_query, data_profile, profile_budget, PROMPT_MAX_DETAIL_COLUMNS)
+    prompt = template(user_query, profile, *extra)
+
+    entries = getattr(_log, 'entries', None)
+    if entries is not None:
+        entry = {'stage': stage, 'tokens': estimate_tokens(prompt), 'chars': len(prompt)}
+        if info is not None:
+            entry.update(info)
+        entries.append(entry)
+    return prompt
+
+def describe_prompt_sizes(entries: List[Dict[str, Any]]) -> Optional[str]:
+    """One-line caption of the prompts behind an answer, or None if none were sent."""
+    parts = []
+    for entry in entries:
+        text = f"{entry['stage']} prompt ~{entry['tokens']:,} tokens"
+        if entry.get('columns_detailed', entry.get('columns_total')) != entry.get('columns_total'):
+            text += f" ({entry['columns_detailed']} of {entry['columns_total']} columns in detail)"
+        parts.append(text)
+    return " · ".join(parts) or None
@@ -1,5 +1,15 @@
-def get_code_generation_prompt(user_query: str, data_profile: str) -> str:
-    """Generate prompt for code generation."""
+def get_code_generation_prompt(user_query: str, data_profile: str, rollups: bool = False) -> str:
+    """Generate prompt for code generation; rollups=True when the sandbox has cubes for this dataset."""
+    rollup_instruction = ""
+    if rollups:
+        rollup_instruction = """6. For totals, counts, means, min or max grouped by one or two columns of the whole dataset, use
+   `rollup(by, measure=None, agg='sum', freq=None)`: it returns the same as `df.groupby(by)[measure].agg(agg)`
+   from precomputed aggregates (agg: 'sum', 'mean', 'count', 'min', 'max' or 'size'; freq 'D', 'W' or 'M'
+   groups the date column in `by` by day, week or month start). It ignores changes made to `df` by your code.
+   `lookup_rows(column, value=None, start=None, end=None)` returns the rows of `df` where column equals value
+   (or a list of values), or where a date column lies in [start, end).
+"""
+    step = 7 if rollups else 6
     return f"""You are an expert Python Data Analyst.
 
 You have access to a pandas DataFrame variable named `df`.
@@ -22,8 +32,8 @@ Instructions:
    - datetime (as `datetime`)
    - timedelta (as `timedelta`)
 5. Use only the pre-imported libraries listed above.
-6. Output ONLY the Python code, wrapped in ```python``` blocks.
-7. Do not include explanations or markdown outside code blocks.
+{rollup_instruction}{step}. Output ONLY the Python code, wrapped in ```python``` blocks.
+{step + 1}. Do not include explanations or markdown outside code blocks.
 
 Code:"""
 
@@ -47,6 +57,93 @@ Error message:
 
 Please correct the code and try again. Output ONLY the corrected Python code wrapped in ```python``` blocks."""
 
+def get_speedup_prompt(user_query: str, data_profile: str, hotspots: str, slow_code: str) -> str:
+    """Generate prompt for rewriting working code whose profiled hot lines are slow."""
+    return f"""You are an expert Python Data Analyst.
+
+You have access to a pandas DataFrame variable named `df`.
+
+{data_profile}
+
+User Question: "{user_query}"
+
+This code answers the question correctly but is slow:
+```python
+{slow_code}
+```
+
+Line profile of its run on the full data (hottest lines first):
+{hotspots}
+
+Rewrite the code so it produces exactly the same `result` (and `fig`, if any) faster. Focus on the hot lines: replace Python loops, iterrows and apply(axis=1) with vectorized pandas/numpy operations, avoid repeated work and unnecessary copies. Output ONLY the rewritten Python code wrapped in ```python``` blocks."""
+
+def get_sql_generation_prompt(user_query: str, data_profile: str) -> str:
+    """Generate prompt for SQL generation (DuckDB engine)."""
+    return f"""You are an expert data analyst writing DuckDB SQL.
+
+You have access to a table named `df`.
+
+{data_profile}
+
+User Question: "{user_query}"
+
+Instructions:
+1. Write a single DuckDB SQL query that answers the question.
+2. Only a SELECT statement (optionally starting with WITH) is allowed; do not create, modify or read other tables or files.
+3. Quote column names that contain spaces or capitals with double quotes.
+4. Give computed columns short, readable aliases; add ORDER BY when the order matters for the answer.
+5. For a single number or label, return one row with one column.
+6. Output ONLY the DuckDB SQL query, wrapped in ```sql``` blocks.
+
+SQL:"""
+
+def get_sql_error_correction_prompt(user_query: str, data_profile: str, error_message: str, failed_sql: str) -> str:
+    """Generate prompt for SQL error correction."""
+    return f"""You are an expert data analyst writing DuckDB SQL.
+
+You have access to a table named `df`.
+
+{data_profile}
+
+User Question: "{user_query}"
+
+Previous DuckDB SQL query that failed:
+```sql
+{failed_sql}
+```
+
+Error message:
+{error_message}
+
+Please correct the query. Output ONLY the corrected DuckDB SQL query (a single SELECT) wrapped in ```sql``` blocks."""
+
+# Approaches asked of speculative candidates so they fail in different ways;
+# the first candidate gets the plain prompt
+CANDIDATE_HINTS = [
+    "",
+    "Prefer a direct groupby/agg or value_counts solution and convert types explicitly (e.g. pd.to_datetime, pd.to_numeric) before using them.",
+    "Handle missing values with dropna/fillna before aggregating, and keep the code short.",
+    "Use boolean masks, pivot_table or resample where they fit, and avoid loops and apply.",
+]
+CANDIDATE_SQL_HINTS = [
+    "",
+    "Cast columns explicitly (TRY_CAST, strptime) before comparing or aggregating them.",
+    "Use a WITH clause to build the answer in small steps, filtering NULLs first.",
+    "Prefer plain GROUP BY with aggregate FILTER clauses over subqueries.",
+]
+
+def get_candidate_prompt(user_query: str, data_profile: str, hint: str, sql: bool = False,
+                         rollups: bool = False) -> str:
+    """Code (or SQL) generation prompt for one speculative candidate, steered by hint."""
+    if sql:
+        prompt = get_sql_generation_prompt(user_query, data_profile)
+    else:
+        prompt = get_code_generation_prompt(user_query, data_profile, rollups)
+    if not hint:
+        return prompt
+    body, label = prompt.rsplit('\n\n', 1)
+    return f"{body}\nApproach: {hint}\n\n{label}"
+
 def get_summary_prompt(user_query: str, result_description: str) -> str:
     """Generate prompt for narrative summary."""
     return f"""Based on the following analysis:
@@ -56,13 +153,13 @@ Result: {result_description}
 
 Generate a 2-sentence executive summary explaining what the data shows. Be specific with numbers and insights."""
 
-def get_voice_narrative_prompt(user_query: str, result_description: str, summary: str) -> str:
-    """Generate prompt for voice-optimized narrative."""
+def get_voice_narrative_prompt(user_query: str, result_description: str, summary: str = None) -> str:
+    """Generate prompt for voice-optimized narrative (summary is optional so both can run in parallel)."""
+    summary_line = f"\nSummary: {summary}" if summary else ""
     return f"""You are a data analyst presenting insights in a conversational, engaging way for voice narration.
 
 User Question: "{user_query}"
-Analysis Result: {result_description}
-Summary: {summary}
+Analysis Result: {result_description}{summary_line}
 
 Generate a natural, conversational narrative (2-3 sentences) that:
 1. Is optimized for voice narration - use natural speech patterns
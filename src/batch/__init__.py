@@ -0,0 +1 @@
+# Batch (headless) processing package
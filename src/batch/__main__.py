@@ -0,0 +1,10 @@
+import os
+import sys
+
+# Headless runs execute generated code in the worker pool; set before settings are read
+os.environ.setdefault('EXECUTION_BACKEND', 'pool')
+
+from src.batch.runner import main
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,309 @@
+"""
+Headless batch mode: run a question set over a directory of data files.
+
+    python -m src.batch --input data/ --questions questions.txt --output out/
+
+Every file goes through load_data -> generate_profile, then each question
+through process_query(). LLM calls are capped at --llm-concurrency in flight,
+generated code runs in the execution process pool, and every finished
+(file, question) pair is appended to out/checkpoint.jsonl so an interrupted
+run picks up where it stopped with --resume. Stage latencies (p50/p95) and
+throughput are printed at the end and written to out/report.json; per-stage
+span metrics (Prometheus text format) go to out/metrics.prom, or METRICS_FILE.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config.settings import ALLOWED_EXTENSIONS
+
+# Stages reported at the end; process_query() contributes its own timings
+STAGES = ['load', 'profile', 'codegen', 'race', 'optimize', 'exec', 'retry', 'summary', 'query']
+
+def find_data_files(input_dir: str) -> List[str]:
+    """Supported data files under input_dir, sorted for a stable run order."""
+    found = []
+    for root, _, names in os.walk(input_dir):
+        for name in names:
+            if os.path.splitext(name)[1].lower() in ALLOWED_EXTENSIONS:
+                found.append(os.path.join(root, name))
+    return sorted(found)
+
+def read_questions(path: str) -> List[str]:
+    """Questions from a JSON list or a text file with one question per line (# comments)."""
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    if path.endswith('.json'):
+        return [str(question) for question in json.loads(text)]
+    return [line.strip() for line in text.splitlines() if line.strip() and not line.lstrip().startswith('#')]
+
+def file_fingerprint(path: str) -> str:
+    """Cheap change detector for checkpoints: a rewritten file is processed again."""
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+def slugify(text: str, max_length: int = 40) -> str:
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')[:max_length] or 'query'
+
+class Checkpoint:
+    """Append-only JSONL log of finished (file, question) pairs."""
+
+    def __init__(self, path: str, resume: bool):
+        self.path = path
+        self.done = {}
+        if resume and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Last line cut short by an interrupted run
+                        continue
+                    if record.get('status') == 'ok':
+                        self.done[(record['file'], record['fingerprint'], record['question'])] = record
+        elif os.path.exists(path):
+            os.remove(path)
+        self._lock = threading.Lock()
+
+    def is_done(self, file: str, fingerprint: str, question: str) -> bool:
+        return (file, fingerprint, question) in self.done
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        line = json.dumps(entry, default=str) + '\n'
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+class StageStats:
+    """Collects per-stage latencies from all worker threads."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        report = {}
+        for stage, values in self.samples.items():
+            if values:
+                report[stage] = {
+                    'count': len(values),
+                    'p50': float(np.percentile(values, 50)),
+                    'p95': float(np.percentile(values, 95)),
+                    'total': float(sum(values)),
+                }
+        return report
+
+def write_outputs(response: Dict[str, Any], directory: str, name: str) -> Dict[str, Optional[str]]:
+    """Write result table, chart and a JSON record for one answer; returns the paths written."""
+    paths = {'result': None, 'chart': None}
+    result = response.get('result')
+    if isinstance(result, pd.Series):
+        result = result.reset_index()
+    if isinstance(result, pd.DataFrame):
+        paths['result'] = os.path.join(directory, f"{name}.csv")
+        result.to_csv(paths['result'], index=False)
+
+    fig = response.get('fig')
+    if fig is None and isinstance(result, pd.DataFrame):
+        from src.visualization.chart_generator import should_visualize, create_chart
+        if should_visualize(result):
+            fig = create_chart(result)
+    if fig is not None:
+        try:
+            if hasattr(fig, 'write_html'):
+                paths['chart'] = os.path.join(directory, f"{name}.html")
+                fig.write_html(paths['chart'], include_plotlyjs='cdn')
+            elif hasattr(fig, 'savefig'):
+                paths['chart'] = os.path.join(directory, f"{name}.png")
+                fig.savefig(paths['chart'], bbox_inches='tight')
+        except Exception:
+            paths['chart'] = None
+
+    record = {
+        'question': response.get('question'),
+        'code': response.get('code'),
+        'language': response.get('language'),
+        'error': response.get('error'),
+        'summary': response.get('summary'),
+        'was_retried': response.get('was_retried'),
+        'strategy': response.get('strategy'),
+        'speculation': response.get('speculation'),
+        'timings': response.get('timings'),
+        'prompt_sizes': response.get('prompt_sizes'),
+        'trace': response.get('trace'),
+        'result_preview': None if isinstance(result, pd.DataFrame) or result is None else str(result),
+        **{f"{kind}_path": path for kind, path in paths.items()},
+    }
+    with open(os.path.join(directory, f"{name}.json"), 'w', encoding='utf-8') as f:
+        json.dump(record, f, indent=2, default=str)
+    return paths
+
+def run_file(path: str, input_dir: str, questions: List[str], output_dir: str,
+             checkpoint: Checkpoint, stats: StageStats, question_pool: ThreadPoolExecutor,
+             strategy: Optional[str] = None) -> Tuple[int, int, int]:
+    """Load and profile one file, then answer its pending questions; returns (ok, failed, skipped)."""
+    from src.data.loader import load_data
+    from src.data.profiler import generate_profile, format_profile_for_prompt
+    from src.ai.agent import process_query
+    from src.data.rollups import get_rollup_store
+
+    relative = os.path.relpath(path, input_dir)
+    fingerprint = file_fingerprint(path)
+    pending = [(i, q) for i, q in enumerate(questions) if not checkpoint.is_done(relative, fingerprint, q)]
+    skipped = len(questions) - len(pending)
+    if not pending:
+        return 0, 0, skipped
+
+    directory = os.path.join(output_dir, slugify(relative, max_length=80))
+    os.makedirs(directory, exist_ok=True)
+    try:
+        start = time.perf_counter()
+        df = load_data(path, os.path.splitext(path)[1][1:])
+        stats.add('load', time.perf_counter() - start)
+        start = time.perf_counter()
+        profile = generate_profile(df)
+        data_profile = format_profile_for_prompt(profile)
+        stats.add('profile', time.perf_counter() - start)
+        rollup_store = get_rollup_store()
+        if rollup_store is not None:
+            # Questions asked before the build finishes scan the frame as usual
+            rollup_store.schedule(df, profile)
+    except Exception as e:
+        for i, question in pending:
+            checkpoint.record({'file': relative, 'fingerprint': fingerprint, 'question': question,
+                               'status': 'error', 'error': f"Load failed: {type(e).__name__}: {e}"})
+        return 0, len(pending), skipped
+
+    def answer(i: int, question: str) -> bool:
+        name = f"q{i + 1:02d}-{slugify(question)}"
+        start = time.perf_counter()
+        try:
+            response = process_query(question, df, data_profile, narrative=False, strategy=strategy)
+            error = response.get('error')
+        except Exception as e:
+            response, error = {}, f"{type(e).__name__}: {e}"
+        stats.add('query', time.perf_counter() - start)
+        for stage, seconds in (response.get('timings') or {}).items():
+            if stage in STAGES:
+                stats.add(stage, seconds)
+        response['question'] = question
+        paths = write_outputs(dict(response, error=error), directory, name)
+        checkpoint.record({
+            'file': relative, 'fingerprint': fingerprint, 'question': question,
+            'status': 'error' if error else 'ok', 'error': error,
+            'output': os.path.join(directory, f"{name}.json"), **paths,
+        })
+        return not error
+
+    futures = [question_pool.submit(answer, i, question) for i, question in pending]
+    outcomes = [future.result() for future in futures]
+    return sum(outcomes), len(outcomes) - sum(outcomes), skipped
+
+def run_batch(input_dir: str, questions: List[str], output_dir: str, llm_concurrency: int = 4,
+              file_workers: int = 2, resume: bool = False, strategy: Optional[str] = None) -> Dict[str, Any]:
+    """Run every question over every data file in input_dir; returns the run report."""
+    from src.ai.llm_client import get_llm_client, set_llm_client, ConcurrencyLimitedClient
+    from src.execution.speculative import get_strategy_stats
+    from src.utils.tracing import write_metrics_file
+    from config.settings import METRICS_FILE
+
+    os.makedirs(output_dir, exist_ok=True)
+    files = find_data_files(input_dir)
+    checkpoint = Checkpoint(os.path.join(output_dir, 'checkpoint.jsonl'), resume)
+    stats = StageStats()
+    # Every codegen, correction and summary call goes through this limit
+    shared_client = get_llm_client()
+    set_llm_client(ConcurrencyLimitedClient(shared_client, llm_concurrency))
+
+    start = time.perf_counter()
+    ok = failed = skipped = 0
+    # More question threads than LLM slots, so execution overlaps waiting on the model
+    with ThreadPoolExecutor(max_workers=llm_concurrency * 2, thread_name_prefix='dataspark-batch-q') as question_pool, \
+            ThreadPoolExecutor(max_workers=file_workers, thread_name_prefix='dataspark-batch-file') as file_pool:
+        futures = [
+            file_pool.submit(run_file, path, input_dir, questions, output_dir, checkpoint, stats, question_pool,
+                             strategy)
+            for path in files
+        ]
+        for path, future in zip(files, futures):
+            file_ok, file_failed, file_skipped = future.result()
+            ok += file_ok
+            failed += file_failed
+            skipped += file_skipped
+            print(f"{os.path.relpath(path, input_dir)}: {file_ok} ok, {file_failed} failed", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+
+    report = {
+        'files': len(files),
+        'questions': len(questions),
+        'answered': ok,
+        'failed': failed,
+        'skipped': skipped,
+        'seconds': elapsed,
+        'queries_per_minute': (ok + failed) / elapsed * 60 if elapsed > 0 else 0.0,
+        'stages': stats.summary(),
+        'config': {'llm_concurrency': llm_concurrency, 'file_workers': file_workers, 'strategy': strategy},
+        'llm': shared_client.stats() if hasattr(shared_client, 'stats') else None,
+        'strategies': get_strategy_stats().summary(),
+        'metrics_path': METRICS_FILE or os.path.join(output_dir, 'metrics.prom'),
+    }
+    write_metrics_file(report['metrics_path'])
+    with open(os.path.join(output_dir, 'report.json'), 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"{report['files']} files x {report['questions']} questions: {report['answered']} answered, "
+          f"{report['failed']} failed, {report['skipped']} skipped (checkpoint) in {report['seconds']:.1f}s "
+          f"({report['queries_per_minute']:.1f} queries/min)")
+    llm = report.get('llm')
+    if llm:
+        print(f"LLM: {llm['calls']} calls, {llm['coalesced']} coalesced, {llm['retries']} retries, "
+              f"{llm['failures']} failed, {llm['rate_limited_seconds']:.1f}s waiting on rate limits")
+    for strategy, row in (report.get('strategies') or {}).items():
+        wins = ', '.join(f"{name} {count}" for name, count in row.get('candidate_wins', {}).items())
+        print(f"{strategy}: {row['win_rate']:.0%} answered, {row['first_try_rate']:.0%} without correction, "
+              f"p50 {row['p50_s']:.2f}s / p95 {row['p95_s']:.2f}s" + (f" (wins: {wins})" if wins else ""))
+    print(f"{'stage':<10} {'count':>6} {'p50 s':>9} {'p95 s':>9} {'total s':>9}")
+    for stage in STAGES:
+        row = report['stages'].get(stage)
+        if row:
+            print(f"{stage:<10} {row['count']:>6} {row['p50']:>9.3f} {row['p95']:>9.3f} {row['total']:>9.1f}")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run a question set over a directory of data files")
+    parser.add_argument('--input', required=True, help="Directory of CSV/JSON/JSONL files (searched recursively)")
+    parser.add_argument('--questions', required=True, help="Text file (one question per line) or JSON list")
+    parser.add_argument('--output', required=True, help="Directory for results, charts, checkpoint and report")
+    parser.add_argument('--llm-concurrency', type=int, default=4, help="Maximum LLM calls in flight")
+    parser.add_argument('--file-workers', type=int, default=2, help="Files loaded and processed at once")
+    parser.add_argument('--resume', action='store_true', help="Skip questions already answered in the checkpoint")
+    parser.add_argument('--strategy', choices=['serial', 'speculative'], default=None,
+                        help="Code generation strategy (default: CODEGEN_STRATEGY)")
+    args = parser.parse_args(argv)
+
+    # Generated code gets shallow views of each loaded frame
+    from src.data.registry import enable_copy_on_write
+    enable_copy_on_write()
+    questions = read_questions(args.questions)
+    if not questions:
+        parser.error(f"No questions found in {args.questions}")
+    report = run_batch(args.input, questions, args.output, args.llm_concurrency, args.file_workers, args.resume,
+                       args.strategy)
+    print_report(report)
+    return 0 if report['failed'] == 0 else 1
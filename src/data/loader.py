@@ -1,20 +1,351 @@
 import pandas as pd
+import numpy as np
 import json
-from typing import Union
+import os
+import time
+from typing import Union, Iterator, Dict, Any, Tuple, Optional, List
+from src.utils.tracing import span
 
-def load_data(file_path: str, file_type: str) -> pd.DataFrame:
-    """Load CSV or JSON file into pandas DataFrame."""
-    try:
-        if file_type == 'csv':
-            df = pd.read_csv(file_path)
-        elif file_type == 'json':
-            with open(file_path, 'r') as f:
+JSON_LINES_TYPES = ('jsonl', 'ndjson')
+
+def load_data(file_path: str, file_type: str, chunksize: Optional[int] = None,
+              engine: Optional[str] = None, downcast: Optional[bool] = None) -> pd.DataFrame:
+    """Load CSV, JSON or JSON Lines file into pandas DataFrame."""
+    df, _ = load_data_with_stats(file_path, file_type, chunksize, engine, downcast)
+    return df
+
+def load_data_with_stats(file_path: str, file_type: str, chunksize: Optional[int] = None,
+                         engine: Optional[str] = None,
+                         downcast: Optional[bool] = None) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Load a file and report ingest statistics.
+
+    Files above LOADER_CHUNKED_THRESHOLD_MB (or any file when chunksize is given)
+    are read in chunks and downcast while streaming, so peak memory stays close
+    to the size of the final frame. With LOADER_PARSE_DATES, text columns
+    holding dates are converted to datetimes, so profiles, date filters and
+    the day/week/month rollups see them as dates.
+
+    Args:
+        chunksize: Rows per chunk; None picks full or chunked mode by file size.
+        engine: CSV parser, 'c' or 'pyarrow'.
+        downcast: Shrink float widths and convert low-cardinality strings to
+            categoricals (integers too with LOADER_DOWNCAST_INTEGERS);
+            defaults to LOADER_DOWNCAST in chunked mode.
+
+    Returns:
+        Tuple of (df, stats) where stats contains rows, columns, chunks, mode,
+        seconds, rows_per_sec, peak_rss_delta_mb (how far the process's memory
+        rose above its level before the load) and date_columns.
+    """
+    from config.settings import (
+        LOADER_CHUNK_ROWS, LOADER_CHUNKED_THRESHOLD_MB, LOADER_CSV_ENGINE, LOADER_DOWNCAST,
+        LOADER_DOWNCAST_INTEGERS, LOADER_PARSE_DATES
+    )
+    file_type = file_type.lower()
+    engine = engine or LOADER_CSV_ENGINE
+    if chunksize is None and os.path.getsize(file_path) / 1024**2 > LOADER_CHUNKED_THRESHOLD_MB:
+        chunksize = LOADER_CHUNK_ROWS
+    if downcast is None:
+        # Small files keep pandas' default dtypes
+        downcast = LOADER_DOWNCAST and bool(chunksize)
+
+    start = time.perf_counter()
+    rss_before, peak_before = _rss_mb(), _peak_rss_mb()
+    rss_samples = []
+    with span('parse', file_type=file_type, mode='chunked' if chunksize else 'full',
+              bytes=os.path.getsize(file_path)) as parse_span:
+        try:
+            if chunksize:
+                chunks = []
+                for chunk in iter_chunks(file_path, file_type, chunksize, engine):
+                    chunks.append(downcast_dtypes(chunk, integers=LOADER_DOWNCAST_INTEGERS) if downcast else chunk)
+                    rss_samples.append(_rss_mb())
+                df = concat_chunks(chunks)
+                chunk_count = len(chunks)
+            else:
+                df = _load_full(file_path, file_type, engine)
+                if downcast:
+                    df = downcast_dtypes(df, integers=LOADER_DOWNCAST_INTEGERS)
+                chunk_count = 1
+            rss_samples.append(_rss_mb())
+            date_columns = parse_dates(df) if LOADER_PARSE_DATES else []
+        except Exception as e:
+            raise Exception(f"Error loading file: {str(e)}")
+        parse_span.set(rows=len(df), columns=len(df.columns), chunks=chunk_count, date_columns=len(date_columns))
+
+    seconds = time.perf_counter() - start
+    stats = {
+        'rows': len(df),
+        'columns': len(df.columns),
+        'chunks': chunk_count,
+        'mode': 'chunked' if chunksize else 'full',
+        'engine': engine if file_type == 'csv' else 'json',
+        'seconds': seconds,
+        'rows_per_sec': len(df) / seconds if seconds > 0 else float('inf'),
+        'peak_rss_delta_mb': _load_peak_mb(rss_before, peak_before, rss_samples),
+        'date_columns': date_columns,
+    }
+    return df, stats
+
+def _load_full(file_path: str, file_type: str, engine: str) -> pd.DataFrame:
+    """Load the whole file in one pass."""
+    if file_type == 'csv':
+        return pd.read_csv(file_path, engine=engine)
+    elif file_type in JSON_LINES_TYPES:
+        return pd.read_json(file_path, lines=True)
+    elif file_type == 'json':
+        with open(file_path, 'r') as f:
+            try:
                 data = json.load(f)
-            df = pd.DataFrame(data)
+            except json.JSONDecodeError as e:
+                # JSON Lines saved with a .json extension
+                if 'Extra data' not in str(e):
+                    raise
+                return pd.read_json(file_path, lines=True)
+        return pd.DataFrame(data)
+    else:
+        raise ValueError(f"Unsupported file type: {file_type}")
+
+def iter_chunks(file_path: str, file_type: str, chunksize: int, engine: str = 'c') -> Iterator[pd.DataFrame]:
+    """Yield the file as DataFrames of at most chunksize rows."""
+    if file_type == 'csv':
+        if engine == 'pyarrow':
+            yield from _iter_csv_pyarrow(file_path, chunksize)
         else:
-            raise ValueError(f"Unsupported file type: {file_type}")
-        
-        return df
-    except Exception as e:
-        raise Exception(f"Error loading file: {str(e)}")
+            yield from pd.read_csv(file_path, chunksize=chunksize)
+    elif file_type in JSON_LINES_TYPES:
+        with pd.read_json(file_path, lines=True, chunksize=chunksize) as reader:
+            yield from reader
+    elif file_type == 'json':
+        if _first_char(file_path) != '[':
+            # Objects of columns or JSON Lines; neither can be split into records cheaply
+            yield _load_full(file_path, file_type, engine)
+            return
+        records = []
+        for record in iter_json_array(file_path):
+            records.append(record)
+            if len(records) >= chunksize:
+                yield pd.DataFrame(records)
+                records = []
+        if records:
+            yield pd.DataFrame(records)
+    else:
+        raise ValueError(f"Unsupported file type: {file_type}")
+
+def _iter_csv_pyarrow(file_path: str, chunksize: int) -> Iterator[pd.DataFrame]:
+    """
+    Stream a CSV through pyarrow's multithreaded reader in frames of at most chunksize rows.
+
+    The reader works in blocks of bytes, so the block size is estimated from
+    the average line length at the head of the file; any larger batch is
+    sliced.
+    """
+    from pyarrow import csv as pa_csv
+
+    block_size = max(_bytes_per_line(file_path) * chunksize, 1 << 16)
+    reader = pa_csv.open_csv(file_path, read_options=pa_csv.ReadOptions(block_size=int(block_size)))
+    for batch in reader:
+        for offset in range(0, batch.num_rows, chunksize):
+            # Dates pyarrow already inferred become datetime64, not object columns of datetime.date
+            yield batch.slice(offset, chunksize).to_pandas(date_as_object=False)
+
+def _bytes_per_line(file_path: str, probe_bytes: int = 1 << 20) -> float:
+    """Average line length in bytes over the first probe_bytes of a text file."""
+    with open(file_path, 'rb') as f:
+        head = f.read(probe_bytes)
+    return len(head) / max(head.count(b'\n'), 1)
+
+def _first_char(file_path: str) -> str:
+    """Return the first non-whitespace character of a text file."""
+    with open(file_path, 'r') as f:
+        while True:
+            block = f.read(4096)
+            if not block:
+                return ''
+            stripped = block.lstrip()
+            if stripped:
+                return stripped[0]
 
+def iter_json_array(file_path: str, read_size: int = 1024**2) -> Iterator[Any]:
+    """Incrementally parse a top-level JSON array, yielding one element at a time."""
+    decoder = json.JSONDecoder()
+    with open(file_path, 'r') as f:
+        buffer = f.read(read_size).lstrip()
+        if not buffer.startswith('['):
+            raise ValueError("Expected a JSON array")
+        pos = 1
+        eof = False
+        while True:
+            # Skip separators between elements
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == ']':
+                return
+            if pos >= len(buffer):
+                if eof:
+                    raise ValueError("Unterminated JSON array")
+                chunk = f.read(read_size)
+                eof = not chunk
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            try:
+                obj, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                end = None
+            # A value ending exactly at the buffer edge may be truncated (e.g. a number)
+            if end is None or (end == len(buffer) and not eof):
+                if eof:
+                    raise ValueError("Malformed JSON array")
+                chunk = f.read(read_size)
+                eof = not chunk
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            yield obj
+            pos = end
+
+def downcast_dtypes(df: pd.DataFrame, category_ratio: float = 0.5, integers: bool = False) -> pd.DataFrame:
+    """
+    Shrink column dtypes without losing information.
+
+    Floats go to float32 only when every value round-trips exactly and
+    string columns whose distinct count is at most category_ratio of the rows
+    become categoricals. With integers=True, integers also go to int32 when
+    their range allows; that is opt-in because sums and products of int32
+    columns in generated code can overflow silently (narrower widths even more so).
+    """
+    int32 = np.iinfo(np.int32)
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_bool_dtype(series):
+            continue
+        if pd.api.types.is_integer_dtype(series):
+            if (integers and isinstance(series.dtype, np.dtype) and series.dtype.itemsize > 4 and len(series) > 0
+                    and int32.min <= series.min() and series.max() <= int32.max):
+                df[col] = series.astype(np.int32)
+        elif pd.api.types.is_float_dtype(series) and series.dtype != np.float32:
+            values = series.to_numpy()
+            narrowed = values.astype(np.float32)
+            if np.array_equal(narrowed.astype(values.dtype), values, equal_nan=True):
+                df[col] = narrowed
+        elif pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                continue
+            try:
+                unique_count = series.nunique(dropna=True)
+            except TypeError:
+                # Unhashable values such as nested lists/dicts
+                continue
+            if len(series) > 0 and unique_count <= max(1, category_ratio * len(series)):
+                df[col] = series.astype('category')
+    return df
+
+# Formats without a month are years or times of day, not dates
+_DATE_DIRECTIVES = ('%m', '%b', '%B')
+
+def _date_format(values: pd.Series) -> Optional[str]:
+    """strptime format of date strings, if the first non-missing one looks like a date."""
+    from pandas.tseries.api import guess_datetime_format
+    first = values.dropna()
+    if first.empty or not isinstance(first.iloc[0], str):
+        return None
+    date_format = guess_datetime_format(first.iloc[0].strip())
+    if date_format is None or not any(directive in date_format for directive in _DATE_DIRECTIVES):
+        return None
+    return date_format
+
+def parse_dates(df: pd.DataFrame, sample_size: int = 1000, min_parsed: float = 0.95) -> List[str]:
+    """
+    Convert text (and categorical text) columns holding dates to datetime64, in place.
+
+    The format is guessed from the first value and must parse at least
+    min_parsed of a sample and of the whole column, so IDs or free text that
+    happen to start with a date stay text. Categoricals are converted through
+    their categories, which is cheap for repeated dates. Returns the
+    converted column names.
+    """
+    converted = []
+    for col in df.columns:
+        series = df[col]
+        categorical = isinstance(series.dtype, pd.CategoricalDtype)
+        values = pd.Series(series.cat.categories) if categorical else series
+        if not (pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values)):
+            continue
+        present = values.dropna()
+        if present.empty:
+            continue
+        date_format = _date_format(present)
+        if date_format is None:
+            continue
+        sample = present.sample(n=min(sample_size, len(present)), random_state=0)
+        if pd.to_datetime(sample, format=date_format, errors='coerce').notna().mean() < min_parsed:
+            continue
+        parsed = pd.to_datetime(values, format=date_format, errors='coerce')
+        if parsed.notna().sum() < min_parsed * len(present):
+            continue
+        if categorical:
+            # Code -1 (missing) becomes NaT
+            parsed = pd.Series(pd.DatetimeIndex(parsed).take(series.cat.codes.to_numpy(), allow_fill=True,
+                                                             fill_value=pd.NaT), index=series.index)
+        df[col] = parsed
+        converted.append(col)
+    return converted
+
+def concat_chunks(chunks: List[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate chunks, keeping categoricals when every chunk has them."""
+    if not chunks:
+        return pd.DataFrame()
+    if len(chunks) == 1:
+        return chunks[0]
+
+    for col in chunks[0].columns:
+        is_category = [
+            col in chunk.columns and isinstance(chunk[col].dtype, pd.CategoricalDtype) for chunk in chunks
+        ]
+        if all(is_category):
+            # Align categories so concat keeps the categorical dtype
+            categories = pd.api.types.union_categoricals(
+                [chunk[col] for chunk in chunks], ignore_order=True
+            ).categories
+            for chunk in chunks:
+                chunk[col] = chunk[col].cat.set_categories(categories)
+        elif any(is_category):
+            for chunk, categorical in zip(chunks, is_category):
+                if categorical:
+                    chunk[col] = chunk[col].astype(object)
+    return pd.concat(chunks, ignore_index=True)
+
+def _rss_mb() -> Optional[float]:
+    """Current resident set size of this process in MB (Linux /proc), or None elsewhere."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024**2
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+def _load_peak_mb(rss_before: Optional[float], peak_before: Optional[float],
+                  rss_samples: List[Optional[float]]) -> Optional[float]:
+    """
+    How far RSS rose above rss_before while loading.
+
+    A load that set a new lifetime peak (ru_maxrss) is measured exactly;
+    otherwise the highest RSS sampled after each chunk is used.
+    """
+    if rss_before is None:
+        return None
+    peak = max([rss for rss in rss_samples if rss is not None], default=rss_before)
+    peak_after = _peak_rss_mb()
+    if peak_before is not None and peak_after is not None and peak_after > peak_before:
+        peak = max(peak, peak_after)
+    return max(peak - rss_before, 0.0)
+
+def _peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB, where the platform reports it."""
+    try:
+        import resource
+        import sys
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 1024**2 if sys.platform == 'darwin' else peak / 1024
@@ -1,9 +1,40 @@
 import pandas as pd
-from typing import Dict, Any
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Any, Optional
+from src.data.sketches import HyperLogLog, ReservoirSample, RunningMoments
+from src.utils.helpers import hash_dataframe
+from src.utils.tracing import span
 
-def generate_profile(df: pd.DataFrame) -> Dict[str, Any]:
-    """Generate data profile for display and LLM context."""
+def generate_profile(df: pd.DataFrame, tier: str = 'auto') -> Dict[str, Any]:
+    """
+    Generate data profile for display and LLM context.
+
+    Args:
+        tier: 'full' computes exact statistics, 'fast' exact counts and dtypes
+            with sample/sketch-based statistics, 'auto' picks by frame size.
+    """
+    if tier == 'auto':
+        from config.settings import PROFILER_FAST_THRESHOLD_CELLS
+        tier = 'full' if df.size <= PROFILER_FAST_THRESHOLD_CELLS else 'fast'
+    with span('profile', tier=tier, rows=len(df), columns=len(df.columns)):
+        if tier == 'full':
+            return _full_profile(df)
+        state = ProfileState()
+        state.add(df)
+        return state.profile()
+
+def _full_profile(df: pd.DataFrame) -> Dict[str, Any]:
+    """Exact profile; walks every value, so it is slow on wide or large frames."""
+    distinct_counts = {}
+    for col in df.columns:
+        try:
+            distinct_counts[col] = int(df[col].nunique())
+        except TypeError:
+            distinct_counts[col] = int(df[col].astype(str).nunique())
     profile = {
+        'tier': 'full',
         'row_count': len(df),
         'column_count': len(df.columns),
         'columns': df.columns.tolist(),
@@ -11,13 +42,191 @@ def generate_profile(df: pd.DataFrame) -> Dict[str, Any]:
         'first_5_rows': df.head(5).to_dict('records'),
         'memory_usage_mb': df.memory_usage(deep=True).sum() / 1024**2,
         'missing_values': df.isnull().sum().to_dict(),
+        'distinct_counts': distinct_counts,
         'numeric_summary': df.describe().to_dict() if len(df.select_dtypes(include=['number']).columns) > 0 else {}
     }
     return profile
 
+class ProfileState:
+    """
+    Mergeable statistics behind the fast profile tier.
+
+    Counts, missing values, min/max/mean/std are exact; quartiles come from a
+    reservoir sample and distinct counts from HyperLogLog sketches. Appended
+    rows are folded in with add() instead of recomputing the profile.
+    """
+
+    def __init__(self, sample_size: Optional[int] = None, hll_precision: Optional[int] = None):
+        from config.settings import PROFILER_SAMPLE_SIZE, PROFILER_HLL_PRECISION
+        self.hll_precision = hll_precision or PROFILER_HLL_PRECISION
+        self.sample = ReservoirSample(sample_size or PROFILER_SAMPLE_SIZE)
+        self.moments = RunningMoments()
+        self.sketches = {}
+        self.row_count = 0
+        self.dtypes = {}
+        self.first_5_rows = []
+        self.missing = pd.Series(dtype='int64')
+        self.memory_bytes = 0.0
+
+    def add(self, df: pd.DataFrame) -> None:
+        """Fold a frame (the initial data or appended rows) into the statistics."""
+        if not self.dtypes:
+            self.first_5_rows = df.head(5).to_dict('records')
+        for col, dtype in df.dtypes.astype(str).items():
+            self.dtypes.setdefault(col, dtype)
+
+        self.row_count += len(df)
+        self.missing = self.missing.add(df.isnull().sum(), fill_value=0).astype('int64')
+        self.moments.add(df.select_dtypes(include=['number']))
+        self.sample.add(df)
+        for col in df.columns:
+            sketch = self.sketches.setdefault(col, HyperLogLog(self.hll_precision))
+            sketch.add_series(df[col])
+
+        # Shallow usage is exact; string payloads are extrapolated from a sample
+        self.memory_bytes += df.memory_usage(deep=False).sum()
+        object_columns = df.select_dtypes(include=['object', 'string']).columns
+        if len(object_columns) > 0 and len(df) > 0:
+            sample = df[object_columns].head(self.sample.size)
+            extra = sample.memory_usage(deep=True, index=False).sum() - sample.memory_usage(index=False).sum()
+            self.memory_bytes += extra / len(sample) * len(df)
+
+    def profile(self) -> Dict[str, Any]:
+        """Render the statistics in the generate_profile() format."""
+        numeric_summary = {}
+        if self.moments.count is not None:
+            quartiles = self.sample.rows[self.moments.count.index].quantile([0.25, 0.5, 0.75])
+            std = self.moments.std()
+            for col in self.moments.count.index:
+                numeric_summary[col] = {
+                    'count': float(self.moments.count[col]),
+                    'mean': float(self.moments.mean[col]),
+                    'std': float(std[col]),
+                    'min': float(self.moments.min[col]),
+                    '25%': float(quartiles.loc[0.25, col]),
+                    '50%': float(quartiles.loc[0.5, col]),
+                    '75%': float(quartiles.loc[0.75, col]),
+                    'max': float(self.moments.max[col]),
+                }
+        return {
+            'tier': 'fast',
+            'row_count': self.row_count,
+            'column_count': len(self.dtypes),
+            'columns': list(self.dtypes),
+            'dtypes': dict(self.dtypes),
+            'first_5_rows': self.first_5_rows,
+            'memory_usage_mb': self.memory_bytes / 1024**2,
+            'missing_values': self.missing.to_dict(),
+            'distinct_counts': {col: sketch.count() for col, sketch in self.sketches.items()},
+            'numeric_summary': numeric_summary,
+            'sample_size': len(self.sample.rows) if self.sample.rows is not None else 0,
+        }
+
+# dataset hash -> {'state': ProfileState (None for frames profiled exactly up front),
+#                  'full': Future (None after an append without the combined frame)}
+_profile_cache = OrderedDict()
+_profile_cache_lock = threading.Lock()
+_background = ThreadPoolExecutor(max_workers=1, thread_name_prefix='dataspark-profile')
+
+def _cache_entry(dataset_key: str, entry: Dict[str, Any]) -> None:
+    from config.settings import PROFILER_CACHE_SIZE
+    with _profile_cache_lock:
+        _profile_cache[dataset_key] = entry
+        _profile_cache.move_to_end(dataset_key)
+        while len(_profile_cache) > PROFILER_CACHE_SIZE:
+            _profile_cache.popitem(last=False)
+
+def profile_dataset(df: pd.DataFrame, dataset_key: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Cached profile of a dataset.
+
+    Frames up to PROFILER_FAST_THRESHOLD_CELLS get the exact profile right
+    away. Larger ones get the fast tier, while the exact tier is computed in
+    the background; it is returned once ready and can be fetched with
+    get_full_profile().
+    """
+    from config.settings import PROFILER_FAST_THRESHOLD_CELLS
+    dataset_key = dataset_key or hash_dataframe(df)
+    with _profile_cache_lock:
+        entry = _profile_cache.get(dataset_key)
+    if entry is not None:
+        full = get_full_profile(dataset_key)
+        return full if full is not None else entry['state'].profile()
+    if df.size <= PROFILER_FAST_THRESHOLD_CELLS:
+        with span('profile', tier='full', rows=len(df), columns=len(df.columns)):
+            profile = _full_profile(df)
+        full = Future()
+        full.set_result(profile)
+        _cache_entry(dataset_key, {'state': None, 'full': full})
+        return profile
+    with span('profile', tier='fast', rows=len(df), columns=len(df.columns)):
+        state = ProfileState()
+        state.add(df)
+        _cache_entry(dataset_key, {'state': state, 'full': _background.submit(_full_profile, df)})
+        return state.profile()
+
+def get_full_profile(dataset_key: str, timeout: Optional[float] = 0) -> Optional[Dict[str, Any]]:
+    """Return the exact profile if it has been computed (waiting up to timeout seconds)."""
+    with _profile_cache_lock:
+        entry = _profile_cache.get(dataset_key)
+    if entry is None or entry['full'] is None:
+        return None
+    if timeout == 0 and not entry['full'].done():
+        return None
+    try:
+        return entry['full'].result(timeout=timeout)
+    except Exception:
+        return None
+
+def append_to_profile(dataset_key: str, new_rows: pd.DataFrame, new_key: str,
+                      combined_df: Optional[pd.DataFrame] = None) -> Dict[str, Any]:
+    """
+    Update a cached profile with appended rows instead of recomputing it.
+
+    The new rows are folded into the cached ProfileState, which is re-keyed
+    from dataset_key to new_key (the hash of the combined frame). Frames
+    profiled exactly up front have no state to merge into; they need
+    combined_df and are profiled afresh. When combined_df is given, the exact
+    tier is recomputed for it in the background.
+    """
+    with _profile_cache_lock:
+        entry = _profile_cache.get(dataset_key)
+    if entry is None or entry['state'] is None:
+        if combined_df is None:
+            raise KeyError(f"No mergeable cached profile for dataset {dataset_key}")
+        return profile_dataset(combined_df, new_key)
+
+    with span('profile', tier='append', rows=len(new_rows), columns=len(new_rows.columns)):
+        state = entry['state']
+        state.add(new_rows)
+        full = _background.submit(_full_profile, combined_df) if combined_df is not None else None
+        with _profile_cache_lock:
+            if new_key != dataset_key:
+                _profile_cache.pop(dataset_key, None)
+        _cache_entry(new_key, {'state': state, 'full': full})
+        return state.profile()
+
+def _format_examples(profile: Dict[str, Any], col: str, dtype: str, limit: int = 3) -> str:
+    """' | e.g. a, b' with sample values of a text column, so questions can be matched to it."""
+    if dtype not in ('object', 'str', 'string', 'category'):
+        return ''
+    examples = []
+    for row in profile.get('first_5_rows') or []:
+        value = row.get(col)
+        if value is None or value != value:
+            continue
+        value = str(value).replace(',', ' ').replace('\n', ' ').strip()[:30]
+        if value and value not in examples:
+            examples.append(value)
+        if len(examples) == limit:
+            break
+    return f" | e.g. {', '.join(examples)}" if examples else ''
+
 def format_profile_for_prompt(profile: Dict[str, Any]) -> str:
     """Format profile for LLM prompt."""
-    columns_info = "\n".join([f"- {col}: {dtype}" for col, dtype in profile['dtypes'].items()])
+    columns_info = "\n".join([
+        f"- {col}: {dtype}" + _format_examples(profile, col, dtype) for col, dtype in profile['dtypes'].items()
+    ])
     return f"""
 DataFrame Information:
 - Rows: {profile['row_count']}
@@ -25,4 +234,3 @@ DataFrame Information:
 - Column Details:
 {columns_info}
 """
-
@@ -0,0 +1,198 @@
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import pandas as pd
+
+from src.utils.tracing import span
+
+def enable_copy_on_write() -> None:
+    """
+    Turn on pandas copy-on-write for the process (the default from pandas 3).
+
+    Called once at startup by entry points that share frames; without it a
+    shared_view() lets in-place writes reach the shared frame.
+    """
+    if int(pd.__version__.split('.')[0]) < 3:
+        pd.set_option('mode.copy_on_write', True)
+
+def shared_view(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Shallow copy of a shared frame for code that may modify it.
+
+    With copy-on-write, adding, replacing or writing into columns of the view
+    copies just the affected columns; the shared frame is never changed.
+    """
+    return df.copy(deep=False)
+
+class _Entry:
+    def __init__(self, df: pd.DataFrame, info: Dict[str, Any]):
+        self.df = df
+        self.info = info
+        self.refs = 0
+        self.idle_since = time.monotonic()
+        self.nbytes = int(df.memory_usage(deep=True).sum())
+
+class DatasetLease:
+    """
+    A session's hold on a shared dataset.
+
+    Released explicitly when the session switches datasets, or automatically
+    when the lease is garbage collected (the Streamlit session went away).
+    """
+
+    def __init__(self, registry: 'DatasetRegistry', key: str, df: pd.DataFrame, shared: bool):
+        self.key = key
+        self.df = df
+        self.shared = shared  # True if another session had already loaded it
+        self._release = weakref.finalize(self, registry._release, key)
+
+    def release(self) -> None:
+        self.df = None
+        self._release()
+
+    @property
+    def released(self) -> bool:
+        return not self._release.alive
+
+class DatasetRegistry:
+    """
+    Process-wide frames shared by every session that opened the same content.
+
+    Datasets are keyed by content hash; the first session to open one loads
+    it, later ones get the same DataFrame object, so memory for N sessions on
+    one file stays near 1x. Sessions must treat the frame as read-only and
+    give code that may modify it a shared_view(). Entries are reference
+    counted by leases and dropped once unreferenced for idle_seconds.
+    """
+
+    def __init__(self, idle_seconds: float = 600):
+        self.idle_seconds = idle_seconds
+        self.loads = 0
+        self.shared_hits = 0
+        self.evictions = 0
+        self._entries: Dict[str, _Entry] = {}
+        self._loading: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, loader: Callable[[], Optional[Tuple[pd.DataFrame, Dict[str, Any]]]]
+                ) -> Optional[Tuple[DatasetLease, Dict[str, Any]]]:
+        """
+        Lease the dataset with this key, calling loader() -> (df, info) on a miss.
+
+        Concurrent sessions opening the same key wait for a single load.
+        Returns (lease, info), or None when loader returns None. If the
+        loader fails, the next session to open the key loads it afresh.
+        """
+        self.evict_idle()
+        shared = True
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                load_lock = self._loading.setdefault(key, threading.Lock())
+        if entry is None:
+            with load_lock:
+                with self._lock:
+                    entry = self._entries.get(key)
+                if entry is None:
+                    try:
+                        loaded = loader()
+                        if loaded is None:
+                            return None
+                        entry = _Entry(*loaded)
+                        shared = False
+                        with self._lock:
+                            self._entries[key] = entry
+                            self.loads += 1
+                    finally:
+                        # Loaded, missing or failed: either way nobody is loading it now
+                        with self._lock:
+                            if self._loading.get(key) is load_lock:
+                                del self._loading[key]
+                else:
+                    with self._lock:
+                        self.shared_hits += 1
+        else:
+            with self._lock:
+                self.shared_hits += 1
+        with self._lock:
+            entry.refs += 1
+            # The entry may have been evicted between lookup and here; re-register it
+            self._entries.setdefault(key, entry)
+        return DatasetLease(self, key, entry.df, shared), entry.info
+
+    def refs(self, key: str) -> int:
+        """Number of sessions currently holding key."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry.refs if entry is not None else 0
+
+    def _release(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.refs > 0:
+                entry.refs -= 1
+                if entry.refs == 0:
+                    entry.idle_since = time.monotonic()
+
+    def evict_idle(self) -> int:
+        """Drop datasets nobody has held for idle_seconds; returns how many."""
+        now = time.monotonic()
+        with self._lock:
+            stale = [key for key, entry in self._entries.items()
+                     if entry.refs == 0 and now - entry.idle_since >= self.idle_seconds]
+            for key in stale:
+                del self._entries[key]
+            self.evictions += len(stale)
+        return len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'datasets': len(self._entries),
+                'sessions': sum(entry.refs for entry in self._entries.values()),
+                'bytes': sum(entry.nbytes for entry in self._entries.values()),
+                'loads': self.loads,
+                'shared_hits': self.shared_hits,
+                'evictions': self.evictions,
+            }
+
+def open_upload(data: bytes, file_type: str) -> Tuple[DatasetLease, Dict[str, Any]]:
+    """Lease the dataset for uploaded bytes, parsing (or mapping from the store) only on first open."""
+    from src.data.store import content_key, get_dataset_store
+    key = content_key(data)
+
+    def load():
+        df, _, stats = get_dataset_store().load_upload(data, file_type)
+        return df, stats
+
+    with span('upload', bytes=len(data), file_type=file_type) as upload_span:
+        lease, stats = get_dataset_registry().acquire(key, load)
+        if lease.shared:
+            stats = dict(stats or {}, source='shared', seconds=0.0, rows=len(lease.df))
+        upload_span.set(rows=len(lease.df), source=(stats or {}).get('source'))
+    return lease, stats
+
+def open_stored(key: str) -> Optional[DatasetLease]:
+    """Lease a dataset already in the dataset store (e.g. after a browser refresh), or None."""
+    from src.data.store import get_dataset_store
+
+    def load():
+        df = get_dataset_store().get(key)
+        return None if df is None else (df, None)
+
+    acquired = get_dataset_registry().acquire(key, load)
+    return acquired[0] if acquired is not None else None
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_dataset_registry() -> DatasetRegistry:
+    """Return the process-wide dataset registry configured in settings."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            from config.settings import DATASET_REGISTRY_IDLE_SECONDS
+            _registry = DatasetRegistry(DATASET_REGISTRY_IDLE_SECONDS)
+        return _registry
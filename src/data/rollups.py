@@ -0,0 +1,426 @@
+"""
+Pre-aggregated rollups and sorted indexes built in the background after upload.
+
+Most questions are group-by totals, top-N and daily/weekly/monthly trends over
+one or two columns. For every candidate dimension (low-cardinality text or
+category columns, datetime columns bucketed by day/week/month) and pairs of
+them, a small cube with sum, count, min and max of every measure is built
+once; generated code calls rollup() in the sandbox and gets the groupby
+answer from the cube instead of scanning the frame. lookup_rows() uses
+sorted indexes to pick rows by category value or date range.
+
+Rollups are keyed by the frame's content hash, so changed data never sees
+stale cubes; they are also dropped when the frame is garbage collected or
+invalidated explicitly.
+"""
+import itertools
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from src.utils.helpers import hash_dataframe
+
+# Time buckets precomputed for datetime dimensions
+TIME_FREQS = ('D', 'W', 'M')
+_FREQ_ALIASES = {
+    'd': 'D', 'day': 'D', 'daily': 'D',
+    'w': 'W', 'week': 'W', 'weekly': 'W',
+    'm': 'M', 'ms': 'M', 'me': 'M', 'month': 'M', 'monthly': 'M',
+}
+AGGREGATIONS = ('sum', 'mean', 'count', 'min', 'max', 'size')
+# Column of every cube holding the number of rows per group
+_ROWS = ('__rows__', 'size')
+
+Key = Tuple[str, Optional[str]]  # (column, time bucket or None)
+
+def normalize_freq(freq: Optional[str]) -> Optional[str]:
+    if freq is None:
+        return None
+    normalized = _FREQ_ALIASES.get(str(freq).lower())
+    if normalized is None:
+        raise ValueError(f"Unsupported freq {freq!r}; use 'D', 'W' or 'M'")
+    return normalized
+
+def time_bucket(series: pd.Series, freq: str) -> pd.Series:
+    """Start of the day, week (Monday) or month each timestamp falls in."""
+    day = series.dt.floor('D')
+    if freq == 'D':
+        return day
+    if freq == 'W':
+        return day - pd.to_timedelta(series.dt.dayofweek, unit='D')
+    return day - pd.to_timedelta(series.dt.day - 1, unit='D')
+
+def group_stats(df: pd.DataFrame, keys: Sequence[Key], measures: Sequence[str]) -> pd.DataFrame:
+    """
+    Per-group sum, count, min and max of measures plus the group sizes.
+
+    Groups like df.groupby(...) with its defaults (sorted keys, missing keys
+    dropped); columns are (measure, stat) pairs and ('__rows__', 'size').
+    """
+    key_series = [time_bucket(df[col], freq).rename(col) if freq else df[col] for col, freq in keys]
+    if measures:
+        grouped = df[list(measures)].groupby(key_series, observed=True, sort=True)
+        stats = grouped.agg(['sum', 'count', 'min', 'max'])
+        stats[_ROWS] = grouped.size()
+    else:
+        sizes = df.groupby(key_series, observed=True, sort=True).size()
+        stats = pd.DataFrame({_ROWS: sizes})
+    return stats
+
+def _select(stats: pd.DataFrame, measure: Union[str, List[str], None], agg: str,
+            by: List[str]) -> Union[pd.Series, pd.DataFrame]:
+    """Turn group_stats() output into what df.groupby(by)[measure].agg(agg) returns."""
+    if measure is None or agg == 'size':
+        result = stats[_ROWS].rename(None)
+    elif isinstance(measure, list):
+        return pd.DataFrame({m: _select(stats, m, agg, by) for m in measure})
+    elif agg == 'mean':
+        result = (stats[(measure, 'sum')] / stats[(measure, 'count')]).rename(measure)
+    else:
+        result = stats[(measure, agg)].rename(measure)
+    names = list(result.index.names)
+    if len(by) > 1 and names != by:
+        result = result.reorder_levels(by).sort_index()
+    return result
+
+class SortedIndex:
+    """Row positions of one column sorted by value, for equality and range lookups."""
+
+    def __init__(self, series: pd.Series):
+        dtype = np.int32 if len(series) < 2**31 else np.int64
+        self.temporal = pd.api.types.is_datetime64_any_dtype(series)
+        if self.temporal:
+            values = series.to_numpy(dtype='datetime64[ns]') if series.dt.tz is None else \
+                series.dt.tz_convert(None).to_numpy(dtype='datetime64[ns]')
+            self.tz = series.dt.tz
+            keys = values.view(np.int64)
+            self.order = np.argsort(keys, kind='stable').astype(dtype)
+            self.sorted_keys = keys[self.order]
+        else:
+            codes, self.uniques = pd.factorize(series, sort=True)
+            self.order = np.argsort(codes, kind='stable').astype(dtype)
+            self.bounds = np.searchsorted(codes[self.order], np.arange(len(self.uniques) + 1))
+            self.lookup = {value: i for i, value in enumerate(self.uniques)}
+
+    @property
+    def nbytes(self) -> int:
+        return self.order.nbytes + (self.sorted_keys.nbytes if self.temporal else self.bounds.nbytes)
+
+    def positions(self, value: Any = None, start: Any = None, end: Any = None) -> np.ndarray:
+        """Ascending positions of rows equal to value (or any of a list), or in [start, end)."""
+        if self.temporal:
+            # NaT sorts first as the smallest int64; never part of a range
+            low = int(np.searchsorted(self.sorted_keys, np.iinfo(np.int64).min, side='right'))
+            high = len(self.sorted_keys)
+            if start is not None:
+                low = max(low, int(np.searchsorted(self.sorted_keys, self._key(start), side='left')))
+            if end is not None:
+                high = int(np.searchsorted(self.sorted_keys, self._key(end), side='left'))
+            return np.sort(self.order[low:max(low, high)])
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        parts = [self.order[self.bounds[i]:self.bounds[i + 1]]
+                 for i in (self.lookup.get(v) for v in values) if i is not None]
+        return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=self.order.dtype)
+
+    def _key(self, when: Any) -> int:
+        timestamp = pd.Timestamp(when)
+        if timestamp.tz is not None:
+            timestamp = timestamp.tz_convert(None)
+        elif self.tz is not None:
+            timestamp = timestamp.tz_localize(self.tz).tz_convert(None)
+        return timestamp.as_unit('ns').value
+
+class Rollups:
+    """The cubes and indexes built for one dataset."""
+
+    def __init__(self, dimensions: Dict[str, List[str]], measures: List[str],
+                 cubes: Dict[frozenset, Tuple[List[Key], pd.DataFrame]], indexes: Dict[str, SortedIndex],
+                 row_count: int, build_seconds: float):
+        self.dimensions = dimensions
+        self.measures = measures
+        self.cubes = cubes
+        self.indexes = indexes
+        self.row_count = row_count
+        self.build_seconds = build_seconds
+
+    @property
+    def nbytes(self) -> int:
+        cubes = sum(int(stats.memory_usage(deep=True).sum()) for _, stats in self.cubes.values())
+        return cubes + sum(index.nbytes for index in self.indexes.values())
+
+    def answer(self, keys: List[Key], measure: Union[str, List[str], None], agg: str,
+               by: List[str]) -> Optional[Union[pd.Series, pd.DataFrame]]:
+        """The groupby result from a cube, or None if no cube covers this shape."""
+        cube = self.cubes.get(frozenset(keys))
+        if cube is None:
+            return None
+        wanted = [] if measure is None or agg == 'size' else (measure if isinstance(measure, list) else [measure])
+        if any(m not in self.measures for m in wanted):
+            return None
+        return _select(cube[1], measure, agg, by)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            'categories': self.dimensions['categorical'],
+            'dates': self.dimensions['temporal'],
+            'measures': self.measures,
+            'cubes': len(self.cubes),
+            'indexes': sorted(self.indexes),
+            'bytes': self.nbytes,
+            'build_seconds': self.build_seconds,
+        }
+
+def detect_dimensions(df: pd.DataFrame, profile: Optional[Dict[str, Any]] = None,
+                      max_cardinality: int = 100, max_dimensions: int = 8,
+                      max_measures: int = 20) -> Dict[str, List[str]]:
+    """
+    Candidate rollup columns: {'categorical', 'temporal', 'measures'}.
+
+    Categorical dimensions are text, category and boolean columns with at
+    most max_cardinality distinct values (from the profile's distinct counts
+    when given); temporal ones are datetime columns. Measures are the other
+    numeric columns, except integer columns unique on every row (ids).
+    """
+    distinct = (profile or {}).get('distinct_counts') or {}
+    categorical, temporal, measures = [], [], []
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            temporal.append(col)
+        elif (pd.api.types.is_bool_dtype(series) or isinstance(series.dtype, pd.CategoricalDtype)
+              or pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+            count = distinct.get(col)
+            if count is None:
+                try:
+                    count = series.nunique()
+                except TypeError:
+                    continue
+            if 1 <= count <= max_cardinality:
+                categorical.append(col)
+        elif pd.api.types.is_numeric_dtype(series):
+            if pd.api.types.is_integer_dtype(series) and len(df) > 1:
+                count = distinct.get(col)
+                # Distinct counts of the fast profile are HyperLogLog estimates
+                if (count >= 0.95 * len(df)) if count is not None else series.is_unique:
+                    continue
+            measures.append(col)
+    return {
+        'categorical': categorical[:max_dimensions],
+        'temporal': temporal[:max(1, max_dimensions // 4)],
+        'measures': measures[:max_measures],
+    }
+
+def build_rollups(df: pd.DataFrame, profile: Optional[Dict[str, Any]] = None,
+                  max_cardinality: int = 100, max_cells: int = 100_000,
+                  index_columns: int = 4) -> Rollups:
+    """
+    Build the cubes for every dimension and pair of dimensions, and sorted indexes.
+
+    Pairs whose cube would exceed max_cells groups are skipped; indexes are
+    built for up to index_columns dimensions (dates first).
+    """
+    start = time.perf_counter()
+    dimensions = detect_dimensions(df, profile, max_cardinality)
+    measures = dimensions['measures']
+    singles: List[Key] = [(col, None) for col in dimensions['categorical']]
+    singles += [(col, freq) for col in dimensions['temporal'] for freq in TIME_FREQS]
+
+    cubes = {}
+    sizes = {}
+    for key in singles:
+        stats = group_stats(df, [key], measures)
+        cubes[frozenset([key])] = ([key], stats)
+        sizes[key] = len(stats)
+    for first, second in itertools.combinations(singles, 2):
+        # A date bucketed two ways, or a cube that is nearly as large as the data, doesn't pay off
+        if first[0] == second[0] or sizes[first] * sizes[second] > min(max_cells, len(df)):
+            continue
+        keys = [first, second]
+        cubes[frozenset(keys)] = (keys, group_stats(df, keys, measures))
+
+    indexes = {}
+    for col in (dimensions['temporal'] + dimensions['categorical'])[:index_columns]:
+        try:
+            indexes[col] = SortedIndex(df[col])
+        except (TypeError, ValueError):
+            continue
+    return Rollups(dimensions, measures, cubes, indexes, len(df), time.perf_counter() - start)
+
+def _resolve_keys(df: pd.DataFrame, by: Union[str, List[str]], freq: Optional[str]) -> Tuple[List[str], List[Key]]:
+    by = [by] if isinstance(by, str) else list(by)
+    freq = normalize_freq(freq)
+    keys = []
+    for col in by:
+        if col not in df.columns:
+            raise KeyError(col)
+        bucket = freq if freq and pd.api.types.is_datetime64_any_dtype(df[col]) else None
+        keys.append((col, bucket))
+    if freq and not any(bucket for _, bucket in keys):
+        raise ValueError(f"freq={freq!r} needs a datetime column in by; columns given: {by}")
+    return by, keys
+
+def make_sandbox_helpers(df: pd.DataFrame, rollups: Optional[Rollups],
+                         on_lookup: Optional[Callable[[bool], None]] = None) -> Dict[str, Callable]:
+    """
+    rollup() and lookup_rows() for generated code running on df.
+
+    Both answer over the frame as it was uploaded, from rollups when they
+    cover the request and by scanning df otherwise (e.g. on validation
+    samples), so results are the same either way. on_lookup(hit) is called
+    after every rollup() call.
+    """
+
+    def rollup(by, measure=None, agg='sum', freq=None):
+        """
+        df.groupby(by)[measure].agg(agg) for one or two columns, from precomputed aggregates.
+
+        agg is 'sum', 'mean', 'count', 'min', 'max' or 'size' (rows per group,
+        also used when measure is None); freq ('D', 'W' or 'M') buckets the
+        datetime column in by to the start of its day, week or month.
+        """
+        if agg not in AGGREGATIONS:
+            raise ValueError(f"Unsupported agg {agg!r}; use one of {', '.join(AGGREGATIONS)}")
+        if isinstance(measure, tuple):
+            measure = list(measure)
+        columns, keys = _resolve_keys(df, by, freq)
+        result = rollups.answer(keys, measure, agg, columns) if rollups is not None else None
+        if on_lookup is not None:
+            on_lookup(result is not None)
+        if result is not None:
+            return result.copy()
+        wanted = [] if measure is None or agg == 'size' else (measure if isinstance(measure, list) else [measure])
+        return _select(group_stats(df, keys, wanted), measure, agg, columns)
+
+    def lookup_rows(column, value=None, start=None, end=None):
+        """Rows where column equals value (or any value in a list), or lies in [start, end) for dates."""
+        index = rollups.indexes.get(column) if rollups is not None else None
+        if index is not None:
+            return df.iloc[index.positions(value, start, end)]
+        series = df[column]
+        if start is not None or end is not None:
+            mask = series.notna()
+            if start is not None:
+                mask &= series >= pd.Timestamp(start)
+            if end is not None:
+                mask &= series < pd.Timestamp(end)
+            return df[mask]
+        values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+        return df[series.isin(values)]
+
+    return {'rollup': rollup, 'lookup_rows': lookup_rows}
+
+class RollupStore:
+    """
+    Rollups of recently uploaded datasets, built on a background thread.
+
+    schedule() queues a build after upload; get() returns the rollups once
+    they are ready and None while building, so queries never wait for them.
+    """
+
+    def __init__(self, min_rows: int = 50_000, max_datasets: int = 8, max_cardinality: int = 100,
+                 max_cells: int = 100_000, index_columns: int = 4):
+        self.min_rows = min_rows
+        self.max_datasets = max_datasets
+        self.max_cardinality = max_cardinality
+        self.max_cells = max_cells
+        self.index_columns = index_columns
+        self.builds = 0
+        self.hits = 0
+        self.fallbacks = 0
+        self._ready: OrderedDict = OrderedDict()
+        self._building: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='dataspark-rollups')
+
+    def schedule(self, df: pd.DataFrame, profile: Optional[Dict[str, Any]] = None) -> Optional[Future]:
+        """Start building rollups for df unless it is small or already covered."""
+        if len(df) < self.min_rows:
+            return None
+        dataset_key = hash_dataframe(df)
+        with self._lock:
+            if dataset_key in self._ready:
+                return None
+            future = self._building.get(dataset_key)
+            if future is not None:
+                return future
+            future = self._executor.submit(self._build, dataset_key, df, profile)
+            self._building[dataset_key] = future
+        # Cubes of a frame nobody holds any more can't be asked for again
+        weakref.finalize(df, self.invalidate, dataset_key)
+        return future
+
+    def _build(self, dataset_key: str, df: pd.DataFrame, profile: Optional[Dict[str, Any]]) -> Optional[Rollups]:
+        try:
+            rollups = build_rollups(df, profile, self.max_cardinality, self.max_cells, self.index_columns)
+        finally:
+            with self._lock:
+                building = self._building.pop(dataset_key, None)
+        if building is None:
+            # Invalidated while building
+            return None
+        with self._lock:
+            self._ready[dataset_key] = rollups
+            self.builds += 1
+            while len(self._ready) > self.max_datasets:
+                self._ready.popitem(last=False)
+        return rollups
+
+    def get(self, dataset_key: str) -> Optional[Rollups]:
+        with self._lock:
+            rollups = self._ready.get(dataset_key)
+            if rollups is not None:
+                self._ready.move_to_end(dataset_key)
+            return rollups
+
+    def invalidate(self, dataset_key: str) -> None:
+        """Drop the rollups of a dataset that changed or went away (a running build is discarded)."""
+        with self._lock:
+            self._ready.pop(dataset_key, None)
+            self._building.pop(dataset_key, None)
+
+    def record_lookup(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.fallbacks += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'datasets': len(self._ready),
+                'building': len(self._building),
+                'bytes': sum(rollups.nbytes for rollups in self._ready.values()),
+                'builds': self.builds,
+                'hits': self.hits,
+                'fallbacks': self.fallbacks,
+            }
+
+_store = None
+_store_lock = threading.Lock()
+
+def rollups_ready(df: pd.DataFrame) -> bool:
+    """Whether df's rollups are built, so generated code can be pointed at the rollup helpers."""
+    store = get_rollup_store()
+    return store is not None and len(df) >= store.min_rows and store.get(hash_dataframe(df)) is not None
+
+def get_rollup_store() -> Optional[RollupStore]:
+    """Return the process-wide rollup store, or None when rollups are disabled."""
+    global _store
+    from config.settings import (
+        ROLLUPS_ENABLED, ROLLUP_MIN_ROWS, ROLLUP_MAX_DATASETS, ROLLUP_MAX_CARDINALITY,
+        ROLLUP_MAX_CELLS, ROLLUP_INDEX_COLUMNS
+    )
+    if not ROLLUPS_ENABLED:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = RollupStore(ROLLUP_MIN_ROWS, ROLLUP_MAX_DATASETS, ROLLUP_MAX_CARDINALITY,
+                                 ROLLUP_MAX_CELLS, ROLLUP_INDEX_COLUMNS)
+        return _store
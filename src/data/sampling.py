@@ -0,0 +1,74 @@
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from src.utils.helpers import hash_dataframe
+
+def stratified_sample(df: pd.DataFrame, rows: int, seed: int = 0, max_strata: Optional[int] = None) -> pd.DataFrame:
+    """
+    Sample rows so that every value of each low-cardinality column is present.
+
+    Filters and groupbys on a category (region == 'West') then behave on the
+    sample as they do on the full data. Columns with more than max_strata
+    distinct values (default rows // 10) are not stratified; the remainder of
+    the budget is filled uniformly at random. Row order is preserved.
+    """
+    if len(df) <= rows:
+        return df.copy()
+    if max_strata is None:
+        max_strata = max(1, rows // 10)
+
+    rng = np.random.default_rng(seed)
+    positions = np.arange(len(df))
+    chosen = set()
+    for col in df.columns:
+        series = df[col]
+        if not (isinstance(series.dtype, pd.CategoricalDtype) or pd.api.types.is_bool_dtype(series)
+                or pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+            continue
+        try:
+            # First occurrence of each value (including NaN)
+            first_rows = positions[~series.duplicated(keep='first').to_numpy()]
+        except TypeError:
+            # Unhashable cells (lists/dicts from nested JSON)
+            continue
+        if len(first_rows) > max_strata or len(chosen) + len(first_rows) > rows:
+            continue
+        chosen.update(first_rows.tolist())
+
+    remaining = rows - len(chosen)
+    if remaining > 0:
+        candidates = np.setdiff1d(positions, np.fromiter(chosen, dtype=np.int64, count=len(chosen)), assume_unique=True)
+        chosen.update(rng.choice(candidates, remaining, replace=False).tolist())
+    return df.iloc[np.sort(np.fromiter(chosen, dtype=np.int64, count=len(chosen)))].copy()
+
+_samples = OrderedDict()
+_samples_lock = threading.Lock()
+_SAMPLE_CACHE_SIZE = 4
+
+def get_validation_sample(df: pd.DataFrame) -> Optional[pd.DataFrame]:
+    """
+    Cached stratified sample used to try generated code before the full run.
+
+    Returns None when df is below SAMPLE_FIRST_MIN_ROWS (or sampling is off),
+    i.e. when a full run is already cheap.
+    """
+    from config.settings import SAMPLE_FIRST_MIN_ROWS, SAMPLE_FIRST_ROWS
+    if not SAMPLE_FIRST_MIN_ROWS or len(df) < SAMPLE_FIRST_MIN_ROWS:
+        return None
+
+    key = (hash_dataframe(df), SAMPLE_FIRST_ROWS)
+    with _samples_lock:
+        sample = _samples.get(key)
+        if sample is not None:
+            _samples.move_to_end(key)
+            return sample
+    sample = stratified_sample(df, SAMPLE_FIRST_ROWS)
+    with _samples_lock:
+        _samples[key] = sample
+        while len(_samples) > _SAMPLE_CACHE_SIZE:
+            _samples.popitem(last=False)
+    return sample
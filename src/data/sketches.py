@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+from typing import Optional
+
+def hash_values(series: pd.Series) -> np.ndarray:
+    """64-bit hashes of a column's values (nulls excluded)."""
+    values = series.dropna()
+    if not pd.api.types.is_numeric_dtype(values):
+        # Duplicates never change a sketch, and hashing strings dominates the cost
+        try:
+            values = pd.Series(values.unique())
+        except TypeError:
+            pass
+    try:
+        return pd.util.hash_pandas_object(values, index=False).to_numpy()
+    except TypeError:
+        # Unhashable cells (lists/dicts from nested JSON)
+        return pd.util.hash_pandas_object(values.astype(str), index=False).to_numpy()
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    """Bit length of uint64 values (0 for zero)."""
+    # The top 53 bits convert to float64 exactly; frexp's exponent is their bit length
+    _, exponent = np.frexp((values >> np.uint64(11)).astype(np.float64))
+    low_length = np.frexp((values & np.uint64(0x7FF)).astype(np.float64))[1]
+    return np.where(exponent > 0, exponent + 11, low_length)
+
+class HyperLogLog:
+    """HyperLogLog distinct-count sketch; mergeable, about 1.6% error at precision 12."""
+
+    def __init__(self, precision: int = 12):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes: np.ndarray) -> None:
+        if len(hashes) == 0:
+            return
+        hashes = hashes.astype(np.uint64, copy=False)
+        p = np.uint64(self.precision)
+        index = (hashes >> (np.uint64(64) - p)).astype(np.int64)
+        # Remaining bits, with a sentinel so the rank is bounded by 64 - precision + 1
+        rest = (hashes << p) | (np.uint64(1) << (p - np.uint64(1)))
+        rank = (65 - _bit_length(rest)).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def add_series(self, series: pd.Series) -> None:
+        self.add_hashes(hash_values(series))
+
+    def merge(self, other: 'HyperLogLog') -> None:
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        empty = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and empty:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * np.log(m / empty)
+        return int(round(estimate))
+
+class ReservoirSample:
+    """Uniform fixed-size row sample that can absorb appended rows (Algorithm R)."""
+
+    def __init__(self, size: int, seed: Optional[int] = None):
+        self.size = size
+        self.seen = 0
+        self.rows: Optional[pd.DataFrame] = None
+        self._rng = np.random.default_rng(seed)
+
+    def add(self, df: pd.DataFrame) -> None:
+        if len(df) == 0:
+            return
+        if self.rows is None:
+            if len(df) <= self.size:
+                self.rows = df.reset_index(drop=True).copy()
+            else:
+                positions = np.sort(self._rng.choice(len(df), self.size, replace=False))
+                self.rows = df.iloc[positions].reset_index(drop=True)
+            self.seen = len(df)
+            return
+
+        incoming = df.reset_index(drop=True)
+        free = self.size - len(self.rows)
+        if free > 0:
+            self.rows = pd.concat([self.rows, incoming.iloc[:free]], ignore_index=True)
+            self.seen += min(free, len(incoming))
+            incoming = incoming.iloc[free:].reset_index(drop=True)
+            if len(incoming) == 0:
+                return
+
+        # Row i (1-based overall) replaces a random slot with probability size / i
+        overall = self.seen + np.arange(1, len(incoming) + 1)
+        accepted = np.flatnonzero(self._rng.random(len(incoming)) < self.size / overall)
+        slots = self._rng.integers(0, self.size, len(accepted))
+        self.seen += len(incoming)
+        if len(accepted):
+            # Later acceptances overwrite earlier ones in the same slot, as in the sequential algorithm
+            winners = pd.Series(accepted).groupby(slots).last()
+            self.rows = pd.concat(
+                [self.rows.drop(index=winners.index), incoming.iloc[winners.to_numpy()]], ignore_index=True
+            )
+
+class RunningMoments:
+    """Exact, mergeable count/mean/variance/min/max per numeric column."""
+
+    def __init__(self):
+        self.count = None
+        self.mean = None
+        self.m2 = None
+        self.min = None
+        self.max = None
+
+    def add(self, numeric: pd.DataFrame) -> None:
+        if numeric.shape[1] == 0:
+            return
+        count = numeric.count().astype(np.float64)
+        mean = numeric.mean()
+        m2 = numeric.var(ddof=0) * count
+        minimum = numeric.min()
+        maximum = numeric.max()
+        if self.count is None:
+            self.count, self.mean, self.m2, self.min, self.max = count, mean, m2, minimum, maximum
+            return
+
+        # Chan et al. parallel combination
+        total = self.count.add(count, fill_value=0)
+        delta = mean.sub(self.mean, fill_value=0)
+        weight = (count / total).fillna(0)
+        self.mean = self.mean.add(delta * weight, fill_value=0)
+        self.m2 = self.m2.add(m2, fill_value=0).add(
+            (delta ** 2) * self.count.mul(count, fill_value=0) / total, fill_value=0
+        )
+        self.count = total
+        self.min = pd.concat([self.min, minimum], axis=1).min(axis=1)
+        self.max = pd.concat([self.max, maximum], axis=1).max(axis=1)
+
+    def std(self) -> pd.Series:
+        """Sample standard deviation, matching DataFrame.describe()."""
+        return np.sqrt(self.m2 / (self.count - 1).where(self.count > 1))
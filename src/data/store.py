@@ -0,0 +1,166 @@
+import hashlib
+import mmap
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Dict, Any, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.data.loader import load_data_with_stats
+
+def content_key(data: bytes) -> str:
+    """Content hash used as the dataset key."""
+    return hashlib.sha256(data).hexdigest()
+
+def write_frame(df: pd.DataFrame, path: str) -> None:
+    """Write df as uncompressed Feather (Arrow IPC) so it can be memory-mapped back."""
+    if not isinstance(df.index, pd.RangeIndex) or df.index.start != 0 or df.index.step != 1:
+        df = df.reset_index(drop=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        df.to_feather(tmp_path, compression='uncompressed')
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+def read_mapped_frame(path: str) -> pd.DataFrame:
+    """
+    Load a Feather file through a private copy-on-write memory map.
+
+    Numeric columns without nulls are wrapped directly over the mapped pages, so
+    every process and session reading the file shares the same page cache, and
+    in-place writes by generated code only copy the pages they touch. Other
+    columns (strings, nullable, dictionary-encoded) are converted by pyarrow.
+    """
+    import pyarrow as pa
+
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    buffer = pa.py_buffer(mapped)
+    table = pa.ipc.open_file(buffer).read_all()
+
+    columns = {}
+    for name, column in zip(table.column_names, table.columns):
+        arrow_type = column.type
+        if (column.num_chunks == 1 and column.null_count == 0
+                and (pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type))
+                and not pa.types.is_float16(arrow_type)):
+            chunk = column.chunk(0)
+            dtype = np.dtype(arrow_type.to_pandas_dtype())
+            data = chunk.buffers()[1]
+            offset = data.address - buffer.address + chunk.offset * dtype.itemsize
+            columns[name] = np.frombuffer(mapped, dtype=dtype, count=len(chunk), offset=offset)
+        else:
+            columns[name] = column.to_pandas()
+    return pd.DataFrame(columns, copy=False)
+
+class DatasetStore:
+    """
+    On-disk columnar store of parsed uploads, keyed by content hash.
+
+    Each distinct upload is parsed once and written as Feather; later uploads
+    of the same bytes, refreshed sessions and other replicas sharing the
+    directory reload it through a memory map instead of re-parsing.
+    """
+
+    def __init__(self, root_dir: str, max_datasets: int = 32):
+        self.root_dir = root_dir
+        self.max_datasets = max_datasets
+        os.makedirs(root_dir, exist_ok=True)
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.root_dir, f"{key}.feather")
+
+    def has(self, key: str) -> bool:
+        return os.path.exists(self.path_for(key))
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """Reload a stored dataset, or None if it isn't in the store."""
+        if not re.fullmatch(r'[0-9a-f]{64}', key or ''):
+            # Keys also arrive from URL query parameters
+            return None
+        path = self.path_for(key)
+        try:
+            df = read_mapped_frame(path)
+        except FileNotFoundError:
+            return None
+        # Touch so eviction is least-recently-used
+        os.utime(path)
+        return df
+
+    def put(self, key: str, df: pd.DataFrame) -> bool:
+        """Persist df; returns False if it can't be represented in Arrow (e.g. mixed-type objects)."""
+        try:
+            write_frame(df, self.path_for(key))
+        except (ImportError, ValueError, TypeError):
+            # pyarrow's ArrowInvalid/ArrowTypeError derive from ValueError/TypeError
+            return False
+        self._evict()
+        return True
+
+    def _evict(self) -> None:
+        entries = [
+            os.path.join(self.root_dir, name) for name in os.listdir(self.root_dir) if name.endswith('.feather')
+        ]
+        if len(entries) <= self.max_datasets:
+            return
+        entries.sort(key=lambda path: os.path.getmtime(path))
+        for path in entries[:len(entries) - self.max_datasets]:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def load_upload(self, data: bytes, file_type: str) -> Tuple[pd.DataFrame, str, Dict[str, Any]]:
+        """
+        Return (df, dataset_key, stats) for uploaded file bytes.
+
+        stats['source'] is 'store' when the upload was already converted and
+        'parsed' when it was parsed now.
+        """
+        start = time.perf_counter()
+        key = content_key(data)
+        df = self.get(key)
+        if df is not None:
+            seconds = time.perf_counter() - start
+            return df, key, {
+                'source': 'store',
+                'rows': len(df),
+                'columns': len(df.columns),
+                'mode': 'mmap',
+                'seconds': seconds,
+                'rows_per_sec': len(df) / seconds if seconds > 0 else float('inf'),
+                'peak_rss_delta_mb': None,
+            }
+
+        with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{file_type}') as tmp_file:
+            tmp_file.write(data)
+            tmp_path = tmp_file.name
+        try:
+            df, stats = load_data_with_stats(tmp_path, file_type)
+        finally:
+            os.unlink(tmp_path)
+
+        if self.put(key, df):
+            # Serve the mapped copy so the parsed frame can be freed and pages are shared
+            df = self.get(key)
+        stats['source'] = 'parsed'
+        stats['seconds'] = time.perf_counter() - start
+        return df, key, stats
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_dataset_store() -> DatasetStore:
+    """Return the process-wide dataset store configured in settings."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            from config.settings import DATASET_STORE_DIR, DATASET_STORE_MAX_DATASETS
+            _store = DatasetStore(DATASET_STORE_DIR, DATASET_STORE_MAX_DATASETS)
+        return _store
@@ -0,0 +1,234 @@
+import ast
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+# Modules the sandbox pre-imports, by the name generated code sees them under
+SANDBOX_MODULES = {
+    'pandas': 'pd',
+    'numpy': 'np',
+    'plotly.graph_objects': 'go',
+    'plotly.express': 'px',
+    'matplotlib.pyplot': 'plt',
+    'seaborn': 'sns',
+}
+
+# Names from modules whose objects (not the module itself) are pre-imported
+SANDBOX_OBJECTS = {
+    'datetime': {'datetime', 'timedelta'},
+}
+
+# Functions bound per dataset by the executor (see src/data/rollups.py)
+SANDBOX_HELPERS = frozenset({'rollup', 'lookup_rows'})
+
+SANDBOX_NAMES = frozenset(SANDBOX_MODULES.values()) | frozenset(
+    name for names in SANDBOX_OBJECTS.values() for name in names
+) | SANDBOX_HELPERS
+
+# Modules that are dropped without a binding (e.g. `import datetime` before using `datetime.now()`)
+IGNORED_IMPORTS = {'datetime', 'plotly', 'matplotlib', 'warnings'}
+
+# Attributes that iterate a frame column-wise rather than row-wise
+_NON_ROW_ATTRIBUTES = {'columns', 'dtypes', 'keys', 'items'}
+
+class CodeRejected(Exception):
+    """Generated code uses something the sandbox doesn't allow."""
+
+class AnalyzedCode:
+    """Compiled generated code plus what the static pass learned about it."""
+
+    def __init__(self, code_object, used_names: frozenset, warnings: List[Dict[str, Any]],
+                 removed_imports: List[str]):
+        self.code_object = code_object
+        self.used_names = used_names
+        self.warnings = warnings
+        self.removed_imports = removed_imports
+
+class _ImportRewriter(ast.NodeTransformer):
+    """Replace imports of sandbox modules with bindings to the pre-imported names."""
+
+    def __init__(self):
+        self.removed = []
+
+    def visit_Import(self, node: ast.Import):
+        replacements = []
+        for alias in node.names:
+            self.removed.append(f"import {alias.name}" + (f" as {alias.asname}" if alias.asname else ""))
+            sandbox_name = SANDBOX_MODULES.get(alias.name)
+            if sandbox_name is not None:
+                # `import matplotlib.pyplot` binds `matplotlib`, which the sandbox can't provide
+                bound = alias.asname or (alias.name if '.' not in alias.name else None)
+                if bound is not None and bound != sandbox_name:
+                    # import pandas as pandas_lib -> pandas_lib = pd
+                    replacements.append(_assign(bound, ast.Name(id=sandbox_name, ctx=ast.Load())))
+            elif alias.name.split('.')[0] not in IGNORED_IMPORTS:
+                raise CodeRejected(_not_available(alias.name))
+        return _located(replacements, node)
+
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        module = node.module or ''
+        if node.level:
+            raise CodeRejected("Relative imports are not allowed")
+        replacements = []
+        for alias in node.names:
+            self.removed.append(f"from {module} import {alias.name}" + (f" as {alias.asname}" if alias.asname else ""))
+            bound = alias.asname or alias.name
+            if alias.name == '*':
+                raise CodeRejected("Wildcard imports are not allowed")
+
+            full_name = f"{module}.{alias.name}"
+            if full_name in SANDBOX_MODULES:
+                # from plotly import express as px
+                value = ast.Name(id=SANDBOX_MODULES[full_name], ctx=ast.Load())
+            elif module in SANDBOX_MODULES:
+                # from pandas import DataFrame -> DataFrame = pd.DataFrame
+                value = ast.Attribute(value=ast.Name(id=SANDBOX_MODULES[module], ctx=ast.Load()),
+                                      attr=alias.name, ctx=ast.Load())
+            elif alias.name in SANDBOX_OBJECTS.get(module, ()):
+                value = ast.Name(id=alias.name, ctx=ast.Load())
+            elif module.split('.')[0] in IGNORED_IMPORTS:
+                continue
+            else:
+                raise CodeRejected(_not_available(module))
+
+            if not (isinstance(value, ast.Name) and value.id == bound):
+                replacements.append(_assign(bound, value))
+        return _located(replacements, node)
+
+def _assign(name: str, value: ast.expr) -> ast.Assign:
+    return ast.Assign(targets=[ast.Name(id=name, ctx=ast.Store())], value=value)
+
+def _located(nodes: List[ast.stmt], original: ast.stmt):
+    """Give replacement nodes the original's position; an empty body becomes `pass`."""
+    if not nodes:
+        nodes = [ast.Pass()]
+    for node in nodes:
+        ast.copy_location(node, original)
+        ast.fix_missing_locations(node)
+    return nodes
+
+def _not_available(module: str) -> str:
+    allowed = ', '.join(f"{name} ({alias})" for name, alias in SANDBOX_MODULES.items())
+    return (f"Module '{module}' is not available and import statements are not allowed. "
+            f"Use the pre-imported modules: {allowed}, datetime, timedelta")
+
+def _root_name(node: ast.AST) -> Optional[str]:
+    """Name at the root of an attribute/subscript chain (df['a'].str -> 'df')."""
+    while isinstance(node, (ast.Attribute, ast.Subscript, ast.Call)):
+        node = node.func if isinstance(node, ast.Call) else node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+def _is_row_loop(iterable: ast.expr, frames: set) -> bool:
+    """for i in range(len(df)) / for x in df['col'] / for idx in df.index."""
+    if (isinstance(iterable, ast.Call) and isinstance(iterable.func, ast.Name)
+            and iterable.func.id == 'range' and iterable.args):
+        bound = iterable.args[-1] if len(iterable.args) > 1 else iterable.args[0]
+        return (isinstance(bound, ast.Call) and isinstance(bound.func, ast.Name) and bound.func.id == 'len'
+                and len(bound.args) == 1 and _root_name(bound.args[0]) in frames)
+    if isinstance(iterable, ast.Call):
+        # Method calls are handled by the iterrows/itertuples check
+        return False
+    if _root_name(iterable) not in frames:
+        return False
+    if isinstance(iterable, ast.Name):
+        # Iterating a DataFrame yields column names
+        return False
+    return not (isinstance(iterable, ast.Attribute) and iterable.attr in _NON_ROW_ATTRIBUTES)
+
+def find_expensive_patterns(tree: ast.AST, frames: set = frozenset({'df'})) -> List[Dict[str, Any]]:
+    """Flag row-at-a-time pandas idioms that usually have a vectorized equivalent."""
+    warnings = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            method = node.func.attr
+            if method in ('iterrows', 'itertuples'):
+                warnings.append({
+                    'pattern': method,
+                    'line': node.lineno,
+                    'message': f"{method}() processes rows one at a time in Python"
+                })
+            elif method == 'apply':
+                row_wise = any(
+                    keyword.arg == 'axis' and isinstance(keyword.value, ast.Constant)
+                    and keyword.value.value in (1, 'columns')
+                    for keyword in node.keywords
+                )
+                python_function = bool(node.args) and isinstance(node.args[0], (ast.Lambda, ast.Name))
+                if row_wise and python_function:
+                    warnings.append({
+                        'pattern': 'apply_axis1',
+                        'line': node.lineno,
+                        'message': "apply(..., axis=1) calls a Python function for every row"
+                    })
+        elif isinstance(node, (ast.For, ast.comprehension)) and _is_row_loop(node.iter, frames):
+            warnings.append({
+                'pattern': 'row_loop',
+                'line': getattr(node, 'lineno', node.iter.lineno),
+                'message': "Loop over DataFrame rows; a column operation is usually much faster"
+            })
+    return sorted(warnings, key=lambda warning: warning['line'])
+
+def analyze_code(source: str) -> AnalyzedCode:
+    """
+    Parse, rewrite imports and compile generated code.
+
+    Raises SyntaxError for invalid code and CodeRejected for imports the
+    sandbox can't satisfy.
+    """
+    tree = ast.parse(source, filename='<generated>')
+    rewriter = _ImportRewriter()
+    tree = rewriter.visit(tree)
+    ast.fix_missing_locations(tree)
+
+    used_names = frozenset(
+        node.id for node in ast.walk(tree)
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id in SANDBOX_NAMES
+    )
+    code_object = compile(tree, '<generated>', 'exec')
+    return AnalyzedCode(code_object, used_names, find_expensive_patterns(tree), rewriter.removed)
+
+class CompiledCodeCache:
+    """LRU of AnalyzedCode keyed by the source's sha256; hits skip parsing and compiling."""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, source: str) -> AnalyzedCode:
+        key = hashlib.sha256(source.encode('utf-8')).hexdigest()
+        with self._lock:
+            analyzed = self._entries.get(key)
+            if analyzed is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return analyzed
+            self.misses += 1
+
+        # Rejections and syntax errors aren't cached; they are retried with new code anyway
+        analyzed = analyze_code(source)
+        with self._lock:
+            self._entries[key] = analyzed
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return analyzed
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
+
+_compiled_cache = None
+_compiled_cache_lock = threading.Lock()
+
+def get_compiled_code(source: str) -> AnalyzedCode:
+    """Analyze and compile source through the process-wide cache."""
+    global _compiled_cache
+    if _compiled_cache is None:
+        with _compiled_cache_lock:
+            if _compiled_cache is None:
+                from config.settings import COMPILED_CODE_CACHE_SIZE
+                _compiled_cache = CompiledCodeCache(COMPILED_CODE_CACHE_SIZE)
+    return _compiled_cache.get(source)
@@ -1,21 +1,186 @@
-from typing import Tuple, Dict, Any
-from src.execution.executor import execute_code
-from src.ai.code_generator import correct_code
+from typing import Tuple, Dict, Any, Iterator, Generator, Callable, Optional
+from src.execution.executor import execute_code, cached_result
+from src.ai.code_generator import correct_code, correct_code_stream, correct_sql, correct_sql_stream
+from src.data.sampling import get_validation_sample
+from src.utils.tracing import span
+import threading
+import time
 
-def execute_with_retry(code: str, df, user_query: str, data_profile: str) -> Tuple[Dict[str, Any], str, bool]:
+def execute_with_retry(code: str, df, user_query: str, data_profile: str,
+                       engine: str = 'pandas') -> Tuple[Dict[str, Any], str, bool]:
     """
     Execute code with automatic retry on error.
-    
+
+    Args:
+        engine: 'pandas' for generated Python, 'duckdb' for generated SQL.
+
     Returns:
         Tuple of (result_dict, error_message, was_retried)
+        result_dict['code'] holds the code that was actually executed last;
+        result_dict['timings'] the seconds spent in 'exec' and 'retry'
+        (correction round-trips plus re-execution), and 'sample' when the
+        code was validated on a sample first;
+        result_dict['sampling'] describes that validation (None if skipped);
+        result_dict['attempts'] is the number of corrections made
+    """
+    for event, payload in iter_execute_with_retry(code, df, user_query, data_profile, engine=engine):
+        if event == 'done':
+            return payload
+
+def iter_execute_with_retry(code: str, df, user_query: str, data_profile: str,
+                            stream: bool = False, engine: str = 'pandas', max_attempts: Optional[int] = None,
+                            time_budget: Optional[float] = None, first_error: Optional[str] = None,
+                            validated: bool = False, profile: bool = False,
+                            cancel: Optional[threading.Event] = None) -> Iterator[Tuple[str, Any]]:
     """
-    result_dict, error_message = execute_code(code, df)
-    
+    Generator form of execute_with_retry().
+
+    Yields ('stage', 'validating' | 'running' | 'correcting') as it moves on,
+    ('code', partial_code) while a correction is generated (token by token
+    when stream=True), then ('done', (result_dict, error_message, was_retried)).
+
+    Failing code is corrected up to max_attempts times (MAX_RETRY_ATTEMPTS),
+    and no new correction starts once time_budget seconds
+    (RETRY_TIME_BUDGET_SECONDS, 0 = unlimited) have passed since the first run.
+    first_error is the error of a first run the caller already made (on the
+    validation sample when df has one), so correction starts right away;
+    validated=True says the caller's run of code on the validation sample
+    succeeded, so it goes straight to the full run.
+
+    Large frames are handled in two phases: the code (and its corrections, if
+    needed) first runs on a small stratified sample, and only code that works
+    there is run once on the full frame.
+
+    With profile=True (pandas engine only) full-frame runs are line-profiled
+    and result_dict['line_profile'] holds the last run's cost table.
+
+    Setting cancel interrupts the run in progress (see execute_code()) and
+    stops further corrections.
+    """
+    from config.settings import MAX_RETRY_ATTEMPTS, RETRY_TIME_BUDGET_SECONDS
+    max_attempts = MAX_RETRY_ATTEMPTS if max_attempts is None else max_attempts
+    time_budget = RETRY_TIME_BUDGET_SECONDS if time_budget is None else time_budget
+    engine_execute = get_engine_executor(engine)
+
+    def execute(code, df, **options):
+        return engine_execute(code, df, cancel=cancel, **options)
+
+    # Sample runs are never profiled; the full run is the one worth speeding up
+    run_full = (lambda code, df: execute(code, df, profile=True)) if profile and engine == 'pandas' else execute
+    timings = {'exec': 0.0, 'retry': 0.0}
+    sampling = None
+    attempts = 0
+    started = time.perf_counter()
+
+    def can_retry() -> bool:
+        if cancel is not None and cancel.is_set():
+            return False
+        return attempts < max_attempts and (not time_budget or time.perf_counter() - started < time_budget)
+
+    sample = get_validation_sample(df)
+    if sample is not None:
+        # A cached result means this exact code already ran successfully on this data
+        start = time.perf_counter()
+        cached = cached_result(code, df) if first_error is None and not profile else None
+        if cached is not None:
+            timings['exec'] = time.perf_counter() - start
+            cached['code'] = code
+            cached['timings'] = timings
+            cached['sampling'] = None
+            cached['attempts'] = 0
+            yield 'done', (cached, None, False)
+            return
+
+        sampling = {'sample_rows': len(sample), 'full_rows': len(df), 'attempts': 0, 'errors_caught': 0}
+        timings['sample'] = 0.0
+
+        if validated:
+            error_message = None
+            sampling['attempts'] += 1
+        elif first_error is None:
+            yield 'stage', 'validating'
+            result_dict, error_message = _run_on_sample(execute, code, sample, timings, sampling)
+        else:
+            result_dict, error_message = {'result': None, 'fig': None, 'output': ''}, first_error
+            sampling['attempts'] += 1
+            sampling['errors_caught'] += 1
+        while error_message and can_retry():
+            # Correct against the sample; the full frame hasn't been touched yet
+            code = yield from _correct(code, error_message, user_query, data_profile, stream, timings, engine)
+            attempts += 1
+            yield 'stage', 'validating'
+            result_dict, error_message = _run_on_sample(execute, code, sample, timings, sampling)
+        sampling['validated'] = not error_message
+        first_error = None
+
+    if first_error is None:
+        # Full run; also the last chance for code that only failed on the sample
+        yield 'stage', 'running'
+        start = time.perf_counter()
+        result_dict, error_message = run_full(code, df)
+        timings['exec'] = time.perf_counter() - start
+    else:
+        result_dict, error_message = {'result': None, 'fig': None, 'output': ''}, first_error
+
+    while error_message and can_retry():
+        # Retry with error feedback
+        code = yield from _correct(code, error_message, user_query, data_profile, stream, timings, engine)
+        attempts += 1
+        yield 'stage', 'running'
+        start = time.perf_counter()
+        result_dict, error_message = run_full(code, df)
+        timings['retry'] += time.perf_counter() - start
+
+    if sampling is not None:
+        # Each failure caught on the sample stands in for a full run we didn't make
+        # (except a last failure, which still went on to the full run)
+        avoided_runs = sampling['errors_caught'] - (0 if sampling['validated'] else 1)
+        sampling['time_saved_s'] = avoided_runs * timings['exec'] - timings['sample']
+
+    result_dict['code'] = code
+    result_dict['timings'] = timings
+    result_dict['sampling'] = sampling
+    result_dict['attempts'] = attempts
+    yield 'done', (result_dict, error_message, attempts > 0)
+
+def get_engine_executor(engine: str) -> Callable[..., Tuple[Dict[str, Any], str]]:
+    """execute_code or execute_sql, both called as execute(code, df, use_cache=True, cancel=None)."""
+    if engine == 'duckdb':
+        from src.execution.sql_engine import execute_sql
+        return execute_sql
+    if engine != 'pandas':
+        raise ValueError(f"Unsupported query engine: {engine}")
+    return execute_code
+
+def _run_on_sample(execute: Callable, code: str, sample, timings: dict, sampling: dict) -> Tuple[Dict[str, Any], str]:
+    """Run code on a copy of the sample and check that it produced something to show."""
+    start = time.perf_counter()
+    # Generated code may modify df; the cached sample must stay pristine
+    result_dict, error_message = execute(code, sample.copy(), use_cache=False)
+    if not error_message and result_dict.get('result') is None and result_dict.get('fig') is None:
+        error_message = "ValueError: The code ran but did not assign a value to `result` or `fig`."
+    timings['sample'] += time.perf_counter() - start
+    sampling['attempts'] += 1
     if error_message:
-        # Retry once with error feedback
-        corrected_code = correct_code(user_query, data_profile, error_message, code)
-        result_dict, error_message = execute_code(corrected_code, df)
-        return result_dict, error_message, True
-    
-    return result_dict, error_message, False
+        sampling['errors_caught'] += 1
+    return result_dict, error_message
 
+def _correct(code: str, error_message: str, user_query: str, data_profile: str,
+             stream: bool, timings: dict, engine: str = 'pandas') -> Generator[Tuple[str, Any], None, str]:
+    """Ask the model to fix code, yielding ('stage', 'correcting') and ('code', partial) events; returns the corrected code."""
+    yield 'stage', 'correcting'
+    start = time.perf_counter()
+    # The exception line of the error being corrected, e.g. "KeyError: 'Sales'"
+    failed_with = error_message.strip().splitlines()[-1][:200] if error_message.strip() else None
+    with span('retry', engine=engine, streamed=stream, failed_with=failed_with):
+        if stream:
+            corrector_stream = correct_sql_stream if engine == 'duckdb' else correct_code_stream
+            corrected_code = ''
+            for corrected_code in corrector_stream(user_query, data_profile, error_message, code):
+                yield 'code', corrected_code
+        else:
+            corrector = correct_sql if engine == 'duckdb' else correct_code
+            corrected_code = corrector(user_query, data_profile, error_message, code)
+            yield 'code', corrected_code
+    timings['retry'] += time.perf_counter() - start
+    return corrected_code
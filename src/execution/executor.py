@@ -1,23 +1,152 @@
+import os
 import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, Tuple, Optional
+import threading
 import traceback
-import sys
 from io import StringIO
 from datetime import datetime, timedelta
+from src.utils.lazy_import import LazyModule, preload
+from src.execution.code_analysis import get_compiled_code, CodeRejected, SANDBOX_HELPERS
+from src.execution.result_cache import get_result_cache
+from src.utils.helpers import hash_dataframe
+from src.data.registry import shared_view
+from src.utils.tracing import span
 
-def execute_code(code: str, df: pd.DataFrame) -> Tuple[Dict[str, Any], str]:
+# Headless rendering; must be set before pyplot is first imported
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+# Plotting libraries are only imported once generated code touches them
+go = LazyModule('plotly.graph_objects')
+px = LazyModule('plotly.express')
+plt = LazyModule('matplotlib.pyplot')
+sns = LazyModule('seaborn')
+SANDBOX_LAZY_MODULES = [go, px, plt, sns]
+
+# Everything generated code may reference besides df
+SANDBOX_NAMESPACE = {
+    'pd': pd,
+    'np': np,
+    'go': go,
+    'px': px,
+    'plt': plt,
+    'sns': sns,
+    'datetime': datetime,
+    'timedelta': timedelta,
+}
+
+# Error reported for runs stopped by their cancel event
+CANCELLED_ERROR = "CancelledError: execution was cancelled"
+
+_warmup_thread = None
+_warmup_lock = threading.Lock()
+
+def warm_sandbox() -> threading.Thread:
+    """Import the sandbox plotting libraries in a background thread (once per process)."""
+    global _warmup_thread
+    with _warmup_lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(
+                target=preload, args=(SANDBOX_LAZY_MODULES,), name='dataspark-warmup', daemon=True
+            )
+            _warmup_thread.start()
+        return _warmup_thread
+
+def execute_code(code: str, df: pd.DataFrame, backend: Optional[str] = None,
+                 timeout: Optional[float] = None, use_cache: bool = True,
+                 profile: bool = False, cancel: Optional[threading.Event] = None) -> Tuple[Dict[str, Any], str]:
     """
     Execute generated Python code in a sandboxed environment.
     
+    Args:
+        backend: 'inline' runs in the calling thread, 'pool' in a pre-warmed
+            worker process; defaults to EXECUTION_BACKEND from settings.
+        timeout: Wall-clock limit in seconds (pool backend only).
+        use_cache: Serve and store successful results in the result cache
+            (off for sample and verification runs, which are throwaway).
+        profile: Attribute time and memory to each line of the code
+            (see LineProfiler); profiled runs bypass the result cache.
+        cancel: Event that cancels the run when set; a pool worker running
+            the code is killed, inline code is only stopped before it starts.
+    
     Returns:
         Tuple of (result_dict, error_message)
-        result_dict contains: 'result', 'fig', 'output'
+        result_dict contains: 'result', 'fig', 'output', and 'analysis'
+        (used_names, warnings about row-wise patterns, removed_imports);
+        'result_cache_hit' is True when the result came from the cache;
+        'line_profile' holds the per-line cost table of profiled runs
+    """
+    if backend is None:
+        from config.settings import EXECUTION_BACKEND
+        backend = EXECUTION_BACKEND
+    if backend not in ('pool', 'inline'):
+        raise ValueError(f"Unsupported execution backend: {backend}")
+    
+    with span('exec', engine='pandas', backend=backend, rows=len(df), cached=use_cache,
+              profiled=profile) as exec_span:
+        cache = get_result_cache() if use_cache and not profile else None
+        if cache is not None:
+            dataset_key = hash_dataframe(df)
+            cached = cache.get(dataset_key, code)
+            if cached is not None:
+                exec_span.set(result_cache_hit=True)
+                return cached, None
+        
+        if cancel is not None and cancel.is_set():
+            result_dict, error_message = {'result': None, 'fig': None, 'output': ''}, CANCELLED_ERROR
+        elif backend == 'pool':
+            from src.execution.pool import get_execution_pool
+            result_dict, error_message = get_execution_pool().run(code, df, timeout=timeout, profile=profile,
+                                                                  cancel=cancel)
+        else:
+            # Sessions share one frame; writes by generated code land in a copy-on-write view
+            result_dict, error_message = _execute_inline(code, shared_view(df), rollups_for(code, df), profile)
+        exec_span.set(error=error_message, rollup_hits=len(result_dict.get('rollups') or []))
+    
+    lookups = result_dict.get('rollups')
+    if lookups:
+        from src.data.rollups import get_rollup_store
+        store = get_rollup_store()
+        if store is not None:
+            for hit in lookups:
+                store.record_lookup(hit)
+    
+    if cache is not None and not error_message:
+        cache.set(dataset_key, code, result_dict)
+    return result_dict, error_message
+
+def cached_result(code: str, df: pd.DataFrame) -> Optional[Dict[str, Any]]:
+    """Look up a cached result for code on df without executing anything."""
+    cache = get_result_cache()
+    if cache is None:
+        return None
+    return cache.get(hash_dataframe(df), code)
+
+def rollups_for(code: str, df: pd.DataFrame):
+    """Ready rollups of df if code may call the rollup helpers, else None."""
+    if not any(name in code for name in SANDBOX_HELPERS):
+        return None
+    from src.data.rollups import get_rollup_store
+    store = get_rollup_store()
+    return store.get(hash_dataframe(df)) if store is not None else None
+
+def _execute_inline(code: str, df: pd.DataFrame, rollups=None,
+                    profile: bool = False) -> Tuple[Dict[str, Any], str]:
+    """
+    Execute code in the current thread.
+    
+    rollups: Rollups of the dataset df is a view of; rollup() and
+        lookup_rows() scan df when None.
+    profile: Record result_dict['line_profile'], even when the code fails.
     """
+    # Capture output per call instead of swapping the process-wide sys.stdout,
+    # so concurrent sessions don't clobber each other's output
+    captured_output = StringIO()
+    
+    def captured_print(*args, **kwargs):
+        kwargs.setdefault('file', captured_output)
+        print(*args, **kwargs)
+    
     # Create a safe execution namespace
     # Import builtins but restrict dangerous functions
     import builtins
@@ -30,7 +159,7 @@ def execute_code(code: str, df: pd.DataFrame) -> Tuple[Dict[str, Any], str]:
         'dict': dict,
         'tuple': tuple,
         'set': set,
-        'print': print,
+        'print': captured_print,
         'range': range,
         'enumerate': enumerate,
         'zip': zip,
@@ -52,40 +181,40 @@ def execute_code(code: str, df: pd.DataFrame) -> Tuple[Dict[str, Any], str]:
     def restricted_import(name, globals=None, locals=None, fromlist=(), level=0):
         raise ImportError(f"Import statements are not allowed. Use pre-imported modules: pd, np, px, go, plt, sns")
     
-    namespace = {
-        'pd': pd,
-        'df': df,
-        'go': go,
-        'px': px,
-        'np': np,
-        'plt': plt,
-        'sns': sns,
-        'datetime': datetime,
-        'timedelta': timedelta,
-        '__builtins__': safe_builtins,
-        '__import__': restricted_import,
-    }
-    
-    # Capture stdout
-    old_stdout = sys.stdout
-    sys.stdout = captured_output = StringIO()
-    
-    result_dict = {'result': None, 'fig': None, 'output': ''}
+    result_dict = {'result': None, 'fig': None, 'output': '', 'analysis': None}
     error_message = None
+    profiler = None
     
     try:
-        # Remove any import statements from code before execution
-        lines = code.split('\n')
-        filtered_lines = []
-        for line in lines:
-            stripped = line.strip()
-            # Skip import statements
-            if stripped.startswith('import ') or stripped.startswith('from '):
-                continue
-            filtered_lines.append(line)
+        # Parse once per distinct source: imports are rewritten to the
+        # pre-imported names and the code object is reused on later runs
+        analyzed = get_compiled_code(code)
+        result_dict['analysis'] = {
+            'used_names': sorted(analyzed.used_names),
+            'warnings': analyzed.warnings,
+            'removed_imports': analyzed.removed_imports,
+        }
         
-        cleaned_code = '\n'.join(filtered_lines)
-        exec(cleaned_code, namespace)
+        # Only bind the sandbox names the code actually references
+        namespace = {name: SANDBOX_NAMESPACE[name] for name in analyzed.used_names if name in SANDBOX_NAMESPACE}
+        if analyzed.used_names & SANDBOX_HELPERS:
+            from src.data.rollups import make_sandbox_helpers
+            # Which rollup() calls were answered from the cubes, for the store's hit rate
+            result_dict['rollups'] = []
+            namespace.update(make_sandbox_helpers(df, rollups, result_dict['rollups'].append))
+        namespace.update({
+            'df': df,
+            '__builtins__': safe_builtins,
+            '__import__': restricted_import,
+        })
+        if profile:
+            from src.execution.line_profiler import LineProfiler
+            from config.settings import PROFILE_MEMORY
+            profiler = LineProfiler(memory=PROFILE_MEMORY)
+            with profiler:
+                exec(analyzed.code_object, namespace)
+        else:
+            exec(analyzed.code_object, namespace)
         
         # Capture result
         if 'result' in namespace:
@@ -96,11 +225,12 @@ def execute_code(code: str, df: pd.DataFrame) -> Tuple[Dict[str, Any], str]:
         # Capture output
         result_dict['output'] = captured_output.getvalue()
         
+    except CodeRejected as e:
+        error_message = f"ImportError: {str(e)}"
     except Exception as e:
         error_message = f"{type(e).__name__}: {str(e)}\n{traceback.format_exc()}"
     
-    finally:
-        sys.stdout = old_stdout
-    
+    if profiler is not None:
+        result_dict['line_profile'] = profiler.report(code)
     return result_dict, error_message
 
@@ -0,0 +1,152 @@
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+# Filename the sandbox compiles generated code under (see code_analysis)
+GENERATED_FILENAME = '<generated>'
+
+class LineProfiler:
+    """
+    Attribute wall time and memory to lines of generated code.
+
+        profiler = LineProfiler()
+        with profiler:
+            exec(code_object, namespace)
+        report = profiler.report(code)
+
+    A trace function follows only frames of the generated code, so a line is
+    charged for everything it calls into (pandas, numpy, ...) but the time of
+    generated functions and lambdas it calls goes to their own lines. With
+    memory=True tracemalloc (one frame deep, which keeps it cheap) is read at
+    every line boundary: each line gets the net memory it left allocated and
+    the highest transient allocation above its starting point. tracemalloc
+    is process-wide, so concurrent inline runs blur each other's memory
+    figures; pool workers run one job at a time.
+    """
+
+    def __init__(self, filename: str = GENERATED_FILENAME, memory: bool = True):
+        self.filename = filename
+        self.memory = memory
+        # lineno -> [hits, seconds, net bytes, peak bytes]
+        self._lines: Dict[int, List[float]] = {}
+        # [lineno or None, started, traced bytes at start] per active generated frame
+        self._stack: List[List[Any]] = []
+        self._previous_trace = None
+        self._started_tracemalloc = False
+        self._peak = 0
+        self._seconds = 0.0
+
+    def __enter__(self) -> 'LineProfiler':
+        if self.memory:
+            self._started_tracemalloc = not tracemalloc.is_tracing()
+            if self._started_tracemalloc:
+                tracemalloc.start(1)
+            self._baseline = tracemalloc.get_traced_memory()[0]
+        self._previous_trace = sys.gettrace()
+        self._start = time.perf_counter()
+        sys.settrace(self._global_trace)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        sys.settrace(self._previous_trace)
+        self._seconds = time.perf_counter() - self._start
+        while self._stack:
+            self._charge(self._stack.pop())
+        if self.memory and self._started_tracemalloc:
+            tracemalloc.stop()
+
+    def _memory(self) -> int:
+        return tracemalloc.get_traced_memory()[0] if self.memory else 0
+
+    def _charge(self, entry: List[Any]) -> None:
+        """Close the running line of a frame: add its time and memory."""
+        lineno, started, memory_start = entry
+        now = time.perf_counter()
+        if lineno is None:
+            return
+        stats = self._lines.setdefault(lineno, [0, 0.0, 0, 0])
+        stats[1] += now - started
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            stats[2] += current - memory_start
+            stats[3] = max(stats[3], peak - memory_start)
+            self._peak = max(self._peak, peak - self._baseline)
+
+    def _begin(self, entry: List[Any], lineno: Optional[int]) -> None:
+        entry[0], entry[2] = lineno, self._memory()
+        if self.memory:
+            tracemalloc.reset_peak()
+        entry[1] = time.perf_counter()
+
+    def _global_trace(self, frame, event, arg):
+        if frame.f_code.co_filename != self.filename:
+            # Library frames are charged to the generated line that called them
+            return None
+        if self._stack:
+            # The caller's line pauses while a generated function or lambda runs
+            self._charge(self._stack[-1])
+        self._stack.append([None, time.perf_counter(), 0])
+        return self._local_trace
+
+    def _local_trace(self, frame, event, arg):
+        if not self._stack:
+            return None
+        top = self._stack[-1]
+        if event == 'line':
+            self._charge(top)
+            self._lines.setdefault(frame.f_lineno, [0, 0.0, 0, 0])[0] += 1
+            self._begin(top, frame.f_lineno)
+        elif event == 'return':
+            self._charge(self._stack.pop())
+            if self._stack:
+                # Resume the caller's line
+                self._begin(self._stack[-1], self._stack[-1][0])
+        return self._local_trace
+
+    def report(self, code: str) -> Dict[str, Any]:
+        """
+        Per-line cost table of the profiled run.
+
+        Returns {'seconds', 'peak_mb', 'lines'} where lines (in source order)
+        have line, source, hits, seconds, share (of the profiled time),
+        net_mb (memory the line left allocated) and peak_mb (its largest
+        transient allocation); memory figures are None without memory=True.
+        """
+        sources = code.splitlines()
+        total = sum(stats[1] for stats in self._lines.values()) or self._seconds or 1.0
+        lines = []
+        for lineno in sorted(self._lines):
+            hits, seconds, net, peak = self._lines[lineno]
+            lines.append({
+                'line': lineno,
+                'source': sources[lineno - 1].strip() if 0 < lineno <= len(sources) else '',
+                'hits': int(hits),
+                'seconds': seconds,
+                'share': seconds / total,
+                'net_mb': net / 1024**2 if self.memory else None,
+                'peak_mb': peak / 1024**2 if self.memory else None,
+            })
+        return {
+            'seconds': self._seconds,
+            'peak_mb': self._peak / 1024**2 if self.memory else None,
+            'lines': lines,
+        }
+
+def hotspots(line_profile: Optional[Dict[str, Any]], limit: int = 3, min_share: float = 0.05) -> List[Dict[str, Any]]:
+    """The most expensive lines (by time, then peak memory), at least min_share of the time each."""
+    if not line_profile:
+        return []
+    ranked = sorted(line_profile['lines'], key=lambda line: (-line['seconds'], -(line['peak_mb'] or 0)))
+    return [line for line in ranked if line['share'] >= min_share][:limit]
+
+def format_hotspots(line_profile: Optional[Dict[str, Any]], limit: int = 3) -> str:
+    """Hot lines as prompt text, e.g. "Line 4 (78% of 2.31s, 120 hits, peak 45.0MB): ..."."""
+    lines = []
+    for line in hotspots(line_profile, limit):
+        memory = f", peak {line['peak_mb']:.1f}MB" if (line['peak_mb'] or 0) >= 1 else ""
+        lines.append(
+            f"Line {line['line']} ({line['share']:.0%} of {line_profile['seconds']:.2f}s, "
+            f"{line['hits']:,} hits{memory}): {line['source']}"
+        )
+    return '\n'.join(lines)
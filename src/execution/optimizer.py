@@ -0,0 +1,652 @@
+import ast
+import copy
+import math
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.execution.executor import execute_code
+
+# Attributes of frames/series that are not column accessors
+_NON_COLUMN_ATTRIBUTES = {
+    'index', 'columns', 'values', 'T', 'dt', 'str', 'cat', 'shape', 'dtypes', 'loc', 'iloc',
+    'at', 'iat', 'size', 'empty', 'name', 'array', 'ndim',
+}
+
+_ARITHMETIC_OPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+# Per-element Python raises ZeroDivisionError where column arithmetic gives inf/NaN
+_DIVISION_OPS = (ast.Div, ast.FloorDiv, ast.Mod)
+_COMPARE_OPS = (ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Eq, ast.NotEq)
+
+# Builtins that behave the same on a Series as on a scalar
+_ELEMENTWISE_BUILTINS = {'abs', 'round'}
+
+class _Unsupported(Exception):
+    """The expression has no safe vectorized form."""
+
+class _Bindings:
+    """How loop/lambda variables map onto columns of the data being iterated."""
+
+    def __init__(self, base: ast.expr, rows: Dict[str, ast.expr] = None,
+                 values: Dict[str, ast.expr] = None, forbidden: set = None):
+        self.base = base              # frame or series whose index the result shares
+        self.rows = rows or {}        # row variable -> frame expression (row['c'] -> frame['c'])
+        self.values = values or {}    # element variable -> series expression
+        self.forbidden = set(forbidden or ())
+
+def _name(node: ast.AST) -> Optional[str]:
+    return node.id if isinstance(node, ast.Name) else None
+
+def _same(a: ast.AST, b: ast.AST) -> bool:
+    return ast.dump(a) == ast.dump(b)
+
+def _column(frame: ast.expr, column: str) -> ast.expr:
+    return ast.Subscript(value=copy.deepcopy(frame), slice=ast.Constant(column), ctx=ast.Load())
+
+def _call(func: ast.expr, args: List[ast.expr], keywords: Dict[str, ast.expr] = None) -> ast.Call:
+    return ast.Call(func=func, args=args,
+                    keywords=[ast.keyword(arg=key, value=value) for key, value in (keywords or {}).items()])
+
+def _attr(value: ast.expr, attr: str) -> ast.Attribute:
+    return ast.Attribute(value=value, attr=attr, ctx=ast.Load())
+
+def _is_plain_reference(node: ast.expr) -> bool:
+    """A name, or attribute/subscript chain on one, without calls (cheap to evaluate twice)."""
+    while isinstance(node, (ast.Attribute, ast.Subscript)):
+        if isinstance(node, ast.Subscript) and any(isinstance(child, ast.Call) for child in ast.walk(node.slice)):
+            return False
+        node = node.value
+    return isinstance(node, ast.Name)
+
+def _is_series_reference(node: ast.expr) -> bool:
+    """df['col'] or df.col on a plain reference."""
+    if isinstance(node, ast.Subscript):
+        return (isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, str)
+                and _is_plain_reference(node.value))
+    if isinstance(node, ast.Attribute):
+        return node.attr not in _NON_COLUMN_ATTRIBUTES and _is_plain_reference(node.value)
+    return False
+
+def _contains_where(node: ast.AST) -> bool:
+    return any(
+        isinstance(child, ast.Call) and isinstance(child.func, ast.Attribute)
+        and child.func.attr == 'where' and _name(child.func.value) == 'np'
+        for child in ast.walk(node)
+    )
+
+def _as_series(node: ast.expr, base: ast.expr, keep_name: bool = False) -> ast.expr:
+    """np.where returns an ndarray; re-attach the index so the result behaves like the original Series."""
+    if not _contains_where(node):
+        return node
+    keywords = {'index': _attr(copy.deepcopy(base), 'index')}
+    if keep_name:
+        keywords['name'] = _attr(copy.deepcopy(base), 'name')
+    return _call(_attr(ast.Name(id='pd', ctx=ast.Load()), 'Series'), [node], keywords)
+
+def _vectorize(node: ast.expr, bindings: _Bindings) -> Tuple[ast.expr, bool]:
+    """
+    Translate a per-row/per-element expression into a whole-column expression.
+
+    Returns (expression, depends) where depends says whether any loop variable
+    was used; raises _Unsupported for anything without an exact equivalent.
+    """
+    if isinstance(node, ast.Constant):
+        return copy.deepcopy(node), False
+
+    if isinstance(node, ast.Name):
+        if node.id in bindings.values:
+            return copy.deepcopy(bindings.values[node.id]), True
+        if node.id in bindings.rows or node.id in bindings.forbidden:
+            raise _Unsupported(f"'{node.id}' is used as a whole")
+        # Free variable from the enclosing code (a threshold, a constant)
+        return copy.deepcopy(node), False
+
+    if isinstance(node, ast.Subscript):
+        frame = bindings.rows.get(_name(node.value))
+        if frame is not None and isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, str):
+            return _column(frame, node.slice.value), True
+        raise _Unsupported("subscript")
+
+    if isinstance(node, ast.Attribute):
+        frame = bindings.rows.get(_name(node.value))
+        if frame is not None and node.attr not in _NON_COLUMN_ATTRIBUTES:
+            return _column(frame, node.attr), True
+        if any(_name(child) in bindings.values or _name(child) in bindings.rows or _name(child) in bindings.forbidden
+               for child in ast.walk(node)):
+            raise _Unsupported("attribute of a loop variable")
+        return copy.deepcopy(node), False
+
+    if isinstance(node, ast.BinOp) and isinstance(node.op, _ARITHMETIC_OPS):
+        _check_failure_behaviour(node)
+        left, left_depends = _vectorize(node.left, bindings)
+        right, right_depends = _vectorize(node.right, bindings)
+        return ast.BinOp(left=left, op=copy.deepcopy(node.op), right=right), left_depends or right_depends
+
+    if isinstance(node, ast.UnaryOp):
+        operand, depends = _vectorize(node.operand, bindings)
+        if isinstance(node.op, (ast.USub, ast.UAdd)):
+            return ast.UnaryOp(op=copy.deepcopy(node.op), operand=operand), depends
+        if isinstance(node.op, ast.Not) and _is_boolean(node.operand):
+            return ast.UnaryOp(op=ast.Invert(), operand=operand), depends
+        raise _Unsupported("unary operator")
+
+    if isinstance(node, ast.BoolOp):
+        # `and`/`or` only equal `&`/`|` when every operand is a boolean
+        if not all(_is_boolean(value) for value in node.values):
+            raise _Unsupported("non-boolean and/or")
+        op = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+        parts = [_vectorize(value, bindings) for value in node.values]
+        combined = parts[0][0]
+        for part, _ in parts[1:]:
+            combined = ast.BinOp(left=combined, op=op, right=part)
+        return combined, any(depends for _, depends in parts)
+
+    if isinstance(node, ast.Compare):
+        return _vectorize_compare(node, bindings)
+
+    if isinstance(node, ast.IfExp):
+        test, test_depends = _vectorize(node.test, bindings)
+        body, body_depends = _vectorize(node.body, bindings)
+        orelse, orelse_depends = _vectorize(node.orelse, bindings)
+        if not test_depends:
+            raise _Unsupported("condition doesn't depend on the row")
+        where = _call(_attr(ast.Name(id='np', ctx=ast.Load()), 'where'), [test, body, orelse])
+        return where, True
+
+    if (isinstance(node, ast.Call) and _name(node.func) in _ELEMENTWISE_BUILTINS
+            and not node.keywords and 1 <= len(node.args) <= 2):
+        args = [_vectorize(arg, bindings) for arg in node.args]
+        if len(args) == 2 and args[1][1]:
+            raise _Unsupported("per-row ndigits")
+        return _call(ast.Name(id=node.func.id, ctx=ast.Load()), [arg for arg, _ in args]), args[0][1]
+
+    raise _Unsupported(type(node).__name__)
+
+def _is_number(node: ast.expr) -> bool:
+    return (isinstance(node, ast.Constant) and isinstance(node.value, (int, float))
+            and not isinstance(node.value, bool))
+
+def _check_failure_behaviour(node: ast.BinOp) -> None:
+    """
+    Refuse arithmetic that fails differently per element than on a column.
+
+    A divisor of zero raises in the loop but gives inf/NaN on a column, and
+    a negative base to a fractional power gives a complex number instead of
+    NaN. Rows that trigger this may not be in the verification sample, so
+    only literal non-zero divisors and non-negative integer exponents pass.
+    """
+    if isinstance(node.op, _DIVISION_OPS) and not (_is_number(node.right) and node.right.value != 0):
+        raise _Unsupported("division by a value that may be zero")
+    if isinstance(node.op, ast.Pow) and not (_is_number(node.right) and isinstance(node.right.value, int)
+                                             and node.right.value >= 0):
+        raise _Unsupported("power that may be fractional or negative")
+
+def _vectorize_compare(node: ast.Compare, bindings: _Bindings) -> Tuple[ast.expr, bool]:
+    if isinstance(node.ops[0], (ast.In, ast.NotIn)) and len(node.ops) == 1:
+        # x in ('a', 'b') -> s.isin(['a', 'b']) for literal collections only
+        left, depends = _vectorize(node.left, bindings)
+        collection = node.comparators[0]
+        if not (isinstance(collection, (ast.Tuple, ast.List, ast.Set)) and depends
+                and all(isinstance(element, ast.Constant) for element in collection.elts)):
+            raise _Unsupported("membership test")
+        isin = _call(_attr(left, 'isin'), [ast.List(elts=copy.deepcopy(collection.elts), ctx=ast.Load())])
+        return (ast.UnaryOp(op=ast.Invert(), operand=isin) if isinstance(node.ops[0], ast.NotIn) else isin), True
+
+    operands = [_vectorize(operand, bindings) for operand in [node.left] + node.comparators]
+    depends = any(operand_depends for _, operand_depends in operands)
+    parts = []
+    for position, op in enumerate(node.ops):
+        left = operands[position][0]
+        if isinstance(op, _COMPARE_OPS):
+            parts.append(ast.Compare(left=copy.deepcopy(left), ops=[copy.deepcopy(op)],
+                                     comparators=[copy.deepcopy(operands[position + 1][0])]))
+        else:
+            raise _Unsupported("comparison")
+
+    # Chained comparisons (0 < x < 5) become (0 < x) & (x < 5)
+    combined = parts[0]
+    for part in parts[1:]:
+        combined = ast.BinOp(left=combined, op=ast.BitAnd(), right=part)
+    return combined, depends
+
+def _is_boolean(node: ast.expr) -> bool:
+    if isinstance(node, ast.Compare):
+        return True
+    if isinstance(node, ast.BoolOp):
+        return all(_is_boolean(value) for value in node.values)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        return _is_boolean(node.operand)
+    return isinstance(node, ast.Constant) and isinstance(node.value, bool)
+
+def _vectorized(node: ast.expr, bindings: _Bindings) -> ast.expr:
+    expression, depends = _vectorize(node, bindings)
+    if not depends:
+        raise _Unsupported("result doesn't depend on the data")
+    return expression
+
+def _loop_bindings(target: ast.expr, iterable: ast.expr) -> _Bindings:
+    """Bindings for `for target in iterable` over a frame or its columns."""
+    if isinstance(iterable, ast.Call) and isinstance(iterable.func, ast.Attribute):
+        receiver = iterable.func.value
+        method = iterable.func.attr
+        if method == 'iterrows' and not iterable.args and not iterable.keywords and _is_plain_reference(receiver):
+            if isinstance(target, ast.Tuple) and len(target.elts) == 2 and all(_name(e) for e in target.elts):
+                index_name, row_name = target.elts[0].id, target.elts[1].id
+                return _Bindings(receiver, rows={row_name: receiver}, forbidden={index_name})
+        if (method == 'itertuples' and not iterable.args and _is_plain_reference(receiver) and _name(target)
+                and all(k.arg == 'index' for k in iterable.keywords)):
+            return _Bindings(receiver, rows={target.id: receiver})
+        if method == 'tolist' and not iterable.args and _is_series_reference(receiver) and _name(target):
+            return _Bindings(receiver, values={target.id: receiver})
+        raise _Unsupported("iterable")
+
+    if isinstance(iterable, ast.Call) and _name(iterable.func) == 'zip' and not iterable.keywords:
+        if (isinstance(target, ast.Tuple) and len(target.elts) == len(iterable.args)
+                and all(_name(e) for e in target.elts) and all(_is_series_reference(a) for a in iterable.args)):
+            values = {element.id: series for element, series in zip(target.elts, iterable.args)}
+            return _Bindings(iterable.args[0], values=values)
+        raise _Unsupported("zip")
+
+    if isinstance(iterable, ast.Attribute) and iterable.attr == 'values' and _is_series_reference(iterable.value):
+        iterable = iterable.value
+    if _is_series_reference(iterable) and _name(target):
+        return _Bindings(iterable, values={target.id: iterable})
+    raise _Unsupported("iterable")
+
+def _is_call_on(node: ast.AST, receiver: str, method: str) -> bool:
+    return (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+            and node.func.attr == method and _name(node.func.value) == receiver)
+
+def _append_expression(stmts: List[ast.stmt], list_name: str) -> ast.expr:
+    """Collapse `if/else` branches that each append one value into a single conditional expression."""
+    if len(stmts) != 1:
+        raise _Unsupported("loop body")
+    stmt = stmts[0]
+    if isinstance(stmt, ast.Expr) and _is_call_on(stmt.value, list_name, 'append') and len(stmt.value.args) == 1:
+        return stmt.value.args[0]
+    if isinstance(stmt, ast.If) and stmt.orelse:
+        return ast.IfExp(test=stmt.test, body=_append_expression(stmt.body, list_name),
+                         orelse=_append_expression(stmt.orelse, list_name))
+    raise _Unsupported("loop body")
+
+def _is_empty(node: ast.expr, kind: type, builtin: str) -> bool:
+    if isinstance(node, ast.List) and kind is ast.List:
+        return not node.elts
+    if isinstance(node, ast.Dict) and kind is ast.Dict:
+        return not node.keys
+    return isinstance(node, ast.Call) and _name(node.func) == builtin and not node.args and not node.keywords
+
+def _accumulation(stmts: List[ast.stmt], dict_name: str) -> Tuple[ast.expr, Optional[ast.expr]]:
+    """
+    Recognize per-key accumulation into a dict; returns (key, value) with value
+    None for counting.
+
+        d[k] = d.get(k, 0) + v
+        if k not in d: d[k] = 0          followed by  d[k] += v
+        if k in d: d[k] += v  else: d[k] = v
+    """
+    def subscript_key(node):
+        if isinstance(node, ast.Subscript) and _name(node.value) == dict_name:
+            return node.slice
+        return None
+
+    def is_key_subscript(node, key):
+        found = subscript_key(node)
+        return found is not None and _same(found, key)
+
+    def is_membership(node, key, op_type):
+        return (isinstance(node, ast.Compare) and len(node.ops) == 1 and isinstance(node.ops[0], op_type)
+                and _same(node.left, key) and _name(node.comparators[0]) == dict_name)
+
+    def is_zero(node):
+        return isinstance(node, ast.Constant) and node.value == 0 and not isinstance(node.value, bool)
+
+    key = value = None
+    if len(stmts) == 1 and isinstance(stmts[0], ast.Assign) and len(stmts[0].targets) == 1:
+        stmt = stmts[0]
+        key = subscript_key(stmt.targets[0])
+        if key is not None and isinstance(stmt.value, ast.BinOp) and isinstance(stmt.value.op, ast.Add):
+            for get_call, addend in ((stmt.value.left, stmt.value.right), (stmt.value.right, stmt.value.left)):
+                if (_is_call_on(get_call, dict_name, 'get') and len(get_call.args) == 2
+                        and _same(get_call.args[0], key) and is_zero(get_call.args[1])):
+                    value = addend
+                    break
+    elif (len(stmts) == 2 and isinstance(stmts[0], ast.If) and isinstance(stmts[1], ast.AugAssign)
+          and not stmts[0].orelse and len(stmts[0].body) == 1 and isinstance(stmts[0].body[0], ast.Assign)):
+        guard, init, update = stmts[0].test, stmts[0].body[0], stmts[1]
+        key = subscript_key(update.target)
+        if (key is not None and isinstance(update.op, ast.Add) and is_membership(guard, key, ast.NotIn)
+                and len(init.targets) == 1 and is_key_subscript(init.targets[0], key) and is_zero(init.value)):
+            value = update.value
+    elif len(stmts) == 1 and isinstance(stmts[0], ast.If) and len(stmts[0].body) == 1 and len(stmts[0].orelse) == 1:
+        guard, update, init = stmts[0].test, stmts[0].body[0], stmts[0].orelse[0]
+        if (isinstance(update, ast.AugAssign) and isinstance(update.op, ast.Add)
+                and isinstance(init, ast.Assign) and len(init.targets) == 1):
+            key = subscript_key(update.target)
+            if (key is not None and is_membership(guard, key, ast.In)
+                    and is_key_subscript(init.targets[0], key) and _same(init.value, update.value)):
+                value = update.value
+
+    if key is None or value is None:
+        raise _Unsupported("accumulation")
+    if isinstance(value, ast.Constant) and value.value == 1 and not isinstance(value.value, bool):
+        return key, None
+    return key, value
+
+def _groupby_assignment(dict_name: str, key: ast.expr, value: Optional[ast.expr], bindings: _Bindings) -> ast.stmt:
+    """d = <values>.groupby(<keys>, sort=False, dropna=False, observed=True).sum().to_dict()"""
+    keys = _as_series(_vectorized(key, bindings), bindings.base)
+    grouped_values = keys if value is None else _as_series(_vectorized(value, bindings), bindings.base)
+    grouped = _call(_attr(grouped_values, 'groupby'), [copy.deepcopy(keys)], {
+        # First-seen key order and NaN keys, as the dict would have them
+        'sort': ast.Constant(False),
+        'dropna': ast.Constant(False),
+        'observed': ast.Constant(True),
+    })
+    aggregate = _call(_attr(grouped, 'size' if value is None else 'sum'), [])
+    return ast.Assign(targets=[ast.Name(id=dict_name, ctx=ast.Store())],
+                      value=_call(_attr(aggregate, 'to_dict'), []))
+
+class _RewriteFinder(ast.NodeVisitor):
+    """Collect non-overlapping row-wise constructs that have a vectorized replacement."""
+
+    def __init__(self):
+        self.rewrites = []
+        self._claimed = set()
+
+    def visit(self, node):
+        if id(node) in self._claimed:
+            return
+        for field in ('body', 'orelse', 'finalbody'):
+            stmts = getattr(node, field, None)
+            if isinstance(stmts, list):
+                self._scan_block(stmts)
+        super().visit(node)
+
+    def _add(self, pattern: str, nodes: List[ast.AST], replacement: ast.AST) -> None:
+        self.rewrites.append({'pattern': pattern, 'nodes': nodes, 'replacement': replacement})
+        self._claimed.update(id(node) for node in nodes)
+
+    def _scan_block(self, stmts: List[ast.stmt]) -> None:
+        """Look for `x = []` / `x = {}` directly followed by a loop that only fills x."""
+        for init, loop in zip(stmts, stmts[1:]):
+            if not (isinstance(init, ast.Assign) and len(init.targets) == 1 and _name(init.targets[0])
+                    and isinstance(loop, ast.For) and not loop.orelse):
+                continue
+            name = init.targets[0].id
+            try:
+                bindings = _loop_bindings(loop.target, loop.iter)
+                bindings.forbidden.add(name)
+                if _is_empty(init.value, ast.List, 'list'):
+                    replacement = self._list_loop(name, loop, bindings)
+                    self._add('append_loop', [init, loop], replacement)
+                elif _is_empty(init.value, ast.Dict, 'dict'):
+                    key, value = _accumulation(loop.body, name)
+                    self._add('dict_accumulation', [init, loop], _groupby_assignment(name, key, value, bindings))
+            except _Unsupported:
+                continue
+
+    def _list_loop(self, name: str, loop: ast.For, bindings: _Bindings) -> ast.stmt:
+        body = loop.body
+        condition = None
+        if len(body) == 1 and isinstance(body[0], ast.If) and not body[0].orelse:
+            # A filtering loop: only some rows are appended
+            condition = body[0].test
+            body = body[0].body
+        values = _vectorized(_append_expression(body, name), bindings)
+        if condition is not None:
+            values = ast.Subscript(value=values, slice=_vectorized(condition, bindings), ctx=ast.Load())
+        return ast.Assign(targets=[ast.Name(id=name, ctx=ast.Store())], value=_call(_attr(values, 'tolist'), []))
+
+    def visit_Call(self, node: ast.Call) -> None:
+        try:
+            self._match_apply(node)
+        except _Unsupported:
+            self.generic_visit(node)
+
+    def _match_apply(self, node: ast.Call) -> None:
+        if not (isinstance(node.func, ast.Attribute) and node.func.attr in ('apply', 'map')
+                and len(node.args) == 1 and isinstance(node.args[0], ast.Lambda)):
+            raise _Unsupported("call")
+        function = node.args[0]
+        if len(function.args.args) != 1 or function.args.vararg or function.args.kwarg or function.args.kwonlyargs:
+            raise _Unsupported("lambda signature")
+        parameter = function.args.args[0].arg
+        receiver = node.func.value
+        keywords = {keyword.arg: keyword.value for keyword in node.keywords}
+
+        if node.func.attr == 'apply' and set(keywords) == {'axis'}:
+            # df.apply(lambda row: ..., axis=1)
+            axis = keywords['axis']
+            if not (isinstance(axis, ast.Constant) and axis.value in (1, 'columns') and _is_plain_reference(receiver)):
+                raise _Unsupported("apply axis")
+            bindings = _Bindings(receiver, rows={parameter: receiver})
+            replacement = _as_series(_vectorized(function.body, bindings), receiver)
+            self._add('apply_rows', [node], replacement)
+        elif not keywords and _is_series_reference(receiver):
+            # df['col'].apply(lambda x: ...)
+            bindings = _Bindings(receiver, values={parameter: receiver})
+            replacement = _as_series(_vectorized(function.body, bindings), receiver, keep_name=True)
+            self._add('apply_elements', [node], replacement)
+        else:
+            raise _Unsupported("apply receiver")
+
+    def visit_ListComp(self, node: ast.ListComp) -> None:
+        try:
+            if len(node.generators) != 1 or node.generators[0].is_async or len(node.generators[0].ifs) > 1:
+                raise _Unsupported("comprehension")
+            generator = node.generators[0]
+            bindings = _loop_bindings(generator.target, generator.iter)
+            values = _vectorized(node.elt, bindings)
+            if generator.ifs:
+                values = ast.Subscript(value=values, slice=_vectorized(generator.ifs[0], bindings), ctx=ast.Load())
+            self._add('list_comprehension', [node], _call(_attr(values, 'tolist'), []))
+        except _Unsupported:
+            self.generic_visit(node)
+
+def find_rewrites(code: str) -> List[Dict[str, Any]]:
+    """
+    Find row-wise constructs in code that can be replaced by column operations.
+
+    Each rewrite has: pattern, line, original (source text), rewritten (replacement
+    source) and the byte span it replaces.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return []
+    finder = _RewriteFinder()
+    finder.visit(tree)
+
+    source = code.encode('utf-8')
+    line_starts = [0]
+    for line in source.splitlines(keepends=True):
+        line_starts.append(line_starts[-1] + len(line))
+
+    rewrites = []
+    for found in finder.rewrites:
+        first, last = found['nodes'][0], found['nodes'][-1]
+        start = line_starts[first.lineno - 1] + first.col_offset
+        end = line_starts[last.end_lineno - 1] + last.end_col_offset
+        replacement = found['replacement']
+        ast.fix_missing_locations(replacement)
+        rewritten = ast.unparse(replacement)
+        if isinstance(replacement, ast.expr) and not isinstance(replacement, (ast.Call, ast.Subscript, ast.Name)):
+            rewritten = f"({rewritten})"
+        rewrites.append({
+            'pattern': found['pattern'],
+            'line': last.lineno,
+            'original': source[start:end].decode('utf-8'),
+            'rewritten': rewritten,
+            'span': (start, end),
+        })
+    return sorted(rewrites, key=lambda rewrite: rewrite['span'])
+
+def apply_rewrites(code: str, rewrites: List[Dict[str, Any]]) -> str:
+    """Splice rewrites into code, leaving everything else (comments, formatting) as written."""
+    source = code.encode('utf-8')
+    for rewrite in sorted(rewrites, key=lambda rewrite: rewrite['span'], reverse=True):
+        start, end = rewrite['span']
+        source = source[:start] + rewrite['rewritten'].encode('utf-8') + source[end:]
+    return source.decode('utf-8')
+
+def _scalar_kind(value: Any) -> Optional[str]:
+    if isinstance(value, (bool, np.bool_)):
+        return 'bool'
+    if isinstance(value, (int, np.integer)):
+        return 'int'
+    if isinstance(value, (float, np.floating)):
+        return 'float'
+    return None
+
+def values_match(a: Any, b: Any) -> bool:
+    """
+    Whether two outputs of generated code are the same value of the same type.
+
+    Frames and series must have equal dtypes; only float summation order is
+    tolerated. Scalars must be of the same kind (an int where the original
+    gave a float is a change). Lists, tuples, dicts and arrays are compared
+    element by element.
+    """
+    try:
+        if isinstance(a, pd.DataFrame) and isinstance(b, pd.DataFrame):
+            pd.testing.assert_frame_equal(a, b, check_names=False, check_exact=False,
+                                          check_index_type=False, check_column_type=False)
+            return True
+        if isinstance(a, pd.Series) and isinstance(b, pd.Series):
+            pd.testing.assert_series_equal(a, b, check_names=False, check_exact=False, check_index_type=False)
+            return True
+    except (AssertionError, TypeError, ValueError):
+        return False
+    if isinstance(a, (pd.DataFrame, pd.Series)) or isinstance(b, (pd.DataFrame, pd.Series)):
+        return False
+    if isinstance(a, np.ndarray):
+        a = a.tolist()
+    if isinstance(b, np.ndarray):
+        b = b.tolist()
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(values_match(a[key], b[key]) for key in a)
+    if isinstance(a, (list, tuple)) and isinstance(b, (list, tuple)):
+        return len(a) == len(b) and all(values_match(x, y) for x, y in zip(a, b))
+    if _scalar_kind(a) != _scalar_kind(b):
+        return False
+    if isinstance(a, (float, np.floating)) or isinstance(b, (float, np.floating)):
+        try:
+            a, b = float(a), float(b)
+        except (TypeError, ValueError):
+            return False
+        return (math.isnan(a) and math.isnan(b)) or math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-12)
+    try:
+        return bool(a == b)
+    except (TypeError, ValueError):
+        return False
+
+def observe(code: str, sample: pd.DataFrame, backend: str, runs: int = 1) -> Dict[str, Any]:
+    """
+    Run code on a copy of the sample; return its observable outputs and timing.
+
+    Used to check a rewrite of generated code against the original before it
+    replaces it. Returns error, seconds (fastest of runs, so one slow run
+    doesn't decide a comparison), result, fig (Plotly figures as dicts) and
+    df (the frame after an inline run, which may mutate it). Compare two with
+    outputs_match().
+    """
+    frame = sample.copy() if backend == 'inline' else sample
+    start = time.perf_counter()
+    result_dict, error_message = execute_code(code, frame, backend=backend, use_cache=False)
+    seconds = time.perf_counter() - start
+    for _ in range(runs - 1 if not error_message else 0):
+        rerun_frame = sample.copy() if backend == 'inline' else sample
+        start = time.perf_counter()
+        execute_code(code, rerun_frame, backend=backend, use_cache=False)
+        seconds = min(seconds, time.perf_counter() - start)
+    fig = result_dict.get('fig')
+    return {
+        'error': error_message,
+        'seconds': seconds,
+        'result': result_dict.get('result'),
+        # Plotly figures compare by their data; matplotlib figures can't be compared
+        'fig': fig.to_dict() if hasattr(fig, 'to_dict') else None,
+        # Inline runs mutate the copy in place (df['new'] = ...)
+        'df': frame if backend == 'inline' else None,
+    }
+
+def outputs_match(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    """
+    Whether two observe() runs produced the same result, figure and frame (see values_match()).
+
+    Only what the sample exercised is compared: a rewrite that differs on
+    rows outside it (or fails differently on them) can still match.
+    """
+    return all(values_match(a[key], b[key]) for key in ('result', 'fig', 'df'))
+
+def optimize_code(code: str, df: pd.DataFrame, sample_rows: Optional[int] = None,
+                  backend: Optional[str] = None, min_speedup: Optional[float] = None) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Rewrite row-wise pandas code into vectorized operations where it is provably equivalent.
+
+    Each candidate rewrite is checked by running the original and the rewritten
+    code on a sample of df; only rewrites whose result, figure and df mutations
+    match (dtypes included) and that are at least min_speedup times faster
+    there are kept. Code that can't be verified is returned unchanged.
+
+    Returns:
+        Tuple of (code_to_execute, rewrites); each rewrite records pattern, line,
+        original, rewritten, applied and speedup (original / rewritten seconds on the sample)
+    """
+    if sample_rows is None:
+        from config.settings import OPTIMIZER_SAMPLE_ROWS
+        sample_rows = OPTIMIZER_SAMPLE_ROWS
+    if backend is None:
+        from config.settings import EXECUTION_BACKEND
+        backend = EXECUTION_BACKEND
+    if min_speedup is None:
+        from config.settings import OPTIMIZER_MIN_SPEEDUP
+        min_speedup = OPTIMIZER_MIN_SPEEDUP
+    from config.settings import OPTIMIZER_TIMING_RUNS
+
+    rewrites = find_rewrites(code)
+    if not rewrites:
+        return code, []
+
+    if len(df) > sample_rows:
+        sample = df.sample(n=sample_rows, random_state=0).sort_index()
+    else:
+        sample = df
+
+    report = [{key: value for key, value in rewrite.items() if key != 'span'} for rewrite in rewrites]
+    for entry in report:
+        entry.update({'applied': False, 'speedup': None, 'sample_rows': len(sample)})
+
+    baseline = observe(code, sample, backend, OPTIMIZER_TIMING_RUNS)
+    if baseline['error']:
+        # Nothing to compare against; the retry path deals with the failure
+        return code, report
+
+    accepted = []
+    for rewrite, entry in zip(rewrites, report):
+        outcome = observe(apply_rewrites(code, [rewrite]), sample, backend, OPTIMIZER_TIMING_RUNS)
+        if outcome['error'] or not outputs_match(baseline, outcome):
+            continue
+        entry['speedup'] = baseline['seconds'] / outcome['seconds'] if outcome['seconds'] else None
+        if entry['speedup'] is None or entry['speedup'] < min_speedup:
+            # Equivalent but not measurably faster; keep the code the model wrote
+            continue
+        accepted.append((rewrite, entry))
+
+    if not accepted:
+        return code, report
+
+    optimized = apply_rewrites(code, [rewrite for rewrite, _ in accepted])
+    if len(accepted) > 1:
+        # Rewrites verified one at a time; make sure they also hold together
+        combined = observe(optimized, sample, backend, OPTIMIZER_TIMING_RUNS)
+        if (combined['error'] or not outputs_match(baseline, combined)
+                or not combined['seconds'] or baseline['seconds'] / combined['seconds'] < min_speedup):
+            return code, report
+
+    for _, entry in accepted:
+        entry['applied'] = True
+    return optimized, report
@@ -0,0 +1,354 @@
+import atexit
+import multiprocessing as mp
+import os
+import queue
+import signal
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Any, Tuple, Optional
+
+import pandas as pd
+
+from src.data.store import write_frame, read_mapped_frame
+from src.data.registry import shared_view
+from src.execution.executor import CANCELLED_ERROR
+from src.utils.helpers import hash_dataframe
+
+# Modules imported once by the fork server so every worker starts warm
+# (the executor goes first so its matplotlib backend choice applies)
+PRELOAD_MODULES = [
+    'src.execution.executor', 'pandas', 'numpy', 'plotly.express', 'plotly.graph_objects',
+    'matplotlib.pyplot', 'seaborn',
+]
+
+# Datasets each worker keeps memory-mapped between jobs
+WORKER_DATASET_SLOTS = 2
+
+# Exit codes of a worker killed by an allocation failing under RLIMIT_AS: C
+# extensions abort() on a failed malloc/new, or crash dereferencing its NULL
+# (Python-level allocations raise MemoryError and are reported by the worker)
+MEMORY_LIMIT_EXIT_CODES = frozenset({-signal.SIGABRT, -signal.SIGSEGV})
+
+def _load_shared_dataset(path: str) -> pd.DataFrame:
+    """Load a dataset published by the parent process."""
+    if path.endswith('.arrow'):
+        # Memory-mapped Arrow IPC: numeric columns are read straight from the shared pages
+        return read_mapped_frame(path)
+    return pd.read_pickle(path)
+
+def _worker_main(conn, memory_limit_mb: int) -> None:
+    """
+    Worker loop: receive (dataset_key, dataset_path, rollups_path, code, profile), reply
+    with (result_dict, error_message).
+    """
+    from src.execution.executor import _execute_inline
+
+    # Generated code sees a shallow copy; copy-on-write keeps the cached frame pristine
+    if int(pd.__version__.split('.')[0]) < 3:
+        pd.set_option('mode.copy_on_write', True)
+
+    if memory_limit_mb:
+        try:
+            import resource
+            limit = memory_limit_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError):
+            pass
+
+    frames = OrderedDict()
+    rollups = {}
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        dataset_key, dataset_path, rollups_path, code, profile = message
+
+        try:
+            df = frames.get(dataset_key)
+            if df is None:
+                df = _load_shared_dataset(dataset_path)
+                frames[dataset_key] = df
+                while len(frames) > WORKER_DATASET_SLOTS:
+                    rollups.pop(frames.popitem(last=False)[0], None)
+            frames.move_to_end(dataset_key)
+            if rollups_path is not None and dataset_key not in rollups:
+                # Published once the parent's background build finished
+                rollups[dataset_key] = pd.read_pickle(rollups_path)
+            result_dict, error_message = _execute_inline(code, shared_view(df), rollups.get(dataset_key), profile)
+        except Exception as e:
+            result_dict, error_message = {'result': None, 'fig': None, 'output': ''}, f"{type(e).__name__}: {str(e)}"
+
+        try:
+            conn.send((result_dict, error_message))
+        except Exception as e:
+            # Result objects that can't be pickled (open handles, lambdas, ...)
+            conn.send((
+                {'result': None, 'fig': None, 'output': result_dict.get('output', '')},
+                f"SerializationError: result could not be returned from worker: {str(e)}"
+            ))
+
+class _Worker:
+    """A worker process and the parent end of its pipe."""
+
+    def __init__(self, ctx, memory_limit_mb: int):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, memory_limit_mb), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def stop(self, force: bool = False) -> None:
+        if not force:
+            try:
+                self.conn.send(None)
+                self.process.join(timeout=1)
+            except (OSError, ValueError):
+                pass
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(timeout=1)
+        self.conn.close()
+
+class ExecutionJob:
+    """
+    Handle for a job submitted to the pool.
+
+    cancel is an optional event owned by the caller (e.g. the query's job);
+    setting it cancels the job like cancel() does.
+    """
+
+    def __init__(self, cancel: Optional[threading.Event] = None):
+        self.future: Optional[Future] = None
+        self._cancel_event = threading.Event()
+        self._parent_cancel = cancel
+
+    def cancel(self) -> None:
+        """Cancel the job; a running job's worker is killed and replaced."""
+        self._cancel_event.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set() or (self._parent_cancel is not None and self._parent_cancel.is_set())
+
+    def result(self, timeout: Optional[float] = None) -> Tuple[Dict[str, Any], str]:
+        return self.future.result(timeout=timeout)
+
+class ExecutionPool:
+    """
+    Pool of pre-warmed worker processes for running generated code.
+
+    DataFrames are published once per dataset as memory-mapped Arrow IPC files
+    in a shared directory (/dev/shm when available), so queries only ship code.
+    """
+
+    def __init__(self, workers: int, timeout_seconds: float, memory_limit_mb: int, shared_dir: str,
+                 max_shared_datasets: int = 8):
+        self.timeout_seconds = timeout_seconds
+        self.memory_limit_mb = memory_limit_mb
+        self.shared_dir = shared_dir
+        self.max_shared_datasets = max_shared_datasets
+        os.makedirs(shared_dir, exist_ok=True)
+
+        if 'forkserver' in mp.get_all_start_methods():
+            self._ctx = mp.get_context('forkserver')
+            self._ctx.set_forkserver_preload(PRELOAD_MODULES)
+        else:
+            self._ctx = mp.get_context('spawn')
+
+        self._published = OrderedDict()
+        self._published_rollups = {}
+        # dataset_key -> number of submitted jobs that haven't finished with its file
+        self._in_use: Dict[str, int] = {}
+        self._publish_lock = threading.Lock()
+        self._idle = queue.Queue()
+        for _ in range(workers):
+            self._idle.put(self._spawn())
+        self._dispatcher = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dataspark-exec')
+        self._closed = False
+
+    def _spawn(self) -> _Worker:
+        return _Worker(self._ctx, self.memory_limit_mb)
+
+    def _publish(self, df: pd.DataFrame) -> Tuple[str, str]:
+        """
+        Write the dataset to the shared directory once; return (dataset_key, path).
+
+        The caller holds a reference to the file until it calls _release(dataset_key).
+        """
+        dataset_key = hash_dataframe(df)
+        with self._publish_lock:
+            self._in_use[dataset_key] = self._in_use.get(dataset_key, 0) + 1
+            path = self._published.get(dataset_key)
+            if path is not None and os.path.exists(path):
+                self._published.move_to_end(dataset_key)
+                return dataset_key, path
+
+            base = os.path.join(self.shared_dir, dataset_key)
+            if isinstance(df.index, pd.RangeIndex) and df.index.start == 0 and df.index.step == 1:
+                try:
+                    path = base + '.arrow'
+                    write_frame(df, path)
+                except (ImportError, ValueError, TypeError):
+                    path = None
+            else:
+                # Arrow would drop a custom index
+                path = None
+            if path is None:
+                path = base + '.pkl'
+                df.to_pickle(path + '.tmp')
+                os.replace(path + '.tmp', path)
+
+            self._published[dataset_key] = path
+            self._evict_published()
+        return dataset_key, path
+
+    def _release(self, dataset_key: str) -> None:
+        """Drop a job's reference to a published dataset."""
+        with self._publish_lock:
+            self._in_use[dataset_key] -= 1
+            if not self._in_use[dataset_key]:
+                del self._in_use[dataset_key]
+                self._evict_published()
+
+    def _evict_published(self) -> None:
+        """Delete the oldest published files beyond max_shared_datasets that no job references (lock held)."""
+        for old_key in list(self._published):
+            if len(self._published) <= self.max_shared_datasets:
+                break
+            if old_key in self._in_use:
+                # Queued or running jobs still need the file; it goes once they finish
+                continue
+            old_path = self._published.pop(old_key)
+            # Workers that mapped the file keep their pages until they drop it
+            for stale in (old_path, self._published_rollups.pop(old_key, None)):
+                if stale and os.path.exists(stale):
+                    os.unlink(stale)
+
+    def _publish_rollups(self, code: str, df: pd.DataFrame, dataset_key: str) -> Optional[str]:
+        """Path of the dataset's pickled rollups for code calling the rollup helpers, if built."""
+        from src.execution.executor import rollups_for
+        rollups = rollups_for(code, df)
+        if rollups is None:
+            return None
+        with self._publish_lock:
+            path = self._published_rollups.get(dataset_key)
+            if path is None or not os.path.exists(path):
+                path = os.path.join(self.shared_dir, dataset_key + '.rollups.pkl')
+                pd.to_pickle(rollups, path + '.tmp')
+                os.replace(path + '.tmp', path)
+                self._published_rollups[dataset_key] = path
+        return path
+
+    def submit(self, code: str, df: pd.DataFrame, timeout: Optional[float] = None,
+               profile: bool = False, cancel: Optional[threading.Event] = None) -> ExecutionJob:
+        """
+        Queue code for execution against df (line-profiled if profile) and return a job handle.
+
+        timeout defaults to the pool's timeout_seconds; 0 or less means no
+        deadline. Setting cancel stops the job: a queued job never starts and a running
+        one's worker is killed and replaced.
+        """
+        if self._closed:
+            raise RuntimeError("Execution pool has been shut down")
+        dataset_key, path = self._publish(df)
+        try:
+            rollups_path = self._publish_rollups(code, df, dataset_key)
+            job = ExecutionJob(cancel)
+            job.future = self._dispatcher.submit(
+                self._run_job, job, code, dataset_key, path, rollups_path,
+                self.timeout_seconds if timeout is None else timeout, profile
+            )
+        except BaseException:
+            self._release(dataset_key)
+            raise
+        # Also runs for jobs cancelled before they started
+        job.future.add_done_callback(lambda _: self._release(dataset_key))
+        return job
+
+    def run(self, code: str, df: pd.DataFrame, timeout: Optional[float] = None,
+            profile: bool = False, cancel: Optional[threading.Event] = None) -> Tuple[Dict[str, Any], str]:
+        """Execute code on a worker and wait for (result_dict, error_message)."""
+        return self.submit(code, df, timeout, profile, cancel).result()
+
+    def _run_job(self, job: ExecutionJob, code: str, dataset_key: str, path: str, rollups_path: Optional[str],
+                 timeout: float, profile: bool = False) -> Tuple[Dict[str, Any], str]:
+        empty = {'result': None, 'fig': None, 'output': ''}
+        if job.cancelled():
+            return empty, CANCELLED_ERROR
+
+        worker = self._idle.get()
+        healthy = True
+        try:
+            worker.conn.send((dataset_key, path, rollups_path, code, profile))
+            deadline = time.monotonic() + timeout if timeout > 0 else None
+            while True:
+                if worker.conn.poll(0.05):
+                    return worker.conn.recv()
+                if job.cancelled():
+                    healthy = False
+                    return empty, CANCELLED_ERROR
+                if not worker.process.is_alive():
+                    healthy = False
+                    return empty, self._exit_error(worker)
+                if deadline is not None and time.monotonic() > deadline:
+                    healthy = False
+                    return empty, f"TimeoutError: execution exceeded {timeout:.0f} seconds"
+        except (EOFError, OSError) as e:
+            healthy = False
+            # A dying worker usually shows up as a closed pipe before is_alive() turns False
+            worker.process.join(timeout=1)
+            if worker.process.exitcode is not None:
+                return empty, self._exit_error(worker)
+            return empty, f"WorkerError: {type(e).__name__}: {str(e)}"
+        finally:
+            if not healthy:
+                worker.stop(force=True)
+                worker = self._spawn()
+            self._idle.put(worker)
+
+    def _exit_error(self, worker: _Worker) -> str:
+        """Error message for a worker that died mid-job."""
+        exitcode = worker.process.exitcode
+        if self.memory_limit_mb and exitcode in MEMORY_LIMIT_EXIT_CODES:
+            return (f"MemoryError: worker process exited (code {exitcode}); "
+                    f"the analysis may exceed the {self.memory_limit_mb}MB memory limit")
+        return f"WorkerError: worker process exited (code {exitcode})"
+
+    def shutdown(self) -> None:
+        """Stop all workers and remove published datasets."""
+        if self._closed:
+            return
+        self._closed = True
+        self._dispatcher.shutdown(wait=False, cancel_futures=True)
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                break
+        for path in list(self._published.values()) + list(self._published_rollups.values()):
+            if os.path.exists(path):
+                os.unlink(path)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_execution_pool() -> ExecutionPool:
+    """Return the process-wide execution pool, starting it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from config.settings import (
+                EXECUTION_POOL_WORKERS, EXECUTION_TIMEOUT_SECONDS,
+                EXECUTION_MEMORY_LIMIT_MB, EXECUTION_SHARED_DIR
+            )
+            _pool = ExecutionPool(
+                EXECUTION_POOL_WORKERS, EXECUTION_TIMEOUT_SECONDS,
+                EXECUTION_MEMORY_LIMIT_MB, EXECUTION_SHARED_DIR
+            )
+            atexit.register(_pool.shutdown)
+        return _pool
@@ -0,0 +1,251 @@
+import ast
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple
+
+def normalize_code(code: str) -> str:
+    """Canonical form of code: comments and formatting don't change the cache key."""
+    try:
+        return ast.unparse(ast.parse(code))
+    except SyntaxError:
+        return code.strip()
+
+def code_key(code: str) -> str:
+    return hashlib.sha256(normalize_code(code).encode('utf-8')).hexdigest()
+
+def _serialize(result_dict: Dict[str, Any]) -> Optional[bytes]:
+    """Pickle result and output with the figure as Plotly JSON; None if not cacheable."""
+    fig = result_dict.get('fig')
+    fig_json = None
+    if fig is not None:
+        if not hasattr(fig, 'to_json'):
+            # Matplotlib figures hold live renderer state; run them again instead
+            return None
+        fig_json = fig.to_json()
+    payload = {
+        'result': result_dict.get('result'),
+        'output': result_dict.get('output', ''),
+        'analysis': result_dict.get('analysis'),
+        'fig_json': fig_json,
+    }
+    try:
+        return pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        # Results that can't be pickled (generators, open handles, ...)
+        return None
+
+def _deserialize(blob: bytes) -> Dict[str, Any]:
+    payload = pickle.loads(blob)
+    fig = None
+    if payload['fig_json'] is not None:
+        import plotly.io as pio
+        fig = pio.from_json(payload['fig_json'])
+    return {
+        'result': payload['result'],
+        'fig': fig,
+        'output': payload['output'],
+        'analysis': payload['analysis'],
+        'result_cache_hit': True,
+    }
+
+class ResultCache:
+    """
+    Execution results keyed by (dataset hash, normalized code hash).
+
+    Entries are stored serialized, so their exact size counts against a byte
+    budget and every hit returns fresh objects the caller may modify. Least
+    recently used entries are evicted once max_bytes is exceeded; with a
+    spill_dir they move to disk (up to max_disk_bytes) instead of being dropped.
+    """
+
+    def __init__(self, max_bytes: int, max_entry_bytes: Optional[int] = None,
+                 spill_dir: Optional[str] = None, max_disk_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes or max_bytes
+        self.spill_dir = spill_dir or None
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.spills = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._disk = OrderedDict()   # (dataset_key, code_key) -> size, oldest first
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            self._index_disk()
+
+    def _index_disk(self) -> None:
+        """Pick up entries spilled by an earlier process, oldest first."""
+        found = []
+        for dataset_key in os.listdir(self.spill_dir):
+            directory = os.path.join(self.spill_dir, dataset_key)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if name.endswith('.bin'):
+                    stat = os.stat(os.path.join(directory, name))
+                    found.append((stat.st_mtime, (dataset_key, name[:-4]), stat.st_size))
+        for _, key, size in sorted(found):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+    def _spill_path(self, key: Tuple[str, str]) -> str:
+        return os.path.join(self.spill_dir, key[0], f"{key[1]}.bin")
+
+    def get(self, dataset_key: str, code: str) -> Optional[Dict[str, Any]]:
+        key = (dataset_key, code_key(code))
+        with self._lock:
+            blob = self._entries.get(key)
+            if blob is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return _deserialize(blob)
+            on_disk = key in self._disk
+
+        if on_disk:
+            try:
+                with open(self._spill_path(key), 'rb') as f:
+                    blob = f.read()
+                result = _deserialize(blob)
+            except Exception:
+                # Missing or unreadable spill file: treat as a miss
+                blob = result = None
+            with self._lock:
+                if key in self._disk:
+                    self._disk_bytes -= self._disk.pop(key)
+                if blob is not None:
+                    self.disk_hits += 1
+            if blob is not None:
+                try:
+                    os.remove(self._spill_path(key))
+                except OSError:
+                    pass
+                # Promote back to memory
+                self._store(key, blob)
+                return result
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, dataset_key: str, code: str, result_dict: Dict[str, Any]) -> bool:
+        """Cache a successful execution; returns False if the result isn't cacheable."""
+        blob = _serialize(result_dict)
+        if blob is None or len(blob) > self.max_entry_bytes:
+            return False
+        self._store((dataset_key, code_key(code)), blob)
+        return True
+
+    def _store(self, key: Tuple[str, str], blob: bytes) -> None:
+        evicted = []
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[key] = blob
+            self._bytes += len(blob)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, old_blob = self._entries.popitem(last=False)
+                self._bytes -= len(old_blob)
+                self.evictions += 1
+                evicted.append((old_key, old_blob))
+        if self.spill_dir and self.max_disk_bytes:
+            for old_key, old_blob in evicted:
+                self._spill(old_key, old_blob)
+
+    def _spill(self, key: Tuple[str, str], blob: bytes) -> None:
+        if len(blob) > self.max_disk_bytes:
+            return
+        path = self._spill_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(blob)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+
+        removed = []
+        with self._lock:
+            if key in self._disk:
+                self._disk_bytes -= self._disk.pop(key)
+            self._disk[key] = len(blob)
+            self._disk_bytes += len(blob)
+            self.spills += 1
+            while self._disk_bytes > self.max_disk_bytes and self._disk:
+                old_key, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                removed.append(old_key)
+        for old_key in removed:
+            try:
+                os.remove(self._spill_path(old_key))
+            except OSError:
+                pass
+
+    def invalidate_dataset(self, dataset_key: str) -> int:
+        """Drop every entry (memory and disk) computed on dataset_key; returns how many."""
+        with self._lock:
+            stale: List[Tuple[str, str]] = [key for key in self._entries if key[0] == dataset_key]
+            for key in stale:
+                self._bytes -= len(self._entries.pop(key))
+            stale_disk = [key for key in self._disk if key[0] == dataset_key]
+            for key in stale_disk:
+                self._disk_bytes -= self._disk.pop(key)
+        for key in stale_disk:
+            try:
+                os.remove(self._spill_path(key))
+            except OSError:
+                pass
+        return len(stale) + len(stale_disk)
+
+    def clear(self) -> None:
+        with self._lock:
+            dataset_keys = {key[0] for key in self._entries} | {key[0] for key in self._disk}
+        for dataset_key in dataset_keys:
+            self.invalidate_dataset(dataset_key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'disk_entries': len(self._disk),
+                'disk_bytes': self._disk_bytes,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'spills': self.spills,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_result_cache() -> Optional[ResultCache]:
+    """Return the process-wide result cache configured in settings, or None if disabled."""
+    global _cache
+    from config.settings import (
+        RESULT_CACHE_ENABLED, RESULT_CACHE_MAX_MB, RESULT_CACHE_MAX_ENTRY_MB,
+        RESULT_CACHE_SPILL_DIR, RESULT_CACHE_DISK_MB
+    )
+    if not RESULT_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache(
+                max_bytes=int(RESULT_CACHE_MAX_MB * 1024 * 1024),
+                max_entry_bytes=int(RESULT_CACHE_MAX_ENTRY_MB * 1024 * 1024),
+                spill_dir=RESULT_CACHE_SPILL_DIR,
+                max_disk_bytes=int(RESULT_CACHE_DISK_MB * 1024 * 1024),
+            )
+        return _cache
@@ -0,0 +1,201 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from src.ai.code_generator import generate_candidates
+from src.data.rollups import rollups_ready
+from src.data.sampling import get_validation_sample
+from src.execution.error_handler import iter_execute_with_retry, get_engine_executor
+from config.settings import SPECULATIVE_WORKERS
+
+# Inline (and DuckDB) candidate runs; pool runs go through the execution pool's own dispatcher
+_race_executor = ThreadPoolExecutor(max_workers=SPECULATIVE_WORKERS, thread_name_prefix='dataspark-race')
+
+def _has_output(result_dict: Dict[str, Any]) -> bool:
+    return result_dict.get('result') is not None or result_dict.get('fig') is not None
+
+def _start_run(code: str, frame, engine: str, use_cache: bool, profile: bool = False,
+               cancel: Optional[threading.Event] = None) -> Tuple[Future, Callable[[], Any]]:
+    """Run one candidate in isolation; returns (future of (result_dict, error), cancel)."""
+    from config.settings import EXECUTION_BACKEND
+    if engine == 'pandas' and EXECUTION_BACKEND == 'pool':
+        from src.execution.pool import get_execution_pool
+        # Cancelling kills the worker running a losing candidate
+        job = get_execution_pool().submit(code, frame, profile=profile, cancel=cancel)
+        return job.future, job.cancel
+    execute = get_engine_executor(engine)
+    options = {'profile': True} if profile and engine == 'pandas' else {}
+    future = _race_executor.submit(execute, code, frame, use_cache=use_cache, cancel=cancel, **options)
+    # A running thread can't be stopped; its result is simply dropped
+    return future, future.cancel
+
+def iter_speculative(user_query: str, df, data_profile: str, k: int, stream: bool = False,
+                     engine: str = 'pandas', profile: bool = False,
+                     cancel: Optional[threading.Event] = None) -> Iterator[Tuple[str, Any]]:
+    """
+    Generate k diverse candidates concurrently and keep the first that works.
+
+    Every candidate starts running (on the validation sample for large
+    frames, else on the frame itself) as soon as its code arrives; the first
+    to produce a result or figure wins and the others are cancelled. If all
+    fail, the first candidate goes through the usual correction loop with
+    its error. Sample winners then run on the full frame via
+    iter_execute_with_retry(), without validating them again.
+
+    Yields ('stage', 'running') once the first candidate runs, ('code', code)
+    for the first candidate generated and the winner,
+    ('code', partial) during corrections, then ('done', (result_dict,
+    error_message, was_retried, speculation)) where speculation has
+    'candidates', 'generated', 'failed', 'winner' (candidate index or None),
+    'cancelled', 'first_code_s', 'race_s' and 'phase' ('sample' or 'full').
+    With profile=True runs on the full frame are line-profiled. Setting
+    cancel interrupts every candidate run (see execute_code()).
+    """
+    start = time.perf_counter()
+    sample = get_validation_sample(df)
+    frame = sample if sample is not None else df
+    rollups = engine != 'duckdb' and rollups_ready(df)
+    candidates = generate_candidates(user_query, data_profile, k, engine, rollups)
+    generating = {future: i for i, future in enumerate(candidates)}
+    speculation = {
+        'candidates': len(generating), 'generated': 0, 'failed': 0, 'winner': None, 'cancelled': 0,
+        'first_code_s': None, 'race_s': None, 'phase': 'sample' if sample is not None else 'full',
+    }
+    running: Dict[Future, Tuple[int, str, Callable]] = {}
+    codes: Dict[int, str] = {}
+    errors: Dict[int, str] = {}
+    llm_errors: List[Exception] = []
+    winner = None
+
+    while (generating or running) and winner is None:
+        done, _ = wait(list(generating) + list(running), return_when=FIRST_COMPLETED)
+        for future in done:
+            if future in generating:
+                i = generating.pop(future)
+                try:
+                    code = future.result()
+                except Exception as e:
+                    llm_errors.append(e)
+                    continue
+                codes[i] = code
+                speculation['generated'] += 1
+                if speculation['first_code_s'] is None:
+                    speculation['first_code_s'] = time.perf_counter() - start
+                    yield 'code', code
+                    yield 'stage', 'running'
+                # Sample runs must not touch the cached sample; full runs get a copy-on-write view
+                run, cancel = _start_run(code, frame.copy() if sample is not None else frame, engine,
+                                         use_cache=sample is None, profile=profile and sample is None,
+                                         cancel=cancel)
+                running[run] = (i, code, cancel)
+            else:
+                i, code, _ = running.pop(future)
+                try:
+                    result_dict, error_message = future.result()
+                except Exception as e:
+                    result_dict, error_message = {}, f"{type(e).__name__}: {e}"
+                if not error_message and not _has_output(result_dict):
+                    error_message = "ValueError: The code ran but did not assign a value to `result` or `fig`."
+                if error_message:
+                    errors[i] = error_message
+                    speculation['failed'] += 1
+                elif winner is None:
+                    winner = (i, code, result_dict)
+
+    for future in generating:
+        future.cancel()
+    for _, _, cancel in running.values():
+        cancel()
+    speculation['cancelled'] = len(generating) + len(running)
+    speculation['race_s'] = time.perf_counter() - start
+
+    if winner is None and not codes:
+        # No candidate could even be generated; surface the model error as serial generation would
+        raise llm_errors[0]
+
+    if winner is not None:
+        i, code, result_dict = winner
+        speculation['winner'] = i
+        yield 'code', code
+        if sample is None:
+            result_dict['code'] = code
+            result_dict['timings'] = {'exec': 0.0, 'retry': 0.0}
+            result_dict['sampling'] = None
+            result_dict['attempts'] = 0
+            yield 'done', (result_dict, None, False, speculation)
+            return
+        first_error = None
+    else:
+        # Correct the first candidate; it got the plain prompt
+        i = min(codes)
+        code, first_error = codes[i], errors[i]
+
+    for event, payload in iter_execute_with_retry(code, df, user_query, data_profile, stream=stream,
+                                                  engine=engine, first_error=first_error,
+                                                  validated=winner is not None, profile=profile,
+                                                  cancel=cancel):
+        if event == 'done':
+            result_dict, error_message, was_retried = payload
+            yield 'done', (result_dict, error_message, was_retried, speculation)
+        else:
+            yield event, payload
+
+class StrategyStats:
+    """Outcomes and latencies of the last `window` answered queries per code generation strategy."""
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._records: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, strategy: str, seconds: float, ok: bool, corrected: bool,
+               winner: Optional[int] = None) -> None:
+        with self._lock:
+            rows = self._records.setdefault(strategy, deque(maxlen=self.window))
+            rows.append({'seconds': seconds, 'ok': ok, 'corrected': corrected, 'winner': winner})
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Per strategy: queries, win_rate (answered at all), first_try_rate (answered
+        without a correction), p50/p95/mean seconds to the result and, for the
+        speculative strategy, how often each candidate won.
+        """
+        with self._lock:
+            records = {strategy: list(rows) for strategy, rows in self._records.items()}
+        report = {}
+        for strategy, rows in records.items():
+            seconds = [row['seconds'] for row in rows]
+            report[strategy] = {
+                'queries': len(rows),
+                'win_rate': sum(row['ok'] for row in rows) / len(rows),
+                'first_try_rate': sum(row['ok'] and not row['corrected'] for row in rows) / len(rows),
+                'p50_s': float(np.percentile(seconds, 50)),
+                'p95_s': float(np.percentile(seconds, 95)),
+                'mean_s': float(np.mean(seconds)),
+            }
+            winners = [row['winner'] for row in rows if row['winner'] is not None]
+            if winners:
+                report[strategy]['candidate_wins'] = {
+                    f"candidate {i + 1}": winners.count(i) for i in sorted(set(winners))
+                }
+        return report
+
+    def reset(self) -> None:
+        with self._lock:
+            self._records.clear()
+
+_stats = None
+_stats_lock = threading.Lock()
+
+def get_strategy_stats() -> StrategyStats:
+    """Process-wide strategy statistics (shared by all sessions and batch workers)."""
+    global _stats
+    with _stats_lock:
+        if _stats is None:
+            from config.settings import STRATEGY_STATS_WINDOW
+            _stats = StrategyStats(STRATEGY_STATS_WINDOW)
+        return _stats
@@ -0,0 +1,169 @@
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Dict, Any, Tuple, Optional
+
+import pandas as pd
+
+from src.execution.executor import CANCELLED_ERROR
+from src.execution.result_cache import get_result_cache
+from src.utils.helpers import hash_dataframe
+from src.utils.tracing import span
+
+_connection = None
+_connection_lock = threading.Lock()
+
+# dataset hash -> Arrow table of the frame (False if it can't be converted), most recent last
+_arrow_tables = OrderedDict()
+_arrow_lock = threading.Lock()
+
+def _get_connection():
+    """Shared in-memory DuckDB database; each query runs on its own cursor."""
+    global _connection
+    with _connection_lock:
+        if _connection is None:
+            import duckdb
+            from config.settings import DUCKDB_THREADS, EXECUTION_MEMORY_LIMIT_MB
+            connection = duckdb.connect(database=':memory:')
+            if DUCKDB_THREADS:
+                connection.execute(f"SET threads = {int(DUCKDB_THREADS)}")
+            if EXECUTION_MEMORY_LIMIT_MB:
+                connection.execute(f"SET memory_limit = '{int(EXECUTION_MEMORY_LIMIT_MB)}MB'")
+            # Generated SQL may only see the registered frame: no files, extensions or
+            # attached databases, and it can't switch that back on
+            connection.execute("SET enable_external_access = false")
+            connection.execute("SET lock_configuration = true")
+            _connection = connection
+        return _connection
+
+def _check_statement(cursor, sql: str) -> Optional[str]:
+    """Return an error message unless sql is exactly one SELECT statement."""
+    import duckdb
+    try:
+        statements = cursor.extract_statements(sql)
+    except duckdb.Error as e:
+        return f"{type(e).__name__}: {str(e)}"
+    if len(statements) != 1:
+        return f"ValueError: Expected a single SQL statement, got {len(statements)}"
+    if statements[0].type != duckdb.StatementType.SELECT:
+        return f"ValueError: Only SELECT queries are allowed, got {statements[0].type.name}"
+    return None
+
+def _as_arrow(df: pd.DataFrame):
+    """
+    Arrow table of df for DuckDB to scan, converted once per dataset.
+
+    DuckDB reads Arrow string columns natively but has to convert pandas
+    string/object columns value by value, which dominates query time on
+    large frames. The conversion copies every string column, so tables of
+    the DUCKDB_ARROW_CACHE_DATASETS most recently queried datasets are kept
+    (keyed by content hash, dropped with their frame). Falls back to the
+    frame itself for columns Arrow can't represent (mixed-type objects from
+    messy JSON).
+    """
+    from config.settings import DUCKDB_ARROW_CACHE_DATASETS
+    dataset_key = hash_dataframe(df)
+    with _arrow_lock:
+        table = _arrow_tables.get(dataset_key)
+        if table is not None:
+            _arrow_tables.move_to_end(dataset_key)
+            return table if table is not False else df
+    try:
+        import pyarrow as pa
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except Exception:
+        table = False
+    if DUCKDB_ARROW_CACHE_DATASETS > 0:
+        with _arrow_lock:
+            _arrow_tables[dataset_key] = table
+            while len(_arrow_tables) > DUCKDB_ARROW_CACHE_DATASETS:
+                _arrow_tables.popitem(last=False)
+        # No query can name a dataset whose frame is gone
+        weakref.finalize(df, _forget_arrow, dataset_key)
+    return table if table is not False else df
+
+def _forget_arrow(dataset_key: str) -> None:
+    with _arrow_lock:
+        _arrow_tables.pop(dataset_key, None)
+
+def execute_sql(sql: str, df: pd.DataFrame, timeout: Optional[float] = None,
+                use_cache: bool = True, cancel: Optional[threading.Event] = None) -> Tuple[Dict[str, Any], str]:
+    """
+    Run a generated SQL query with DuckDB over df (registered as table `df`).
+
+    DuckDB scans a cached Arrow copy of the frame and runs on all cores. The
+    result is returned like execute_code(): result_dict with 'result' (a
+    DataFrame, or a scalar for single-cell answers), 'fig' (always None; the
+    app charts the result), 'output' and 'analysis'.
+
+    Args:
+        timeout: Seconds before the query is interrupted; defaults to
+            EXECUTION_TIMEOUT_SECONDS.
+        use_cache: Serve and store successful results in the result cache.
+        cancel: Event that interrupts the running query when set.
+    """
+    with span('exec', engine='duckdb', rows=len(df), cached=use_cache) as exec_span:
+        result_dict, error_message = _execute_sql(sql, df, timeout, use_cache, cancel)
+        exec_span.set(error=error_message, result_cache_hit=bool(result_dict.get('result_cache_hit')))
+    return result_dict, error_message
+
+def _interrupt_when_due(cursor, finished: threading.Event, deadline: Optional[float],
+                        cancel: Optional[threading.Event]) -> None:
+    """Interrupt cursor once deadline (monotonic) passes or cancel is set, unless the query finished."""
+    while not finished.wait(0.05):
+        if (cancel is not None and cancel.is_set()) or (deadline is not None and time.monotonic() > deadline):
+            cursor.interrupt()
+            return
+
+def _execute_sql(sql: str, df: pd.DataFrame, timeout: Optional[float],
+                 use_cache: bool, cancel: Optional[threading.Event] = None) -> Tuple[Dict[str, Any], str]:
+    cache = get_result_cache() if use_cache else None
+    if cache is not None:
+        dataset_key = hash_dataframe(df)
+        cached = cache.get(dataset_key, sql)
+        if cached is not None:
+            return cached, None
+
+    if timeout is None:
+        from config.settings import EXECUTION_TIMEOUT_SECONDS
+        timeout = EXECUTION_TIMEOUT_SECONDS
+
+    result_dict = {'result': None, 'fig': None, 'output': '', 'analysis': None}
+    if cancel is not None and cancel.is_set():
+        return result_dict, CANCELLED_ERROR
+    cursor = _get_connection().cursor()
+    error_message = _check_statement(cursor, sql)
+    deadline = time.monotonic() + timeout if timeout and timeout > 0 else None
+    finished = threading.Event()
+    watcher = None
+    try:
+        if error_message is None:
+            cursor.register('df', _as_arrow(df))
+            if deadline is not None or cancel is not None:
+                watcher = threading.Thread(target=_interrupt_when_due, args=(cursor, finished, deadline, cancel),
+                                           daemon=True, name='dataspark-sql-watch')
+                watcher.start()
+            result = cursor.execute(sql).df()
+            if result.shape == (1, 1):
+                # Single number or label, shown like a pandas scalar result
+                value = result.iat[0, 0]
+                result = value.item() if hasattr(value, 'item') else value
+            result_dict['result'] = result
+    except Exception as e:
+        if 'interrupt' in str(e).lower() and cancel is not None and cancel.is_set():
+            error_message = CANCELLED_ERROR
+        elif 'interrupt' in str(e).lower() and deadline is not None and time.monotonic() > deadline:
+            error_message = f"TimeoutError: Query exceeded {timeout:.0f}s and was interrupted"
+        else:
+            # DuckDB's message already points at the offending SQL; a Python traceback adds nothing
+            error_message = f"{type(e).__name__}: {str(e)}"
+    finally:
+        finished.set()
+        if watcher is not None:
+            watcher.join()
+        cursor.close()
+
+    if cache is not None and not error_message:
+        cache.set(dataset_key, sql, result_dict)
+    return result_dict, error_message
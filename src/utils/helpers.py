@@ -1,6 +1,43 @@
-def format_dataframe_for_display(df, max_rows=100):
-    """Format dataframe for display, limiting rows."""
+import hashlib
+import threading
+import weakref
+
+def format_dataframe_for_display(df, max_rows=100, page=0):
+    """Format dataframe for display, limiting rows to one page (0-based) of max_rows."""
     if len(df) > max_rows:
-        return df.head(max_rows)
+        start = max(0, page) * max_rows
+        return df.iloc[start:start + max_rows]
     return df
 
+# id(df) -> (weakref to df, fingerprint); memoized so repeated queries don't rehash large frames
+_fingerprints = {}
+_fingerprints_lock = threading.Lock()
+
+def hash_dataframe(df) -> str:
+    """
+    Content hash of a DataFrame (values, index, column names and dtypes).
+
+    The hash is memoized per object, so frames must not be mutated in place
+    after they have been hashed.
+    """
+    import pandas as pd
+
+    with _fingerprints_lock:
+        cached = _fingerprints.get(id(df))
+        if cached is not None and cached[0]() is df:
+            return cached[1]
+
+    hasher = hashlib.sha256()
+    hasher.update(repr(list(zip(map(str, df.columns), map(str, df.dtypes)))).encode('utf-8'))
+    try:
+        row_hashes = pd.util.hash_pandas_object(df, index=True).values
+    except TypeError:
+        # Unhashable cells (lists/dicts from nested JSON); hash their string form instead
+        row_hashes = pd.util.hash_pandas_object(df.astype(str), index=True).values
+    hasher.update(row_hashes.tobytes())
+    fingerprint = hasher.hexdigest()
+
+    with _fingerprints_lock:
+        key = id(df)
+        _fingerprints[key] = (weakref.ref(df, lambda _ref, key=key: _fingerprints.pop(key, None)), fingerprint)
+    return fingerprint
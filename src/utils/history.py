@@ -0,0 +1,260 @@
+import io
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import uuid
+import weakref
+import zlib
+from typing import Any, Dict, Iterator, List, Optional
+
+# Heavy message fields managed by ChatHistory; everything else stays in the message dict
+PAYLOAD_KINDS = ('fig', 'result')
+
+class _Payload:
+    """
+    One figure or result of a message and where it currently lives.
+
+    state is 'live' (the object itself), 'compact' (compressed bytes in
+    memory), 'disk' (compressed bytes in a spill file) or 'evicted'.
+    """
+
+    def __init__(self, kind: str, obj: Any):
+        self.kind = kind
+        self.obj = obj
+        self.blob = None
+        self.format = None   # 'plotly-json', 'png' or 'pickle' once compacted
+        self.path = None
+        self.state = 'live'
+        self.nbytes = _estimate_size(obj)
+
+def _estimate_size(obj: Any) -> int:
+    """Approximate memory held by a live figure or result."""
+    if hasattr(obj, 'memory_usage') and hasattr(obj, 'columns'):
+        return int(obj.memory_usage(deep=True).sum())
+    if hasattr(obj, 'to_json'):
+        # Plotly figures are roughly as large as their JSON
+        return len(obj.to_json())
+    if hasattr(obj, 'savefig'):
+        # Matplotlib figure: canvas buffer at the default size
+        width, height = obj.get_size_inches() * obj.dpi
+        return int(width * height * 4)
+    try:
+        return len(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 0
+
+def _compact(payload: _Payload) -> bool:
+    """Replace the live object with compressed bytes; False if it can't be serialized."""
+    obj = payload.obj
+    try:
+        if payload.kind == 'fig' and hasattr(obj, 'to_json'):
+            raw, payload.format = obj.to_json().encode('utf-8'), 'plotly-json'
+        elif payload.kind == 'fig' and hasattr(obj, 'savefig'):
+            # Static thumbnail: matplotlib figures hold renderer state we don't want to keep
+            buffer = io.BytesIO()
+            obj.savefig(buffer, format='png', dpi=60, bbox_inches='tight')
+            raw, payload.format = buffer.getvalue(), 'png'
+            import matplotlib.pyplot as plt
+            plt.close(obj)
+        else:
+            raw, payload.format = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL), 'pickle'
+    except Exception:
+        return False
+    # PNG is already compressed
+    payload.blob = raw if payload.format == 'png' else zlib.compress(raw, 6)
+    payload.obj = None
+    payload.state = 'compact'
+    payload.nbytes = len(payload.blob)
+    return True
+
+def _restore(payload: _Payload, blob: bytes) -> Any:
+    if payload.format == 'png':
+        return blob
+    raw = zlib.decompress(blob)
+    if payload.format == 'plotly-json':
+        import plotly.io as pio
+        return pio.from_json(raw.decode('utf-8'))
+    return pickle.loads(raw)
+
+class ChatHistory:
+    """
+    Chat messages of one session with a memory budget for figures and results.
+
+    Messages are plain dicts as before; their 'fig' and 'result' fields are
+    held here instead. Only the newest live_messages keep live objects; older
+    figures become compressed Plotly JSON (matplotlib: PNG thumbnails) and
+    results compressed pickles. Once compacted payloads exceed max_bytes or
+    belong to messages beyond max_messages, the oldest are spilled to
+    spill_dir (up to max_disk_bytes) or evicted. load() brings them back on
+    demand, so old charts are only rebuilt when the user asks to see them.
+    """
+
+    def __init__(self, max_bytes: int, live_messages: int = 4, max_messages: int = 50,
+                 spill_dir: Optional[str] = None, max_disk_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.live_messages = live_messages
+        self.max_messages = max_messages
+        self.max_disk_bytes = max_disk_bytes
+        self.spill_dir = os.path.join(spill_dir, uuid.uuid4().hex) if spill_dir else None
+        self.evictions = 0
+        self.spills = 0
+        self._messages: List[Dict[str, Any]] = []
+        self._payloads: List[Dict[str, _Payload]] = []
+        self._lock = threading.RLock()
+        if self.spill_dir:
+            # Spill files go away with the session
+            weakref.finalize(self, shutil.rmtree, self.spill_dir, True)
+
+    def append(self, message: Dict[str, Any]) -> None:
+        message = dict(message)
+        payloads = {}
+        for kind in PAYLOAD_KINDS:
+            obj = message.pop(kind, None)
+            if obj is not None:
+                payloads[kind] = _Payload(kind, obj)
+        with self._lock:
+            self._messages.append(message)
+            self._payloads.append(payloads)
+            self._enforce()
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(list(self._messages))
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        return self._messages[index]
+
+    def state(self, index: int, kind: str) -> Optional[str]:
+        """'live', 'compact', 'disk', 'evicted', or None if the message has no such payload."""
+        payload = self._payloads[index].get(kind)
+        return payload.state if payload is not None else None
+
+    def format(self, index: int, kind: str) -> Optional[str]:
+        payload = self._payloads[index].get(kind)
+        return payload.format if payload is not None else None
+
+    def load(self, index: int, kind: str) -> Any:
+        """
+        The figure or result of a message, rebuilt from its compact form if needed.
+
+        PNG thumbnails come back as bytes. Returns None once evicted. Loading
+        doesn't make the payload live again, so the budget holds.
+        """
+        with self._lock:
+            payload = self._payloads[index].get(kind)
+            if payload is None or payload.state == 'evicted':
+                return None
+            if payload.state == 'live':
+                return payload.obj
+            blob, path = payload.blob, payload.path
+        if blob is None:
+            try:
+                with open(path, 'rb') as f:
+                    blob = f.read()
+            except OSError:
+                with self._lock:
+                    self._evict(payload)
+                return None
+        return _restore(payload, blob)
+
+    def clear(self) -> None:
+        with self._lock:
+            for payloads in self._payloads:
+                for payload in payloads.values():
+                    self._evict(payload)
+            self._messages.clear()
+            self._payloads.clear()
+            self.evictions = 0
+
+    def _enforce(self) -> None:
+        """Compact, spill and evict until the newest messages fit the budget."""
+        with_payloads = [i for i, payloads in enumerate(self._payloads) if payloads]
+        # Only the newest live_messages keep live objects
+        for i in with_payloads[:max(0, len(with_payloads) - self.live_messages)]:
+            for payload in self._payloads[i].values():
+                if payload.state == 'live' and not _compact(payload):
+                    self._evict(payload)
+
+        # Oldest first: beyond max_messages, or while memory is over budget, move to
+        # disk; the newest message stays in memory so it can be shown right away
+        in_memory = [i for i in with_payloads[:-1]
+                     if any(p.state in ('live', 'compact') for p in self._payloads[i].values())]
+        for position, i in enumerate(in_memory):
+            over_count = len(in_memory) + 1 - position > self.max_messages
+            if not over_count and self.memory_bytes() <= self.max_bytes:
+                break
+            for payload in self._payloads[i].values():
+                if payload.state == 'live' and not _compact(payload):
+                    self._evict(payload)
+                if payload.state == 'compact':
+                    self._spill(payload)
+
+    def _spill(self, payload: _Payload) -> None:
+        if not self.spill_dir or payload.nbytes > self.max_disk_bytes:
+            self._evict(payload)
+            return
+        path = os.path.join(self.spill_dir, f"{uuid.uuid4().hex}.bin")
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(payload.blob)
+        except OSError:
+            self._evict(payload)
+            return
+        payload.path, payload.blob, payload.state = path, None, 'disk'
+        self.spills += 1
+        # Oldest spill files go first once the disk budget is exceeded
+        while self.disk_bytes() > self.max_disk_bytes:
+            oldest = next(p for payloads in self._payloads for p in payloads.values() if p.state == 'disk')
+            self._evict(oldest)
+
+    def _evict(self, payload: _Payload) -> None:
+        if payload.path:
+            try:
+                os.remove(payload.path)
+            except OSError:
+                pass
+        payload.obj = payload.blob = payload.path = None
+        payload.nbytes = 0
+        if payload.state != 'evicted':
+            self.evictions += 1
+        payload.state = 'evicted'
+
+    def memory_bytes(self) -> int:
+        return sum(p.nbytes for payloads in self._payloads for p in payloads.values()
+                   if p.state in ('live', 'compact'))
+
+    def disk_bytes(self) -> int:
+        return sum(p.nbytes for payloads in self._payloads for p in payloads.values() if p.state == 'disk')
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            states = [p.state for payloads in self._payloads for p in payloads.values()]
+            return {
+                'messages': len(self._messages),
+                'memory_bytes': self.memory_bytes(),
+                'max_bytes': self.max_bytes,
+                'disk_bytes': self.disk_bytes(),
+                'live': states.count('live'),
+                'compact': states.count('compact'),
+                'spilled': states.count('disk'),
+                'evicted': states.count('evicted'),
+                'spills': self.spills,
+            }
+
+def new_chat_history() -> ChatHistory:
+    """A ChatHistory configured from settings, one per Streamlit session."""
+    from config.settings import (
+        HISTORY_MAX_MB, HISTORY_LIVE_MESSAGES, HISTORY_MAX_MESSAGES, HISTORY_SPILL_DIR, HISTORY_DISK_MB
+    )
+    return ChatHistory(
+        max_bytes=int(HISTORY_MAX_MB * 1024 * 1024),
+        live_messages=HISTORY_LIVE_MESSAGES,
+        max_messages=HISTORY_MAX_MESSAGES,
+        spill_dir=HISTORY_SPILL_DIR,
+        max_disk_bytes=int(HISTORY_DISK_MB * 1024 * 1024),
+    )
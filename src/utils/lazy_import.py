@@ -0,0 +1,50 @@
+import importlib
+import threading
+import types
+from typing import Iterable
+
+class LazyModule(types.ModuleType):
+    """
+    Module proxy that imports the real module on first attribute access,
+    so heavy libraries only cost import time when something actually uses them.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__['_lazy_module'] = None
+        self.__dict__['_lazy_lock'] = threading.Lock()
+
+    def _load(self) -> types.ModuleType:
+        module = self.__dict__['_lazy_module']
+        if module is None:
+            with self.__dict__['_lazy_lock']:
+                module = self.__dict__['_lazy_module']
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__['_lazy_module'] = module
+        return module
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.__dict__['_lazy_module'] is not None
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        state = 'loaded' if self.is_loaded else 'not loaded'
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+def resolve(value):
+    """Return the real module behind a LazyModule (other values unchanged)."""
+    if isinstance(value, LazyModule):
+        return value._load()
+    return value
+
+def preload(modules: Iterable[LazyModule]) -> None:
+    """Import the given lazy modules now (e.g. from a background warm-up thread)."""
+    for module in modules:
+        module._load()
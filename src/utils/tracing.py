@@ -0,0 +1,369 @@
+"""
+Spans for the stages of a query, exported as JSON logs and Prometheus metrics.
+
+    with span('exec', rows=len(df)) as s:
+        ...
+        s.set(error=error_message)
+
+Every span records wall time, CPU time of the thread running it, the change
+in resident memory and in the process' peak RSS, plus attributes such as rows
+touched and prompt/response tokens (add_to_current() lets LLM calls add to
+whichever stage span they run under). Spans opened inside another span become
+its children; bind() carries the current span into worker threads.
+
+Finished spans go to an in-memory ring buffer (trace_spans()), to the JSON
+log configured by TRACE_LOG and to per-stage histograms and counters labelled
+by query class, served in Prometheus text format by start_metrics_server() or
+written with write_metrics_file().
+"""
+import contextvars
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# Histogram buckets for stage wall time, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Numeric attributes summed into counters, by metric name
+_COUNTED_ATTRIBUTES = {
+    'rows': 'dataspark_stage_rows_total',
+    'prompt_tokens': 'dataspark_llm_prompt_tokens_total',
+    'response_tokens': 'dataspark_llm_response_tokens_total',
+}
+
+_current: contextvars.ContextVar = contextvars.ContextVar('dataspark_span', default=None)
+
+def _rss_bytes() -> Optional[int]:
+    """Current resident set size (Linux /proc), or None elsewhere."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+def _peak_rss_bytes() -> Optional[int]:
+    try:
+        import resource
+        import sys
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def classify_query(user_query: str) -> str:
+    """Coarse question class for metric labels: trend, top_n, aggregate, filter, chart or other."""
+    text = user_query.lower()
+    if re.search(r'\b(trend|over time|per (day|week|month|year)|by (day|week|month|year|date)|daily|weekly|monthly|yearly)\b', text):
+        return 'trend'
+    if re.search(r'\b(top|bottom|highest|lowest|largest|smallest|most|least|best|worst|rank)\b', text):
+        return 'top_n'
+    if re.search(r'\b(total|sum|average|avg|mean|median|count|how many|how much|by|per|each)\b', text):
+        return 'aggregate'
+    if re.search(r'\b(where|which|show|list|filter|only|with)\b', text):
+        return 'filter'
+    if re.search(r'\b(plot|chart|graph|visuali[sz]e|distribution|histogram)\b', text):
+        return 'chart'
+    return 'other'
+
+class Span:
+    """One timed stage; attributes are set while it runs and exported when it ends."""
+
+    def __init__(self, name: str, parent: Optional['Span'], attributes: Dict[str, Any]):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:16]
+        self.root = parent.root if parent is not None else self
+        self.attributes = dict(attributes)
+        self.error = None
+        self._lock = threading.Lock()
+        self._started_at = time.time()
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        self._rss = _rss_bytes()
+        self._peak = _peak_rss_bytes()
+
+    def set(self, **attributes) -> None:
+        """Set attributes; error= marks the stage failed without raising."""
+        with self._lock:
+            if 'error' in attributes:
+                self.error = attributes.pop('error')
+            self.attributes.update(attributes)
+
+    def add(self, **amounts) -> None:
+        """Add to numeric attributes (e.g. tokens of several LLM calls under one stage)."""
+        with self._lock:
+            for key, amount in amounts.items():
+                self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    @property
+    def query_class(self) -> str:
+        return self.root.attributes.get('query_class', 'none')
+
+    def finish(self) -> Dict[str, Any]:
+        rss, peak = _rss_bytes(), _peak_rss_bytes()
+        with self._lock:
+            attributes = dict(self.attributes)
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent.span_id if self.parent is not None else None,
+            'name': self.name,
+            'query_class': self.query_class,
+            'start': self._started_at,
+            'wall_s': time.perf_counter() - self._wall,
+            'cpu_s': time.thread_time() - self._cpu,
+            'rss_delta_mb': (rss - self._rss) / 1024**2 if rss is not None and self._rss is not None else None,
+            'peak_rss_delta_mb': (peak - self._peak) / 1024**2 if peak is not None and self._peak is not None else None,
+            'error': self.error,
+            'attributes': attributes,
+        }
+
+class _NoopSpan:
+    """Stand-in when tracing is disabled."""
+    trace_id = None
+    span_id = None
+    attributes: Dict[str, Any] = {}
+
+    def set(self, **attributes) -> None:
+        pass
+
+    def add(self, **amounts) -> None:
+        pass
+
+_NOOP = _NoopSpan()
+
+class MetricsRegistry:
+    """Per (stage, query class) latency histograms and counters of finished spans."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._series: Dict[tuple, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, record: Dict[str, Any]) -> None:
+        key = (record['name'], record['query_class'])
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {
+                    'buckets': [0] * len(self.buckets), 'count': 0, 'sum': 0.0, 'cpu': 0.0,
+                    'errors': 0, 'peak_rss_delta_max': 0.0, 'counters': {},
+                }
+            series['count'] += 1
+            series['sum'] += record['wall_s']
+            series['cpu'] += record['cpu_s']
+            for i, bound in enumerate(self.buckets):
+                if record['wall_s'] <= bound:
+                    series['buckets'][i] += 1
+            if record['error']:
+                series['errors'] += 1
+            if record['peak_rss_delta_mb']:
+                series['peak_rss_delta_max'] = max(series['peak_rss_delta_max'], record['peak_rss_delta_mb'] * 1024**2)
+            for attribute, metric in _COUNTED_ATTRIBUTES.items():
+                value = record['attributes'].get(attribute)
+                if isinstance(value, (int, float)):
+                    series['counters'][metric] = series['counters'].get(metric, 0) + value
+
+    def render(self) -> str:
+        """All series in the Prometheus text exposition format."""
+        with self._lock:
+            series = {key: dict(value, buckets=list(value['buckets']), counters=dict(value['counters']))
+                      for key, value in sorted(self._series.items())}
+        lines = [
+            '# HELP dataspark_stage_seconds Wall time of a query stage.',
+            '# TYPE dataspark_stage_seconds histogram',
+        ]
+        for (stage, query_class), values in series.items():
+            labels = f'stage="{stage}",query_class="{query_class}"'
+            for bound, count in zip(self.buckets, values['buckets']):
+                lines.append(f'dataspark_stage_seconds_bucket{{{labels},le="{bound:g}"}} {count}')
+            lines.append(f'dataspark_stage_seconds_bucket{{{labels},le="+Inf"}} {values["count"]}')
+            lines.append(f'dataspark_stage_seconds_sum{{{labels}}} {values["sum"]:.6f}')
+            lines.append(f'dataspark_stage_seconds_count{{{labels}}} {values["count"]}')
+        simple = [
+            ('dataspark_stage_cpu_seconds_total', 'counter', 'CPU time of the thread running a stage.',
+             lambda values: f"{values['cpu']:.6f}"),
+            ('dataspark_stage_errors_total', 'counter', 'Stages that ended with an error.',
+             lambda values: str(values['errors'])),
+            ('dataspark_stage_peak_rss_delta_bytes_max', 'gauge', 'Largest growth of peak RSS during a stage.',
+             lambda values: f"{values['peak_rss_delta_max']:.0f}"),
+        ]
+        for name, kind, help_text, value in simple:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+            for (stage, query_class), values in series.items():
+                lines.append(f'{name}{{stage="{stage}",query_class="{query_class}"}} {value(values)}')
+        for metric in _COUNTED_ATTRIBUTES.values():
+            rows = [(key, values['counters'][metric]) for key, values in series.items() if metric in values['counters']]
+            if rows:
+                lines.append(f'# TYPE {metric} counter')
+                for (stage, query_class), total in rows:
+                    lines.append(f'{metric}{{stage="{stage}",query_class="{query_class}"}} {total:g}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per stage (all query classes): count, mean seconds and errors."""
+        with self._lock:
+            report: Dict[str, Dict[str, float]] = {}
+            for (stage, _), values in self._series.items():
+                row = report.setdefault(stage, {'count': 0, 'seconds': 0.0, 'errors': 0})
+                row['count'] += values['count']
+                row['seconds'] += values['sum']
+                row['errors'] += values['errors']
+        for row in report.values():
+            row['mean_s'] = row['seconds'] / row['count'] if row['count'] else 0.0
+        return report
+
+class Tracer:
+    """Exports finished spans to the ring buffer, JSON log and metrics."""
+
+    def __init__(self, enabled: bool = True, log_target: str = '', buffer_spans: int = 2000):
+        self.enabled = enabled
+        self.metrics = MetricsRegistry()
+        self._recent = deque(maxlen=buffer_spans)
+        self._logger = _make_logger(log_target) if log_target else None
+
+    def export(self, record: Dict[str, Any]) -> None:
+        self._recent.append(record)
+        self.metrics.observe(record)
+        if self._logger is not None:
+            self._logger.info(json.dumps(record, default=str))
+
+    def trace_spans(self, trace_id: str) -> List[Dict[str, Any]]:
+        return [record for record in list(self._recent) if record['trace_id'] == trace_id]
+
+    def recent(self, limit: int = 100) -> List[Dict[str, Any]]:
+        return list(self._recent)[-limit:]
+
+def _make_logger(target: str) -> logging.Logger:
+    """JSON lines to stdout, stderr or a file."""
+    import sys
+    logger = logging.getLogger('dataspark.trace')
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    if not logger.handlers:
+        if target in ('stdout', 'stderr'):
+            handler = logging.StreamHandler(sys.stdout if target == 'stdout' else sys.stderr)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+            handler = logging.FileHandler(target, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+    return logger
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+def get_tracer() -> Tracer:
+    """Return the process-wide tracer configured in settings."""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            from config.settings import TRACING_ENABLED, TRACE_LOG, TRACE_BUFFER_SPANS
+            _tracer = Tracer(TRACING_ENABLED, TRACE_LOG, TRACE_BUFFER_SPANS)
+        return _tracer
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span]:
+    """Time a stage as a child of the current span (a new trace if there is none)."""
+    tracer = get_tracer()
+    if not tracer.enabled:
+        yield _NOOP
+        return
+    current = Span(name, _current.get(), attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except GeneratorExit:
+        # The consumer stopped iterating a generator that held the span
+        current.set(abandoned=True)
+        raise
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        tracer.export(current.finish())
+        try:
+            _current.reset(token)
+        except ValueError:
+            # Closed from another context (e.g. a generator finished elsewhere)
+            _current.set(current.parent)
+
+def current_span():
+    """The innermost open span, or a no-op span."""
+    return _current.get() or _NOOP
+
+def add_to_current(**amounts) -> None:
+    """Add numeric attributes (e.g. prompt_tokens) to the innermost open span."""
+    current_span().add(**amounts)
+
+def bind(fn: Callable) -> Callable:
+    """fn running under the current span when called from another thread."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+def trace_spans(trace_id: Optional[str]) -> List[Dict[str, Any]]:
+    """Finished spans of one trace, oldest first."""
+    return get_tracer().trace_spans(trace_id) if trace_id else []
+
+def describe_trace(spans: List[Dict[str, Any]]) -> Optional[str]:
+    """One-line caption of stage spans: wall (CPU) time, slowest first."""
+    parts = []
+    for record in sorted(spans, key=lambda r: -r['wall_s']):
+        text = f"{record['name']} {record['wall_s']:.2f}s (cpu {record['cpu_s']:.2f}s)"
+        if record['error']:
+            text += " ✗"
+        parts.append(text)
+    return " · ".join(parts) or None
+
+def render_metrics() -> str:
+    return get_tracer().metrics.render()
+
+def write_metrics_file(path: str) -> None:
+    """Write the metrics atomically, e.g. for node_exporter's textfile collector."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(render_metrics())
+    os.replace(path + '.tmp', path)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.startswith('/metrics'):
+            body, content_type = render_metrics(), 'text/plain; version=0.0.4'
+        elif self.path.startswith('/traces'):
+            body, content_type = json.dumps(get_tracer().recent(), default=str), 'application/json'
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        data = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+_server = None
+_server_lock = threading.Lock()
+
+def start_metrics_server(port: int) -> ThreadingHTTPServer:
+    """Serve /metrics (Prometheus text) and /traces (recent spans) in a background thread, once per process."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            server = ThreadingHTTPServer(('0.0.0.0', port), _MetricsHandler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name='dataspark-metrics', daemon=True).start()
+            _server = server
+        return _server
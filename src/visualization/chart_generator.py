@@ -1,7 +1,11 @@
-import plotly.graph_objects as go
-import plotly.express as px
 import pandas as pd
 from typing import Any
+from src.utils.lazy_import import LazyModule
+from src.visualization.rendering import downsample_series, top_n_with_other
+from src.utils.tracing import span
+
+# Loaded on the first chart rather than at app start
+px = LazyModule('plotly.express')
 
 def should_visualize(result: Any) -> bool:
     """Determine if result should be visualized."""
@@ -13,24 +17,54 @@ def should_visualize(result: Any) -> bool:
         return False
     return True
 
-def create_chart(result: Any, chart_type: str = 'auto') -> go.Figure:
-    """Create appropriate chart based on result."""
+def create_chart(result: Any, chart_type: str = 'auto') -> 'go.Figure':
+    """
+    Create appropriate chart based on result.
+    
+    Large results are reduced before plotting: lines are downsampled to
+    CHART_MAX_POINTS and drawn with WebGL, bars and pies keep the top
+    CHART_MAX_CATEGORIES with the rest grouped as "Other". What was dropped is
+    recorded in fig.layout.meta['render'] for render_figure().
+    """
     if isinstance(result, pd.DataFrame):
         if chart_type == 'auto':
             # Auto-detect chart type
-            if len(result.columns) == 2:
-                # Likely category-value pair
-                return px.bar(result, x=result.columns[0], y=result.columns[1])
-            elif 'date' in str(result.columns[0]).lower() or 'time' in str(result.columns[0]).lower():
-                return px.line(result, x=result.columns[0], y=result.columns[1])
+            first = result.columns[0]
+            if ('date' in str(first).lower() or 'time' in str(first).lower()
+                    or pd.api.types.is_datetime64_any_dtype(result[first])):
+                # Time series, also as a two-column pair: top-N bars would hide the trend
+                chart_type = 'line'
             else:
-                return px.bar(result, x=result.columns[0], y=result.columns[1])
-        elif chart_type == 'bar':
-            return px.bar(result, x=result.columns[0], y=result.columns[1])
-        elif chart_type == 'line':
-            return px.line(result, x=result.columns[0], y=result.columns[1])
-        elif chart_type == 'pie':
-            return px.pie(result, names=result.columns[0], values=result.columns[1])
+                # Likely category-value pair
+                chart_type = 'bar'
+        if chart_type in ('bar', 'line', 'pie'):
+            with span('chart', chart_type=chart_type, rows=len(result)):
+                return _bounded_chart(result, chart_type)
     
     return None
 
+def _bounded_chart(result: pd.DataFrame, chart_type: str) -> 'go.Figure':
+    """Plot the first two columns as chart_type on at most a screenful of data."""
+    from config.settings import (
+        CHART_MAX_POINTS, CHART_DOWNSAMPLE_METHOD, CHART_MAX_CATEGORIES, CHART_WEBGL_MIN_POINTS
+    )
+    x, y = result.columns[0], result.columns[1]
+    render = {'points_dropped': 0, 'categories_merged': 0, 'categories_dropped': 0, 'method': None}
+    if chart_type == 'line':
+        data, dropped = downsample_series(result, x, y, CHART_MAX_POINTS, CHART_DOWNSAMPLE_METHOD)
+        render['points_dropped'] = dropped
+        render['method'] = CHART_DOWNSAMPLE_METHOD if dropped else None
+        webgl = len(data) > CHART_WEBGL_MIN_POINTS
+        fig = px.line(data, x=x, y=y, render_mode='webgl' if webgl else 'auto')
+    else:
+        # Pies get unreadable long before bars do
+        limit = CHART_MAX_CATEGORIES if chart_type == 'bar' else min(10, CHART_MAX_CATEGORIES)
+        data, merged, dropped = top_n_with_other(result, x, y, limit)
+        render['categories_merged'] = merged
+        render['categories_dropped'] = dropped
+        if chart_type == 'bar':
+            fig = px.bar(data, x=x, y=y)
+        else:
+            fig = px.pie(data, names=x, values=y)
+    fig.update_layout(meta={'render': render})
+    return fig
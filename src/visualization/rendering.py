@@ -0,0 +1,427 @@
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.utils.lazy_import import LazyModule
+from src.utils.tracing import span
+
+go = LazyModule('plotly.graph_objects')
+
+# Per-point trace attributes that have to be subset along with x and y
+_POINT_ARRAYS = ('text', 'hovertext', 'customdata', 'ids')
+_MARKER_ARRAYS = ('color', 'size', 'symbol', 'opacity')
+
+def _numeric_axis(values) -> np.ndarray:
+    """x values as floats for bucketing; positions when they aren't numbers or dates."""
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ns]').astype(np.int64).astype(float)
+    if np.issubdtype(values.dtype, np.number):
+        return values.astype(float)
+    try:
+        return pd.to_datetime(values).asi8.astype(float)
+    except (ValueError, TypeError):
+        # Category labels, periods as strings, ...: keep the drawing order
+        return np.arange(len(values), dtype=float)
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: indices of threshold points that keep the visual shape.
+
+    The first and last points are always kept; from every bucket in between the
+    point forming the largest triangle with the previous pick and the average of
+    the next bucket is chosen. NaN y values are skipped.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    valid = ~np.isnan(y)
+    if not valid.all():
+        kept = np.flatnonzero(valid)
+        return kept[lttb_indices(x[valid], y[valid], threshold)]
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    picked = np.empty(threshold, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        next_start, next_end = end, (edges[i + 2] if i + 2 < len(edges) else n)
+        next_x = x[next_start:max(next_end, next_start + 1)].mean()
+        next_y = y[next_start:max(next_end, next_start + 1)].mean()
+        bucket_x, bucket_y = x[start:end], y[start:end]
+        area = np.abs((x[previous] - next_x) * (bucket_y - y[previous])
+                      - (x[previous] - bucket_x) * (next_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        picked[i + 1] = previous
+    return picked
+
+def minmax_indices(y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices of the min and max of each of threshold // 2 buckets (keeps spikes exactly)."""
+    n = len(y)
+    buckets = threshold // 2
+    if threshold >= n or buckets < 1:
+        return np.arange(n)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    picked = set()
+    for start, end in zip(edges[:-1], edges[1:]):
+        bucket = y[start:end]
+        if len(bucket) == 0 or np.isnan(bucket).all():
+            continue
+        picked.add(start + int(np.nanargmin(bucket)))
+        picked.add(start + int(np.nanargmax(bucket)))
+    return np.array(sorted(picked), dtype=np.int64)
+
+def downsample_indices(x, y, max_points: int, method: str = 'lttb') -> np.ndarray:
+    """Indices to keep when drawing the (x, y) series with at most max_points points."""
+    y = pd.to_numeric(pd.Series(np.asarray(y)), errors='coerce').to_numpy(dtype=float)
+    if method == 'minmax':
+        return minmax_indices(y, max_points)
+    if method != 'lttb':
+        raise ValueError(f"Unsupported downsampling method: {method}")
+    return lttb_indices(_numeric_axis(x), y, max_points)
+
+def downsample_series(df: pd.DataFrame, x: str, y: str, max_points: int,
+                      method: str = 'lttb') -> Tuple[pd.DataFrame, int]:
+    """Rows of a line chart's frame to draw; returns (frame, dropped point count)."""
+    if len(df) <= max_points:
+        return df, 0
+    if pd.api.types.is_numeric_dtype(df[x]) or pd.api.types.is_datetime64_any_dtype(df[x]):
+        # A line is drawn in x order; bucketing unsorted x would mix distant points
+        df = df.sort_values(x, kind='stable')
+    keep = downsample_indices(df[x].to_numpy(), df[y].to_numpy(), max_points, method)
+    return df.iloc[keep], len(df) - len(keep)
+
+def top_totals(totals: pd.Series, n: int, other_label: str = 'Other') -> Tuple[pd.Series, int]:
+    """The n - 1 largest totals plus the sum of the rest as other_label; returns (totals, merged count)."""
+    if len(totals) <= n:
+        return totals, 0
+    top = totals.nlargest(n - 1)
+    rest = totals.drop(top.index)
+    reduced = pd.Series(np.append(top.to_numpy(), rest.sum()),
+                        index=[str(name) for name in top.index] + [other_label])
+    return reduced, len(rest)
+
+def top_n_with_other(df: pd.DataFrame, label: str, value: str, n: int,
+                     other_label: str = 'Other') -> Tuple[pd.DataFrame, int, int]:
+    """
+    Keep the n - 1 largest categories and sum the rest into an "Other" row.
+
+    Returns (frame, categories merged into Other, categories dropped). A value
+    column that isn't numeric can't be summed, so those frames are cut to
+    their first n rows and the rest is reported as dropped.
+    """
+    if len(df) <= n:
+        return df, 0, 0
+    if not pd.api.types.is_numeric_dtype(df[value]):
+        return df.head(n), 0, len(df) - n
+    totals = df.groupby(label, sort=False, observed=True, dropna=False)[value].sum()
+    reduced, merged = top_totals(totals, n, other_label)
+    if not merged:
+        return totals.reset_index(), 0, 0
+    return pd.DataFrame({label: reduced.index, value: reduced.to_numpy()}), merged, 0
+
+def _subset_trace(trace, keep: np.ndarray, length: int) -> Dict[str, Any]:
+    """Plotly JSON of trace with every per-point array reduced to keep."""
+    spec = trace.to_plotly_json()
+    spec.pop('type', None)
+    for key in ('x', 'y') + _POINT_ARRAYS:
+        values = spec.get(key)
+        if values is not None and not isinstance(values, str) and np.ndim(values) == 1 and len(values) == length:
+            spec[key] = np.asarray(values)[keep]
+    marker = spec.get('marker')
+    if isinstance(marker, dict):
+        for key in _MARKER_ARRAYS:
+            values = marker.get(key)
+            if values is not None and not isinstance(values, str) and np.ndim(values) == 1 and len(values) == length:
+                marker[key] = np.asarray(values)[keep]
+    return spec
+
+def _to_webgl(spec: Dict[str, Any]):
+    """Scattergl trace from a scatter trace spec, or None if it uses SVG-only features."""
+    try:
+        return go.Scattergl(spec)
+    except ValueError:
+        # e.g. line.shape='spline' or fill modes Scattergl doesn't support
+        return None
+
+def _without_point_arrays(trace, length: int) -> Dict[str, Any]:
+    """Plotly JSON of trace without its per-point arrays (they don't survive regrouping)."""
+    spec = trace.to_plotly_json()
+    spec.pop('type', None)
+    for container in (spec, spec.get('marker') if isinstance(spec.get('marker'), dict) else {}):
+        for key, values in list(container.items()):
+            if not isinstance(values, (str, dict)) and np.ndim(values) == 1 and len(values) == length:
+                del container[key]
+    return spec
+
+def _is_axis_like(values: np.ndarray) -> bool:
+    return np.issubdtype(values.dtype, np.number) or np.issubdtype(values.dtype, np.datetime64)
+
+def _bound_bar(trace, length: int, max_categories: int, max_points: int, method: str):
+    """
+    Reduced copy of a long bar trace, or None if it can't be reduced.
+
+    Bars over a numeric or date axis are bucketed like lines; category bars
+    keep the top max_categories with the rest summed into "Other".
+    Returns (trace, bars drawn, categories merged, bars dropped).
+    """
+    horizontal = trace.orientation == 'h'
+    labels, values = (trace.y, trace.x) if horizontal else (trace.x, trace.y)
+    if labels is None or values is None:
+        return None
+    labels = np.asarray(labels)
+    if _is_axis_like(labels):
+        if length <= max_points:
+            return None
+        # Bucket in axis order; the bars are placed by position anyway
+        order = np.argsort(labels, kind='stable')
+        keep = np.sort(order[downsample_indices(labels[order], np.asarray(values)[order], max_points, method)])
+        return go.Bar(_subset_trace(trace, keep, length)), len(keep), 0, length - len(keep)
+    values = pd.to_numeric(pd.Series(np.asarray(values)), errors='coerce')
+    totals, merged = top_totals(values.groupby(labels, sort=False, dropna=False).sum(), max_categories)
+    spec = _without_point_arrays(trace, length)
+    label_key, value_key = ('y', 'x') if horizontal else ('x', 'y')
+    spec[label_key], spec[value_key] = totals.index.astype(str).to_numpy(), totals.to_numpy()
+    return go.Bar(spec), len(totals), merged, 0
+
+def _bound_pie(trace, length: int, max_categories: int):
+    """Copy of a pie trace with the top max_categories slices and an "Other" slice (see _bound_bar())."""
+    if trace.labels is None:
+        return None
+    labels = np.asarray(trace.labels)
+    if trace.values is None:
+        totals = pd.Series(labels).value_counts(sort=False, dropna=False)
+    else:
+        values = pd.to_numeric(pd.Series(np.asarray(trace.values)), errors='coerce')
+        totals = values.groupby(labels, sort=False, dropna=False).sum()
+    totals, merged = top_totals(totals, max_categories)
+    spec = _without_point_arrays(trace, length)
+    spec['labels'], spec['values'] = totals.index.astype(str).to_numpy(), totals.to_numpy()
+    return go.Pie(spec), len(totals), merged, 0
+
+# Histogram attributes that still apply to the bars replacing it
+_HISTOGRAM_KEPT = ('name', 'legendgroup', 'showlegend', 'opacity', 'offsetgroup', 'alignmentgroup',
+                   'xaxis', 'yaxis', 'visible')
+
+def _histogram_samples(trace) -> Tuple[Optional[pd.Series], Optional[pd.Series], bool]:
+    """(binned values, values aggregated per bin or None, horizontal) of a histogram trace."""
+    horizontal = trace.orientation == 'h' or trace.x is None
+    samples, weights = (trace.y, trace.x) if horizontal else (trace.x, trace.y)
+    if samples is None:
+        return None, None, horizontal
+    weights = None if weights is None else pd.to_numeric(pd.Series(np.asarray(weights)), errors='coerce')
+    return pd.Series(np.asarray(samples)), weights, horizontal
+
+def _histogram_range(traces) -> Optional[Tuple[float, float, int]]:
+    """Common (min, max, sample count) of the numeric histogram traces, so they share bins."""
+    low, high, count = np.inf, -np.inf, 0
+    for trace in traces:
+        samples, _, _ = _histogram_samples(trace)
+        if samples is None or not _is_axis_like(samples.to_numpy()):
+            continue
+        numbers = _bin_axis(samples)
+        if len(numbers):
+            low, high, count = min(low, numbers.min()), max(high, numbers.max()), count + len(numbers)
+    return (low, high, count) if count else None
+
+def _bin_axis(samples: pd.Series) -> np.ndarray:
+    """Non-missing samples as floats (nanoseconds for dates)."""
+    samples = samples.dropna()
+    if pd.api.types.is_datetime64_any_dtype(samples):
+        return samples.astype('datetime64[ns]').astype(np.int64).to_numpy(dtype=float)
+    return samples.to_numpy(dtype=float)
+
+def _bin_histogram(trace, bounds: Optional[Tuple[float, float, int]], max_bins: int, max_categories: int):
+    """
+    The bars a histogram trace draws, computed here instead of in the browser.
+
+    Numeric and date samples are binned into nbinsx/nbinsy bins (Sturges'
+    rule by default) over the range shared by all histograms of the figure;
+    category samples keep the top max_categories. histfunc 'count', 'sum'
+    and 'avg', histnorm and cumulative are applied as Plotly would. Returns
+    (trace, bars drawn, categories merged, 0), or None for other histfuncs.
+    """
+    histfunc = trace.histfunc or 'count'
+    samples, weights, horizontal = _histogram_samples(trace)
+    if samples is None or histfunc not in ('count', 'sum', 'avg'):
+        return None
+    if weights is not None and len(weights) != len(samples):
+        return None
+    if histfunc == 'count':
+        weights = None
+    merged = 0
+    width = None
+    if _is_axis_like(samples.to_numpy()) and bounds is not None:
+        is_date = pd.api.types.is_datetime64_any_dtype(samples)
+        present = samples.notna().to_numpy()
+        numbers = _bin_axis(samples)
+        low, high, count = bounds
+        bins = (trace.nbinsy if horizontal else trace.nbinsx) or int(np.ceil(np.log2(count))) + 1
+        edges = np.linspace(low, high if high > low else low + 1, min(bins, max_bins) + 1)
+        counts = np.histogram(numbers, edges)[0].astype(float)
+        if weights is None:
+            heights = counts
+        else:
+            heights = np.histogram(numbers, edges, weights=weights[present].fillna(0).to_numpy())[0]
+            if histfunc == 'avg':
+                heights = np.divide(heights, counts, out=np.full_like(heights, np.nan), where=counts > 0)
+        positions = (edges[:-1] + edges[1:]) / 2
+        width = np.diff(edges)
+        if is_date:
+            positions = positions.astype('datetime64[ns]')
+            # Widths on a date axis are in milliseconds
+            width = width / 1e6
+    else:
+        if weights is None:
+            totals = samples.value_counts(sort=False, dropna=False).astype(float)
+        elif histfunc == 'sum':
+            totals = weights.groupby(samples.to_numpy(), sort=False, dropna=False).sum()
+        else:
+            # An average over "Other" isn't the sum of averages
+            return None
+        totals, merged = top_totals(totals, max_categories)
+        positions, heights = totals.index.astype(str).to_numpy(), totals.to_numpy()
+
+    norm = trace.histnorm or ''
+    if 'probability' in norm or norm == 'percent':
+        heights = heights / (np.nansum(heights) or 1) * (100 if norm == 'percent' else 1)
+    if 'density' in norm and width is not None:
+        heights = heights / width
+    if trace.cumulative is not None and trace.cumulative.enabled:
+        heights = np.nancumsum(heights)
+
+    spec = {key: value for key, value in trace.to_plotly_json().items() if key in _HISTOGRAM_KEPT}
+    marker = trace.marker.to_plotly_json() if trace.marker is not None else {}
+    spec['marker'] = {key: value for key, value in marker.items() if np.ndim(value) == 0 or isinstance(value, dict)}
+    label_key, value_key = ('y', 'x') if horizontal else ('x', 'y')
+    spec[label_key], spec[value_key] = positions, heights
+    spec['orientation'] = 'h' if horizontal else 'v'
+    if width is not None:
+        spec['width'] = width
+    return go.Bar(spec), len(heights), merged, 0
+
+def render_figure(fig, max_points: Optional[int] = None, method: Optional[str] = None,
+                  webgl_min_points: Optional[int] = None) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Bound a Plotly figure before it is sent to the browser.
+
+    Scatter/line traces longer than max_points are downsampled (LTTB or
+    min/max buckets) and traces still above webgl_min_points are switched to
+    Scattergl. Category bars and pie slices beyond CHART_MAX_CATEGORIES are
+    summed into "Other" (bars over a numeric or date axis are bucketed like
+    lines), and histograms are binned here instead of shipping every raw
+    value. Figures from create_chart() carry the report of the reduction
+    done on their data. Returns (figure, report) where report has
+    'points_total', 'points_drawn', 'points_dropped', 'values_binned',
+    'categories_merged', 'categories_dropped', 'method' and 'webgl'.
+    Non-Plotly figures are returned unchanged.
+    """
+    from config.settings import CHART_MAX_POINTS, CHART_DOWNSAMPLE_METHOD, CHART_WEBGL_MIN_POINTS
+    max_points = max_points or CHART_MAX_POINTS
+    method = method or CHART_DOWNSAMPLE_METHOD
+    webgl_min_points = CHART_WEBGL_MIN_POINTS if webgl_min_points is None else webgl_min_points
+
+    report = {'points_total': 0, 'points_drawn': 0, 'points_dropped': 0, 'values_binned': 0,
+              'categories_merged': 0, 'categories_dropped': 0, 'method': None, 'webgl': False}
+    if not hasattr(fig, 'data') or not hasattr(fig, 'layout'):
+        return fig, report
+    with span('render') as render_span:
+        fig, report = _bound_figure(fig, report, max_points, method, webgl_min_points)
+        render_span.set(rows=report['points_total'], points_drawn=report['points_drawn'], webgl=report['webgl'])
+    return fig, report
+
+def _bound_figure(fig, report: Dict[str, Any], max_points: int, method: str,
+                  webgl_min_points: int) -> Tuple[Any, Dict[str, Any]]:
+
+    meta = fig.layout.meta if isinstance(fig.layout.meta, dict) else {}
+    chart_report = meta.get('render') or {}
+    report['points_dropped'] = chart_report.get('points_dropped', 0)
+    report['categories_merged'] = chart_report.get('categories_merged', 0)
+    report['categories_dropped'] = chart_report.get('categories_dropped', 0)
+    report['method'] = chart_report.get('method')
+
+    from config.settings import CHART_MAX_CATEGORIES
+    # Histograms of one figure share their bins, as bingroup does in Plotly
+    histograms = [trace for trace in fig.data if trace.type == 'histogram']
+    histogram_bounds = _histogram_range(histograms) if histograms else None
+
+    traces: List[Any] = []
+    changed = False
+    for trace in fig.data:
+        values = next((getattr(trace, name, None) for name in ('y', 'values', 'labels', 'x')
+                       if getattr(trace, name, None) is not None), None)
+        length = len(values) if values is not None else 0
+        report['points_total'] += length
+        reduced = None
+        if trace.type == 'bar' and length > CHART_MAX_CATEGORIES:
+            reduced = _bound_bar(trace, length, CHART_MAX_CATEGORIES, max_points, method)
+        elif trace.type == 'pie' and length > min(10, CHART_MAX_CATEGORIES):
+            # Pies get unreadable long before bars do
+            reduced = _bound_pie(trace, length, min(10, CHART_MAX_CATEGORIES))
+        elif trace.type == 'histogram' and length > CHART_MAX_CATEGORIES:
+            # Raw samples would be sent to be binned in the browser
+            reduced = _bin_histogram(trace, histogram_bounds, max_points, CHART_MAX_CATEGORIES)
+            if reduced is None and length > max_points:
+                # histfunc min/max: cap the samples instead
+                keep = np.sort(np.random.default_rng(0).choice(length, max_points, replace=False))
+                reduced = go.Histogram(_subset_trace(trace, keep, length)), max_points, 0, length - max_points
+                report['method'] = 'sample'
+            elif reduced is not None:
+                report['values_binned'] += length
+        if reduced is not None:
+            new_trace, drawn, merged, dropped = reduced
+            report['points_drawn'] += drawn
+            report['categories_merged'] += merged
+            report['points_dropped'] += dropped
+            if dropped and trace.type == 'bar':
+                report['method'] = method
+            traces.append(new_trace)
+            changed = True
+            continue
+        if trace.type not in ('scatter', 'scattergl') or length <= max_points:
+            report['points_drawn'] += length
+            traces.append(trace)
+            report['webgl'] = report['webgl'] or trace.type == 'scattergl'
+            continue
+        x = trace.x if trace.x is not None else np.arange(length)
+        keep = downsample_indices(x, trace.y, max_points, method)
+        spec = _subset_trace(trace, keep, length)
+        report['points_drawn'] += len(keep)
+        report['points_dropped'] += length - len(keep)
+        report['method'] = method
+        new_trace = _to_webgl(spec) if len(keep) > webgl_min_points else None
+        if new_trace is None:
+            new_trace = go.Scatter(spec) if trace.type == 'scatter' else go.Scattergl(spec)
+        report['webgl'] = report['webgl'] or new_trace.type == 'scattergl'
+        traces.append(new_trace)
+        changed = True
+
+    # Points dropped in create_chart() never reached the figure
+    report['points_total'] += chart_report.get('points_dropped', 0)
+    if changed:
+        fig = go.Figure(data=traces, layout=fig.layout)
+    return fig, report
+
+def describe_render(report: Dict[str, Any]) -> Optional[str]:
+    """One-line caption for a render report, or None if nothing was reduced."""
+    parts = []
+    if report.get('points_dropped'):
+        method = {'lttb': 'LTTB', 'minmax': 'min/max buckets', 'sample': 'random sample'}.get(
+            report.get('method'), report.get('method'))
+        parts.append(f"showing {report['points_drawn']:,} of {report['points_total']:,} points"
+                     + (f" ({method})" if method else ""))
+    if report.get('values_binned'):
+        parts.append(f"{report['values_binned']:,} values binned before drawing")
+    if report.get('categories_merged'):
+        parts.append(f"{report['categories_merged']:,} smaller categories grouped as Other")
+    if report.get('categories_dropped'):
+        parts.append(f"only the first rows shown, {report['categories_dropped']:,} more not charted")
+    if report.get('webgl'):
+        parts.append("WebGL")
+    return " · ".join(parts) or None
+
+def page_count(rows: int, page_rows: int) -> int:
+    return max(1, math.ceil(rows / page_rows))
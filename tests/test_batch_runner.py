@@ -0,0 +1,52 @@
+import json
+
+from src.batch.runner import Checkpoint, StageStats, find_data_files, read_questions, slugify
+
+
+def test_read_questions_from_text_and_json(tmp_path):
+    text = tmp_path / 'questions.txt'
+    text.write_text("# totals\nTotal sales?\n\n  Top region?  \n")
+    assert read_questions(str(text)) == ['Total sales?', 'Top region?']
+    listed = tmp_path / 'questions.json'
+    listed.write_text(json.dumps(['Total sales?', 3]))
+    assert read_questions(str(listed)) == ['Total sales?', '3']
+
+
+def test_find_data_files_is_sorted_and_filtered(tmp_path):
+    (tmp_path / 'nested').mkdir()
+    for name in ('b.csv', 'a.json', 'nested/c.jsonl', 'notes.txt'):
+        (tmp_path / name).write_text('')
+    found = [path[len(str(tmp_path)) + 1:] for path in find_data_files(str(tmp_path))]
+    assert found == ['a.json', 'b.csv', 'nested/c.jsonl']
+
+
+def test_slugify():
+    assert slugify("What's the Total Sales, by Region?") == 'what-s-the-total-sales-by-region'
+    assert slugify('???') == 'query'
+    assert len(slugify('x' * 100)) == 40
+
+
+def test_checkpoint_resumes_only_successful_entries(tmp_path):
+    path = str(tmp_path / 'checkpoint.jsonl')
+    checkpoint = Checkpoint(path, resume=False)
+    checkpoint.record({'file': 'a.csv', 'fingerprint': '1:1', 'question': 'q1', 'status': 'ok'})
+    checkpoint.record({'file': 'a.csv', 'fingerprint': '1:1', 'question': 'q2', 'status': 'error'})
+    with open(path, 'a') as f:
+        f.write('{"file": "a.csv", "fing')
+
+    resumed = Checkpoint(path, resume=True)
+    assert resumed.is_done('a.csv', '1:1', 'q1')
+    assert not resumed.is_done('a.csv', '1:1', 'q2')
+    assert not resumed.is_done('a.csv', '2:2', 'q1')
+
+    Checkpoint(path, resume=False)
+    assert not (tmp_path / 'checkpoint.jsonl').exists()
+
+
+def test_stage_stats_summary():
+    stats = StageStats()
+    for seconds in (1.0, 2.0, 3.0):
+        stats.add('exec', seconds)
+    summary = stats.summary()
+    assert list(summary) == ['exec']
+    assert summary['exec']['count'] == 3 and summary['exec']['p50'] == 2.0 and summary['exec']['total'] == 6.0
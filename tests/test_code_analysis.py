@@ -0,0 +1,65 @@
+import pytest
+
+from src.execution.code_analysis import CodeRejected, CompiledCodeCache, analyze_code
+
+
+def _patterns(source: str):
+    return [warning['pattern'] for warning in analyze_code(source).warnings]
+
+
+def test_sandbox_imports_are_rewritten():
+    analyzed = analyze_code("import pandas as pd\nimport numpy\nfrom datetime import datetime\nresult = numpy.mean([1])")
+    assert analyzed.removed_imports[:2] == ['import pandas as pd', 'import numpy']
+    namespace = {'np': __import__('numpy'), 'pd': __import__('pandas'), 'datetime': __import__('datetime').datetime}
+    exec(analyzed.code_object, namespace)
+    assert namespace['result'] == 1.0
+    assert 'np' in analyzed.used_names
+
+
+@pytest.mark.parametrize('source', ["import os", "from subprocess import run", "import requests as r"])
+def test_unknown_imports_are_rejected(source):
+    with pytest.raises(CodeRejected):
+        analyze_code(source)
+
+
+def test_syntax_errors_propagate():
+    with pytest.raises(SyntaxError):
+        analyze_code("result = (")
+
+
+@pytest.mark.parametrize('source, pattern', [
+    ("for _, row in df.iterrows():\n    pass", 'iterrows'),
+    ("result = df.apply(lambda r: r['a'] + 1, axis=1)", 'apply_axis1'),
+    ("for i in range(len(df)):\n    pass", 'row_loop'),
+    ("result = [x * 2 for x in df['a']]", 'row_loop'),
+])
+def test_row_wise_idioms_are_flagged(source, pattern):
+    assert pattern in _patterns(source)
+
+
+@pytest.mark.parametrize('source', [
+    "for column in df.columns:\n    pass",
+    "for column in df:\n    pass",
+    "result = df['a'].apply(len)",
+    "result = df.apply(sum, axis=0)",
+])
+def test_column_wise_code_is_not_flagged(source):
+    assert _patterns(source) == []
+
+
+def test_compiled_cache_hits_and_evicts():
+    cache = CompiledCodeCache(max_entries=2)
+    first = cache.get("result = 1")
+    assert cache.get("result = 1") is first
+    cache.get("result = 2")
+    cache.get("result = 3")
+    assert cache.stats() == {'hits': 1, 'misses': 3, 'entries': 2}
+    assert cache.get("result = 1") is not first
+
+
+def test_rejected_code_is_not_cached():
+    cache = CompiledCodeCache()
+    for _ in range(2):
+        with pytest.raises(CodeRejected):
+            cache.get("import os")
+    assert cache.stats()['entries'] == 0
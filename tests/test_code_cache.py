@@ -0,0 +1,99 @@
+import time
+
+import pandas as pd
+import pytest
+
+from src.ai.code_cache import (
+    CodeCache, MemoryCodeCache, SqliteCodeCache, make_cache_key, normalize_query, schema_fingerprint
+)
+from src.data.profiler import format_profile_for_prompt, generate_profile
+
+
+def _prompt_profile(df: pd.DataFrame) -> str:
+    return format_profile_for_prompt(generate_profile(df, tier='full'))
+
+
+def test_same_schema_frames_share_cache_key():
+    paris = pd.DataFrame({'city': ['Paris', 'Rome', 'Oslo'], 'sales': [1.0, 2.0, 3.0]})
+    tokyo = pd.DataFrame({'city': ['Tokyo', 'Lima', 'Cairo', 'Quito'], 'sales': [4.0, 5.0, 6.0, 7.0]})
+    assert 'e.g. Paris' in _prompt_profile(paris)
+    assert schema_fingerprint(_prompt_profile(paris)) == schema_fingerprint(_prompt_profile(tokyo))
+    assert (make_cache_key('Total sales by city?', _prompt_profile(paris))
+            == make_cache_key('total sales by city', _prompt_profile(tokyo)))
+
+
+def test_schema_change_changes_cache_key():
+    base = pd.DataFrame({'city': ['Paris'], 'sales': [1.0]})
+    renamed = pd.DataFrame({'town': ['Paris'], 'sales': [1.0]})
+    retyped = pd.DataFrame({'city': ['Paris'], 'sales': [1]})
+    key = make_cache_key('total sales', _prompt_profile(base))
+    assert make_cache_key('total sales', _prompt_profile(renamed)) != key
+    assert make_cache_key('total sales', _prompt_profile(retyped)) != key
+    assert make_cache_key('total sales', _prompt_profile(base), engine='duckdb') != key
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def make_cache(request, tmp_path):
+    def make(max_entries=512, ttl_seconds=None):
+        if request.param == 'sqlite':
+            return SqliteCodeCache(str(tmp_path / 'cache' / 'code.db'), max_entries, ttl_seconds)
+        return MemoryCodeCache(max_entries, ttl_seconds)
+    return make
+
+
+def test_hit_and_miss(make_cache):
+    cache = make_cache()
+    assert cache.get('k') is None
+    cache.set('k', "result = df['a'].sum()")
+    assert cache.get('k') == "result = df['a'].sum()"
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+    assert stats['hit_rate'] == 0.5
+
+
+def test_least_recently_used_entry_is_evicted(make_cache):
+    cache = make_cache(max_entries=2)
+    cache.set('a', 'code a')
+    time.sleep(0.01)
+    cache.set('b', 'code b')
+    time.sleep(0.01)
+    # Touching 'a' makes 'b' the least recently used
+    assert cache.get('a') == 'code a'
+    time.sleep(0.01)
+    cache.set('c', 'code c')
+    assert len(cache) == 2
+    assert cache.get('b') is None
+    assert cache.get('a') == 'code a'
+    assert cache.stats()['evictions'] == 1
+
+
+def test_expired_entries_are_misses(make_cache, monkeypatch):
+    cache = make_cache(ttl_seconds=60)
+    cache.set('k', 'code')
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 120)
+    assert cache.get('k') is None
+    assert cache.stats()['evictions'] == 1
+
+
+def test_delete(make_cache):
+    cache = make_cache()
+    cache.set('k', 'code')
+    cache.delete('k')
+    assert cache.get('k') is None
+    assert len(cache) == 0
+
+
+def test_sqlite_cache_is_shared_through_the_file(tmp_path):
+    path = str(tmp_path / 'code.db')
+    SqliteCodeCache(path).set('k', 'code')
+    assert SqliteCodeCache(path).get('k') == 'code'
+
+
+def test_code_cache_is_abstract():
+    with pytest.raises(TypeError):
+        CodeCache(10)
+
+
+def test_normalize_query_ignores_case_spacing_and_punctuation():
+    assert normalize_query('  Total   Sales by Region?? ') == 'total sales by region'
@@ -0,0 +1,57 @@
+import pandas as pd
+import plotly.graph_objects as go
+
+from src.utils.history import ChatHistory
+
+
+def _message(i: int, rows: int = 1000) -> dict:
+    return {
+        'role': 'assistant', 'content': f"answer {i}",
+        'result': pd.DataFrame({'a': range(rows)}),
+        'fig': go.Figure(go.Bar(x=[1, 2], y=[i, i])),
+    }
+
+
+def test_only_newest_messages_stay_live():
+    history = ChatHistory(max_bytes=10**8, live_messages=2)
+    for i in range(4):
+        history.append(_message(i))
+    assert [history.state(i, 'result') for i in range(4)] == ['compact', 'compact', 'live', 'live']
+    assert history[0] == {'role': 'assistant', 'content': 'answer 0'}
+    assert history.format(0, 'fig') == 'plotly-json'
+
+
+def test_compacted_payloads_load_back():
+    history = ChatHistory(max_bytes=10**8, live_messages=1)
+    history.append(_message(0))
+    history.append(_message(1))
+    pd.testing.assert_frame_equal(history.load(0, 'result'), pd.DataFrame({'a': range(1000)}))
+    assert list(history.load(0, 'fig').data[0].y) == [0, 0]
+    assert history.state(0, 'result') == 'compact'
+
+
+def test_over_budget_spills_to_disk_and_reloads(tmp_path):
+    history = ChatHistory(max_bytes=1, live_messages=1, spill_dir=str(tmp_path), max_disk_bytes=10**8)
+    for i in range(3):
+        history.append(_message(i))
+    assert history.state(0, 'result') == 'disk'
+    assert history.state(2, 'result') == 'live'
+    assert history.load(0, 'result')['a'].sum() == sum(range(1000))
+    assert history.stats()['spilled'] >= 2
+
+
+def test_without_disk_old_payloads_are_evicted():
+    history = ChatHistory(max_bytes=1, live_messages=1)
+    for i in range(3):
+        history.append(_message(i))
+    assert history.state(0, 'result') == 'evicted'
+    assert history.load(0, 'result') is None
+    assert history[0]['content'] == 'answer 0'
+
+
+def test_messages_without_payloads_and_clear():
+    history = ChatHistory(max_bytes=10**8)
+    history.append({'role': 'user', 'content': 'hi'})
+    assert history.state(0, 'fig') is None and len(history) == 1
+    history.clear()
+    assert len(history) == 0 and history.stats()['messages'] == 0
@@ -0,0 +1,136 @@
+import threading
+import time
+
+import pytest
+
+from src.ai import agent
+from src.ai.jobs import JobManager, JobRejected
+
+
+class FakePipeline:
+    """Stands in for process_query_stream(); each question runs until released."""
+
+    def __init__(self):
+        self.release = {}
+        self.closed = []
+        self.cancel_events = {}
+
+    def __call__(self, user_query, df, data_profile, stream=False, cancel=None, **options):
+        gate = self.release.setdefault(user_query, threading.Event())
+        self.cancel_events[user_query] = cancel
+        try:
+            yield 'stage', 'codegen'
+            yield 'code', f"result = '{user_query}'"
+            gate.wait(5)
+            yield 'stage', 'running'
+            if user_query.startswith('fail'):
+                raise ValueError('boom')
+            yield 'result', {'result': user_query}
+            yield 'done', {'result': user_query}
+        finally:
+            self.closed.append(user_query)
+
+    def finish(self, user_query):
+        self.release.setdefault(user_query, threading.Event()).set()
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    fake = FakePipeline()
+    monkeypatch.setattr(agent, 'process_query_stream', fake)
+    yield fake
+    for gate in fake.release.values():
+        gate.set()
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+def test_job_runs_to_a_response(pipeline):
+    manager = JobManager(max_concurrent=2)
+    job = manager.submit('session', 'q1', None, 'profile')
+    pipeline.finish('q1')
+    _wait_for(lambda: job.done)
+    assert job.state == 'done'
+    assert job.response == {'result': 'q1'}
+    assert job.code == "result = 'q1'"
+    assert job._df is None
+    assert manager.stats()['completed'] == 1
+
+
+def test_failed_job_records_the_error(pipeline):
+    manager = JobManager()
+    job = manager.submit('session', 'fail me', None, 'profile')
+    pipeline.finish('fail me')
+    _wait_for(lambda: job.done)
+    assert job.state == 'failed' and job.error == 'ValueError: boom'
+
+
+def test_rejects_jobs_beyond_the_per_session_queue_limit(pipeline):
+    manager = JobManager(max_concurrent=1, max_per_session=1, max_queued_per_session=2)
+    running = manager.submit('a', 'q1', None, 'profile')
+    _wait_for(lambda: running.state == 'running')
+    queued = [manager.submit('a', f'q{i}', None, 'profile') for i in (2, 3)]
+    with pytest.raises(JobRejected):
+        manager.submit('a', 'q4', None, 'profile')
+    # Other sessions have their own allowance
+    other = manager.submit('b', 'q5', None, 'profile')
+    assert [manager.position(job) for job in queued + [other]] == [1, 2, 3]
+    assert manager.stats()['queued'] == 3
+
+
+def test_per_session_and_global_running_caps(pipeline):
+    manager = JobManager(max_concurrent=2, max_per_session=1, max_queued_per_session=5)
+    a1 = manager.submit('a', 'a1', None, 'profile')
+    a2 = manager.submit('a', 'a2', None, 'profile')
+    b1 = manager.submit('b', 'b1', None, 'profile')
+    c1 = manager.submit('c', 'c1', None, 'profile')
+    _wait_for(lambda: manager.stats()['running'] == 2)
+    # a2 waits for a1 although a slot is free; b1 takes it; c1 waits for a global slot
+    assert (a1.state, a2.state, b1.state, c1.state) == ('running', 'queued', 'running', 'queued')
+    pipeline.finish('a1')
+    _wait_for(lambda: a1.done and manager.stats()['running'] == 2)
+    # The freed slot goes to the oldest job that may run
+    assert a2.state == 'running' and c1.state == 'queued'
+
+
+def test_cancelling_a_queued_job_is_not_counted_as_completed(pipeline):
+    manager = JobManager(max_concurrent=1, max_per_session=1)
+    first = manager.submit('a', 'q1', None, 'profile')
+    second = manager.submit('a', 'q2', None, 'profile')
+    assert manager.cancel(second.id)
+    assert second.state == 'cancelled' and manager.position(second) is None
+    assert not manager.cancel(second.id)
+    pipeline.finish('q1')
+    _wait_for(lambda: first.done)
+    stats = manager.stats()
+    assert (stats['completed'], stats['cancelled']) == (1, 1)
+
+
+def test_cancelling_a_running_job_closes_the_pipeline(pipeline):
+    manager = JobManager()
+    job = manager.submit('a', 'q1', None, 'profile')
+    _wait_for(lambda: job.code)
+    assert not pipeline.cancel_events['q1'].is_set()
+    manager.cancel(job.id)
+    # The pipeline sees the cancel while it is still executing
+    assert pipeline.cancel_events['q1'].is_set()
+    pipeline.finish('q1')
+    _wait_for(lambda: job.done)
+    assert job.state == 'cancelled' and job.response is None
+    assert pipeline.closed == ['q1']
+
+
+def test_forget_drops_finished_jobs_only(pipeline):
+    manager = JobManager()
+    job = manager.submit('a', 'q1', None, 'profile')
+    manager.forget(job.id)
+    assert manager.get(job.id) is job
+    pipeline.finish('q1')
+    _wait_for(lambda: job.done)
+    manager.forget(job.id)
+    assert manager.get(job.id) is None and manager.jobs('a') == []
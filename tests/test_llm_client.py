@@ -0,0 +1,202 @@
+import threading
+import time
+
+import pytest
+
+from src.ai.llm_client import (
+    ConcurrencyLimitedClient, FakeLLMClient, LLMClient, LLMHTTPError, LLMResponse, RateLimitedClient,
+    TokenBucket, is_retryable
+)
+
+
+class ScriptedClient(LLMClient):
+    """Backend that can be held at a gate and fails with the queued errors first."""
+
+    def __init__(self, text='answer', errors=(), delay=0.0):
+        self.text = text
+        self.errors = list(errors)
+        self.delay = delay
+        self.calls = 0
+        self.started = threading.Event()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def generate_content(self, prompt, stream=False):
+        self.calls += 1
+        self.started.set()
+        self.gate.wait(5)
+        if self.delay:
+            time.sleep(self.delay)
+        if self.errors:
+            raise self.errors.pop(0)
+        if stream:
+            return iter([LLMResponse(word) for word in self.text.split(' ')])
+        return LLMResponse(self.text)
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+def test_token_bucket_waits_once_capacity_is_spent():
+    bucket = TokenBucket(rate=50, capacity=2)
+    assert bucket.acquire() == 0.0
+    assert bucket.acquire() == 0.0
+    start = time.monotonic()
+    assert bucket.acquire() > 0
+    assert time.monotonic() - start >= 0.015
+
+
+def test_token_bucket_caps_requests_at_capacity():
+    bucket = TokenBucket(rate=100, capacity=5)
+    # More than capacity would otherwise wait forever; it takes the whole bucket instead
+    assert bucket.acquire(50) == 0.0
+    assert bucket.acquire(1) > 0
+
+
+def _in_threads(calls):
+    results = [None] * len(calls)
+
+    def run(i, call):
+        results[i] = call()
+
+    threads = [threading.Thread(target=run, args=(i, call)) for i, call in enumerate(calls)]
+    return threads, results
+
+
+def test_identical_prompts_in_flight_share_one_call():
+    backend = ScriptedClient('shared answer')
+    backend.gate.clear()
+    client = RateLimitedClient(backend)
+    threads, results = _in_threads([lambda: client.generate_content('same prompt').text] * 2)
+    threads[0].start()
+    backend.started.wait(5)
+    threads[1].start()
+    _wait_for(lambda: client.stats()['coalesced'] == 1)
+    backend.gate.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == ['shared answer', 'shared answer']
+    assert backend.calls == 1
+    # Once finished, the same prompt is asked again
+    client.generate_content('same prompt')
+    assert backend.calls == 2
+
+
+def test_identical_streams_in_flight_share_one_call():
+    backend = ScriptedClient('one two three')
+    backend.gate.clear()
+    client = RateLimitedClient(backend)
+    read = lambda: ' '.join(chunk.text for chunk in client.generate_content('same prompt', stream=True))
+    threads, results = _in_threads([read, read])
+    threads[0].start()
+    backend.started.wait(5)
+    threads[1].start()
+    _wait_for(lambda: client.stats()['coalesced'] == 1)
+    backend.gate.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == ['one two three', 'one two three']
+    assert backend.calls == 1
+
+
+def test_quota_errors_are_retried():
+    backend = ScriptedClient(errors=[LLMHTTPError(429, 'slow down'), LLMHTTPError(503, 'busy')])
+    client = RateLimitedClient(backend, max_retries=3, backoff_base=0)
+    assert client.generate_content('prompt').text == 'answer'
+    assert backend.calls == 3
+    assert client.stats()['retries'] == 2
+
+
+def test_bad_requests_are_not_retried():
+    backend = ScriptedClient(errors=[LLMHTTPError(400, 'bad prompt')])
+    client = RateLimitedClient(backend, max_retries=3, backoff_base=0)
+    with pytest.raises(LLMHTTPError):
+        client.generate_content('prompt')
+    assert backend.calls == 1
+    assert client.stats()['failures'] == 1
+
+
+def test_stream_errors_before_first_chunk_are_retried():
+    backend = ScriptedClient('a b', errors=[LLMHTTPError(429, 'slow down')])
+    client = RateLimitedClient(backend, max_retries=1, backoff_base=0, coalesce=False)
+    assert [chunk.text for chunk in client.generate_content('prompt', stream=True)] == ['a', 'b']
+    assert backend.calls == 2
+
+
+def test_slow_calls_time_out():
+    client = RateLimitedClient(ScriptedClient(delay=0.5), timeout=0.05, max_retries=0)
+    with pytest.raises(TimeoutError):
+        client.generate_content('prompt')
+    assert client.stats()['timeouts'] == 1
+
+
+def test_timed_out_calls_hold_at_most_max_workers_threads():
+    backend = ScriptedClient()
+    backend.gate.clear()
+    client = RateLimitedClient(backend, timeout=0.1, max_retries=0, coalesce=False, max_workers=1)
+    with pytest.raises(TimeoutError):
+        client.generate_content('first')
+    assert client.stats()['abandoned'] == 1
+    # The only thread is still held, so the next call waits in the queue and is dropped unstarted
+    with pytest.raises(TimeoutError):
+        client.generate_content('second')
+    assert backend.calls == 1 and client.stats()['abandoned'] == 1
+    backend.gate.set()
+    _wait_for(lambda: client.stats()['abandoned'] == 0)
+    assert client.generate_content('third').text == 'answer'
+
+
+def test_backoff_honours_retry_after():
+    client = RateLimitedClient(ScriptedClient(), backoff_base=1, backoff_max=10)
+    assert client._backoff(0, LLMHTTPError(429, 'wait', retry_after=4)) == 4
+    assert client._backoff(0, LLMHTTPError(429, 'wait', retry_after=60)) == 10
+    assert 0 <= client._backoff(3, LLMHTTPError(429, 'wait')) <= 8
+
+
+@pytest.mark.parametrize('error, retryable', [
+    (LLMHTTPError(429, 'quota'), True),
+    (LLMHTTPError(500, 'oops'), True),
+    (LLMHTTPError(404, 'missing'), False),
+    (TimeoutError(), True),
+    (ValueError('Quota exceeded for model'), True),
+    (ValueError('invalid argument'), False),
+])
+def test_is_retryable(error, retryable):
+    assert is_retryable(error) is retryable
+
+
+def test_concurrency_limited_client_caps_calls_in_flight():
+    backend = ScriptedClient(delay=0.05)
+    active, peak = [0], [0]
+    lock = threading.Lock()
+    original = backend.generate_content
+
+    def tracked(prompt, stream=False):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        try:
+            return original(prompt, stream)
+        finally:
+            with lock:
+                active[0] -= 1
+
+    backend.generate_content = tracked
+    client = ConcurrencyLimitedClient(backend, max_concurrent=2)
+    threads = [threading.Thread(target=client.generate_content, args=(f'p{i}',)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert peak[0] == 2 and backend.calls == 6
+
+
+def test_fake_client_matches_rules_and_streams_in_chunks():
+    client = FakeLLMClient([(r'code', 'result = 1')], default='summary', chunk_size=4)
+    assert client.generate_content('write code').text == 'result = 1'
+    assert client.generate_content('summarise').text == 'summary'
+    assert [chunk.text for chunk in client.generate_content('write code', stream=True)] == ['resu', 'lt =', ' 1']
@@ -0,0 +1,126 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data.loader import (
+    concat_chunks, downcast_dtypes, iter_chunks, iter_json_array, load_data, load_data_with_stats, parse_dates
+)
+
+
+@pytest.fixture
+def records():
+    return [{'id': i, 'region': 'north' if i % 2 else 'south', 'sales': i * 1.5, 'tags': [i, 'x']}
+            for i in range(25)]
+
+
+def test_json_array_streams_across_read_boundaries(tmp_path, records):
+    path = tmp_path / 'data.json'
+    path.write_text(json.dumps(records, indent=2))
+    # A tiny read size splits values (numbers, strings, nested lists) across reads
+    assert list(iter_json_array(str(path), read_size=7)) == records
+
+
+@pytest.mark.parametrize('text, message', [('{"a": 1}', 'Expected a JSON array'),
+                                           ('[{"a": 1}, {"a": ', 'Unterminated|Malformed')])
+def test_json_array_rejects_malformed_input(tmp_path, text, message):
+    path = tmp_path / 'bad.json'
+    path.write_text(text)
+    with pytest.raises(ValueError, match=message):
+        list(iter_json_array(str(path), read_size=4))
+
+
+@pytest.mark.parametrize('file_type', ['json', 'jsonl', 'csv'])
+def test_chunked_load_matches_full_load(tmp_path, records, file_type):
+    frame = pd.DataFrame(records).drop(columns='tags')
+    path = tmp_path / f'data.{file_type}'
+    if file_type == 'json':
+        path.write_text(json.dumps(frame.to_dict('records')))
+    elif file_type == 'jsonl':
+        path.write_text('\n'.join(json.dumps(row) for row in frame.to_dict('records')))
+    else:
+        frame.to_csv(path, index=False)
+
+    chunks = list(iter_chunks(str(path), file_type, chunksize=10))
+    assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+    full = load_data(str(path), file_type)
+    chunked, stats = load_data_with_stats(str(path), file_type, chunksize=10, downcast=False)
+    assert stats['chunks'] == 3 and stats['mode'] == 'chunked' and stats['rows'] == 25
+    pd.testing.assert_frame_equal(chunked, full)
+
+
+def test_json_lines_saved_as_json_still_loads(tmp_path):
+    path = tmp_path / 'data.json'
+    path.write_text('{"a": 1}\n{"a": 2}\n')
+    assert load_data(str(path), 'json')['a'].tolist() == [1, 2]
+
+
+def test_downcast_keeps_values():
+    df = pd.DataFrame({
+        'small_int': np.arange(100, dtype=np.int64),
+        'big_int': np.arange(100, dtype=np.int64) + 2**40,
+        'exact_float': np.arange(100) / 4,
+        'inexact_float': np.arange(100) / 3,
+        'repeated': ['a', 'b'] * 50,
+        'unique': [f'id{i}' for i in range(100)],
+        'flag': [True, False] * 50,
+    })
+    original = df.copy()
+    downcast_dtypes(df)
+    # Integers keep their width unless asked for
+    assert df['small_int'].dtype == np.int64
+    assert df['big_int'].dtype == np.int64
+    assert df['exact_float'].dtype == np.float32
+    assert df['inexact_float'].dtype == np.float64
+    assert isinstance(df['repeated'].dtype, pd.CategoricalDtype)
+    assert not isinstance(df['unique'].dtype, pd.CategoricalDtype)
+    assert df['flag'].dtype == bool
+    for col in df.columns:
+        assert df[col].astype(object).tolist() == original[col].astype(object).tolist()
+
+
+def test_integer_downcast_is_opt_in():
+    df = pd.DataFrame({
+        'small_int': np.arange(100, dtype=np.int64),
+        'big_int': np.arange(100, dtype=np.int64) + 2**40,
+    })
+    downcast_dtypes(df, integers=True)
+    assert df['small_int'].dtype == np.int32
+    assert df['big_int'].dtype == np.int64
+    assert df['small_int'].tolist() == list(range(100))
+
+
+def test_loader_leaves_dates_and_integers_alone_by_default(tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_text('day,amount\n2024-01-05,1\n2024-02-10,2\n')
+    df, stats = load_data_with_stats(str(path), 'csv', chunksize=1)
+    assert stats['date_columns'] == []
+    assert not pd.api.types.is_datetime64_any_dtype(df['day'])
+    assert df['amount'].dtype == np.int64
+
+
+def test_concat_chunks_keeps_categoricals_only_when_every_chunk_has_them():
+    a = pd.DataFrame({'c': pd.Categorical(['x', 'y']), 'd': pd.Categorical(['p', 'q'])})
+    b = pd.DataFrame({'c': pd.Categorical(['z']), 'd': ['r']})
+    combined = concat_chunks([a, b])
+    assert isinstance(combined['c'].dtype, pd.CategoricalDtype)
+    assert combined['c'].tolist() == ['x', 'y', 'z']
+    assert not isinstance(combined['d'].dtype, pd.CategoricalDtype)
+    assert combined['d'].tolist() == ['p', 'q', 'r']
+
+
+def test_parse_dates_converts_only_date_columns():
+    df = pd.DataFrame({
+        'day': ['2024-01-05', '2024-02-10', None, '2024-03-15'],
+        'us_day': ['01/05/2024', '02/10/2024', '03/15/2024', '04/20/2024'],
+        'year': ['2021', '2022', '2023', '2024'],
+        'code': ['2024-01-05-A', 'B', 'C', 'D'],
+        'coded_day': pd.Categorical(['2024-01-05', None, '2024-01-05', '2024-01-06']),
+    })
+    assert parse_dates(df) == ['day', 'us_day', 'coded_day']
+    assert df['day'].iloc[1] == pd.Timestamp('2024-02-10') and pd.isna(df['day'].iloc[2])
+    assert df['us_day'].iloc[3] == pd.Timestamp('2024-04-20')
+    assert pd.isna(df['coded_day'].iloc[1]) and df['coded_day'].iloc[3] == pd.Timestamp('2024-01-06')
+    assert df['year'].tolist() == ['2021', '2022', '2023', '2024']
+    assert df['code'].iloc[0] == '2024-01-05-A'
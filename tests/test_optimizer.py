@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.execution.optimizer import apply_rewrites, find_rewrites, observe, optimize_code, outputs_match, values_match
+
+REWRITABLE = {
+    'apply_rows': "result = df.apply(lambda row: row['price'] * row['qty'], axis=1)",
+    'apply_elements': "df['band'] = df['price'].apply(lambda x: 'high' if x > 10 else 'low')\nresult = df",
+    'append_loop': "totals = []\nfor _, row in df.iterrows():\n    totals.append(row['price'] * 2)\nresult = totals",
+    'list_comprehension': "result = [p + 1 for p in df['price'] if p > 3]",
+    'dict_accumulation': ("sums = {}\nfor _, row in df.iterrows():\n"
+                          "    sums[row['region']] = sums.get(row['region'], 0) + row['qty']\nresult = sums"),
+}
+
+
+@pytest.fixture
+def sample():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'region': rng.choice(['north', 'south', 'east'], 500),
+        'price': rng.uniform(0, 20, 500).round(2),
+        'qty': rng.integers(0, 10, 500),
+    })
+
+
+@pytest.mark.parametrize('pattern', sorted(REWRITABLE))
+def test_rewrites_are_equivalent_on_sample_frames(pattern, sample):
+    code = REWRITABLE[pattern]
+    rewrites = find_rewrites(code)
+    assert [rewrite['pattern'] for rewrite in rewrites] == [pattern]
+    rewritten = apply_rewrites(code, rewrites)
+    assert 'lambda' not in rewritten and 'iterrows' not in rewritten
+    before = observe(code, sample, 'inline')
+    after = observe(rewritten, sample, 'inline')
+    assert before['error'] is None and after['error'] is None
+    assert outputs_match(before, after)
+
+
+@pytest.mark.parametrize('code', [
+    # A zero divisor raises per row but gives inf on a column
+    "result = df.apply(lambda row: row['price'] / row['qty'], axis=1)",
+    # A fractional power of a negative number is complex per element, NaN on a column
+    "result = df['price'].apply(lambda x: x ** 0.5)",
+    # Calls with unknown per-element behaviour
+    "result = df['price'].apply(lambda x: format_price(x))",
+])
+def test_rewrites_that_change_failure_behaviour_are_refused(code):
+    assert find_rewrites(code) == []
+
+
+def test_apply_rewrites_keeps_surrounding_code():
+    code = "# keep me\nresult = df.apply(lambda row: row['price'] * row['qty'], axis=1)  # and me\nprint(result)"
+    rewritten = apply_rewrites(code, find_rewrites(code))
+    assert rewritten == "# keep me\nresult = (df['price'] * df['qty'])  # and me\nprint(result)"
+
+
+def test_optimize_code_applies_fast_equivalent_rewrite(sample):
+    code = REWRITABLE['append_loop']
+    optimized, report = optimize_code(code, sample, backend='inline', min_speedup=1.2)
+    assert report[0]['applied'] and report[0]['speedup'] >= 1.2
+    assert optimized == apply_rewrites(code, find_rewrites(code))
+
+
+def test_optimize_code_keeps_rewrites_that_are_not_faster_enough(sample):
+    code = REWRITABLE['apply_elements']
+    optimized, report = optimize_code(code, sample, backend='inline', min_speedup=1e9)
+    assert optimized == code
+    assert not report[0]['applied']
+
+
+def test_optimize_code_leaves_failing_code_alone(sample):
+    code = "totals = []\nfor _, row in df.iterrows():\n    totals.append(row['missing'] * 2)\nresult = totals"
+    optimized, report = optimize_code(code, sample, backend='inline')
+    assert optimized == code and not any(entry['applied'] for entry in report)
+
+
+def test_values_match_is_dtype_strict():
+    floats = pd.Series([1.0, 2.0, 3.0])
+    assert values_match(floats, floats + 1e-13)
+    assert not values_match(floats, floats.astype('int64'))
+    assert not values_match(pd.DataFrame({'a': floats}), pd.DataFrame({'a': floats.astype('float32')}))
+    assert not values_match(2.0, 2)
+    assert not values_match(True, 1)
+    assert values_match(float('nan'), np.float64('nan'))
+
+
+def test_values_match_compares_containers_element_wise():
+    assert values_match({'a': [1, 2.5]}, {'a': np.array([1, 2.5], dtype=object)})
+    assert not values_match({'a': [1, 2]}, {'a': [1, 2], 'b': []})
+    assert not values_match([1, 2], [1, 2, 3])
+    assert not values_match(pd.Series([1]), [1])
+    assert values_match('north', 'north') and not values_match('north', 'south')
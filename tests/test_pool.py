@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from src.execution.executor import CANCELLED_ERROR
+from src.execution.pool import ExecutionPool
+
+
+@pytest.fixture(scope='module')
+def pool(tmp_path_factory):
+    pool = ExecutionPool(workers=2, timeout_seconds=30, memory_limit_mb=0,
+                         shared_dir=str(tmp_path_factory.mktemp('shared')), max_shared_datasets=2)
+    yield pool
+    pool.shutdown()
+
+
+def _frame(n: int = 100) -> pd.DataFrame:
+    return pd.DataFrame({'a': range(n), 'b': ['x', 'y'] * (n // 2)})
+
+
+def test_runs_code_against_the_published_frame(pool):
+    result, error = pool.run("result = df['a'].sum()", _frame())
+    assert error is None and result['result'] == 4950
+
+
+def test_errors_come_back_as_messages(pool):
+    _, error = pool.run("result = df['missing']", _frame())
+    assert error and 'missing' in error
+
+
+def test_timeout_replaces_the_worker(pool):
+    _, error = pool.run("while True:\n    pass", _frame(), timeout=0.5)
+    assert error.startswith('TimeoutError')
+    result, error = pool.run("result = len(df)", _frame())
+    assert error is None and result['result'] == 100
+
+
+@pytest.mark.parametrize('timeout', [0, -1])
+def test_non_positive_timeout_means_no_deadline(pool, timeout):
+    result, error = pool.run("result = sum(range(3000000)) and 1", _frame(), timeout=timeout)
+    assert error is None and result['result'] == 1
+
+
+def test_cancel_kills_a_running_job(pool):
+    job = pool.submit("while True:\n    pass", _frame())
+    time.sleep(0.3)
+    job.cancel()
+    start = time.monotonic()
+    while not job.future.done() and time.monotonic() - start < 5:
+        time.sleep(0.05)
+    assert job.future.done()
+
+
+def test_cancel_event_kills_a_running_job(pool):
+    cancel = threading.Event()
+    job = pool.submit("while True:\n    pass", _frame(), cancel=cancel)
+    time.sleep(0.3)
+    cancel.set()
+    _, error = job.result(timeout=5)
+    assert error == CANCELLED_ERROR
+    result, error = pool.run("result = len(df)", _frame())
+    assert error is None and result['result'] == 100
+
+
+def test_worker_exit_is_not_reported_as_memory_error(pool):
+    _, error = pool.run("pd.io.common.os._exit(3)", _frame())
+    assert error == "WorkerError: worker process exited (code 3)"
+    result, error = pool.run("result = len(df)", _frame())
+    assert error is None and result['result'] == 100
+
+
+def test_abort_under_memory_limit_is_reported_as_memory_error(pool, monkeypatch):
+    monkeypatch.setattr(pool, 'memory_limit_mb', 10**6)
+    _, error = pool.run("pd.io.common.os.abort()", _frame())
+    assert error.startswith('MemoryError: worker process exited (code -6)')
+
+
+def test_frame_is_published_once(pool):
+    df = _frame(10)
+    first_key, first_path = pool._publish(df)
+    second_key, second_path = pool._publish(df.copy())
+    assert (first_key, first_path) == (second_key, second_path)
+
+
+def test_custom_index_is_preserved(pool):
+    df = _frame(10).set_index('b', append=True)
+    result, error = pool.run("result = df.index.nlevels", df)
+    assert error is None and result['result'] == 2
+
+
+def test_queued_jobs_keep_their_dataset_published(tmp_path):
+    pool = ExecutionPool(workers=1, timeout_seconds=30, memory_limit_mb=0, shared_dir=str(tmp_path),
+                         max_shared_datasets=1)
+    try:
+        blocker = pool.submit("while True:\n    pass", _frame(10))
+        queued = [pool.submit("result = len(df)", _frame(n)) for n in (20, 30)]
+        # Both queued datasets are still on disk though only one may be kept
+        assert len(os.listdir(tmp_path)) == 3
+        blocker.cancel()
+        results = [job.result(timeout=10) for job in queued]
+        assert [error for _, error in results] == [None, None]
+        assert [result['result'] for result, _ in results] == [20, 30]
+        _wait_for_files(tmp_path, 1)
+    finally:
+        pool.shutdown()
+
+
+def _wait_for_files(directory, count, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while len(os.listdir(directory)) != count:
+        assert time.monotonic() < deadline, os.listdir(directory)
+        time.sleep(0.01)
@@ -0,0 +1,82 @@
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data import profiler
+from src.data.profiler import append_to_profile, generate_profile, get_full_profile, profile_dataset
+from src.utils.helpers import hash_dataframe
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(profiler, '_profile_cache', OrderedDict())
+
+
+def _frame(n: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'amount': rng.normal(100, 15, n),
+        'quantity': rng.integers(1, 50, n),
+        'region': rng.choice(['North', 'South', 'East', 'West', None], n),
+    })
+
+
+def test_small_frames_are_profiled_exactly():
+    df = _frame(100, 0)
+    profile = profile_dataset(df)
+    assert profile['tier'] == 'full'
+    assert get_full_profile(hash_dataframe(df)) is profile
+
+
+def test_large_frames_get_the_fast_tier_first(monkeypatch):
+    monkeypatch.setattr('config.settings.PROFILER_FAST_THRESHOLD_CELLS', 0)
+    df = _frame(1000, 0)
+    assert profile_dataset(df)['tier'] == 'fast'
+    assert get_full_profile(hash_dataframe(df), timeout=10)['tier'] == 'full'
+
+
+def test_appended_profile_matches_full_recompute(monkeypatch):
+    monkeypatch.setattr('config.settings.PROFILER_FAST_THRESHOLD_CELLS', 0)
+    first, new_rows = _frame(3000, 1), _frame(2000, 2)
+    combined = pd.concat([first, new_rows], ignore_index=True)
+    old_key, new_key = hash_dataframe(first), hash_dataframe(combined)
+    profile_dataset(first, old_key)
+
+    appended = append_to_profile(old_key, new_rows, new_key)
+    exact = generate_profile(combined, tier='full')
+
+    assert appended['row_count'] == exact['row_count'] == 5000
+    assert appended['dtypes'] == exact['dtypes']
+    assert appended['missing_values'] == exact['missing_values']
+    for col in ('amount', 'quantity'):
+        for stat in ('count', 'mean', 'std', 'min', 'max'):
+            assert appended['numeric_summary'][col][stat] == pytest.approx(exact['numeric_summary'][col][stat])
+    for col, count in exact['distinct_counts'].items():
+        assert appended['distinct_counts'][col] == pytest.approx(count, rel=0.05)
+
+    # The cached entry moved to the combined frame's key
+    assert profile_dataset(combined, new_key) == appended
+    assert old_key not in profiler._profile_cache
+
+
+def test_append_recomputes_exact_tier_when_given_the_combined_frame(monkeypatch):
+    monkeypatch.setattr('config.settings.PROFILER_FAST_THRESHOLD_CELLS', 0)
+    first, new_rows = _frame(500, 1), _frame(500, 2)
+    combined = pd.concat([first, new_rows], ignore_index=True)
+    profile_dataset(first, 'old')
+    append_to_profile('old', new_rows, 'new', combined)
+    assert get_full_profile('new', timeout=10)['row_count'] == 1000
+
+
+def test_append_without_a_mergeable_state():
+    first, new_rows = _frame(50, 1), _frame(50, 2)
+    combined = pd.concat([first, new_rows], ignore_index=True)
+    with pytest.raises(KeyError):
+        append_to_profile('unknown', new_rows, 'new')
+    # Small frames are profiled exactly and keep no sketch state
+    profile_dataset(first, 'old')
+    with pytest.raises(KeyError):
+        append_to_profile('old', new_rows, 'new')
+    assert append_to_profile('old', new_rows, 'new', combined)['row_count'] == 100
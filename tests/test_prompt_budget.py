@@ -0,0 +1,82 @@
+import pandas as pd
+
+from src.ai.llm_client import estimate_tokens
+from src.ai.prompt_budget import (
+    build_prompt, describe_prompt_sizes, fit_profile, parse_profile, score_columns, start_prompt_log,
+    trim_traceback
+)
+from src.data.profiler import format_profile_for_prompt, generate_profile
+
+
+def _wide_profile(columns=300):
+    data = {f'metric_{i}': [float(i)] * 3 for i in range(columns)}
+    data.update({'region': ['North', 'South', 'East'], 'orderDate': ['a', 'b', 'c'], 'sales_amount': [1.0, 2.0, 3.0]})
+    return format_profile_for_prompt(generate_profile(pd.DataFrame(data), tier='full'))
+
+
+def test_parse_profile_reads_columns_and_examples():
+    header, columns = parse_profile(_wide_profile(2))
+    assert '- Column Details:' in header
+    region = next(column for column in columns if column['name'] == 'region')
+    assert region['examples'] == ['North', 'South', 'East']
+    assert region['dtype'] in ('object', 'str', 'string')
+
+
+def test_score_columns_prefers_mentioned_columns():
+    _, columns = parse_profile(_wide_profile(2))
+    scores = dict(zip([column['name'] for column in columns],
+                      score_columns('total sales amount per order date in North', columns)))
+    assert scores['sales_amount'] > scores['metric_0']
+    assert scores['orderDate'] > 0
+    # "North" is a sample value of region
+    assert scores['region'] > 0
+    assert scores['metric_1'] == 0
+
+
+def test_fit_profile_keeps_small_profiles_unchanged():
+    profile = _wide_profile(2)
+    assert fit_profile('anything', profile, 10000) == (profile, {'columns_total': 5, 'columns_detailed': 5})
+
+
+def test_fit_profile_shrinks_wide_profiles_to_the_budget():
+    profile = _wide_profile()
+    fitted, info = fit_profile('sales amount by region', profile, 600)
+    assert estimate_tokens(profile) > 600 and estimate_tokens(fitted) <= 700
+    assert info['columns_total'] == 303 and info['columns_detailed'] == 2
+    assert '- sales_amount: float64' in fitted and '- region:' in fitted
+    assert 'Other columns by type (301; names only)' in fitted
+    assert 'more)' in fitted
+
+
+def test_trim_traceback_keeps_generated_frames():
+    error = '\n'.join([
+        'Traceback (most recent call last):',
+        '  File "/app/src/execution/executor.py", line 10, in run',
+        '    exec(code)',
+        '  File "<generated>", line 2, in <module>',
+        "    result = df['Sales'].sum()",
+        '  File "/usr/lib/pandas/core/frame.py", line 3000, in __getitem__',
+        '    raise KeyError(key)',
+        '  File "/usr/lib/pandas/core/indexes/base.py", line 300, in get_loc',
+        '    raise KeyError(key) from err',
+        "KeyError: 'Sales'",
+    ])
+    trimmed = trim_traceback(error)
+    assert 'File "<generated>", line 2' in trimmed and "result = df['Sales'].sum()" in trimmed
+    assert 'executor.py' not in trimmed and 'frame.py' not in trimmed
+    assert '[1 library frame omitted]' in trimmed and '[2 library frames omitted]' in trimmed
+    assert trimmed.endswith("KeyError: 'Sales'")
+    assert len(trim_traceback('x' * 5000, max_chars=100)) < 120
+
+
+def test_build_prompt_logs_sizes(monkeypatch):
+    monkeypatch.setattr('config.settings.PROMPT_TOKEN_BUDGET', 800)
+    template = lambda query, profile: f"Question: {query}\n{profile}\nWrite code."
+    log = start_prompt_log()
+    prompt = build_prompt('codegen', template, 'sales amount by region', _wide_profile())
+    assert prompt.startswith('Question: sales amount by region')
+    assert log[0]['stage'] == 'codegen' and log[0]['tokens'] == estimate_tokens(prompt)
+    assert log[0]['columns_detailed'] < log[0]['columns_total']
+    caption = describe_prompt_sizes(log)
+    assert caption.startswith('codegen prompt ~') and 'columns in detail' in caption
+    assert describe_prompt_sizes([]) is None
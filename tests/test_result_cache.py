@@ -0,0 +1,79 @@
+import pandas as pd
+
+from src.execution.result_cache import ResultCache, code_key
+
+
+def _result(rows: int = 10) -> dict:
+    return {'result': pd.DataFrame({'a': range(rows)}), 'fig': None, 'output': 'printed', 'analysis': None}
+
+
+def _size(result_dict: dict) -> int:
+    cache = ResultCache(max_bytes=10**9)
+    cache.set('sizer', 'result = 1', result_dict)
+    return cache.stats()['bytes']
+
+
+def test_hit_returns_a_fresh_copy():
+    cache = ResultCache(max_bytes=10**7)
+    assert cache.get('dataset', 'result = df') is None
+    assert cache.set('dataset', 'result = df', _result())
+    hit = cache.get('dataset', 'result = df')
+    assert hit['result_cache_hit'] is True
+    pd.testing.assert_frame_equal(hit['result'], _result()['result'])
+    hit['result']['a'] = 0
+    assert cache.get('dataset', 'result = df')['result']['a'].tolist() == list(range(10))
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (2, 1)
+
+
+def test_formatting_and_comments_share_an_entry():
+    assert code_key("result = df['a'].sum()") == code_key("# total\nresult = df[ 'a' ].sum()  ")
+    cache = ResultCache(max_bytes=10**7)
+    cache.set('dataset', "result = df['a'].sum()", _result())
+    assert cache.get('dataset', "result = df[ 'a' ].sum()  # same") is not None
+    assert cache.get('other dataset', "result = df['a'].sum()") is None
+
+
+def test_evicts_least_recently_used_beyond_byte_budget():
+    size = _size(_result())
+    cache = ResultCache(max_bytes=int(size * 2.5))
+    for code in ('result = 1', 'result = 2'):
+        cache.set('dataset', code, _result())
+    cache.get('dataset', 'result = 1')
+    cache.set('dataset', 'result = 3', _result())
+    assert cache.stats()['entries'] == 2
+    assert cache.stats()['bytes'] <= size * 2.5
+    assert cache.get('dataset', 'result = 2') is None
+    assert cache.get('dataset', 'result = 1') is not None
+    assert cache.stats()['evictions'] == 1
+
+
+def test_oversized_and_unpicklable_results_are_not_cached():
+    cache = ResultCache(max_bytes=10**7, max_entry_bytes=_size(_result(10)) + 10)
+    assert not cache.set('dataset', 'result = big', _result(100000))
+    assert not cache.set('dataset', 'result = gen', {'result': (i for i in range(3)), 'fig': None})
+    assert cache.stats()['entries'] == 0
+
+
+def test_evicted_entries_spill_to_disk_and_come_back(tmp_path):
+    size = _size(_result())
+    cache = ResultCache(max_bytes=size, spill_dir=str(tmp_path), max_disk_bytes=size * 10)
+    cache.set('dataset', 'result = 1', _result())
+    cache.set('dataset', 'result = 2', _result())
+    assert cache.stats()['disk_entries'] == 1
+    # A new process finds the spilled entry
+    reopened = ResultCache(max_bytes=size * 4, spill_dir=str(tmp_path), max_disk_bytes=size * 10)
+    assert reopened.get('dataset', 'result = 1') is not None
+    assert reopened.stats()['disk_hits'] == 1
+    assert reopened.stats()['entries'] == 1
+
+
+def test_invalidate_dataset_drops_memory_and_disk_entries(tmp_path):
+    size = _size(_result())
+    cache = ResultCache(max_bytes=size, spill_dir=str(tmp_path), max_disk_bytes=size * 10)
+    cache.set('old', 'result = 1', _result())
+    cache.set('old', 'result = 2', _result())
+    cache.set('new', 'result = 1', _result())
+    assert cache.invalidate_dataset('old') == 2
+    assert cache.get('old', 'result = 1') is None
+    assert cache.get('new', 'result = 1') is not None
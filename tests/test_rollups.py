@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data.rollups import RollupStore, build_rollups, detect_dimensions, make_sandbox_helpers
+from src.utils.helpers import hash_dataframe
+
+
+@pytest.fixture(scope='module')
+def sales():
+    rng = np.random.default_rng(3)
+    rows = 5000
+    return pd.DataFrame({
+        'order_id': np.arange(rows),
+        'region': rng.choice(['north', 'south', 'east', 'west'], rows),
+        'channel': pd.Categorical(rng.choice(['web', 'store'], rows)),
+        'date': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 120, rows), unit='D'),
+        'sales': rng.uniform(0, 100, rows).round(2),
+        'qty': rng.integers(1, 10, rows),
+    })
+
+
+def test_detect_dimensions(sales):
+    dims = detect_dimensions(sales)
+    assert dims['categorical'] == ['region', 'channel']
+    assert dims['temporal'] == ['date']
+    # Row ids are not measures
+    assert dims['measures'] == ['sales', 'qty']
+
+
+@pytest.mark.parametrize('by, measure, agg, freq, expected', [
+    ('region', 'sales', 'sum', None, lambda df: df.groupby('region')['sales'].sum()),
+    ('region', 'qty', 'mean', None, lambda df: df.groupby('region')['qty'].mean()),
+    ('channel', 'sales', 'max', None, lambda df: df.groupby('channel', observed=True)['sales'].max()),
+    (['region', 'channel'], 'sales', 'count', None,
+     lambda df: df.groupby(['region', 'channel'], observed=True)['sales'].count()),
+    ('region', None, 'size', None, lambda df: df.groupby('region').size()),
+    ('date', 'sales', 'sum', 'M', lambda df: df.groupby(df['date'].dt.to_period('M').dt.start_time)['sales'].sum()),
+])
+def test_rollup_matches_pandas_with_and_without_cubes(sales, by, measure, agg, freq, expected):
+    cubes = build_rollups(sales)
+    lookups = []
+    with_cubes = make_sandbox_helpers(sales, cubes, on_lookup=lookups.append)['rollup']
+    scanned = make_sandbox_helpers(sales, None)['rollup']
+    want = expected(sales)
+    for rollup in (with_cubes, scanned):
+        got = rollup(by, measure, agg, freq=freq)
+        pd.testing.assert_series_equal(got, want, check_names=False, check_index_type=False,
+                                       check_categorical=False, check_dtype=False)
+    assert lookups == [True]
+
+
+def test_rollup_rejects_unknown_shapes(sales):
+    rollup = make_sandbox_helpers(sales, build_rollups(sales))['rollup']
+    with pytest.raises(ValueError):
+        rollup('region', 'sales', 'median')
+    with pytest.raises(KeyError):
+        rollup('missing', 'sales')
+    with pytest.raises(ValueError):
+        rollup('region', 'sales', freq='M')
+
+
+def test_lookup_rows_matches_filters(sales):
+    for rollups in (build_rollups(sales), None):
+        lookup_rows = make_sandbox_helpers(sales, rollups)['lookup_rows']
+        pd.testing.assert_frame_equal(lookup_rows('region', 'north').sort_index(),
+                                      sales[sales['region'] == 'north'])
+        pd.testing.assert_frame_equal(lookup_rows('region', ['north', 'east']).sort_index(),
+                                      sales[sales['region'].isin(['north', 'east'])])
+        window = (sales['date'] >= '2024-02-01') & (sales['date'] < '2024-03-01')
+        pd.testing.assert_frame_equal(lookup_rows('date', start='2024-02-01', end='2024-03-01').sort_index(),
+                                      sales[window])
+
+
+def test_store_builds_large_datasets_in_background(sales):
+    store = RollupStore(min_rows=1000)
+    future = store.schedule(sales)
+    assert future is not None
+    future.result(timeout=30)
+    assert store.get(hash_dataframe(sales)) is not None
+    assert RollupStore(min_rows=10**6).schedule(sales) is None
+    store.invalidate(hash_dataframe(sales))
+    assert store.get(hash_dataframe(sales)) is None
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+from src.data import sampling
+from src.data.sampling import get_validation_sample, stratified_sample
+
+
+def _frame(rows=10000):
+    rng = np.random.default_rng(1)
+    regions = np.where(rng.random(rows) < 0.999, 'common', 'rare')
+    return pd.DataFrame({'region': regions, 'flag': rng.random(rows) < 0.5, 'value': rng.random(rows),
+                         'id': [f'row{i}' for i in range(rows)]})
+
+
+def test_stratified_sample_keeps_every_category_and_row_order():
+    df = _frame()
+    sample = stratified_sample(df, 200)
+    assert len(sample) == 200
+    assert set(sample['region']) == set(df['region'])
+    assert set(sample['flag']) == {True, False}
+    assert sample.index.is_monotonic_increasing
+    pd.testing.assert_frame_equal(sample, df.loc[sample.index])
+
+
+def test_stratified_sample_returns_small_frames_whole():
+    df = _frame(50)
+    sample = stratified_sample(df, 200)
+    pd.testing.assert_frame_equal(sample, df)
+    assert sample is not df
+
+
+def test_validation_sample_only_for_large_frames(monkeypatch):
+    monkeypatch.setattr('config.settings.SAMPLE_FIRST_MIN_ROWS', 5000)
+    monkeypatch.setattr('config.settings.SAMPLE_FIRST_ROWS', 300)
+    monkeypatch.setattr(sampling, '_samples', sampling.OrderedDict())
+    assert get_validation_sample(_frame(1000)) is None
+    df = _frame()
+    sample = get_validation_sample(df)
+    assert len(sample) == 300
+    assert get_validation_sample(df) is sample
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data.sketches import HyperLogLog, ReservoirSample, RunningMoments
+
+
+@pytest.mark.parametrize('distinct', [10, 1000, 50000])
+def test_hyperloglog_estimates_distinct_counts(distinct):
+    sketch = HyperLogLog(precision=12)
+    sketch.add_series(pd.Series(np.arange(distinct * 3) % distinct))
+    assert abs(sketch.count() - distinct) <= max(2, 0.05 * distinct)
+
+
+def test_hyperloglog_merge_equals_sketch_of_union():
+    left, right, both = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    a = pd.Series([f'user{i}' for i in range(0, 6000)])
+    b = pd.Series([f'user{i}' for i in range(4000, 10000)])
+    left.add_series(a)
+    right.add_series(b)
+    both.add_series(pd.concat([a, b]))
+    left.merge(right)
+    assert left.count() == both.count()
+    assert abs(left.count() - 10000) <= 500
+
+
+def test_hyperloglog_ignores_nulls_and_handles_unhashable_cells():
+    sketch = HyperLogLog()
+    sketch.add_series(pd.Series([None, np.nan, [1, 2], [1, 2], {'a': 1}], dtype=object))
+    assert sketch.count() == 2
+
+
+def test_reservoir_keeps_a_bounded_uniform_sample_of_appended_rows():
+    reservoir = ReservoirSample(size=200, seed=0)
+    for start in range(0, 20000, 1000):
+        reservoir.add(pd.DataFrame({'x': np.arange(start, start + 1000)}))
+    assert reservoir.seen == 20000
+    assert len(reservoir.rows) == 200
+    assert reservoir.rows['x'].is_unique
+    # Late chunks are represented as much as early ones
+    assert 0.35 < (reservoir.rows['x'] >= 10000).mean() < 0.65
+
+
+def test_reservoir_fills_up_before_sampling():
+    reservoir = ReservoirSample(size=10, seed=0)
+    reservoir.add(pd.DataFrame({'x': range(4)}))
+    reservoir.add(pd.DataFrame({'x': range(4, 8)}))
+    assert reservoir.rows['x'].tolist() == list(range(8))
+
+
+def test_running_moments_merge_matches_describe():
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame({'a': rng.normal(5, 2, 3000), 'b': rng.integers(0, 100, 3000).astype(float)})
+    frame.loc[::7, 'b'] = np.nan
+    moments = RunningMoments()
+    for start in range(0, len(frame), 750):
+        moments.add(frame.iloc[start:start + 750])
+    described = frame.describe()
+    for col in frame.columns:
+        assert moments.count[col] == described.loc['count', col]
+        assert moments.mean[col] == pytest.approx(described.loc['mean', col])
+        assert moments.std()[col] == pytest.approx(described.loc['std', col])
+        assert moments.min[col] == described.loc['min', col]
+        assert moments.max[col] == described.loc['max', col]
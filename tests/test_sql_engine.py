@@ -0,0 +1,53 @@
+import threading
+
+import pandas as pd
+import pytest
+
+from src.execution.executor import CANCELLED_ERROR
+from src.execution.sql_engine import execute_sql
+
+duckdb = pytest.importorskip('duckdb')
+
+
+def _frame() -> pd.DataFrame:
+    return pd.DataFrame({'region': ['North', 'South', 'North', 'East'], 'sales': [10.0, 20.0, 30.0, 5.0]})
+
+
+def test_query_returns_a_frame():
+    result, error = execute_sql(
+        "SELECT region, SUM(sales) AS total FROM df GROUP BY region ORDER BY total DESC", _frame(), use_cache=False
+    )
+    assert error is None
+    assert result['result'].to_dict('list') == {'region': ['North', 'South', 'East'], 'total': [40.0, 20.0, 5.0]}
+    assert result['fig'] is None
+
+
+def test_single_cell_becomes_a_scalar():
+    result, error = execute_sql("SELECT SUM(sales) FROM df", _frame(), use_cache=False)
+    assert error is None and result['result'] == 65.0
+
+
+def test_statements_other_than_queries_are_refused():
+    result, error = execute_sql("DROP TABLE df", _frame(), use_cache=False)
+    assert error and result['result'] is None
+
+
+def test_sql_errors_are_reported():
+    _, error = execute_sql("SELECT missing_column FROM df", _frame(), use_cache=False)
+    assert error and 'missing_column' in error
+
+
+def test_long_query_is_interrupted():
+    big = pd.DataFrame({'x': range(2000)})
+    _, error = execute_sql("SELECT COUNT(*) FROM df a, df b, df c WHERE a.x + b.x = c.x", big,
+                           timeout=0.2, use_cache=False)
+    assert error and error.startswith('TimeoutError')
+
+
+def test_cancel_event_interrupts_the_query():
+    big = pd.DataFrame({'x': range(2000)})
+    cancel = threading.Event()
+    threading.Timer(0.2, cancel.set).start()
+    _, error = execute_sql("SELECT COUNT(*) FROM df a, df b, df c WHERE a.x + b.x = c.x", big,
+                           timeout=30, use_cache=False, cancel=cancel)
+    assert error == CANCELLED_ERROR
@@ -0,0 +1,131 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from src.data.registry import DatasetRegistry, shared_view
+from src.data.store import DatasetStore, content_key, read_mapped_frame, write_frame
+
+
+def _frame() -> pd.DataFrame:
+    return pd.DataFrame({
+        'amount': np.arange(100, dtype='float64'),
+        'count': np.arange(100, dtype='int64'),
+        'region': ['North', 'South'] * 50,
+        'maybe': [1.0, None] * 50,
+    })
+
+
+def test_mapped_frame_round_trips(tmp_path):
+    path = str(tmp_path / 'frame.feather')
+    write_frame(_frame(), path)
+    pd.testing.assert_frame_equal(read_mapped_frame(path), _frame())
+
+
+def test_writes_to_mapped_frame_stay_private(tmp_path):
+    path = str(tmp_path / 'frame.feather')
+    write_frame(_frame(), path)
+    first = read_mapped_frame(path)
+    first.loc[0, 'amount'] = -1.0
+    assert read_mapped_frame(path)['amount'].iloc[0] == 0.0
+
+
+def test_store_rejects_malformed_keys(tmp_path):
+    store = DatasetStore(str(tmp_path))
+    assert store.get('../etc/passwd') is None
+    assert store.get('') is None
+
+
+def test_load_upload_parses_once(tmp_path):
+    store = DatasetStore(str(tmp_path))
+    data = _frame().to_csv(index=False).encode()
+    df, key, stats = store.load_upload(data, 'csv')
+    assert key == content_key(data) and stats['source'] == 'parsed'
+    again, _, stats = store.load_upload(data, 'csv')
+    assert stats['source'] == 'store'
+    pd.testing.assert_frame_equal(again, df)
+
+
+def test_store_evicts_least_recently_used(tmp_path):
+    store = DatasetStore(str(tmp_path), max_datasets=2)
+    keys = [content_key(bytes([i])) for i in range(3)]
+    for i, key in enumerate(keys):
+        assert store.put(key, pd.DataFrame({'a': [i]}))
+        # mtime resolution can be coarse; make the order explicit
+        os.utime(store.path_for(key), (i, i))
+    assert not store.has(keys[0])
+    assert store.has(keys[1]) and store.has(keys[2])
+
+
+def test_registry_shares_one_load():
+    registry = DatasetRegistry()
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return _frame(), {'rows': 100}
+
+    first, info = registry.acquire('key', loader)
+    second, _ = registry.acquire('key', loader)
+    assert len(loads) == 1 and info == {'rows': 100}
+    assert second.df is first.df and second.shared and not first.shared
+    assert registry.refs('key') == 2
+    first.release()
+    second.release()
+    assert registry.refs('key') == 0
+
+
+def test_registry_concurrent_opens_wait_for_one_load():
+    registry = DatasetRegistry()
+    started, release = threading.Event(), threading.Event()
+    loads = []
+
+    def loader():
+        loads.append(1)
+        started.set()
+        release.wait(5)
+        return _frame(), {}
+
+    leases = []
+    threads = [threading.Thread(target=lambda: leases.append(registry.acquire('key', loader))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    started.wait(5)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(loads) == 1 and len(leases) == 4
+    assert registry.refs('key') == 4
+
+
+def test_registry_missing_and_failed_loads():
+    registry = DatasetRegistry()
+    assert registry.acquire('key', lambda: None) is None
+
+    def failing():
+        raise ValueError('bad file')
+
+    try:
+        registry.acquire('key', failing)
+    except ValueError:
+        pass
+    lease, _ = registry.acquire('key', lambda: (_frame(), {}))
+    assert not lease.shared
+
+
+def test_registry_evicts_idle_entries():
+    registry = DatasetRegistry(idle_seconds=0)
+    lease, _ = registry.acquire('key', lambda: (_frame(), {}))
+    assert registry.evict_idle() == 0
+    lease.release()
+    assert registry.evict_idle() == 1
+    assert registry.stats()['datasets'] == 0
+
+
+def test_shared_view_leaves_shared_frame_unchanged():
+    shared = _frame()
+    view = shared_view(shared)
+    view['amount'] = 0.0
+    view['extra'] = 1
+    assert shared['amount'].iloc[1] == 1.0 and 'extra' not in shared
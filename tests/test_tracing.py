@@ -0,0 +1,75 @@
+import threading
+
+import pytest
+
+from src.utils import tracing
+from src.utils.tracing import Tracer, add_to_current, bind, classify_query, current_span, span
+
+
+@pytest.fixture
+def tracer(monkeypatch):
+    tracer = Tracer(enabled=True)
+    monkeypatch.setattr(tracing, '_tracer', tracer)
+    return tracer
+
+
+@pytest.mark.parametrize('question, query_class', [
+    ('Monthly revenue trend', 'trend'),
+    ('Top 5 customers', 'top_n'),
+    ('Total sales by region', 'aggregate'),
+    ('Show orders with discounts', 'filter'),
+    ('Plot a histogram of age', 'chart'),
+    ('Hello', 'other'),
+])
+def test_classify_query(question, query_class):
+    assert classify_query(question) == query_class
+
+
+def test_spans_nest_and_export(tracer):
+    with span('query', query_class='aggregate') as root:
+        with span('exec', rows=10) as child:
+            add_to_current(prompt_tokens=5)
+            add_to_current(prompt_tokens=7)
+            child.set(error='ValueError: bad')
+    records = tracing.trace_spans(root.trace_id)
+    assert [record['name'] for record in records] == ['exec', 'query']
+    exec_record = records[0]
+    assert exec_record['parent_id'] == root.span_id and exec_record['query_class'] == 'aggregate'
+    assert exec_record['attributes'] == {'rows': 10, 'prompt_tokens': 12}
+    assert exec_record['error'] == 'ValueError: bad'
+    assert current_span() is tracing._NOOP
+
+
+def test_exceptions_mark_the_span_failed(tracer):
+    with pytest.raises(KeyError):
+        with span('exec'):
+            raise KeyError('a')
+    assert tracer.recent()[-1]['error'] == "KeyError: 'a'"
+
+
+def test_bind_carries_the_span_into_threads(tracer):
+    with span('race') as parent:
+        thread = threading.Thread(target=bind(lambda: add_to_current(rows=3)))
+        thread.start()
+        thread.join()
+    assert tracer.recent()[-1]['attributes'] == {'rows': 3}
+    assert tracer.recent()[-1]['span_id'] == parent.span_id
+
+
+def test_disabled_tracer_yields_noop(monkeypatch):
+    monkeypatch.setattr(tracing, '_tracer', Tracer(enabled=False))
+    with span('exec') as noop:
+        noop.set(rows=1)
+    assert tracing.get_tracer().recent() == []
+
+
+def test_metrics_render_histogram_and_counters(tracer):
+    with span('exec', query_class='trend', rows=4):
+        pass
+    with span('exec', query_class='trend', rows=6) as failed:
+        failed.set(error='boom')
+    text = tracing.render_metrics()
+    assert 'dataspark_stage_seconds_count{stage="exec",query_class="trend"} 2' in text
+    assert 'dataspark_stage_errors_total{stage="exec",query_class="trend"} 1' in text
+    assert 'dataspark_stage_rows_total{stage="exec",query_class="trend"} 10' in text
+    assert tracer.metrics.summary()['exec']['count'] == 2